@@ -4,18 +4,42 @@ Create installers for duoauthproxy distributions.
 """
 
 from atexit import register as atexit_register
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+from functools import partial
+from hashlib import sha256
+from io import BytesIO, StringIO
 from json import dumps as json_dumps, loads as json_loads
 from logging import getLogger
-from pathlib import Path, PurePath
+from os import cpu_count, environ
+from pathlib import Path, PurePath, PurePosixPath
+from re import fullmatch as re_fullmatch, split as re_split
 from shutil import copytree, copyfileobj, move, rmtree
 from subprocess import PIPE, STDOUT, run
-from tarfile import open as tarfile_open
-from tempfile import TemporaryDirectory, mkdtemp
+from tarfile import TarInfo, open as tarfile_open
+from tempfile import SpooledTemporaryFile, TemporaryDirectory, mkdtemp
+from threading import local as threading_local
+from time import monotonic
 from urllib.parse import urlparse
 
 from devautotools import VirtualEnvironmentManager
 from requests import get as requests_get
 
+from ._buildscheduler import DEFAULT_HISTORY_FILE, BuildHistory, BuildScheduler, measured_command
+from ._bundle import SitePackagesBundle
+from ._compilercache import CACHE_DIR_VARIABLE, CompilerCache
+from ._daemon import BuildClient, BuildDaemon
+from ._loadtest import LoadTest, compare_results
+from ._members import MemberTable, TarballIndex, member_table_memory
+from ._pipeline import Stage, StagePipeline
+from ._requirements import WheelRequirements
+from ._sbom import BillOfMaterials, FileDigests
+from ._standins import StandIns, StandInServer
+from ._wheelbuilder import SOURCE_DATE_EPOCH_VARIABLE, PureWheelBuilder, source_date_epoch
+from ._wheelinstaller import WheelInstaller
+from ._wheels import DEFAULT_INDEX_URL, SdistSource, SimpleIndexSource, WheelhouseSource, WheelResolver, canonical_name, interpreter_environment, interpreter_tags, interpreter_venv, parse_wheel_name
+from ._yumrepo import YumRepository
+
 try:
 	from jinja2 import Environment as Jinja2Environment
 except ImportError:
@@ -31,89 +55,148 @@ LOGGER = getLogger(__name__)
 
 DEFAULT_TARGET_INSTALL_PATH = '/opt/duoauthproxy'
 NON_PYTHON_MODULES = ['python-']
-		
+PGO_TRAINING_SCRIPT = Path(__file__).parent / 'data' / 'pgo_training.py'
+
 
 class InstallerTarball:
-	"""
-	
+	"""Installer tarball
+	The duoauthproxy source tarball at "file_path". The member table and the facts found out of it (root directory, python version and modules) are kept in a sidecar TarballIndex with "use_index", so every other InstallerTarball for the same tarball loads them instead of reading the whole archive again.
 	"""
 	
 	BASIC_PYTHON_MODULES = ('pip', 'setuptools', 'setuptools_scm', 'wheel')
 	NON_PYTHON_MODULES = ('python-',)
+	INSTANCE_DEFAULT_PORTS = (('radius_server_', 1812), ('ldap_server_auto', 389))
+	SYSTEMD_INSTANCE_UNIT_FILE_NAME = 'duoauthproxy@.service'
+	SYSTEMD_TARGET_FILE_NAME = 'duoauthproxy.target'
 	SYSTEMD_UNIT_FILE_NAME = 'duoauthproxy.service'
 	
-	def __init__(self, file_path):
+	def __init__(self, file_path, *, use_index=True):
 		"""
 		
 		"""
 		
 		self._path = Path(file_path)
+		self._use_index = use_index
+		self._local = threading_local()
+		self.digests = FileDigests()
 	
 	def __getattr__(self, item):
 		"""
 		
 		"""
 		
-		if item == 'members':
-			value = self.tarball_obj.getmembers()
-			if not value:
-				raise RuntimeError('Empty tarball "{}"'.format(str(self._path)))
-		elif item == 'member_paths':
-			value = {PurePath(member.name): member for member in self.members}
+		if item == 'member_paths':
+			if self.tarball_index is not None:
+				value = self.tarball_index.members
+			else:
+				value = MemberTable.from_tarball(self._path)
+				if not value:
+					raise RuntimeError('Empty tarball "{}"'.format(str(self._path)))
+				if self._use_index:
+					self.member_paths = value
+					self.tarball_index = self.save_index()
 		elif item == 'packages_dir':
 			value = self.root_dir / 'pkgs'
 		elif item == 'python_version':
-			value = None
+			value = self._indexed('python_version')
 			LOOKING_FOR = 'python-'
-			for member in self.member_paths:
-				if member.parent == self.packages_dir:
+			if value is None:
+				for member in self.member_paths.paths(self.packages_dir, recursive=False):
 					if member.name[:len(LOOKING_FOR)].lower() == LOOKING_FOR.lower():
 						value = member.name[len(LOOKING_FOR):].split('.')
 						break
 			if value is None:
 				raise RuntimeError("Couldn't detect the version of the Python package")
 		elif item == 'root_dir':
-			value = PurePath(self.members[0].name).parts[0]
-			for member in self.member_paths:
-				if value != member.parts[0]:
-					raise ValueError('Unknown tarball structure')
+			value = self._indexed('root_dir')
+			if value is None:
+				roots = self.member_paths.roots()
+				if len(roots) != 1:
+					raise ValueError('Unknown tarball structure, several top level entries: {}'.format(', '.join(roots)))
+				value = roots[0]
 			value = PurePath(value)
-		elif item == 'tarball_obj':
-			value = tarfile_open(name=self._path)
+		elif item == 'tarball_index':
+			value = TarballIndex.load(self._path) if self._use_index else None
 		else:
 			raise AttributeError(item)
 		
 		self.__setattr__(item, value)
 		return value
 	
-	def build_sources(self, *source_modules, wheels_dir, venv_wheels={}):
-		"""
-
+	def build_sources(self, *source_modules, wheels_dir, venv_wheels={}, max_workers=None, native_builds=True, compiler_cache=None, build_history=None, memory_budget=None, python=None):
+		"""Build source modules
+		Builds wheels for the source modules into "wheels_dir". The tarball is read once, as a stream, and every module is queued for building as soon as its subtree is extracted; the build venv (created by the "python" interpreter, the running one by default) gets ready meanwhile.
+		
+		The builds are admitted by a BuildScheduler, against the "memory_budget" (80% of the available memory by default) and "max_workers" CPUs (the CPU count by default), using the peak RSS, CPU usage and duration of previous builds of the same modules recorded in "build_history" (a BuildHistory, the one in the user cache by default); the longest builds start first.
+		
+		With "native_builds" the pure python modules are turned into wheels straight from the tarball stream by a PureWheelBuilder (no temporary tree, no setuptools run); the rest (extension modules, custom build steps) go through "setup.py bdist_wheel", with their compilations cached by "compiler_cache" (a CompilerCache) if provided.
 		"""
 		
 		result = []
-		with VirtualEnvironmentManager(path=None) as venv:
-			venv('-m', 'pip', 'install', '--upgrade', *['=='.join(item) for item in venv_wheels.items()],)
+		wheels_dir = Path(wheels_dir)
+		builders = {}
+		if native_builds:
+			for module in source_modules:
+				builder = PureWheelBuilder.for_package(self, module, wheels_dir)
+				if builder is not None:
+					builders[module] = builder
+		
+		with ThreadPoolExecutor(max_workers=1) as venv_executor:
+			venv_future = venv_executor.submit(self._build_venv, venv_wheels, python) if len(builders) < len(source_modules) else None
 			with TemporaryDirectory() as temp_dir_name:
-				temp_dir = Path(temp_dir_name)
-				for module in source_modules:
-					module_dir = temp_dir / module
-					self.extract_package(module, temp_dir)
-					try:
-						venv('setup.py', 'bdist_wheel', cwd=module_dir)
-					except Exception:
-						LOGGER.exception("Couldn't build module: %s", module)
-					else:
-						module_dist = list((module_dir / 'dist').iterdir())
-						if not module_dist:
-							raise RuntimeError('No resulting wheel')
-						elif len(module_dist) > 1:
-							raise RuntimeError('Too many resulting files')
+				with BuildScheduler(build_history, memory_budget=memory_budget, cpu_budget=max_workers) as scheduler:
+					futures = []
+					for module, module_path in self.stream_packages(temp_dir_name, *source_modules, builders=builders):
+						if module_path.suffix == '.whl':
+							result.append(module_path)
 						else:
-							move(module_dist[0], wheels_dir)
-							result.append(wheels_dir / module_dist[0].name)
+							if venv_future is None:
+								venv_future = venv_executor.submit(self._build_venv, venv_wheels, python)
+							package, separator, version = module.rpartition('-')
+							futures.append(scheduler.submit(package if separator else module, version if separator else None, self._build_module, venv_future, module, module_path, wheels_dir, compiler_cache))
+					for future in futures:
+						wheel = future.result()
+						if wheel is not None:
+							result.append(wheel)
 		return result
+	
+	@staticmethod
+	def _build_module(venv_future, module, module_dir, wheels_dir, compiler_cache=None, usage_file=None):
+		"""
 		
+		"""
+		
+		venv = venv_future.result()
+		arguments = ('setup.py', 'bdist_wheel') if usage_file is None else measured_command(usage_file, 'setup.py', 'bdist_wheel')
+		try:
+			if compiler_cache is None:
+				venv(*arguments, cwd=module_dir, env=dict(environ, **{SOURCE_DATE_EPOCH_VARIABLE: str(source_date_epoch())}))
+			else:
+				with compiler_cache.track(module) as environment:
+					environment[SOURCE_DATE_EPOCH_VARIABLE] = str(source_date_epoch())
+					venv(*arguments, cwd=module_dir, env=environment)
+		except Exception:
+			LOGGER.exception("Couldn't build module: %s", module)
+			return None
+		
+		module_dist = list((module_dir / 'dist').iterdir())
+		if not module_dist:
+			raise RuntimeError('No resulting wheel')
+		elif len(module_dist) > 1:
+			raise RuntimeError('Too many resulting files')
+		else:
+			return Path(move(module_dist[0], wheels_dir / module_dist[0].name))
+	
+	@staticmethod
+	def _build_venv(venv_wheels, python=None):
+		"""
+		
+		"""
+		
+		venv = interpreter_venv(python)
+		venv('-m', 'pip', 'install', '--upgrade', *['=='.join(item) for item in venv_wheels.items()],)
+		return venv
+	
 	def extract_file(self, path, destination=None, *, parents=True, exist_ok=False, fail_silently=False):
 		"""
 		
@@ -128,7 +211,7 @@ class InstallerTarball:
 				raise ValueError('Path "{}" is not a file'.format(member.name))
 		
 		if destination is None:
-			with self.tarball_obj.extractfile(member) as source_f:
+			with self.open_member(member) as source_f:
 				return source_f.read()
 		
 		destination = Path(destination)
@@ -137,27 +220,26 @@ class InstallerTarball:
 		if destination.exists() and not exist_ok:
 			raise FileExistsError(str(destination))
 		destination.parent.mkdir(parents=parents, exist_ok=True)
-		with destination.open('wb') as dest_f:
-			with self.tarball_obj.extractfile(member) as source_f:
-				copyfileobj(source_f, dest_f)
+		with self.open_member(member) as source_f:
+			self.digests.copy(source_f, destination)
 		return destination
 	
-	def extract_package(self, package_name, destination):
+	def extract_package(self, package_name, destination, *, exist_ok=False):
 		"""
 		
 		"""
 		
 		destination = Path(destination)
 		package_path = self.packages_dir / package_name
-		members = [member for member in self.member_paths if package_path in member.parents]
+		members = list(self.member_paths.paths(package_path))
 		if members:
 			result = []
 			for member in members:
-				extracted_member = self.extract_file(member, destination/ package_name / member.relative_to(package_path), fail_silently=True)
+				extracted_member = self.extract_file(member, destination/ package_name / member.relative_to(package_path), exist_ok=exist_ok, fail_silently=True)
 				if extracted_member is not None:
 					result.append(extracted_member)
 		else:
-			result = self.extract_file(package_path, destination)
+			result = self.extract_file(package_path, destination, exist_ok=exist_ok)
 		return result
 	
 	def get_dir_members(self, directory):
@@ -169,25 +251,49 @@ class InstallerTarball:
 		if not directory.is_relative_to(self.root_dir):
 			directory = self.root_dir / directory
 		
-		return [member for member in self.member_paths if directory in member.parents]
-		
+		return list(self.member_paths.paths(directory))
+	
 	def identify_modules(self):
 		"""Identify modules on the tarball
 		Given a tarball, detect all the packages present and sort wheels, source modules, and "special cases" (mostly "cryptography")
 		"""
 		
+		modules = self._indexed('modules')
+		if modules is not None:
+			return tuple(list(names) for names in modules)
+		
 		wheels, source_modules, special = [], [], []
-		for member in self.member_paths:
-			if member.parent == self.packages_dir:
-				if member.suffix == '.whl':
-					wheels.append(member.name)
-				elif self.is_python_module(member.name) and (member / 'setup.py' in self.member_paths):
-					source_modules.append(member.name)
-				else:
-					special.append(member.name)
+		for member in self.member_paths.paths(self.packages_dir, recursive=False):
+			if member.suffix == '.whl':
+				wheels.append(member.name)
+			elif self.is_python_module(member.name) and (member / 'setup.py' in self.member_paths):
+				source_modules.append(member.name)
+			else:
+				special.append(member.name)
 		
 		return wheels, source_modules, special
 	
+	@classmethod
+	def instance_config(cls, config_text, instance, port_stride=1):
+		"""Instance configuration
+		Derives the configuration for the (1 based) "instance" out of the template "config_text": every listening section (radius_server_* and ldap_server_auto) gets its port moved by "port_stride" per instance, starting from the configured port (or the default one for the section).
+		"""
+		
+		config = ConfigParser(interpolation=None, strict=False)
+		config.optionxform = str
+		config.read_string(config_text)
+		
+		offset = (int(instance) - 1) * port_stride
+		for section in config.sections():
+			for prefix, default_port in cls.INSTANCE_DEFAULT_PORTS:
+				if section.startswith(prefix):
+					config[section]['port'] = str(int(config[section].get('port', default_port)) + offset)
+					break
+		
+		result = StringIO()
+		config.write(result)
+		return result.getvalue()
+	
 	@classmethod
 	def is_python_module(cls, package_name):
 		"""Is it a python module?
@@ -199,17 +305,90 @@ class InstallerTarball:
 				return False
 		return True
 	
-	def prepare_assets(self, output_dir=Path.cwd(), service_uid='root', clean_output_first=False, wheels_dir_name='wheels'):
+	def save_index(self):
+		"""Save the analysis index
+		Saves the member table and the facts found out of it (root directory, python version and modules) as a TarballIndex next to the tarball, returning it.
 		"""
-
+		
+		facts = {}
+		for name, fact in (('root_dir', lambda: self.root_dir.as_posix()), ('python_version', lambda: list(self.python_version)), ('modules', lambda: tuple(list(names) for names in self.identify_modules()))):
+			try:
+				facts[name] = fact()
+			except (RuntimeError, ValueError) as error:
+				LOGGER.debug('Not indexing "%s" for %s: %s', name, self._path, error)
+		
+		tarball_index = TarballIndex(self._path, self.member_paths, facts)
+		tarball_index.save()
+		return tarball_index
+	
+	def _indexed(self, fact):
 		"""
 		
-		result = {}
+		"""
 		
-		output_dir = Path(output_dir).absolute()
-		if clean_output_first and output_dir.exists():
-			rmtree(output_dir)
-		output_dir.mkdir(parents=True, exist_ok=True)
+		if self.tarball_index is None:
+			return None
+		return self.tarball_index.facts.get(fact)
+	
+	def build_python(self, prefix, *, optimizations=False, training_script=PGO_TRAINING_SCRIPT, training_iterations=20000, jobs=None):
+		"""Build the bundled interpreter
+		Builds the python shipped in the tarball and installs it (as "make altinstall" does) under "prefix", returning the path to the interpreter. With "optimizations" the build uses "--enable-optimizations --with-lto", and the profile guided part is trained with "training_script" (a workload mimicking the proxy's hot paths by default) instead of the python test suite.
+		
+		The interpreter links to the system OpenSSL, not the one in the tarball.
+		"""
+		
+		prefix = Path(prefix).absolute()
+		package_name = next((member.name for member in self.member_paths.paths(self.packages_dir, recursive=False) if self.member_paths.isdir(member) and member.name.lower().startswith('python-')), None)
+		if package_name is None:
+			raise RuntimeError('No python source found in the tarball')
+		
+		configure_args = ['--prefix={}'.format(prefix)]
+		if optimizations:
+			configure_args += ['--enable-optimizations', '--with-lto', 'PROFILE_TASK=-E {} --iterations {}'.format(Path(training_script).absolute(), training_iterations)]
+		
+		with TemporaryDirectory() as temp_dir_name:
+			source_dir = dict(self.stream_packages(temp_dir_name, package_name))[package_name]
+			run(('sh', './configure', *configure_args), cwd=source_dir, check=True)
+			run(('make', '-j{}'.format(jobs or cpu_count() or 1)), cwd=source_dir, check=True)
+			run(('make', 'altinstall'), cwd=source_dir, check=True)
+		
+		return prefix / 'bin' / 'python{}'.format('.'.join(self.python_version[:2]))
+	
+	def classify_wheels(self, wheels=None, python=None):
+		"""Classify the wheels on the tarball
+		Sort the wheels in the tarball into the ones needed by the build venv (BASIC_PYTHON_MODULES), the ones compatible with the "python" interpreter (the running one by default), and the ones that would need to be fetched elsewhere. The supported tags of the interpreter are computed once (and cached) and, when there are several compatible wheels for a distribution, the one with the best ranked tag is picked.
+		"""
+		
+		if wheels is None:
+			wheels = self.identify_modules()[0]
+		
+		ranking = {tag: rank for rank, tag in enumerate(interpreter_tags(python))}
+		venv_wheels, ranked_wheels, missing_wheels = {}, {}, {}
+		for wheel in wheels:
+			wheel_data = VirtualEnvironmentManager.parse_wheel_name(wheel)
+			distribution = wheel_data['distribution']
+			if distribution in self.BASIC_PYTHON_MODULES:
+				venv_wheels[distribution] = wheel_data['version']
+				continue
+			
+			rank = min((ranking[tag] for tag in parse_wheel_name(wheel)[2] if tag in ranking), default=None)
+			if rank is None:
+				if distribution not in ranked_wheels:
+					missing_wheels[distribution] = wheel_data['version']
+			elif (distribution not in ranked_wheels) or (rank < ranked_wheels[distribution][0]):
+				ranked_wheels[distribution] = (rank, wheel)
+				missing_wheels.pop(distribution, None)
+		
+		local_wheels = {distribution: wheel for distribution, (rank, wheel) in ranked_wheels.items()}
+		return venv_wheels, local_wheels, missing_wheels
+	
+	def extract_assets(self, output_dir):
+		"""Extract the non python assets
+		Extracts the configuration, documentation (licenses), selinux policy and the loose python files from the tarball.
+		"""
+		
+		result = {}
+		output_dir = Path(output_dir)
 		
 		conf_content = self.get_dir_members('conf')
 		if conf_content:
@@ -244,52 +423,178 @@ class InstallerTarball:
 				if file_path.suffix == '.py':
 					result['extra_py'].append(self.extract_file(file_path, extra_py_dir, exist_ok=True))
 		
-		wheels, source_modules, special = self.identify_modules()
+		return result
+	
+	def extract_wheels(self, *wheels, wheels_dir):
+		"""Extract wheels
+		Extracts the provided wheels (file names in the packages directory) into "wheels_dir".
+		"""
+		
+		wheels_dir = Path(wheels_dir)
+		wheels_dir.mkdir(parents=True, exist_ok=True)
+		return [self.extract_package(wheel, wheels_dir, exist_ok=True) for wheel in wheels]
+	
+	def member_table_memory(self):
+		"""Member table memory
+		Benchmark of the memory taken by the member table of the tarball, compared to the "{PurePath: TarInfo}" dict it replaced.
+		"""
 		
-		venv_wheels, local_wheels, result['missing_wheels'] ={}, {}, {}
-		with VirtualEnvironmentManager(path=None) as venv:
-			for wheel in wheels:
-				wheel_data = venv.parse_wheel_name(wheel)
-				if wheel_data['distribution'] in self.BASIC_PYTHON_MODULES:
-					venv_wheels[wheel_data['distribution']] = wheel_data['version']
-				elif venv.compatible_wheel(wheel):
-					local_wheels[wheel_data['distribution']] = wheel
-					if wheel_data['distribution'] in result['missing_wheels']:
-						del result['missing_wheels'][wheel_data['distribution']]
-				elif wheel_data['distribution'] not in local_wheels:
-					result['missing_wheels'][wheel_data['distribution']] = wheel_data['version']
+		return member_table_memory(self._path)
+	
+	def open_member(self, member):
+		"""Open a member
+		File object for the member's content. Every thread gets its own handle on the tarball, so extractions can run concurrently.
+		"""
+		
+		tarball_obj = getattr(self._local, 'tarball_obj', None)
+		if tarball_obj is None:
+			tarball_obj = tarfile_open(name=self._path)
+			self._local.tarball_obj = tarball_obj
+		return tarball_obj.extractfile(member)
+	
+	def stream_packages(self, destination, *package_names, builders={}):
+		"""Stream packages
+		Reads the tarball once, as a stream, extracting the files of the "package_names" subtrees (in the packages directory) into "destination". It's a generator that yields (package name, extracted path) as soon as each package is completely extracted, so it can be consumed while the rest of the tarball is still being read.
+		
+		The packages with an entry in "builders" (a PureWheelBuilder) are not extracted; their files are streamed into the builder and the resulting wheel path is yielded instead (its digest, computed while it was written, goes to "digests"). When a builder gives up along the way the package is extracted after all, and its directory is yielded as usual.
+		"""
+		
+		destination = Path(destination)
+		pending = {self.packages_dir / package_name: sum(1 for name in self.member_paths.names(self.packages_dir / package_name)) for package_name in package_names}
+		native = {package_name for package_name in package_names if package_name in builders}
+		
+		for package_path, count in tuple(pending.items()):
+			if not count:
+				LOGGER.warning('Empty package in tarball: %s', package_path.name)
+				del pending[package_path]
+				yield package_path.name, destination / package_path.name
+		
+		with tarfile_open(name=self._path, mode='r|*') as tarball_stream:
+			for member in tarball_stream:
+				if not pending:
+					break
+				member_path = PurePath(member.name)
+				package_path = next((parent for parent in member_path.parents if parent in pending), None)
+				if package_path is None:
+					continue
+				
+				if member.isfile():
+					with tarball_stream.extractfile(member) as source_f:
+						if package_path.name in native:
+							builder = builders[package_path.name]
+							builder.add(member_path.relative_to(package_path), source_f, member)
+							if builder.fallback is not None:
+								native.discard(package_path.name)
+								builder.spill(destination / package_path.name)
+						else:
+							target = destination / package_path.name / member_path.relative_to(package_path)
+							target.parent.mkdir(parents=True, exist_ok=True)
+							with target.open('wb') as dest_f:
+								copyfileobj(source_f, dest_f)
+							if member.mode & 0o111:
+								target.chmod(member.mode & 0o777)
+				
+				pending[package_path] -= 1
+				if not pending[package_path]:
+					del pending[package_path]
+					LOGGER.debug('Package extracted: %s', package_path.name)
+					if package_path.name in native:
+						try:
+							wheel = builders[package_path.name].finish()
+						except (OSError, RuntimeError):
+							LOGGER.warning("Couldn't build %s natively, falling back to setup.py", package_path.name, exc_info=True)
+							builders[package_path.name].abort()
+							self.extract_package(package_path.name, destination, exist_ok=True)
+						else:
+							self.digests[wheel.absolute()] = builders[package_path.name].digest
+							yield package_path.name, wheel
+							continue
+					yield package_path.name, destination / package_path.name
+		
+		if pending:
+			raise RuntimeError('Incomplete packages in tarball: {}'.format(', '.join(package_path.name for package_path in pending)))
+	
+	def prepare_assets(self, output_dir=Path.cwd(), service_uid='root', clean_output_first=False, wheels_dir_name='wheels'):
+		"""
+		
+		"""
+		
+		output_dir = Path(output_dir).absolute()
+		if clean_output_first and output_dir.exists():
+			rmtree(output_dir)
+		output_dir.mkdir(parents=True, exist_ok=True)
+		
+		result = self.extract_assets(output_dir)
+		
+		wheels, source_modules, special = self.identify_modules()
+		venv_wheels, local_wheels, result['missing_wheels'] = self.classify_wheels(wheels)
 		
 		result['wheels_dir'] = (output_dir / wheels_dir_name).absolute()
 		
 		if local_wheels:
-			result['wheels_dir'].mkdir(parents=True, exist_ok=True)
-			result['local_wheels'] = []
-			for wheel in local_wheels.values():
-				result['local_wheels'].append(self.extract_package(wheel, result['wheels_dir']))
+			result['local_wheels'] = self.extract_wheels(*local_wheels.values(), wheels_dir=result['wheels_dir'])
 		
 		if source_modules:
 			result['wheels_dir'].mkdir(parents=True, exist_ok=True)
 			result['built_wheels'] = self.build_sources(*source_modules, wheels_dir=result['wheels_dir'], venv_wheels=venv_wheels)
 		
+		result['systemd_unit'] = self.render_systemd_unit(output_dir, service_uid=service_uid)
+		
+		return result
+	
+	def render_instance_units(self, output_dir, instances, install_dir=None, service_uid='root', profile=None):
+		"""Render the multi-instance systemd units
+		Writes a "duoauthproxy@.service" template unit and a "duoauthproxy.target" unit that starts the "instances" (a number, or the list of instance names) into "output_dir". Every instance gets its own pidfile, run and log directories and configuration (conf/instances/<instance>/authproxy.cfg), bound into the standard locations for the instance only.
+		
+		The settings of the RuntimeProfile "profile" that can't be shared by the instances (like the CPU affinity) are left out of the template and go, with the share of every instance, into a "duoauthproxy@<instance>.service.d/runtime-profile.conf" drop-in.
+		"""
+		
+		output_dir = Path(output_dir)
+		install_dir = output_dir if install_dir is None else install_dir
+		if isinstance(instances, int):
+			instances = [str(instance) for instance in range(1, instances + 1)]
+		
+		jinja_env = Jinja2Environment()
+		result = {}
+		for key, file_name, context in (('systemd_instance_unit', self.SYSTEMD_INSTANCE_UNIT_FILE_NAME, {'install_dir': install_dir, 'service_uid': service_uid, 'profile': profile, 'instance_settings': RuntimeProfile.INSTANCE_SETTINGS}), ('systemd_target', self.SYSTEMD_TARGET_FILE_NAME, {'instances': instances})):
+			template = Path(__file__).parent / 'data' / (file_name + '.jinja')
+			result[key] = output_dir / file_name
+			self.digests.write(result[key], jinja_env.from_string(template.read_text()).render(context))
+		
+		if profile is not None:
+			for position, instance in enumerate(instances):
+				settings = profile.instance_service(position, len(instances))
+				if settings:
+					drop_in = output_dir / (self.SYSTEMD_INSTANCE_UNIT_FILE_NAME.replace('@', '@' + instance) + '.d') / 'runtime-profile.conf'
+					drop_in.parent.mkdir(parents=True, exist_ok=True)
+					result['systemd_drop_in_' + instance] = self.digests.write(drop_in, '[Service]\n' + ''.join('{}={}\n'.format(name, value) for name, value in settings.items()))
+		return result
+	
+	def render_systemd_unit(self, output_dir, service_uid='root', install_dir=None, profile=None):
+		"""Render the systemd unit
+		Writes the systemd unit for the service into "output_dir". The unit points to "install_dir" (the "output_dir" by default) and applies the RuntimeProfile "profile", if any.
+		"""
+		
+		output_dir = Path(output_dir)
+		install_dir = output_dir if install_dir is None else install_dir
 		systemd_unit_template = Path(__file__).parent / 'data' / (self.SYSTEMD_UNIT_FILE_NAME + '.jinja')
 		jinja_env = Jinja2Environment()
 		systemd_unit = jinja_env.from_string(systemd_unit_template.read_text())
-		result['systemd_unit'] = output_dir / self.SYSTEMD_UNIT_FILE_NAME
-		result['systemd_unit'].write_text(systemd_unit.render({'output_dir': output_dir, 'service_uid': service_uid}))
-		
+		result = output_dir / self.SYSTEMD_UNIT_FILE_NAME
+		self.digests.write(result, systemd_unit.render({'output_dir': install_dir, 'service_uid': service_uid, 'profile': profile}))
 		return result
-		
+
 
 class RPMVenvTemplate(dict):
 	"""
-
+	
 	"""
 	
 	VALID_BLOCKS = ('blocks', 'core', 'extensions', 'python_venv')
 	
 	def __init__(self, base_dir=None, *, load_defaults=True):
 		"""
-
+		
 		"""
 		
 		super().__init__()
@@ -299,7 +604,7 @@ class RPMVenvTemplate(dict):
 	
 	def __missing__(self, key):
 		"""
-
+		
 		"""
 		
 		if key not in self.VALID_BLOCKS:
@@ -311,7 +616,7 @@ class RPMVenvTemplate(dict):
 	
 	def __str__(self):
 		"""
-
+		
 		"""
 		
 		return json_dumps(self, default=str, indent=4)
@@ -319,7 +624,7 @@ class RPMVenvTemplate(dict):
 	@property
 	def name(self):
 		"""
-
+		
 		"""
 		
 		return self['core']['name']
@@ -327,7 +632,7 @@ class RPMVenvTemplate(dict):
 	@property
 	def version(self):
 		"""
-
+		
 		"""
 		
 		return self['core']['version']
@@ -335,7 +640,7 @@ class RPMVenvTemplate(dict):
 	@version.setter
 	def version(self, new_version):
 		"""
-
+		
 		"""
 		
 		self['core']['version'] = new_version
@@ -343,7 +648,7 @@ class RPMVenvTemplate(dict):
 	@version.deleter
 	def version(self):
 		"""
-
+		
 		"""
 		
 		del self['core']['version']
@@ -353,7 +658,7 @@ class RPMVenvTemplate(dict):
 	@property
 	def release(self):
 		"""
-
+		
 		"""
 		
 		return self['core']['release']
@@ -361,7 +666,7 @@ class RPMVenvTemplate(dict):
 	@release.setter
 	def release(self, new_release):
 		"""
-
+		
 		"""
 		
 		self['core']['release'] = new_release
@@ -369,7 +674,7 @@ class RPMVenvTemplate(dict):
 	@release.deleter
 	def release(self):
 		"""
-
+		
 		"""
 		
 		del self['core']['release']
@@ -378,7 +683,7 @@ class RPMVenvTemplate(dict):
 	
 	def add_data_file(self, src, dest):
 		"""
-
+		
 		"""
 		
 		dest = PurePath(dest)
@@ -391,7 +696,7 @@ class RPMVenvTemplate(dict):
 	
 	def load_defaults(self):
 		"""
-
+		
 		"""
 		
 		default_json = Path(__file__).parent / 'data' / 'default_template.json'
@@ -399,7 +704,7 @@ class RPMVenvTemplate(dict):
 			raise FileNotFoundError(str(default_json))
 		
 		self.update(json_loads(default_json.read_text()))
-		
+	
 	def update_venv(self, name, path, requirements, python):
 		"""
 		
@@ -414,11 +719,135 @@ class RPMVenvTemplate(dict):
 		self['python_venv']['cmd'] = str(python) + ' -m venv'
 
 
+class RuntimeProfile(dict):
+	"""Runtime profile
+	Named set of tuning knobs for the service (Twisted reactor, environment and systemd settings), loaded from a data file and validated when loaded.
+	"""
+	
+	DATA_DIR = Path(__file__).parent / 'data'
+	ENVIRONMENT_NAME = r'[A-Z_][A-Z0-9_]*'
+	ENVIRONMENT_VALUES = {
+		'MALLOC_ARENA_MAX': r'[1-9][0-9]*',
+		'PYTHONOPTIMIZE': r'[0-2]',
+	}
+	INSTANCE_SETTINGS = ('CPUAffinity',)
+	PROFILE_FILES = 'runtime_profile_{}.json'
+	REACTORS = ('default', 'epoll', 'poll', 'select')
+	SERVICE_SETTINGS = {
+		'CPUAffinity': r'[0-9]+(-[0-9]+)?([ ,][0-9]+(-[0-9]+)?)*',
+		'CPUSchedulingPolicy': r'other|batch|idle|fifo|rr',
+		'IOSchedulingClass': r'realtime|best-effort|idle',
+		'IOSchedulingPriority': r'[0-7]',
+		'MemoryHigh': r'[0-9]+[KMGT]?|[0-9]+%|infinity',
+		'MemoryMax': r'[0-9]+[KMGT]?|[0-9]+%|infinity',
+		'Nice': r'-?[0-9]+',
+		'TasksMax': r'[0-9]+%?|infinity',
+	}
+	VALID_KEYS = ('description', 'environment', 'reactor', 'service')
+	
+	def __init__(self, profile):
+		"""
+		
+		"""
+		
+		profile_file = Path(profile)
+		if not profile_file.is_file():
+			profile_file = self.DATA_DIR / self.PROFILE_FILES.format(profile)
+			if not profile_file.is_file():
+				raise FileNotFoundError('Unknown runtime profile "{}". Available: {}'.format(profile, ', '.join(self.available())))
+		
+		super().__init__(json_loads(profile_file.read_text()))
+		prefix, suffix = self.PROFILE_FILES.split('{}')
+		self.name = profile_file.name[len(prefix):-len(suffix)] if profile_file.parent == self.DATA_DIR else str(profile_file)
+		self.validate()
+	
+	@classmethod
+	def available(cls):
+		"""Available profiles
+		The names of the profiles shipped in the data directory.
+		"""
+		
+		prefix, suffix = cls.PROFILE_FILES.split('{}')
+		return sorted(child.name[len(prefix):-len(suffix)] for child in cls.DATA_DIR.glob(cls.PROFILE_FILES.format('*')))
+	
+	@property
+	def environment(self):
+		"""
+		
+		"""
+		
+		return self.get('environment', {})
+	
+	def instance_service(self, position, instances):
+		"""Instance service settings
+		The INSTANCE_SETTINGS of the service, as they apply to the instance in the (0 based) "position" out of "instances": the CPUs of "CPUAffinity" are split in contiguous shares, one per instance, or handed out one CPU per instance, round robin, when there are more instances than CPUs.
+		"""
+		
+		result = {}
+		if 'CPUAffinity' in self.service:
+			cpus = []
+			for cpu_range in re_split(r'[ ,]', str(self.service['CPUAffinity'])):
+				first, _, last = cpu_range.partition('-')
+				cpus += range(int(first), int(last or first) + 1)
+			if len(cpus) >= instances:
+				cpus = cpus[len(cpus) * position // instances:len(cpus) * (position + 1) // instances]
+			else:
+				cpus = [cpus[position % len(cpus)]]
+			result['CPUAffinity'] = ' '.join(str(cpu) for cpu in cpus)
+		return result
+	
+	@property
+	def reactor(self):
+		"""
+		
+		"""
+		
+		return self.get('reactor')
+	
+	@property
+	def service(self):
+		"""
+		
+		"""
+		
+		return self.get('service', {})
+	
+	def validate(self):
+		"""Validate the profile
+		Checks every setting in the profile, raising ValueError on the first invalid one.
+		"""
+		
+		unknown_keys = [key for key in self if key not in self.VALID_KEYS]
+		if unknown_keys:
+			raise ValueError('Unknown keys in runtime profile "{}": {}'.format(self.name, ', '.join(unknown_keys)))
+		
+		if (self.reactor is not None) and (self.reactor not in self.REACTORS):
+			raise ValueError('Invalid reactor "{}" in runtime profile "{}"'.format(self.reactor, self.name))
+		
+		for name, value in self.environment.items():
+			if not re_fullmatch(self.ENVIRONMENT_NAME, name):
+				raise ValueError('Invalid environment variable name "{}" in runtime profile "{}"'.format(name, self.name))
+			if (name in self.ENVIRONMENT_VALUES) and not re_fullmatch(self.ENVIRONMENT_VALUES[name], str(value)):
+				raise ValueError('Invalid value for {} in runtime profile "{}": {}'.format(name, self.name, value))
+		
+		for name, value in self.service.items():
+			if name not in self.SERVICE_SETTINGS:
+				raise ValueError('Unsupported service setting "{}" in runtime profile "{}"'.format(name, self.name))
+			if not re_fullmatch(self.SERVICE_SETTINGS[name], str(value)):
+				raise ValueError('Invalid value for {} in runtime profile "{}": {}'.format(name, self.name, value))
+		if not (-20 <= int(self.service.get('Nice', 0)) <= 19):
+			raise ValueError('Nice should be between -20 and 19 in runtime profile "{}"'.format(self.name))
+		
+		return True
+
+
 class DockerfileTemplate(dict):
 	"""
 	
 	"""
 	
+	CONTEXT_INSTRUCTIONS = ('ADD', 'COPY')
+	CONTEXT_SPOOL_SIZE = 64 * 1024 * 1024
 	DEFAULTS_FILE = Path(__file__).parent / 'data' / 'dockerfile_defaults.json'
 	TAG_NAME = 'duoauthproxy_packager'
 	TEMPLATE_NAMES = 'dockerfile_{}_template.jinja'
@@ -439,7 +868,7 @@ class DockerfileTemplate(dict):
 		
 		LOGGER.debug('Ignoring exception in context: %s(%s) | %s', exc_type, exc_val, exc_tb)
 		self.dockerfile.unlink(missing_ok=True)
-		
+	
 	def __getattr__(self, item):
 		"""
 		
@@ -494,14 +923,69 @@ class DockerfileTemplate(dict):
 		return result.render(self)
 	
 	def build(self, name_tag):
+		"""Build the image
+		Builds the image out of a minimal context (see "build_context") streamed to the docker daemon, instead of sending the whole "root_dir".
 		"""
 		
-		"""
-		
-		with self as dockerfile:
-			result = self.client.images.build(path=str(dockerfile.parent), tag=name_tag, rm=True, forcerm=True)
+		with self.build_context() as context:
+			result = self.client.images.build(fileobj=context, custom_context=True, tag=name_tag, rm=True, forcerm=True)
+		return result
+	
+	def build_context(self):
+		"""Build context
+		A tarball with the rendered Dockerfile and only the files referenced by its COPY/ADD instructions, in a spooled temporary file (it stays in memory unless it grows beyond CONTEXT_SPOOL_SIZE) positioned at the start. Its size is logged and kept in "context_size".
+		"""
+		
+		dockerfile = str(self)
+		files = self.context_files(dockerfile)
+		result = SpooledTemporaryFile(max_size=self.CONTEXT_SPOOL_SIZE)
+		with tarfile_open(fileobj=result, mode='w') as context:
+			content = dockerfile.encode('utf8')
+			dockerfile_info = TarInfo('Dockerfile')
+			dockerfile_info.size = len(content)
+			context.addfile(dockerfile_info, BytesIO(content))
+			for path in files:
+				context.add(str(self.root_dir / path), arcname=path.as_posix(), recursive=False)
+		
+		self.context_size = result.tell()
+		result.seek(0)
+		LOGGER.info('Docker build context: %d files, %d bytes', len(files) + 1, self.context_size)
 		return result
 	
+	def context_files(self, dockerfile=None):
+		"""Context files
+		The files (relative to "root_dir") referenced as sources by the COPY/ADD instructions of the "dockerfile" (the rendered template by default). Wildcards are expanded and directories are included recursively; remote sources and the ones copied from other build stages are ignored.
+		"""
+		
+		dockerfile = str(self) if dockerfile is None else dockerfile
+		result = set()
+		for instruction in dockerfile.replace('\\\n', ' ').splitlines():
+			arguments = instruction.strip().split(maxsplit=1)
+			if (len(arguments) < 2) or (arguments[0].upper() not in self.CONTEXT_INSTRUCTIONS):
+				continue
+			flags, arguments = [], arguments[1].strip()
+			while arguments.startswith('--'):
+				flag, _, arguments = arguments.partition(' ')
+				flags.append(flag)
+				arguments = arguments.strip()
+			if any(flag.startswith('--from=') for flag in flags):
+				continue
+			arguments = json_loads(arguments) if arguments.startswith('[') else arguments.split()
+			
+			for source in arguments[:-1]:
+				if '://' in source:
+					continue
+				source = PurePath(source)
+				matches = [self.root_dir] if source == PurePath('.') else list(self.root_dir.glob(source.as_posix()))
+				if not matches:
+					raise FileNotFoundError('Missing file for the docker build context: {}'.format(self.root_dir / source))
+				for match in matches:
+					for path in ([match] if match.is_file() else match.rglob('*')):
+						if path.is_file():
+							result.add(PurePath(path.relative_to(self.root_dir)))
+		
+		return sorted(result)
+	
 	def _load_values(self):
 		"""
 		
@@ -526,6 +1010,11 @@ class DockerfileTemplate(dict):
 			raise ValueError('Missing "python.path" section for "{}" distribution in dockerfile_defaults'.format(self.dist))
 		self['python'] = self.defaults['python']['path'].format(self.python_version)
 		
+		if self.get('compiler_cache'):
+			if 'compiler_cache' not in self.defaults:
+				raise ValueError('Missing "compiler_cache" section for "{}" distribution in dockerfile_defaults'.format(self.dist))
+			self['image_preparation'] += self.defaults['compiler_cache']
+	
 	def run(self, fresh_build=True, /, **run_arguments):
 		"""
 		
@@ -550,17 +1039,19 @@ class DuoAuthProxyInstaller:
 	"""
 	
 	DEFAULTS_FILE = Path(__file__).parent / 'data' / 'target_defaults.json'
+	DEPENDENCIES_RPM_NAME = 'duoauthproxy-deps'
 	DOWNLOAD_PATH_TEMPLATE = r'https://dl.duosecurity.com/duoauthproxy-{version_tag}-src.tgz'
+	PROXY_DISTRIBUTION = 'duoauthproxy'
 	SYSTEMD_UNIT_PATH = PurePath('/') / 'etc' / 'systemd' / 'system'
 	
-	def __call__(self, release_tag, *, target_install_path=DEFAULT_TARGET_INSTALL_PATH, dist_dir='dist'):
+	def __call__(self, release_tag, *, target_install_path=DEFAULT_TARGET_INSTALL_PATH, dist_dir='dist', instances=None, runtime_profile=None, python='python3', split_dependencies=False, bundle_site_packages=False):
 		"""
 		
 		"""
 		
-		return self.build_rpm(release_tag=release_tag, target_install_path=target_install_path, rpms_dir=dist_dir)
-		
-	def __init__(self, version_tag, *, installer_root=Path.cwd(), download_dir_name='downloads', wheels_dir_name='wheels'):
+		return self.build_rpm(release_tag=release_tag, target_install_path=target_install_path, rpms_dir=dist_dir, instances=instances, runtime_profile=runtime_profile, python=python, split_dependencies=split_dependencies, bundle_site_packages=bundle_site_packages)
+	
+	def __init__(self, version_tag, *, installer_root=Path.cwd(), download_dir_name='downloads', wheels_dir_name='wheels', wheelhouse=None, index_url=DEFAULT_INDEX_URL, build_missing_wheels=True, compiler_cache_dir=None, build_history=None):
 		"""
 		
 		"""
@@ -569,6 +1060,11 @@ class DuoAuthProxyInstaller:
 		self._installer_root = Path(installer_root)
 		self._download_dir_name = download_dir_name
 		self._wheels_dir_name = wheels_dir_name
+		self._wheelhouse = wheelhouse
+		self._index_url = index_url
+		self._build_missing_wheels = build_missing_wheels
+		self._compiler_cache_dir = compiler_cache_dir
+		self._build_history = build_history
 	
 	def __getattr__(self, item):
 		"""
@@ -578,6 +1074,11 @@ class DuoAuthProxyInstaller:
 		if item == 'assets_dir':
 			value = Path(mkdtemp()).absolute()
 			atexit_register(rmtree, value, ignore_errors=True)
+		elif item == 'compiler_cache':
+			if (self._compiler_cache_dir is not None) or (CACHE_DIR_VARIABLE in environ):
+				value = CompilerCache(self._compiler_cache_dir)
+			else:
+				value = None
 		elif item == 'download_dir':
 			value = self.root_path / self._download_dir_name
 			value.mkdir(parents=True, exist_ok=True)
@@ -585,37 +1086,129 @@ class DuoAuthProxyInstaller:
 			value = self._installer_root if self._installer_root.is_absolute() else Path.cwd() / self._installer_root
 			value.mkdir(parents=True, exist_ok=True)
 		elif item == 'requirements':
-			with VirtualEnvironmentManager(path=None) as venv:
-				venv.install(*[str(wheel) for wheel in self.wheels_dir.iterdir() if wheel.suffix == '.whl'], no_index=True)
-				value = venv.freeze()
+			value = self.compute_requirements(self.wheels_dir, digests=self.tarball.digests)
 		elif item == 'tarball':
 			value = InstallerTarball(self.download_tarball())
 		elif item == 'tarball_assets':
 			value = self.tarball.prepare_assets(output_dir=self.assets_dir)
+		elif item == 'wheel_resolver':
+			sources = []
+			if self._wheelhouse is not None:
+				sources.append(WheelhouseSource(self._wheelhouse))
+			if self._index_url:
+				sources.append(SimpleIndexSource(self._index_url))
+			if self._build_missing_wheels:
+				sources.append(SdistSource(self._index_url or None, find_links=self._wheelhouse, compiler_cache=self.compiler_cache))
+			value = WheelResolver(*sources)
 		elif item == 'wheels_dir':
 			value = self.root_path / self._wheels_dir_name
 			copytree(self.tarball_assets['wheels_dir'], value, dirs_exist_ok=True)
-			if self.tarball_assets['missing_wheels']:
-				with VirtualEnvironmentManager(path=None) as venv:
-					venv.download(*['=='.join(item) for item in self.tarball_assets['missing_wheels'].items()], dest=str(value))
+			self.download_wheels(self.tarball_assets['missing_wheels'], value)
 		else:
 			raise AttributeError(item)
 		
 		self.__setattr__(item, value)
 		return value
 	
-	def build_rpm(self, release_tag, *, target_install_path=DEFAULT_TARGET_INSTALL_PATH, rpms_dir='RPMS', staging_dir='rpm_data'):
+	def build_matrix(self, release_tag, *pythons, target_install_path=DEFAULT_TARGET_INSTALL_PATH, rpms_dir='dist', staging_dir='rpm_matrix', instances=None, service_uid='root', runtime_profile=None):
+		"""Build for several interpreters
+		Builds the venv and the RPM for every interpreter in "pythons" (paths to them, like the ones built by "InstallerTarball.build_python") in a single run, the release of each one tagged with the interpreter version (like "1.py311"). Everything goes to the same wheels directory: the pure python wheels ("py3-none-any", or anything else the next interpreter supports, like "abi3" ones) are extracted, built or downloaded only once and shared, only the modules with ABI specific extensions are compiled again for every interpreter.
+		
+		Returns the report: the time spent on the shared work and, per interpreter, the time spent on every step, the modules built for it and the ones reused.
 		"""
-
+		
+		if not pythons:
+			raise ValueError('No interpreters to build for')
+		if runtime_profile is not None:
+			runtime_profile = RuntimeProfile(runtime_profile)
+		staging_dir = Path(staging_dir).absolute()
+		staging_dir.mkdir(parents=True, exist_ok=True)
+		
+		def timed(timings, name, function, *args, **kwargs):
+			start = monotonic()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				timings[name] = monotonic() - start
+		
+		wheels_dir = self.root_path / self._wheels_dir_name
+		wheels_dir.mkdir(parents=True, exist_ok=True)
+		shared_timings = {}
+		wheels, source_modules, special = timed(shared_timings, 'modules', lambda: self.tarball.identify_modules())
+		module_names = {canonical_name(module.rpartition('-')[0] or module): module for module in source_modules}
+		report = {'shared': shared_timings, 'interpreters': {}}
+		
+		built_wheels = {}
+		for python in pythons:
+			start, timings = monotonic(), {}
+			python_version = interpreter_environment(python)['python_version']
+			tags = frozenset(interpreter_tags(python))
+			venv_wheels, local_wheels, missing_wheels = timed(timings, 'classification', self.tarball.classify_wheels, wheels, python=python)
+			
+			timed(timings, 'local_wheels', self.tarball.extract_wheels, *[wheel for wheel in local_wheels.values() if not (wheels_dir / wheel).exists()], wheels_dir=wheels_dir)
+			
+			reused = [module for module in source_modules if any(tags & parse_wheel_name(wheel.name)[2] for wheel in built_wheels.get(module, ()))]
+			modules = [module for module in source_modules if module not in reused]
+			new_wheels = timed(timings, 'built_wheels', self.tarball.build_sources, *modules, wheels_dir=wheels_dir, venv_wheels=venv_wheels, compiler_cache=self.compiler_cache, python=python) if modules else []
+			for wheel in new_wheels:
+				module = module_names.get(parse_wheel_name(wheel.name)[0])
+				if module is not None:
+					built_wheels.setdefault(module, []).append(wheel)
+			
+			available = [parse_wheel_name(wheel.name) for wheel in wheels_dir.glob('*.whl')]
+			missing_wheels = {name: version for name, version in missing_wheels.items() if not any((details is not None) and (details[0] == canonical_name(name)) and (details[1] == version) and (details[2] & tags) for details in available)}
+			downloaded_wheels = timed(timings, 'downloaded_wheels', self.download_wheels, missing_wheels, wheels_dir, python=python)
+			
+			self.wheels_dir = wheels_dir
+			self.requirements = timed(timings, 'requirements', self.compute_requirements, wheels_dir, python=python, digests=self.tarball.digests)
+			self.tarball_assets = {'missing_wheels': missing_wheels, 'wheels_dir': wheels_dir, 'local_wheels': list(local_wheels.values()), 'built_wheels': new_wheels, 'downloaded_wheels': downloaded_wheels}
+			timed(timings, 'assets', self.refresh_assets, service_uid=service_uid, target_install_path=target_install_path, runtime_profile=runtime_profile)
+			
+			release = '{}.py{}'.format(release_tag, python_version.replace('.', ''))
+			python_staging_dir = staging_dir / 'py{}'.format(python_version)
+			rmtree(python_staging_dir, ignore_errors=True)
+			output = timed(timings, 'rpm', self.build_rpm, release, target_install_path=target_install_path, rpms_dir=rpms_dir, staging_dir=python_staging_dir, instances=instances, service_uid=service_uid, runtime_profile=runtime_profile, python=python)
+			timings['total'] = monotonic() - start
+			
+			report['interpreters'][str(python)] = {
+				'python_version': python_version,
+				'release': release,
+				'built_modules': sorted(modules),
+				'reused_modules': sorted(reused),
+				'timings': timings,
+				'output': output,
+			}
+			LOGGER.info('Python %s (%s): %.1fs, %d modules built, %d reused', python_version, python, timings['total'], len(modules), len(reused))
+		
+		return report
+	
+	def build_rpm(self, release_tag, *, target_install_path=DEFAULT_TARGET_INSTALL_PATH, rpms_dir='RPMS', staging_dir='rpm_data', instances=None, port_stride=1, instance_config=None, service_uid='root', runtime_profile=None, python='python3', split_dependencies=False, bundle_site_packages=False, unbundled=None):
+		"""Build the RPM
+		Packages the proxy using rpmvenv. With "instances" the package also ships a "duoauthproxy@.service" template unit, a "duoauthproxy.target" starting that many instances, and their configuration, derived from "instance_config" (the tarball's authproxy.cfg by default) moving the listening ports by "port_stride" per instance.
+		
+		The "runtime_profile" (the name of a shipped RuntimeProfile or the path to a profile file) is validated right away and applied to the systemd units. The venv is created by the "python" interpreter on the target host (like the one built by "InstallerTarball.build_python"); it doesn't have to exist here. An installer that wasn't prepared gets prepared first, for the running interpreter; to pick and build the wheels for another one, "prepare" it for that interpreter beforehand (as "build_matrix" does).
+		
+		With "split_dependencies" the third-party wheels go to a separate "duoauthproxy-deps" RPM (the venv) whose release is keyed by the hash of that wheel set (the pinned versions, and the digests of the wheels that were not built from source), and it's only built when there's no such RPM in "rpms_dir" already. The proxy RPM becomes a thin one, with just the proxy distribution (unpacked into the venv paths) and the data files, requiring that exact deps RPM; so a proxy point release doesn't ship the dependencies again.
+		
+		With "bundle_site_packages" the pure python distributions go into a single zip with precompiled bytecode, loaded by a custom importer (a SitePackagesBundle), instead of thousands of files in site-packages; only the ones with native extensions (or listed in "unbundled", the proxy itself by default) get installed in the venv. That cuts the file system lookups on startup, which are slow on network backed or encrypted volumes.
+		
+		Every RPM gets its bill of materials next to it, in "rpms_dir": a SHA-256 manifest of the files it installs ("<name>-<version>-<release>.sha256", in the "sha256sum" format) and the SBOM of the distributions it ships, as CycloneDX and SPDX JSON ("<name>-<version>-<release>.cdx.json" and ".spdx.json"). The digests are computed while the files are extracted, built and staged (the venv files take theirs from the wheels RECORD), so nothing is read again for them.
 		"""
 		
 		target_install_path = Path(target_install_path)
 		if not target_install_path.is_absolute():
 			raise ValueError('"target-install-path" should be an absolute path')
+		if split_dependencies and bundle_site_packages:
+			raise ValueError('"split-dependencies" and "bundle-site-packages" can\'t be used together')
+		if runtime_profile is not None:
+			runtime_profile = RuntimeProfile(runtime_profile)
 		
 		staging_dir = Path(staging_dir).absolute()
 		staging_dir.mkdir(exist_ok=True)
 		
+		if 'tarball_assets' not in vars(self):
+			self.prepare(service_uid=service_uid, target_install_path=target_install_path, runtime_profile=runtime_profile)
+		
 		rpmvenv_data = RPMVenvTemplate()
 		rpmvenv_data.version = self._version_tag
 		rpmvenv_data.release = release_tag
@@ -624,51 +1217,289 @@ class DuoAuthProxyInstaller:
 			conf_dir = staging_dir / 'conf'
 			conf_dir.mkdir(exist_ok=True)
 			for file_path in self.tarball_assets['conf']:
-				final_file = Path(move(file_path, conf_dir)).absolute()
+				final_file = self.tarball.digests.move(file_path, conf_dir)
 				relative_name = final_file.relative_to(staging_dir)
 				rpmvenv_data.add_data_file(relative_name, target_install_path / relative_name)
-				
+		
 		if self.tarball_assets['licenses']:
 			licenses_dir = staging_dir / 'licenses'
 			licenses_dir.mkdir(exist_ok=True)
 			for file_path in self.tarball_assets['licenses']:
-				final_file = Path(move(file_path, licenses_dir)).absolute()
+				final_file = self.tarball.digests.move(file_path, licenses_dir)
 				relative_name = final_file.relative_to(staging_dir)
 				rpmvenv_data.add_data_file(relative_name, target_install_path / relative_name)
 		
 		log_dir = staging_dir / 'log'
 		log_dir.mkdir(exist_ok=True)
-		log_file = log_dir / 'authproxy.log'
-		log_file.touch()
+		log_file = self.tarball.digests.write(log_dir / 'authproxy.log', b'')
 		relative_log_name = log_file.relative_to(staging_dir)
 		rpmvenv_data.add_data_file(relative_log_name, target_install_path / relative_log_name)
 		
 		run_dir = staging_dir / 'run'
 		run_dir.mkdir(exist_ok=True)
-		run_empty_file = run_dir / '.empty_file'
-		run_empty_file.touch()
+		run_empty_file = self.tarball.digests.write(run_dir / '.empty_file', b'')
 		relative_run_name = run_empty_file.relative_to(staging_dir)
 		rpmvenv_data.add_data_file(relative_run_name, target_install_path / relative_run_name)
 		
 		if 'systemd_unit' in self.tarball_assets:
 			systemd_unit_dest = self.SYSTEMD_UNIT_PATH / self.tarball_assets['systemd_unit'].name
-			move(self.tarball_assets['systemd_unit'], staging_dir)
+			self.tarball.digests.move(self.tarball_assets['systemd_unit'], staging_dir)
 			rpmvenv_data.add_data_file(self.tarball_assets['systemd_unit'].name, systemd_unit_dest)
 		
-		requirements_file = staging_dir / 'requirements.txt'
-		requirements_file.write_text(self.requirements)
+		if instances:
+			if instance_config is not None:
+				template_config = Path(instance_config).read_text()
+			elif (staging_dir / 'conf' / 'authproxy.cfg').exists():
+				template_config = (staging_dir / 'conf' / 'authproxy.cfg').read_text()
+			else:
+				raise ValueError('No template configuration found for the instances')
+			
+			for instance in range(1, int(instances) + 1):
+				for relative_name, content in ((PurePath('conf', 'instances', str(instance), 'authproxy.cfg'), self.tarball.instance_config(template_config, instance, port_stride=port_stride)), (PurePath('log', 'instances', str(instance), 'authproxy.log'), ''), (PurePath('run', 'instances', str(instance), '.empty_file'), '')):
+					instance_file = staging_dir / relative_name
+					instance_file.parent.mkdir(parents=True, exist_ok=True)
+					self.tarball.digests.write(instance_file, content)
+					rpmvenv_data.add_data_file(relative_name, target_install_path / relative_name)
+			
+			for instance_unit in self.tarball.render_instance_units(staging_dir, int(instances), install_dir=target_install_path, service_uid=service_uid, profile=runtime_profile).values():
+				relative_unit_name = instance_unit.relative_to(staging_dir)
+				rpmvenv_data.add_data_file(relative_unit_name, self.SYSTEMD_UNIT_PATH / relative_unit_name)
+		
+		requirements_file, requirements_text = staging_dir / 'requirements.txt', self.requirements
 		
-		rpmvenv_data.update_venv(name=target_install_path.name, path=target_install_path.parent, requirements=[requirements_file.relative_to(staging_dir)], python='python3')
+		rpms_dir = (Path.cwd() if rpms_dir is None else Path(rpms_dir)).absolute()
+		rpms_dir.mkdir(exist_ok=True)
 		
+		output, installed_wheels, bill_exclude = '', [], ()
+		wheel_requirements = WheelRequirements(self.wheels_dir, digests=self.tarball.digests)
+		if split_dependencies:
+			proxy_distribution = wheel_requirements.pinned.get(self.PROXY_DISTRIBUTION)
+			if proxy_distribution is None:
+				raise RuntimeError('No "{}" wheel in "{}"'.format(self.PROXY_DISTRIBUTION, self.wheels_dir))
+			
+			dependencies_version, dependencies_release, output = self._dependencies_rpm(wheel_requirements, release_tag, target_install_path=target_install_path, rpms_dir=rpms_dir, staging_dir=staging_dir, python=python)
+			rpmvenv_data['core']['requires'] = rpmvenv_data['core'].get('requires', []) + ['{} = {}-{}'.format(self.DEPENDENCIES_RPM_NAME, dependencies_version, dependencies_release)]
+			rpmvenv_data['extensions']['enabled'] = [extension for extension in rpmvenv_data['extensions']['enabled'] if extension != 'python_venv']
+			del rpmvenv_data['python_venv']
+			
+			venv_dir = staging_dir / 'venv'
+			rmtree(venv_dir, ignore_errors=True)
+			installer = WheelInstaller(venv_dir, byte_compile=False)
+			installer.python = target_install_path / 'bin' / 'python'
+			installer.python_version = run((str(python), '-c', 'import sys; print("{}.{}".format(*sys.version_info))'), stdout=PIPE, text=True, check=True).stdout.strip()
+			dist_info = installer.install(proxy_distribution.path, expected_hash='{}:{}'.format(wheel_requirements.hash_algorithm, proxy_distribution.digest))
+			self.tarball.digests.add_record((dist_info / 'RECORD').read_text(), dist_info.parent)
+			bill_exclude = [name for name in wheel_requirements.pinned if name != canonical_name(self.PROXY_DISTRIBUTION)]
+			for file_path in sorted(path for path in venv_dir.rglob('*') if path.is_file()):
+				rpmvenv_data.add_data_file(file_path.relative_to(staging_dir), target_install_path / file_path.relative_to(venv_dir))
+		else:
+			bundle_dir = staging_dir / 'bundle'
+			rmtree(bundle_dir, ignore_errors=True)
+			installed_wheels = [distribution.path for distribution in wheel_requirements.pinned.values()]
+			if bundle_site_packages:
+				bundle = SitePackagesBundle([distribution.path for distribution in wheel_requirements.pinned.values()], python=python, unbundled=(self.PROXY_DISTRIBUTION,) if unbundled is None else unbundled)
+				for relative_name in bundle.build(bundle_dir, target_install_path=target_install_path):
+					rpmvenv_data.add_data_file(bundle_dir.relative_to(staging_dir) / relative_name, target_install_path / relative_name)
+				requirements_text = wheel_requirements.text(hashes=True, references=True, exclude=bundle.bundled)
+				installed_wheels = list(bundle.unbundled.values())
+			rpmvenv_data.update_venv(name=target_install_path.name, path=target_install_path.parent, requirements=[requirements_file.relative_to(staging_dir)], python=python)
+		
+		requirements_file.write_text(requirements_text)
 		rpmvenv_json_file = staging_dir / '{}.{}.json'.format(rpmvenv_data.name, rpmvenv_data.version)
 		rpmvenv_json_file.write_text(str(rpmvenv_data))
 		
-		rpms_dir = (Path.cwd() if rpms_dir is None else Path(rpms_dir)).absolute()
-		rpms_dir.mkdir(exist_ok=True)
+		output += run(('rpmvenv', '--destination', str(rpms_dir), str(rpmvenv_json_file)), stderr=STDOUT, stdout=PIPE, text=True, check=True, cwd=staging_dir).stdout
+		self._bill_of_materials(rpmvenv_data, wheel_requirements, rpms_dir=rpms_dir, staging_dir=staging_dir, target_install_path=target_install_path, python=python, installed_wheels=installed_wheels, exclude=bill_exclude)
+		return output
+	
+	@staticmethod
+	def publish(rpms_dir='dist', *, keep_releases=None):
+		"""Publish the RPMs
+		Updates the yum repository metadata of "rpms_dir" (where "build_rpm" leaves the packages) incrementally, with a YumRepository: only the headers of the new packages are read, no createrepo needed. With "keep_releases" only that many releases of every package are kept, the older ones are deleted.
+		"""
 		
-		# return (run(('ls', '-l', '/root/rpm_data')), run(('cat', '/root/rpm_data/duoauthproxy.6.4.1.json')))
+		return YumRepository(rpms_dir).update(keep_releases=keep_releases)
+	
+	def _bill_of_materials(self, rpmvenv_data, wheel_requirements, *, rpms_dir, staging_dir, target_install_path, python, installed_wheels=(), exclude=()):
+		"""Bill of materials
+		Writes the bill of materials of the RPM described by "rpmvenv_data" into "rpms_dir": the SHA-256 manifest of its data files (staged in "staging_dir") and of the files of the "installed_wheels" in the site-packages of "python" under "target_install_path", and the SBOM of the "wheel_requirements" distributions (but the ones in "exclude"). The digests come from the tarball FileDigests and the wheels RECORD, nothing is read again. Returns the paths of the files written.
+		"""
+		
+		manifest = FileDigests()
+		for data_file in rpmvenv_data['file_extras']['files']:
+			manifest[PurePosixPath('/', data_file['dest'])] = self.tarball.digests.file_digest(staging_dir / data_file['src'])
+		if installed_wheels:
+			site_packages = PurePosixPath(target_install_path, 'lib', 'python{}'.format(interpreter_environment(python)['python_version']), 'site-packages')
+			for wheel in installed_wheels:
+				manifest.add_wheel(wheel, site_packages)
+		
+		package_prefix = rpms_dir / '{}-{}-{}'.format(rpmvenv_data.name, rpmvenv_data.version, rpmvenv_data.release)
+		manifest_file = package_prefix.with_name(package_prefix.name + '.sha256')
+		manifest_file.write_text(manifest.manifest())
+		bill = BillOfMaterials(rpmvenv_data.name, '{}-{}'.format(rpmvenv_data.version, rpmvenv_data.release), wheel_requirements, tarball_modules=self.tarball.identify_modules(), exclude=exclude, tool=(__name__, __version__))
+		result = [manifest_file] + bill.write(package_prefix)
+		LOGGER.info('Bill of materials of %s: %d files, %d components', package_prefix.name, len(manifest), len(bill.components))
+		return result
+	
+	def _dependencies_rpm(self, wheel_requirements, release_tag, *, target_install_path, rpms_dir, staging_dir, python):
+		"""Dependencies RPM
+		Builds the "duoauthproxy-deps" RPM, the venv with the third-party wheels (all the "wheel_requirements" but the proxy distribution), into "rpms_dir", with its bill of materials. Its release is "release_tag" followed by the hash of the wheel set, so when "rpms_dir" already has an RPM for the same set that one is reused instead. Returns its version, its release and the rpmvenv output (empty if reused).
+		
+		The wheel set is the pinned "name==version" of every distribution plus the digest of the wheels that came as such (from the tarball or downloaded). The wheels built from source are left to their version: a build tool that isn't reproducible would give another digest every time.
+		"""
+		
+		built_wheels = {Path(wheel).absolute() for wheel in self.tarball_assets.get('built_wheels', ())}
+		wheel_set = []
+		for name, distribution in wheel_requirements.pinned.items():
+			if name == canonical_name(self.PROXY_DISTRIBUTION):
+				continue
+			wheel_set.append('{}=={}'.format(distribution.project_name, distribution.version))
+			if distribution.path.absolute() not in built_wheels:
+				wheel_set[-1] += ' --hash={}:{}'.format(wheel_requirements.hash_algorithm, distribution.digest)
+		wheels_hash = sha256('\n'.join(wheel_set + ['']).encode('utf8')).hexdigest()[:16]
+		for rpm_file in sorted(rpms_dir.rglob('{}-*-*.{}.*.rpm'.format(self.DEPENDENCIES_RPM_NAME, wheels_hash))):
+			version, _, release = rpm_file.name[len(self.DEPENDENCIES_RPM_NAME) + 1:].rsplit('.', 2)[0].rpartition('-')
+			LOGGER.info('The third-party wheels did not change (%s), reusing %s', wheels_hash, rpm_file.name)
+			return version, release, ''
+		
+		rpmvenv_data = RPMVenvTemplate()
+		rpmvenv_data['core']['name'] = self.DEPENDENCIES_RPM_NAME
+		rpmvenv_data['core']['summary'] = 'Third-party dependencies of the Duo Authentication Proxy'
+		rpmvenv_data.version = self._version_tag
+		rpmvenv_data.release = '{}.{}'.format(release_tag, wheels_hash)
 		
-		return run(('rpmvenv', '--destination', str(rpms_dir), str(rpmvenv_json_file)), stderr=STDOUT, stdout=PIPE, text=True, check=True, cwd=staging_dir).stdout
+		requirements_file = staging_dir / 'requirements-deps.txt'
+		requirements_file.write_text(wheel_requirements.text(hashes=True, references=True, exclude=(self.PROXY_DISTRIBUTION,)))
+		rpmvenv_data.update_venv(name=target_install_path.name, path=target_install_path.parent, requirements=[requirements_file.relative_to(staging_dir)], python=python)
+		
+		rpmvenv_json_file = staging_dir / '{}.{}.json'.format(rpmvenv_data.name, rpmvenv_data.version)
+		rpmvenv_json_file.write_text(str(rpmvenv_data))
+		LOGGER.info('Building %s %s-%s', rpmvenv_data.name, rpmvenv_data.version, rpmvenv_data.release)
+		output = run(('rpmvenv', '--destination', str(rpms_dir), str(rpmvenv_json_file)), stderr=STDOUT, stdout=PIPE, text=True, check=True, cwd=staging_dir).stdout
+		self._bill_of_materials(rpmvenv_data, wheel_requirements, rpms_dir=rpms_dir, staging_dir=staging_dir, target_install_path=target_install_path, python=python, installed_wheels=[distribution.path for name, distribution in wheel_requirements.pinned.items() if name != canonical_name(self.PROXY_DISTRIBUTION)], exclude=(self.PROXY_DISTRIBUTION,))
+		return rpmvenv_data.version, rpmvenv_data.release, output
+	
+	def benchmark(self, staging_dir='rpm_data', *, target_install_path=DEFAULT_TARGET_INSTALL_PATH, label=None, concurrency=16, requests=2000, python='python3', results_file=None, native_installer=False, startup_runs=5):
+		"""Benchmark the package
+		Load tests what "build_rpm" staged in "staging_dir": the venv gets installed in a temporary prefix with "python" (by pip, or by a WheelInstaller with "native_installer") and started through the staged systemd unit, against local stub upstreams (no network needed). Returns the startup time (over "startup_runs" runs) and file system calls, and the requests/s, latency percentiles and RSS of the proxy, also saved as JSON in "results_file" (if provided) to be compared with "compare_benchmarks".
+		"""
+		
+		staging_dir = Path(staging_dir).absolute()
+		with TemporaryDirectory() as prefix:
+			LoadTest.install(staging_dir, self.wheels_dir, prefix, target_install_path=target_install_path, python=python, native_installer=native_installer)
+			load_test = LoadTest(prefix, staging_dir / InstallerTarball.SYSTEMD_UNIT_FILE_NAME, target_install_path=target_install_path, label=label or self._version_tag, concurrency=concurrency, requests=requests, startup_runs=startup_runs)
+			results = load_test()
+		
+		if results_file is not None:
+			Path(results_file).write_text(json_dumps(results, indent=2))
+		return results
+	
+	@classmethod
+	def benchmark_pipeline(cls, tarball, *, wheelhouse=None, release_tag='1', time_scale=1.0, timings=None, history_file=DEFAULT_HISTORY_FILE, latency=0.0, resource_limits=None, split_dependencies=False, bundle_site_packages=False, results_file=None):
+		"""Benchmark the pipeline
+		Runs the whole build of the source "tarball" (a local "duoauthproxy-<version>-src.tgz"), "prepare", "build_rpm" and "publish", against stand-ins: a local StandInServer serves the tarball and a simple index of the "wheelhouse" wheels (waiting "latency" seconds per request), and StandIns take the place of the interpreter, pip, "setup.py bdist_wheel" and rpmvenv, replaying the build durations recorded in "history_file" (and the "timings" per tool, for everything else) scaled by "time_scale" while producing valid artifacts. What's left is the scheduling, the I/O and the copying done by the installer itself, which can be timed reproducibly.
+		
+		Returns the time of every phase, the timing of every pipeline stage, its critical path (the stages that set the duration of "prepare", with the time each one was queued for its resource class) and the runs and time of every stand-in, also saved as JSON in "results_file" (if provided).
+		"""
+		
+		tarball = Path(tarball).absolute()
+		tarball_name = re_fullmatch(r'duoauthproxy-(?P<version_tag>.+)-src\.tgz', tarball.name)
+		if tarball_name is None:
+			raise ValueError('Not a duoauthproxy source tarball: {}'.format(tarball))
+		version_tag = tarball_name.group('version_tag')
+		
+		with TemporaryDirectory() as temp_dir_name:
+			temp_dir = Path(temp_dir_name)
+			served_dir = temp_dir / 'served'
+			served_dir.mkdir()
+			(served_dir / tarball.name).symlink_to(tarball)
+			if wheelhouse is not None:
+				for wheel in Path(wheelhouse).absolute().glob('*.whl'):
+					(served_dir / wheel.name).symlink_to(wheel)
+			
+			with StandIns(temp_dir / 'standins', timings=timings, time_scale=time_scale, history_file=history_file) as stand_ins, StandInServer(served_dir, latency=latency) as server:
+				installer = cls(version_tag, installer_root=temp_dir / 'root', index_url=server.url + '/simple/', build_missing_wheels=False, build_history=BuildHistory(stand_ins.history_file or (temp_dir / 'build_history.json')))
+				installer.DOWNLOAD_PATH_TEMPLATE = server.url + '/duoauthproxy-{version_tag}-src.tgz'
+				rpms_dir, phases = temp_dir / 'rpms', {}
+				
+				start = monotonic()
+				stage_timings = installer.prepare(resource_limits=resource_limits, python=stand_ins.python)
+				phases['prepare'] = monotonic() - start
+				installer.build_rpm(release_tag, rpms_dir=rpms_dir, staging_dir=temp_dir / 'staging', python=stand_ins.python, split_dependencies=split_dependencies, bundle_site_packages=bundle_site_packages)
+				phases['build_rpm'] = monotonic() - start - phases['prepare']
+				installer.publish(rpms_dir)
+				phases['publish'] = monotonic() - start - phases['prepare'] - phases['build_rpm']
+				phases['total'] = monotonic() - start
+				
+				results = {
+					'version_tag': version_tag,
+					'time_scale': time_scale,
+					'phases': phases,
+					'stages': {name: dict(timing, duration=timing['end'] - timing['start'], wait=timing['start'] - timing['ready']) for name, timing in stage_timings.items()},
+					'critical_path': StagePipeline(*installer.stages(python=stand_ins.python), resource_limits=resource_limits).critical_path(stage_timings),
+					'stand_ins': stand_ins.usage(),
+					'requests': server.requests,
+					'rpms': sorted(rpm.name for rpm in rpms_dir.glob('*.rpm')),
+				}
+		
+		LOGGER.info('Pipeline: %.3fs (prepare %.3fs, build_rpm %.3fs, publish %.3fs), critical path: %s', phases['total'], phases['prepare'], phases['build_rpm'], phases['publish'], ' > '.join(step['stage'] for step in results['critical_path']))
+		if results_file is not None:
+			Path(results_file).write_text(json_dumps(results, indent=2))
+		return results
+	
+	@staticmethod
+	def compare_benchmarks(*results_files):
+		"""Compare benchmarks
+		Table of the "benchmark" results saved in "results_files", relative to the first one.
+		"""
+		
+		return compare_results(*results_files)
+	
+	@staticmethod
+	def compare_interpreters(*pythons, iterations=20000):
+		"""Compare interpreters
+		Runs the PGO training workload (which mimics the proxy's hot paths) with every interpreter in "pythons" and returns a table with the time spent on every workload, relative to the first interpreter. Useful to check an optimized build against the stock one.
+		"""
+		
+		results = [json_loads(run((str(python), str(PGO_TRAINING_SCRIPT), '--benchmark', '--iterations', str(iterations)), stdout=PIPE, text=True, check=True).stdout) for python in pythons]
+		if not results:
+			return ''
+		
+		lines = ['\t'.join(['workload'] + [str(python) for python in pythons])]
+		for workload in list(results[0]['timings']) + ['total']:
+			getter = (lambda result: result['total']) if workload == 'total' else (lambda result: result['timings'][workload])
+			baseline, row = getter(results[0]), [workload]
+			for position, result in enumerate(results):
+				cell = '{:.3f}s'.format(getter(result))
+				if position and baseline:
+					cell += ' ({:+.1f}%)'.format((getter(result) - baseline) * 100 / baseline)
+				row.append(cell)
+			lines.append('\t'.join(row))
+		return '\n'.join(lines)
+	
+	@staticmethod
+	def compute_requirements(wheels_dir, *, roots=None, python=None, hashes=True, references=True, strict=False, digests=None):
+		"""Compute the requirements
+		Returns the pinned requirements for the wheels in "wheels_dir", as "pip freeze" would after installing them, but read straight out of the wheels metadata by a WheelRequirements (no venv, nothing gets installed). With "hashes" every requirement carries the digest of its wheel. Conflicting and missing requirements, and unused wheels, are logged; with "strict" the first two raise a RuntimeError instead.
+		
+		With "references" (the default) the result is an install plan: direct references to the wheel files in dependency order, meant to be installed with "--no-deps --require-hashes" (as rpmvenv does with the default template) or by a WheelInstaller. The "digests" (like the FileDigests of the tarball) spare reading the wheels whose digest is already known.
+		"""
+		
+		wheel_requirements = WheelRequirements(wheels_dir, roots=roots, python=python, digests=digests)
+		if strict and (wheel_requirements.conflicts or wheel_requirements.missing):
+			raise RuntimeError('Inconsistent wheels in "{}": {}'.format(wheels_dir, ', '.join('{} (required by {})'.format(requirement, required_by or 'roots') for requirement, required_by in wheel_requirements.conflicts + wheel_requirements.missing)))
+		return wheel_requirements.text(hashes=hashes, references=references)
+	
+	def download_wheels(self, missing_wheels, wheels_dir, python=None):
+		"""Download missing wheels
+		Fetches the wheels that are not present (or not compatible) in the tarball into "wheels_dir", using the configured wheel sources: the local wheelhouse, the package index (or mirror) and, as a last resort, building them from their source distribution. The wheels are picked (and built) for the "python" interpreter (the running one by default).
+		"""
+		
+		if not missing_wheels:
+			return []
+		
+		wheel_resolver = self.wheel_resolver if python is None else self.wheel_resolver.for_interpreter(python)
+		return wheel_resolver.fetch(missing_wheels, wheels_dir)
 	
 	def download_tarball(self, *, stream_chunk_size=1048576, destination_dir=None, overwrite=False):
 		"""Download tarball
@@ -694,10 +1525,65 @@ class DuoAuthProxyInstaller:
 		
 		return local_file
 	
-	@classmethod
-	def run_in_docker(cls, version_tag, release_tag, dist_dir='dist', *, target_install_path=DEFAULT_TARGET_INSTALL_PATH):
-		"""
+	def prepare(self, service_uid='root', resource_limits=None, target_install_path=None, runtime_profile=None, python=None):
+		"""Prepare the assets
+		Runs the stages required by "build_rpm" (download, extraction, wheel collection and building, requirements) through a StagePipeline, so the I/O bound and the CPU bound work overlap. The "resource_limits" map caps the concurrency per resource class. The wheels are picked and built for the "python" interpreter (the running one by default). Returns the timing of every stage.
+		"""
+		
+		wheels_dir = self.root_path / self._wheels_dir_name
+		wheels_dir.mkdir(parents=True, exist_ok=True)
+		
+		if (runtime_profile is not None) and not isinstance(runtime_profile, RuntimeProfile):
+			runtime_profile = RuntimeProfile(runtime_profile)
+		pipeline = StagePipeline(*self.stages(service_uid=service_uid, target_install_path=target_install_path, runtime_profile=runtime_profile, python=python), resource_limits=resource_limits)
+		values = pipeline(assets_dir=self.assets_dir, wheels_dir=wheels_dir)
+		
+		tarball_assets = values['assets'].copy()
+		tarball_assets.update({
+			'missing_wheels': values['missing_wheels'],
+			'wheels_dir': wheels_dir,
+			'local_wheels': values['local_wheels_files'],
+			'built_wheels': values['built_wheels'],
+			'downloaded_wheels': values['downloaded_wheels'],
+			'systemd_unit': values['systemd_unit'],
+		})
+		
+		self.tarball = values['tarball']
+		self.tarball_assets = tarball_assets
+		self.wheels_dir = wheels_dir
+		self.requirements = values['requirements']
 		
+		if (self.compiler_cache is not None) and self.compiler_cache.report:
+			hits, misses = (sum(module[counter] for module in self.compiler_cache.report.values()) for counter in ('hits', 'misses'))
+			LOGGER.info('Compiler cache: %d hits, %d misses over %d modules', hits, misses, len(self.compiler_cache.report))
+		
+		return pipeline.timings
+	
+	def refresh_assets(self, service_uid='root', target_install_path=None, runtime_profile=None):
+		"""Refresh the assets
+		Extracts the tarball assets that "build_rpm" consumes (configuration, licenses and systemd unit) again, into a new assets directory, keeping the collected wheels and the requirements. That way a prepared installer can build another package without running the whole "prepare" again. Returns the new tarball assets.
+		"""
+		
+		if 'tarball_assets' not in vars(self):
+			self.prepare(service_uid=service_uid, target_install_path=target_install_path, runtime_profile=runtime_profile)
+			return self.tarball_assets
+		
+		if (runtime_profile is not None) and not isinstance(runtime_profile, RuntimeProfile):
+			runtime_profile = RuntimeProfile(runtime_profile)
+		if 'assets_dir' in vars(self):
+			rmtree(self.assets_dir, ignore_errors=True)
+			del self.assets_dir
+		
+		tarball_assets = self.tarball_assets.copy()
+		tarball_assets.update(self.tarball.extract_assets(self.assets_dir))
+		tarball_assets['systemd_unit'] = self.tarball.render_systemd_unit(self.assets_dir, service_uid=service_uid, install_dir=target_install_path, profile=runtime_profile)
+		self.tarball_assets = tarball_assets
+		return tarball_assets
+	
+	@classmethod
+	def run_in_docker(cls, version_tag, release_tag, dist_dir='dist', *, target_install_path=DEFAULT_TARGET_INSTALL_PATH, compiler_cache_dir=None):
+		"""Build in a container
+		Builds the RPM in a fresh container. With "compiler_cache_dir" the image gets ccache and the directory is mounted as the compiler cache, so it's reused across container builds.
 		"""
 		
 		host_dist_dir = Path(dist_dir)
@@ -713,4 +1599,99 @@ class DuoAuthProxyInstaller:
 			'dist_dir': str(dist_volume),
 		}
 		volumes = {str(host_dist_dir): {'bind': str(dist_volume), 'mode': 'rw'}}
-		return DockerfileTemplate(**template_details).run(volumes=volumes).decode('utf8')
+		run_arguments = {}
+		if compiler_cache_dir is not None:
+			host_cache_dir = Path(compiler_cache_dir).expanduser().absolute()
+			host_cache_dir.mkdir(parents=True, exist_ok=True)
+			cache_volume = '/root/.cache/duoauthproxy_installer/compiler'
+			volumes[str(host_cache_dir)] = {'bind': cache_volume, 'mode': 'rw'}
+			run_arguments['environment'] = {CACHE_DIR_VARIABLE: cache_volume}
+			template_details['compiler_cache'] = True
+		return DockerfileTemplate(**template_details).run(volumes=volumes, **run_arguments).decode('utf8')
+	
+	def stages(self, service_uid='root', target_install_path=None, runtime_profile=None, python=None):
+		"""Installer stages
+		The stages needed to prepare the assets, declaring what every one of them consumes and produces.
+		"""
+		
+		return [
+			Stage('tarball_path', self.download_tarball, resource='network'),
+			Stage('tarball', self._open_tarball, inputs=('tarball_path',), resource='disk'),
+			Stage('modules', self._identify_modules, inputs=('tarball',), outputs=('wheels', 'source_modules')),
+			Stage('classification', partial(self._classify_wheels, python=python), inputs=('tarball', 'wheels'), outputs=('venv_wheels', 'local_wheels', 'missing_wheels')),
+			Stage('assets', self._extract_assets, inputs=('tarball', 'assets_dir'), resource='disk'),
+			Stage('systemd_unit', partial(self._render_systemd_unit, service_uid=service_uid, install_dir=target_install_path, profile=runtime_profile), inputs=('tarball', 'assets_dir'), resource='disk'),
+			Stage('local_wheels_files', self._extract_wheels, inputs=('tarball', 'local_wheels', 'wheels_dir'), resource='disk'),
+			Stage('built_wheels', partial(self._build_sources, compiler_cache=self.compiler_cache, build_history=self._build_history, python=python), inputs=('tarball', 'source_modules', 'venv_wheels', 'wheels_dir')),
+			Stage('downloaded_wheels', partial(self.download_wheels, python=python), inputs=('missing_wheels', 'wheels_dir'), resource='network'),
+			Stage('requirements', partial(self._compute_requirements, python=python), inputs=('tarball', 'wheels_dir', 'local_wheels_files', 'built_wheels', 'downloaded_wheels')),
+		]
+	
+	@staticmethod
+	def _build_sources(tarball, source_modules, venv_wheels, wheels_dir, compiler_cache=None, build_history=None, python=None):
+		"""
+		
+		"""
+		
+		if not source_modules:
+			return []
+		return tarball.build_sources(*source_modules, wheels_dir=wheels_dir, venv_wheels=venv_wheels, compiler_cache=compiler_cache, build_history=build_history, python=python)
+	
+	@staticmethod
+	def _classify_wheels(tarball, wheels, python=None):
+		"""
+		
+		"""
+		
+		venv_wheels, local_wheels, missing_wheels = tarball.classify_wheels(wheels, python=python)
+		return {'venv_wheels': venv_wheels, 'local_wheels': local_wheels, 'missing_wheels': missing_wheels}
+	
+	def _compute_requirements(self, tarball, wheels_dir, python=None, **previous_stages):
+		"""
+		
+		"""
+		
+		return self.compute_requirements(wheels_dir, python=python, digests=tarball.digests)
+	
+	@staticmethod
+	def _extract_assets(tarball, assets_dir):
+		"""
+		
+		"""
+		
+		return tarball.extract_assets(assets_dir)
+	
+	@staticmethod
+	def _extract_wheels(tarball, local_wheels, wheels_dir):
+		"""
+		
+		"""
+		
+		return tarball.extract_wheels(*local_wheels.values(), wheels_dir=wheels_dir)
+	
+	@staticmethod
+	def _identify_modules(tarball):
+		"""
+		
+		"""
+		
+		wheels, source_modules, special = tarball.identify_modules()
+		return {'wheels': wheels, 'source_modules': source_modules}
+	
+	@staticmethod
+	def _open_tarball(tarball_path):
+		"""
+		
+		"""
+		
+		tarball = InstallerTarball(tarball_path)
+		tarball.member_paths
+		return tarball
+	
+	@staticmethod
+	def _render_systemd_unit(tarball, assets_dir, service_uid='root', install_dir=None, profile=None):
+		"""
+		
+		"""
+		
+		return tarball.render_systemd_unit(assets_dir, service_uid=service_uid, install_dir=install_dir, profile=profile)
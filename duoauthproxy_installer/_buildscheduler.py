@@ -0,0 +1,246 @@
+#!python
+"""Duo Authentication Proxy Installers (build scheduler)
+Admission control for the concurrent wheel builds, based on the resources used by previous builds.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from json import dumps as json_dumps, loads as json_loads
+from logging import getLogger
+from os import cpu_count, sysconf
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Lock
+from time import monotonic, time
+
+LOGGER = getLogger(__name__)
+
+DEFAULT_ESTIMATE = {
+	'cpu': 1.0,
+	'duration': 60.0,
+	'peak_rss': 512 * 1024 * 1024,
+}
+DEFAULT_HISTORY_FILE = Path.home() / '.cache' / 'duoauthproxy_installer' / 'build_history.json'
+MEASURE_SCRIPT = '''import json, resource, subprocess, sys, time
+start = time.monotonic()
+code = subprocess.call([sys.executable] + sys.argv[2:])
+usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+with open(sys.argv[1], 'w') as usage_file:
+    json.dump({'peak_rss': usage.ru_maxrss * 1024, 'cpu_time': usage.ru_utime + usage.ru_stime, 'duration': time.monotonic() - start}, usage_file)
+sys.exit(code)
+'''
+MEMORY_BUDGET_RATIO = 0.8
+
+
+def available_memory():
+	"""Available memory
+	The memory available for new processes, in bytes: "MemAvailable" from /proc/meminfo or, if that's not there, the physical memory.
+	"""
+	
+	try:
+		for line in Path('/proc/meminfo').read_text().splitlines():
+			name, _, value = line.partition(':')
+			if name == 'MemAvailable':
+				return int(value.split()[0]) * 1024
+	except OSError:
+		pass
+	return sysconf('SC_PAGE_SIZE') * sysconf('SC_PHYS_PAGES')
+
+
+def measured_command(usage_file, *arguments):
+	"""Measured command
+	Arguments for a python interpreter so it runs itself with "arguments" (like "setup.py bdist_wheel") in a child process and leaves the peak RSS of the process tree, the CPU time and the duration, as JSON, in "usage_file".
+	"""
+	
+	return ('-c', MEASURE_SCRIPT, str(usage_file)) + tuple(arguments)
+
+
+class BuildHistory:
+	"""Build history
+	The resources used by previous builds (peak RSS in bytes, average CPUs in use and duration in seconds) per package and version, kept as JSON in "history_file". Estimates for a version that was never built use the latest build of the same package, or the "default" values.
+	"""
+	
+	def __init__(self, history_file=DEFAULT_HISTORY_FILE, *, default=DEFAULT_ESTIMATE):
+		"""
+		
+		"""
+		
+		self.history_file = Path(history_file).expanduser().absolute()
+		self.default = dict(default)
+		self._lock = Lock()
+	
+	def __getattr__(self, item):
+		"""
+		
+		"""
+		
+		if item == 'builds':
+			value = {}
+			if self.history_file.exists():
+				try:
+					value = json_loads(self.history_file.read_text())
+				except ValueError:
+					LOGGER.warning('Ignoring the corrupted build history: %s', self.history_file)
+		else:
+			raise AttributeError(item)
+		
+		self.__setattr__(item, value)
+		return value
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r})'.format(type(self).__name__, str(self.history_file))
+	
+	def estimate(self, package, version=None):
+		"""Estimate a build
+		The expected peak RSS, CPUs and duration of building "package" "version", out of the history.
+		"""
+		
+		with self._lock:
+			versions = self.builds.get(package.lower(), {})
+			build = versions.get(str(version or '')) or (max(versions.values(), key=lambda build: build['recorded']) if versions else None)
+		result = self.default.copy()
+		if build is not None:
+			result.update({key: build[key] for key in result if key in build})
+		return result
+	
+	def record(self, package, version, *, peak_rss, duration, cpu_time=None):
+		"""Record a build
+		Keeps the resources used by building "package" "version" and saves the history.
+		"""
+		
+		build = {
+			'cpu': max(1.0, cpu_time / duration) if (cpu_time is not None) and duration else 1.0,
+			'duration': duration,
+			'peak_rss': peak_rss,
+			'recorded': time(),
+		}
+		with self._lock:
+			self.builds.setdefault(package.lower(), {})[str(version or '')] = build
+			self.history_file.parent.mkdir(parents=True, exist_ok=True)
+			temporary_file = self.history_file.with_name(self.history_file.name + '.tmp')
+			temporary_file.write_text(json_dumps(self.builds, indent='\t', sort_keys=True))
+			temporary_file.replace(self.history_file)
+		LOGGER.debug('Build of %s %s: %.1fs, %.0f MiB peak, %.1f CPUs', package, version, duration, peak_rss / 1048576, build['cpu'])
+		return build
+
+
+class BuildScheduler:
+	"""Build scheduler
+	Runs the submitted builds concurrently, admitting them against a "memory_budget" (80% of the available memory by default) and a "cpu_budget" (the CPU count by default) according to their BuildHistory estimates. Among the builds waiting for resources, the longest ones start first, so they don't end up as a tail at the end; a build is always admitted when nothing else is running, even if it's estimated over budget.
+	
+	Every build function gets a "usage_file" argument, a path where it should leave its resource usage as written by a "measured_command"; it's recorded in the history once the build is done (the wall time is used when the file is missing).
+	"""
+	
+	def __init__(self, history=None, *, memory_budget=None, cpu_budget=None):
+		"""
+		
+		"""
+		
+		self.history = BuildHistory() if history is None else history
+		self.memory_budget = int(available_memory() * MEMORY_BUDGET_RATIO) if memory_budget is None else int(memory_budget)
+		self.cpu_budget = float(cpu_count() or 1) if cpu_budget is None else float(cpu_budget)
+		self._pending, self._running = [], {}
+		self._lock = Lock()
+		self._executor = ThreadPoolExecutor(max_workers=max(1, int(self.cpu_budget)), thread_name_prefix='wheel_build')
+		self._temp_dir = TemporaryDirectory()
+	
+	def __enter__(self):
+		"""
+		
+		"""
+		
+		return self
+	
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		"""
+		
+		"""
+		
+		self.shutdown()
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}(memory_budget={}, cpu_budget={})'.format(type(self).__name__, self.memory_budget, self.cpu_budget)
+	
+	def shutdown(self):
+		"""Shut down
+		Waits for every submitted build to finish.
+		"""
+		
+		while True:
+			with self._lock:
+				futures = [future for *details, future in self._pending] + [details['future'] for details in self._running.values()]
+			if not futures:
+				break
+			for future in futures:
+				try:
+					future.exception()
+				except Exception:
+					pass
+		self._executor.shutdown(wait=True)
+		self._temp_dir.cleanup()
+	
+	def submit(self, package, version, function, *args, **kwargs):
+		"""Submit a build
+		Queues the build of "package" "version" (a call to "function" with the arguments plus "usage_file") and returns a Future for its result.
+		"""
+		
+		future = Future()
+		estimate = self.history.estimate(package, version)
+		with self._lock:
+			self._pending.append((package, version, estimate, function, args, kwargs, future))
+		self._dispatch()
+		return future
+	
+	def _dispatch(self):
+		"""
+		
+		"""
+		
+		with self._lock:
+			self._pending.sort(key=lambda pending: pending[2]['duration'], reverse=True)
+			memory = sum(details['estimate']['peak_rss'] for details in self._running.values())
+			cpu = sum(min(details['estimate']['cpu'], self.cpu_budget) for details in self._running.values())
+			for pending in list(self._pending):
+				package, version, estimate, function, args, kwargs, future = pending
+				if self._running and ((memory + estimate['peak_rss'] > self.memory_budget) or (cpu + min(estimate['cpu'], self.cpu_budget) > self.cpu_budget)):
+					continue
+				self._pending.remove(pending)
+				memory += estimate['peak_rss']
+				cpu += min(estimate['cpu'], self.cpu_budget)
+				usage_file = Path(self._temp_dir.name) / '{}-{}.json'.format(package, version)
+				self._running[usage_file] = {'estimate': estimate, 'future': future}
+				LOGGER.debug('Starting the build of %s %s (expected %.0fs, %.0f MiB)', package, version, estimate['duration'], estimate['peak_rss'] / 1048576)
+				self._executor.submit(self._run, package, version, function, args, dict(kwargs, usage_file=usage_file), future)
+	
+	def _run(self, package, version, function, args, kwargs, future):
+		"""
+		
+		"""
+		
+		start, usage_file = monotonic(), kwargs['usage_file']
+		try:
+			result = function(*args, **kwargs)
+		except BaseException as error:
+			result, exception = None, error
+		else:
+			exception = None
+			try:
+				usage = json_loads(usage_file.read_text()) if usage_file.exists() else {'peak_rss': self._running[usage_file]['estimate']['peak_rss'], 'duration': monotonic() - start}
+				self.history.record(package, version, peak_rss=usage['peak_rss'], duration=usage['duration'], cpu_time=usage.get('cpu_time'))
+			except (OSError, ValueError, KeyError):
+				LOGGER.exception("Couldn't record the build of %s %s", package, version)
+		
+		with self._lock:
+			del self._running[usage_file]
+		if exception is None:
+			future.set_result(result)
+		else:
+			future.set_exception(exception)
+		self._dispatch()
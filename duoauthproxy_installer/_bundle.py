@@ -0,0 +1,263 @@
+#!python
+"""Duo Authentication Proxy Installers (site-packages bundle)
+Bundle the pure python part of the venv into a single zip, with precompiled bytecode, loaded by a custom importer.
+"""
+
+from configparser import ConfigParser
+from logging import getLogger
+from pathlib import Path, PurePosixPath
+from re import IGNORECASE, fullmatch as re_fullmatch
+from shutil import copyfile
+from subprocess import PIPE, run
+from tempfile import TemporaryDirectory
+from zipfile import ZipFile
+
+from ._wheelinstaller import CONSOLE_SCRIPT_TEMPLATE
+from ._wheels import canonical_name, interpreter_environment
+
+LOGGER = getLogger(__name__)
+
+BUNDLE_FILE = PurePosixPath('lib', 'site-packages.zip')
+BUNDLE_SCRIPT = '''import marshal, os, py_compile, re, struct, sys, zipfile
+source_dir, bundle_file, index_name, comment_prefix, install_file = sys.argv[1:6]
+date_time, cache_date_time = (1980, 1, 1, 0, 0, 0), (1980, 1, 1, 0, 0, 2)
+bytecode, distributions = {}, {}
+with zipfile.ZipFile(bundle_file, 'w') as bundle:
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            arcname = os.path.relpath(path, source_dir).replace(os.sep, '/')
+            with open(path, 'rb') as source_file:
+                bundle.writestr(zipfile.ZipInfo(arcname, cache_date_time if name == 'dropin.cache' else date_time), source_file.read(), zipfile.ZIP_DEFLATED)
+            if (arcname.count('/') == 1) and arcname.endswith('.dist-info/METADATA'):
+                dist_info = arcname.split('/')[0]
+                distributions[re.sub(r'[-_.]+', '_', dist_info[:-len('.dist-info')].rpartition('-')[0]).lower()] = dist_info
+            parts = arcname[:-len('.py')].split('/')
+            is_package = parts[-1] == '__init__'
+            if is_package:
+                parts.pop()
+            if (not name.endswith('.py')) or (not parts) or not all(part.isidentifier() for part in parts):
+                continue
+            try:
+                py_compile.compile(path, path + 'c', os.path.join(install_file, *arcname.split('/')), doraise=True, invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+            except py_compile.PyCompileError as error:
+                print(error, file=sys.stderr)
+                continue
+            with open(path + 'c', 'rb') as bytecode_file:
+                bundle.writestr(zipfile.ZipInfo(arcname + 'c', date_time), bytecode_file.read(), zipfile.ZIP_STORED)
+            bytecode['.'.join(parts)] = (arcname + 'c', is_package)
+
+modules = {}
+with zipfile.ZipFile(bundle_file) as bundle, open(bundle_file, 'rb') as raw_file:
+    for module, (member, is_package) in bytecode.items():
+        info = bundle.getinfo(member)
+        raw_file.seek(info.header_offset + 26)
+        name_size, extra_size = struct.unpack('<HH', raw_file.read(4))
+        modules[module] = (info.header_offset + 30 + name_size + extra_size, info.file_size, is_package)
+        parts = module.split('.')
+        for position in range(1, len(parts)):
+            modules.setdefault('.'.join(parts[:position]), (-1, 0, True))
+
+index = marshal.dumps({'modules': modules, 'distributions': distributions})
+with zipfile.ZipFile(bundle_file, 'a') as bundle:
+    info = zipfile.ZipInfo(index_name, date_time)
+    bundle.writestr(info, index, zipfile.ZIP_STORED)
+    offset = info.header_offset + 30 + len(info.filename.encode('utf8')) + len(info.extra)
+    bundle.comment = '{}{} {}'.format(comment_prefix, offset, len(index)).encode('ascii')
+with open(bundle_file, 'rb') as raw_file:
+    raw_file.seek(offset)
+    if raw_file.read(len(index)) != index:
+        sys.exit('Misplaced bundle index')
+print(sum(1 for offset, size, is_package in modules.values() if offset >= 0))
+'''
+COMMENT_PREFIX = 'duoauthproxy-bundle '
+EXTENSION_SUFFIXES = ('.so', '.pyd', '.dll', '.dylib')
+IMPORTER_MODULE = '_duoauthproxy_bundle'
+IMPORTER_SOURCE = Path(__file__).parent / 'data' / 'bundle_importer.py'
+INDEX_NAME = 'bundle-index.marshal'
+PLUGIN_CACHE_SCRIPT = '''import sys
+sys.path[:0] = sys.argv[1:]
+from twisted.plugin import IPlugin, getPlugins
+print(len(list(getPlugins(IPlugin))))
+'''
+PTH_FILE = 'duoauthproxy_bundle.pth'
+
+
+class SitePackagesBundle:
+	"""Site-packages bundle
+	Splits the "wheels" of an install plan into the ones that can be bundled (pure python: "Root-Is-Purelib", no extension modules, nothing in ".data" but scripts and purelib files, and not listed in "unbundled") and the rest, which should be installed in the venv as usual.
+	
+	The bundled ones end up in a single zip ("lib/site-packages.zip" in the venv) with their modules precompiled by the "python" interpreter (unchecked hash based bytecode, stored uncompressed, so the sources are never looked at) and an index with the offset of the bytecode of every module, pointed to by the archive comment. The importer (data/bundle_importer.py) is shipped in site-packages with a ".pth" file that installs it on startup; their scripts and console scripts are left on disk, in "bin". The twisted plugin cache ("dropin.cache") can't be written into the archive at runtime, so it's generated here, with the unbundled wheels unpacked next to the bundled ones (the "python" interpreter should match the target one). Distributions that read their own files through "__file__" (instead of "importlib.resources" or "pkgutil.get_data") won't work from the bundle, so they should be "unbundled".
+	"""
+	
+	def __init__(self, wheels, *, python, unbundled=()):
+		"""
+		
+		"""
+		
+		self.wheels = [Path(wheel) for wheel in wheels]
+		self.python = python
+		self.unbundled_names = frozenset(canonical_name(name) for name in unbundled)
+	
+	def __getattr__(self, item):
+		"""
+		
+		"""
+		
+		if item in ('bundled', 'unbundled'):
+			self.bundled, self.unbundled = {}, {}
+			for wheel in self.wheels:
+				name, reason = self.inspect(wheel)
+				if (reason is None) and (name in self.unbundled_names):
+					reason = 'unbundled on request'
+				if reason is None:
+					self.bundled[name] = wheel
+				else:
+					LOGGER.debug('Not bundling %s: %s', wheel.name, reason)
+					self.unbundled[name] = wheel
+			return getattr(self, item)
+		elif item == 'python_version':
+			value = interpreter_environment(self.python)['python_version']
+		else:
+			raise AttributeError(item)
+		
+		self.__setattr__(item, value)
+		return value
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({} wheels, python={!r})'.format(type(self).__name__, len(self.wheels), str(self.python))
+	
+	@staticmethod
+	def inspect(wheel):
+		"""Inspect a wheel
+		The canonical name of the distribution in "wheel" and the reason why it can't be bundled (None if it can).
+		"""
+		
+		with ZipFile(wheel) as wheel_zip:
+			names = wheel_zip.namelist()
+			dist_info = {PurePosixPath(name).parts[0] for name in names if PurePosixPath(name).parts[0].endswith('.dist-info')}
+			if len(dist_info) != 1:
+				raise ValueError('Unable to find the dist-info in "{}": {}'.format(wheel, sorted(dist_info)))
+			dist_info = dist_info.pop()
+			name = canonical_name(dist_info[:-len('.dist-info')].rpartition('-')[0])
+			data_dir = dist_info[:-len('.dist-info')] + '.data'
+			
+			wheel_metadata = wheel_zip.read('{}/WHEEL'.format(dist_info)).decode('utf8')
+			if not any(re_fullmatch(r'Root-Is-Purelib:\s*true\s*', line, flags=IGNORECASE) for line in wheel_metadata.splitlines()):
+				return name, 'not purelib'
+			for member in names:
+				parts = PurePosixPath(member).parts
+				if member.endswith(EXTENSION_SUFFIXES) or ('.so.' in parts[-1]):
+					return name, 'extension module {}'.format(member)
+				if (parts[0] == data_dir) and ((len(parts) < 3) or (parts[1] not in ('purelib', 'scripts'))):
+					return name, 'data file {}'.format(member)
+		return name, None
+	
+	def build(self, output_dir, *, target_install_path):
+		"""Build the bundle
+		Lays out the bundle files under "output_dir", the way they should be placed under "target_install_path" (the venv): the zip, the importer with its ".pth" file in site-packages, and the scripts in "bin". Returns the paths of the files, relative to "output_dir".
+		"""
+		
+		output_dir = Path(output_dir)
+		python_executable = Path(target_install_path) / 'bin' / 'python'
+		site_packages = PurePosixPath('lib', 'python{}'.format(self.python_version), 'site-packages')
+		result = []
+		with TemporaryDirectory() as temp_dir_name:
+			source_dir = Path(temp_dir_name)
+			for name, wheel in sorted(self.bundled.items()):
+				result += self._unpack(wheel, source_dir, output_dir, python_executable)
+			if (source_dir / 'twisted' / 'plugin.py').exists():
+				self._plugin_cache(source_dir)
+			
+			bundle_file = output_dir / BUNDLE_FILE
+			bundle_file.parent.mkdir(parents=True, exist_ok=True)
+			modules = int(run((str(self.python), '-c', BUNDLE_SCRIPT, str(source_dir), str(bundle_file), INDEX_NAME, COMMENT_PREFIX, str(Path(target_install_path) / BUNDLE_FILE)), stdout=PIPE, text=True, check=True).stdout)
+			result.append(BUNDLE_FILE)
+		
+		(output_dir / site_packages).mkdir(parents=True, exist_ok=True)
+		copyfile(IMPORTER_SOURCE, output_dir / site_packages / (IMPORTER_MODULE + '.py'))
+		(output_dir / site_packages / PTH_FILE).write_text('import {0}; {0}.install()\n'.format(IMPORTER_MODULE))
+		result += [site_packages / (IMPORTER_MODULE + '.py'), site_packages / PTH_FILE]
+		
+		LOGGER.info('Bundled %d distributions (%d modules) into %s, %d distributions left in the venv', len(self.bundled), modules, BUNDLE_FILE, len(self.unbundled))
+		return result
+	
+	@staticmethod
+	def _console_scripts(entry_points, scripts_dir, python_executable):
+		"""
+		
+		"""
+		
+		config = ConfigParser(interpolation=None, delimiters=('=',))
+		config.optionxform = str
+		config.read_string(entry_points)
+		result = []
+		for section in ('console_scripts', 'gui_scripts'):
+			if not config.has_section(section):
+				continue
+			for script_name, reference in config.items(section):
+				module, _, attributes = reference.partition('[')[0].strip().partition(':')
+				script = scripts_dir / script_name
+				script.write_text(CONSOLE_SCRIPT_TEMPLATE.format(python=python_executable, module=module.strip(), name=attributes.strip().split('.')[0], function=attributes.strip()))
+				script.chmod(0o755)
+				result.append(script)
+		return result
+	
+	def _plugin_cache(self, source_dir):
+		"""
+		
+		"""
+		
+		with TemporaryDirectory() as temp_dir_name:
+			platlib_dir = Path(temp_dir_name)
+			for wheel in self.unbundled.values():
+				with ZipFile(wheel) as wheel_zip:
+					for member in wheel_zip.namelist():
+						parts = PurePosixPath(member).parts
+						if parts[0].endswith('.data'):
+							if (len(parts) < 3) or (parts[1] not in ('purelib', 'platlib')):
+								continue
+							parts = parts[2:]
+						if member.endswith('/'):
+							continue
+						destination = platlib_dir.joinpath(*parts)
+						destination.parent.mkdir(parents=True, exist_ok=True)
+						destination.write_bytes(wheel_zip.read(member))
+			plugins = run((str(self.python), '-I', '-B', '-c', PLUGIN_CACHE_SCRIPT, str(source_dir), str(platlib_dir)), stdout=PIPE, text=True, check=True).stdout.strip()
+		LOGGER.debug('Cached %s twisted plugins for the bundle', plugins)
+	
+	def _unpack(self, wheel, source_dir, output_dir, python_executable):
+		"""
+		
+		"""
+		
+		scripts_dir = output_dir / 'bin'
+		scripts_dir.mkdir(parents=True, exist_ok=True)
+		scripts = []
+		with ZipFile(wheel) as wheel_zip:
+			for member in wheel_zip.namelist():
+				if member.endswith('/'):
+					continue
+				parts = PurePosixPath(member).parts
+				if parts[0].endswith('.data') and (parts[1] == 'scripts'):
+					script = scripts_dir.joinpath(*parts[2:])
+					content = wheel_zip.read(member)
+					if content.startswith(b'#!python'):
+						content = '#!{}'.format(python_executable).encode('utf8') + content[len(b'#!python'):].lstrip(b'w')
+					script.write_bytes(content)
+					script.chmod(0o755)
+					scripts.append(script)
+					continue
+				elif parts[0].endswith('.data'):
+					parts = parts[2:]
+				elif parts[-1] == 'entry_points.txt' and parts[0].endswith('.dist-info') and (len(parts) == 2):
+					scripts += self._console_scripts(wheel_zip.read(member).decode('utf8'), scripts_dir, python_executable)
+				destination = source_dir.joinpath(*parts)
+				destination.parent.mkdir(parents=True, exist_ok=True)
+				destination.write_bytes(wheel_zip.read(member))
+		return [script.relative_to(output_dir) for script in scripts]
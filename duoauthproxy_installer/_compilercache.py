@@ -0,0 +1,126 @@
+#!python
+"""Duo Authentication Proxy Installers (compiler cache)
+Compiler output caching (ccache for C/C++, sccache for Rust) for the wheel builds, with hit rates per module.
+"""
+
+from contextlib import contextmanager
+from json import loads as json_loads
+from logging import getLogger
+from os import environ
+from pathlib import Path
+from shutil import which
+from subprocess import DEVNULL, PIPE, run
+from tempfile import TemporaryDirectory
+from threading import Lock
+
+LOGGER = getLogger(__name__)
+
+CACHE_DIR_VARIABLE = 'DUOAUTHPROXY_COMPILER_CACHE'
+DEFAULT_CACHE_DIR = Path.home() / '.cache' / 'duoauthproxy_installer' / 'compiler'
+
+
+class CompilerCache:
+	"""Compiler cache
+	Builds the environment for wheel builds so compilations go through ccache (C/C++) and sccache (rustc), and the Rust crates share a target directory and a cargo registry. Everything lives in "cache_dir" (the "DUOAUTHPROXY_COMPILER_CACHE" environment value or the user cache by default), so it can be kept between builds or mounted into a container.
+	
+	Builds wrapped in "track" are accounted per module: ccache reports every compilation in a per-module stats log, sccache counters are compared before and after the build (so concurrent Rust builds get mixed up).
+	"""
+	
+	CCACHE_HIT_COUNTERS = ('direct_cache_hit', 'preprocessed_cache_hit')
+	CCACHE_MISS_COUNTERS = ('cache_miss',)
+	
+	def __init__(self, cache_dir=None, *, ccache=None, sccache=None, compilers=('gcc', 'g++')):
+		"""
+		
+		"""
+		
+		if cache_dir is None:
+			cache_dir = environ.get(CACHE_DIR_VARIABLE, DEFAULT_CACHE_DIR)
+		self.cache_dir = Path(cache_dir).expanduser().absolute()
+		self.ccache = which('ccache') if ccache is None else ccache
+		self.sccache = which('sccache') if sccache is None else sccache
+		self.compilers = compilers
+		self.report = {}
+		self._lock = Lock()
+		
+		if not (self.ccache or self.sccache):
+			LOGGER.warning('Neither ccache nor sccache were found, compilations will not be cached')
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r})'.format(type(self).__name__, str(self.cache_dir))
+	
+	def environment(self, base=None, *, stats_log=None):
+		"""Build environment
+		The "base" environment (the current one by default) with the cache wrappers and the shared Rust directories.
+		"""
+		
+		result = dict(environ if base is None else base)
+		result.update({
+			'CARGO_HOME': str(self.cache_dir / 'cargo'),
+			'CARGO_TARGET_DIR': str(self.cache_dir / 'cargo-target'),
+		})
+		if self.ccache:
+			c_compiler, cxx_compiler = self.compilers
+			result.update({
+				'CC': '{} {}'.format(self.ccache, result.get('CC', c_compiler)),
+				'CXX': '{} {}'.format(self.ccache, result.get('CXX', cxx_compiler)),
+				'CCACHE_DIR': str(self.cache_dir / 'ccache'),
+				'CCACHE_BASEDIR': result.get('CCACHE_BASEDIR', '/'),
+				'CCACHE_NOHASHDIR': 'true',
+			})
+			if stats_log is not None:
+				result['CCACHE_STATSLOG'] = str(stats_log)
+		if self.sccache:
+			result.update({
+				'RUSTC_WRAPPER': self.sccache,
+				'SCCACHE_DIR': str(self.cache_dir / 'sccache'),
+			})
+		return result
+	
+	def rust_stats(self):
+		"""sccache counters
+		Overall hits and misses from the sccache server, or None if sccache is not in use.
+		"""
+		
+		if not self.sccache:
+			return None
+		
+		completed = run((self.sccache, '--show-stats', '--stats-format', 'json'), stdout=PIPE, stderr=DEVNULL, text=True, env=self.environment())
+		if completed.returncode:
+			return None
+		stats = json_loads(completed.stdout).get('stats', {})
+		return tuple(sum(stats.get(counter, {}).get('counts', {}).values()) for counter in ('cache_hits', 'cache_misses'))
+	
+	@contextmanager
+	def track(self, module):
+		"""Track a build
+		Context manager providing the build environment for "module" and recording its cache hits and misses in "report" once the build is done.
+		"""
+		
+		with TemporaryDirectory() as temp_dir_name:
+			stats_log = Path(temp_dir_name) / 'ccache_stats.log'
+			rust_before = self.rust_stats()
+			yield self.environment(stats_log=stats_log)
+			
+			hits, misses = 0, 0
+			if stats_log.exists():
+				for line in stats_log.read_text().splitlines():
+					line = line.strip()
+					if line in self.CCACHE_HIT_COUNTERS:
+						hits += 1
+					elif line in self.CCACHE_MISS_COUNTERS:
+						misses += 1
+			rust_after = self.rust_stats()
+			if (rust_before is not None) and (rust_after is not None):
+				hits += rust_after[0] - rust_before[0]
+				misses += rust_after[1] - rust_before[1]
+		
+		result = {'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses) if (hits + misses) else None}
+		with self._lock:
+			self.report[module] = result
+		if hits + misses:
+			LOGGER.info('Compiler cache for %s: %d hits, %d misses (%.0f%%)', module, hits, misses, result['hit_rate'] * 100)
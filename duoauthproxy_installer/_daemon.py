@@ -0,0 +1,403 @@
+#!python
+"""Duo Authentication Proxy Installers (build daemon)
+Long running build service, keeping the prepared installers warm between jobs.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps as json_dumps, loads as json_loads
+from logging import getLogger
+from os import cpu_count
+from pathlib import Path
+from socket import AF_UNIX, SOCK_STREAM, socket
+from socketserver import ThreadingMixIn, UnixStreamServer
+from threading import Lock
+from time import monotonic, sleep, time
+from uuid import uuid4
+
+LOGGER = getLogger(__name__)
+
+DEFAULT_ADDRESS = '127.0.0.1:8750'
+
+
+def parse_address(address):
+	"""Parse a daemon address
+	A "host:port" string is a TCP (localhost) address, anything else (a path, optionally prefixed with "unix:") is a unix socket. Returns a (host, port) tuple or the socket path as a string.
+	"""
+	
+	address = str(address)
+	if address.startswith('unix:'):
+		return address[len('unix:'):]
+	host, separator, port = address.rpartition(':')
+	if separator and port.isdigit() and ('/' not in address):
+		return host or '127.0.0.1', int(port)
+	return address
+
+
+class BuildJob:
+	"""Build job
+	A build request ("version_tag", "release_tag" and the "build_rpm" details, or a container build with the "docker" format) and its state: the status ("queued", "running", "succeeded" or "failed"), the output or error, and the timings.
+	"""
+	
+	FORMATS = ('docker', 'rpm')
+	
+	def __init__(self, version_tag, release_tag, *, build_format='rpm', dist_dir='dist', target_install_path=None, instances=None, service_uid='root', runtime_profile=None, python='python3', split_dependencies=False):
+		"""
+		
+		"""
+		
+		if build_format not in self.FORMATS:
+			raise ValueError('Unsupported build format "{}", use one of: {}'.format(build_format, ', '.join(self.FORMATS)))
+		
+		self.id = uuid4().hex[:12]
+		self.version_tag = str(version_tag)
+		self.release_tag = str(release_tag)
+		self.build_format = build_format
+		self.dist_dir = dist_dir
+		self.target_install_path = target_install_path
+		self.instances = instances
+		self.service_uid = service_uid
+		self.runtime_profile = runtime_profile
+		self.python = python
+		self.split_dependencies = split_dependencies
+		
+		self.status = 'queued'
+		self.submitted = time()
+		self.started, self.finished = None, None
+		self.output, self.error, self.warm = None, None, None
+		self.timings = {}
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r}, {!r}, id={!r}, status={!r})'.format(type(self).__name__, self.version_tag, self.release_tag, self.id, self.status)
+	
+	def details(self):
+		"""Job details
+		The request, state and timings of the job, as a JSON friendly dict.
+		"""
+		
+		return {
+			'id': self.id,
+			'version_tag': self.version_tag,
+			'release_tag': self.release_tag,
+			'build_format': self.build_format,
+			'dist_dir': str(self.dist_dir),
+			'target_install_path': None if self.target_install_path is None else str(self.target_install_path),
+			'status': self.status,
+			'warm': self.warm,
+			'submitted': self.submitted,
+			'started': self.started,
+			'finished': self.finished,
+			'timings': self.timings,
+			'output': self.output,
+			'error': self.error,
+		}
+
+
+class BuildDaemon:
+	"""Build daemon
+	Local build service, listening on "address" (a localhost "host:port" or a unix socket path, see "parse_address") for build jobs. It runs up to "max_jobs" of them concurrently and keeps a prepared DuoAuthProxyInstaller (created with the "installer_arguments") per version tag: the tarball stays downloaded and indexed, and the collected and built wheels and the requirements are reused, so only the first job of every version pays for the preparation. Jobs for the same version run one at a time, since they share that installer. The installers are prepared for the interpreter running the daemon; the "python" of a job is the interpreter on the target host, it only ends up in the package.
+	
+	The HTTP API speaks JSON: "POST /jobs" submits a job (the BuildJob arguments), "GET /jobs" and "GET /jobs/<id>" report their state and timings, and "GET /status" summarizes the daemon.
+	"""
+	
+	def __init__(self, address=DEFAULT_ADDRESS, *, max_jobs=None, work_dir=None, **installer_arguments):
+		"""
+		
+		"""
+		
+		self.address = parse_address(address)
+		self.max_jobs = int(max_jobs or max(1, (cpu_count() or 1) // 4))
+		self.work_dir = Path.cwd() / 'build_daemon' if work_dir is None else Path(work_dir).absolute()
+		self.installer_arguments = installer_arguments
+		self.jobs = {}
+		self._installers, self._lock, self._started = {}, Lock(), monotonic()
+	
+	def __getattr__(self, item):
+		"""
+		
+		"""
+		
+		if item == 'executor':
+			value = ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix='build_job')
+		else:
+			raise AttributeError(item)
+		
+		self.__setattr__(item, value)
+		return value
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r}, max_jobs={})'.format(type(self).__name__, self.address, self.max_jobs)
+	
+	def installer(self, version_tag):
+		"""Warm installer
+		The DuoAuthProxyInstaller kept for "version_tag" and the lock serializing its jobs, created on first use.
+		"""
+		
+		from . import DuoAuthProxyInstaller
+		
+		with self._lock:
+			if version_tag not in self._installers:
+				self._installers[version_tag] = DuoAuthProxyInstaller(version_tag, **self.installer_arguments), Lock()
+			return self._installers[version_tag]
+	
+	def run_job(self, job):
+		"""Run a job
+		Builds the package requested by "job" (a BuildJob), updating its state and timings: the time it waited in the queue (and for the other jobs of the same version), the preparation (the whole "prepare" pipeline, with the stage timings, on a cold installer; just the assets refresh on a warm one) and the build itself.
+		"""
+		
+		from . import DEFAULT_TARGET_INSTALL_PATH, DuoAuthProxyInstaller
+		
+		job.status, job.started = 'running', time()
+		job.timings['queued'] = job.started - job.submitted
+		start = monotonic()
+		target_install_path = Path(DEFAULT_TARGET_INSTALL_PATH if job.target_install_path is None else job.target_install_path)
+		try:
+			if job.build_format == 'docker':
+				job.warm = False
+				job.output = DuoAuthProxyInstaller.run_in_docker(job.version_tag, job.release_tag, job.dist_dir, target_install_path=target_install_path)
+			else:
+				installer, lock = self.installer(job.version_tag)
+				with lock:
+					job.timings['waiting'] = monotonic() - start
+					job.warm = 'requirements' in vars(installer)
+					if job.warm:
+						installer.refresh_assets(service_uid=job.service_uid, target_install_path=target_install_path, runtime_profile=job.runtime_profile)
+					else:
+						job.timings['stages'] = installer.prepare(service_uid=job.service_uid, target_install_path=target_install_path, runtime_profile=job.runtime_profile)
+					job.timings['prepare'] = monotonic() - start - job.timings['waiting']
+					staging_dir = self.work_dir / 'jobs' / job.id / 'rpm_data'
+					staging_dir.mkdir(parents=True, exist_ok=True)
+					job.output = installer.build_rpm(job.release_tag, target_install_path=target_install_path, rpms_dir=job.dist_dir, staging_dir=staging_dir, instances=job.instances, service_uid=job.service_uid, runtime_profile=job.runtime_profile, python=job.python, split_dependencies=job.split_dependencies)
+		except Exception as error:
+			LOGGER.exception('Build job %s failed', job.id)
+			job.status, job.error = 'failed', '{}: {}'.format(type(error).__name__, error)
+		else:
+			job.status = 'succeeded'
+		
+		job.finished = time()
+		job.timings['run'] = monotonic() - start
+		if 'prepare' in job.timings:
+			job.timings['build'] = job.timings['run'] - job.timings['waiting'] - job.timings['prepare']
+		LOGGER.info('Build job %s %s in %.1fs (%s)', job.id, job.status, job.timings['run'], 'warm' if job.warm else 'cold')
+		return job
+	
+	def serve(self):
+		"""Serve
+		Listens for requests until interrupted. The running jobs are allowed to finish; the queued ones are dropped.
+		"""
+		
+		if isinstance(self.address, tuple):
+			server = ThreadingHTTPServer(self.address, BuildRequestHandler)
+		else:
+			Path(self.address).unlink(missing_ok=True)
+			server = ThreadingUnixHTTPServer(self.address, BuildRequestHandler)
+		server.build_daemon = self
+		LOGGER.info('Build daemon listening on %s, running up to %d jobs', self.address, self.max_jobs)
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			LOGGER.info('Build daemon stopping')
+		finally:
+			server.server_close()
+			self.executor.shutdown(wait=True, cancel_futures=True)
+			if not isinstance(self.address, tuple):
+				Path(self.address).unlink(missing_ok=True)
+	
+	def status(self):
+		"""Daemon status
+		The amount of jobs per status, the warm installers (version tags) and the uptime.
+		"""
+		
+		statuses = {}
+		for job in list(self.jobs.values()):
+			statuses[job.status] = statuses.get(job.status, 0) + 1
+		return {
+			'address': self.address if isinstance(self.address, str) else '{}:{}'.format(*self.address),
+			'max_jobs': self.max_jobs,
+			'jobs': statuses,
+			'warm': sorted(version_tag for version_tag, (installer, lock) in list(self._installers.items()) if 'requirements' in vars(installer)),
+			'uptime': monotonic() - self._started,
+		}
+	
+	def submit(self, version_tag, release_tag, **details):
+		"""Submit a job
+		Queues a BuildJob for the arguments and returns it.
+		"""
+		
+		job = BuildJob(version_tag, release_tag, **details)
+		self.jobs[job.id] = job
+		self.executor.submit(self.run_job, job)
+		LOGGER.info('Build job %s queued: %s-%s (%s)', job.id, job.version_tag, job.release_tag, job.build_format)
+		return job
+
+
+class BuildRequestHandler(BaseHTTPRequestHandler):
+	"""Build daemon request handler
+	Maps the HTTP API to the BuildDaemon of the server.
+	"""
+	
+	def do_GET(self):
+		"""
+		
+		"""
+		
+		daemon = self.server.build_daemon
+		parts = [part for part in self.path.split('?')[0].split('/') if part]
+		if parts == ['status']:
+			return self._reply(200, daemon.status())
+		if parts == ['jobs']:
+			return self._reply(200, [job.details() for job in list(daemon.jobs.values())])
+		if (len(parts) == 2) and (parts[0] == 'jobs'):
+			if parts[1] in daemon.jobs:
+				return self._reply(200, daemon.jobs[parts[1]].details())
+			return self._reply(404, {'error': 'Unknown job: {}'.format(parts[1])})
+		return self._reply(404, {'error': 'Unknown path: {}'.format(self.path)})
+	
+	def do_POST(self):
+		"""
+		
+		"""
+		
+		if [part for part in self.path.split('?')[0].split('/') if part] != ['jobs']:
+			return self._reply(404, {'error': 'Unknown path: {}'.format(self.path)})
+		try:
+			request = json_loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+			job = self.server.build_daemon.submit(**request)
+		except (TypeError, ValueError) as error:
+			return self._reply(400, {'error': str(error)})
+		return self._reply(202, job.details())
+	
+	def log_message(self, format, *args):
+		"""
+		
+		"""
+		
+		LOGGER.debug('%s %s', self.requestline, format % args)
+	
+	def _reply(self, code, content):
+		"""
+		
+		"""
+		
+		body = json_dumps(content, default=str).encode('utf8')
+		self.send_response(code)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+	"""Threading HTTP server on a unix socket
+	The unix socket counterpart of "ThreadingHTTPServer".
+	"""
+	
+	daemon_threads = True
+
+
+class UnixHTTPConnection(HTTPConnection):
+	"""HTTP connection over a unix socket
+	An "HTTPConnection" to the unix socket at "path".
+	"""
+	
+	def __init__(self, path, timeout=60):
+		"""
+		
+		"""
+		
+		super().__init__('localhost', timeout=timeout)
+		self.socket_path = path
+	
+	def connect(self):
+		"""
+		
+		"""
+		
+		self.sock = socket(AF_UNIX, SOCK_STREAM)
+		self.sock.settimeout(self.timeout)
+		self.sock.connect(self.socket_path)
+
+
+class BuildClient:
+	"""Build daemon client
+	Talks to the BuildDaemon at "address" (the same format it listens on), for CI scripts: submit jobs, check on them and wait for them to finish.
+	"""
+	
+	def __init__(self, address=DEFAULT_ADDRESS, *, timeout=60):
+		"""
+		
+		"""
+		
+		self.address = parse_address(address)
+		self.timeout = timeout
+	
+	def job(self, job_id):
+		"""Job details
+		The state and timings of the job "job_id".
+		"""
+		
+		return self._request('GET', '/jobs/{}'.format(job_id))
+	
+	def jobs(self):
+		"""All jobs
+		The details of every job known to the daemon.
+		"""
+		
+		return self._request('GET', '/jobs')
+	
+	def status(self):
+		"""Daemon status
+		The "BuildDaemon.status" of the daemon.
+		"""
+		
+		return self._request('GET', '/status')
+	
+	def submit(self, version_tag, release_tag, **details):
+		"""Submit a job
+		Queues a build job (see BuildJob) and returns its details.
+		"""
+		
+		return self._request('POST', '/jobs', dict(details, version_tag=version_tag, release_tag=release_tag))
+	
+	def wait(self, job_id, *, poll_interval=2, timeout=None):
+		"""Wait for a job
+		Polls the job "job_id" until it's finished, returning its details. Raises a TimeoutError if it takes longer than "timeout" seconds.
+		"""
+		
+		deadline = None if timeout is None else monotonic() + timeout
+		while True:
+			details = self.job(job_id)
+			if details['status'] in ('failed', 'succeeded'):
+				return details
+			if (deadline is not None) and (monotonic() > deadline):
+				raise TimeoutError('Job {} did not finish in {} seconds'.format(job_id, timeout))
+			sleep(poll_interval)
+	
+	def _request(self, method, path, content=None):
+		"""
+		
+		"""
+		
+		if isinstance(self.address, tuple):
+			connection = HTTPConnection(*self.address, timeout=self.timeout)
+		else:
+			connection = UnixHTTPConnection(self.address, timeout=self.timeout)
+		try:
+			body = None if content is None else json_dumps(content).encode('utf8')
+			connection.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+			response = connection.getresponse()
+			result = json_loads(response.read() or b'null')
+		finally:
+			connection.close()
+		if response.status >= 400:
+			raise RuntimeError('Build daemon error ({}): {}'.format(response.status, result.get('error') if isinstance(result, dict) else result))
+		return result
@@ -0,0 +1,657 @@
+#!python
+"""Duo Authentication Proxy Installers (load test)
+Offline load test for a packaged proxy: the staged venv gets installed in a temporary prefix, started with the command from the generated systemd unit, wired to local stub upstreams (Duo API and RADIUS primary) and flooded with RADIUS Access-Requests.
+"""
+
+from asyncio import DatagramProtocol, gather, get_running_loop, run as asyncio_run, wait_for, TimeoutError as AsyncioTimeoutError
+from datetime import datetime, timezone
+from hashlib import md5
+from hmac import new as hmac_new
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps as json_dumps, loads as json_loads
+from logging import getLogger
+from os import environ, getgid, getuid, kill
+from pathlib import Path
+from secrets import token_bytes, token_hex
+from shlex import split as shlex_split
+from shutil import copytree, which
+from signal import SIGTERM
+from socket import AF_INET, SOCK_DGRAM, socket, timeout as socket_timeout
+from ssl import PROTOCOL_TLS_SERVER, SSLContext
+from statistics import mean, median
+from struct import pack
+from subprocess import DEVNULL, run
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+from time import monotonic, perf_counter, sleep, time
+
+from ._requirements import read_install_plan
+from ._wheelinstaller import WheelInstaller
+
+LOGGER = getLogger(__name__)
+
+PROXY_CONFIG_TEMPLATE = '''[main]
+http_ca_certs_file={ca_certs_file}
+
+[radius_client]
+host=127.0.0.1
+port={primary_port}
+secret={primary_secret}
+
+[radius_server_auto]
+ikey={ikey}
+skey={skey}
+api_host=127.0.0.1:{api_port}
+radius_ip_1=127.0.0.1
+radius_secret_1={radius_secret}
+port={radius_port}
+client=radius_client
+failmode=secure
+'''
+
+RADIUS_ACCESS_REQUEST = 1
+RADIUS_ACCESS_ACCEPT = 2
+RADIUS_ACCESS_REJECT = 3
+RADIUS_MESSAGE_AUTHENTICATOR = 80
+RADIUS_NAS_IP_ADDRESS = 4
+RADIUS_USER_NAME = 1
+RADIUS_USER_PASSWORD = 2
+STARTUP_PROBE = '''import sys
+import twisted.scripts.twistd
+with open(sys.argv[1]) as tap_file:
+    exec(compile(tap_file.read(), sys.argv[1], 'exec'), {'__file__': sys.argv[1], '__name__': '__tap__'})
+'''
+
+
+def free_port(kind=SOCK_DGRAM):
+	"""Free local port
+	Asks the kernel for a currently unused port on the loopback interface.
+	"""
+	
+	with socket(AF_INET, kind) as probe:
+		probe.bind(('127.0.0.1', 0))
+		return probe.getsockname()[1]
+
+
+def percentile(sorted_values, fraction):
+	"""Percentile
+	Nearest-rank percentile of the (already sorted) values.
+	"""
+	
+	if not sorted_values:
+		return None
+	return sorted_values[min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))]
+
+
+def radius_attributes(packet):
+	"""Parse RADIUS attributes
+	The (type, value) pairs of the packet, in order.
+	"""
+	
+	result, offset = [], 20
+	while offset + 2 <= len(packet):
+		attribute_type, length = packet[offset], packet[offset + 1]
+		if length < 2:
+			break
+		result.append((attribute_type, packet[offset + 2:offset + length]))
+		offset += length
+	return result
+
+
+def radius_packet(code, identifier, authenticator, attributes, secret, *, message_authenticator=True):
+	"""Build a RADIUS packet
+	Assembles the packet (RFC-2865) with the provided authenticator field, adding a Message-Authenticator (RFC-3579) as the first attribute if requested.
+	"""
+	
+	if message_authenticator:
+		attributes = [(RADIUS_MESSAGE_AUTHENTICATOR, bytes(16))] + list(attributes)
+	body = b''.join(pack('!BB', attribute_type, len(value) + 2) + value for attribute_type, value in attributes)
+	packet = pack('!BBH', code, identifier, 20 + len(body)) + authenticator + body
+	if message_authenticator:
+		signature = hmac_new(secret, packet, 'md5').digest()
+		packet = packet[:22] + signature + packet[38:]
+	return packet
+
+
+def radius_password(password, secret, authenticator):
+	"""Hide a RADIUS password
+	User-Password attribute value as described in RFC-2865 section 5.2.
+	"""
+	
+	password += bytes((-len(password) % 16) if password else 16)
+	result, previous = b'', authenticator
+	for start in range(0, len(password), 16):
+		key = md5(secret + previous).digest()
+		previous = bytes(a ^ b for a, b in zip(password[start:start + 16], key))
+		result += previous
+	return result
+
+
+def radius_response(request, code, secret):
+	"""Build a RADIUS response
+	A response to "request" with the Response Authenticator (and Message-Authenticator, if the request had one) computed as RFC-2865 and RFC-3579 describe.
+	"""
+	
+	message_authenticator = any(attribute_type == RADIUS_MESSAGE_AUTHENTICATOR for attribute_type, _ in radius_attributes(request))
+	packet = radius_packet(code, request[1], request[4:20], [], secret, message_authenticator=message_authenticator)
+	return packet[:4] + md5(packet + secret).digest() + packet[20:]
+
+
+def rss_kib(pid):
+	"""Process memory
+	Current and peak resident set size (in KiB) of the process, read from /proc.
+	"""
+	
+	values = {}
+	try:
+		for line in Path('/proc', str(pid), 'status').read_text().splitlines():
+			name, _, value = line.partition(':')
+			if name in ('VmRSS', 'VmHWM'):
+				values[name] = int(value.split()[0])
+	except (FileNotFoundError, ProcessLookupError):
+		pass
+	return values.get('VmRSS'), values.get('VmHWM')
+
+
+class StubDuoAPI(ThreadingHTTPServer):
+	"""Stub Duo API
+	HTTPS server answering the Auth API calls made by the proxy (ping, check, preauth, auth) with canned successful responses, using a throw away self-signed certificate.
+	"""
+	
+	RESPONSES = {
+		'/auth/v2/auth': {'result': 'allow', 'status': 'allow', 'status_msg': 'Success. Logging you in...'},
+		'/auth/v2/preauth': {'result': 'auth', 'status_msg': 'Account is active', 'devices': [{'device': 'DPFZRS9FB0D46QFTM891', 'type': 'phone', 'number': 'XXX-XXX-0100', 'name': '', 'capabilities': ['auto', 'push']}]},
+	}
+	
+	daemon_threads = True
+	
+	def __enter__(self):
+		"""
+		
+		"""
+		
+		self._thread = Thread(target=self.serve_forever, name='stub_duo_api', daemon=True)
+		self._thread.start()
+		return self
+	
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		"""
+		
+		"""
+		
+		self.shutdown()
+		self.server_close()
+	
+	def __init__(self, cert_dir):
+		"""
+		
+		"""
+		
+		cert_dir = Path(cert_dir)
+		self.cert_file, key_file = cert_dir / 'stub_duo_api.crt', cert_dir / 'stub_duo_api.key'
+		run(('openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1', '-keyout', str(key_file), '-out', str(self.cert_file)), check=True, stdout=DEVNULL, stderr=DEVNULL)
+		
+		super().__init__(('127.0.0.1', 0), _StubDuoAPIHandler)
+		ssl_context = SSLContext(PROTOCOL_TLS_SERVER)
+		ssl_context.load_cert_chain(self.cert_file, key_file)
+		self.socket = ssl_context.wrap_socket(self.socket, server_side=True)
+		self.calls = {}
+	
+	@property
+	def port(self):
+		"""
+		
+		"""
+		
+		return self.server_address[1]
+
+
+class _StubDuoAPIHandler(BaseHTTPRequestHandler):
+	"""
+	
+	"""
+	
+	protocol_version = 'HTTP/1.1'
+	
+	def do_GET(self):
+		"""
+		
+		"""
+		
+		self.rfile.read(int(self.headers.get('Content-Length', 0)))
+		path = self.path.partition('?')[0]
+		self.server.calls[path] = self.server.calls.get(path, 0) + 1
+		body = json_dumps({'stat': 'OK', 'response': self.server.RESPONSES.get(path, {'time': int(time())})}).encode('utf8')
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+	
+	do_POST = do_GET
+	
+	def log_message(self, format, *args):
+		"""
+		
+		"""
+		
+		LOGGER.debug('Stub Duo API: ' + format, *args)
+
+
+class StubRadiusPrimary:
+	"""Stub RADIUS primary
+	UDP server accepting every Access-Request it gets, standing in for the primary authentication server.
+	"""
+	
+	def __enter__(self):
+		"""
+		
+		"""
+		
+		self._stopping = Event()
+		self._thread = Thread(target=self.serve_forever, name='stub_radius_primary', daemon=True)
+		self._thread.start()
+		return self
+	
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		"""
+		
+		"""
+		
+		self._stopping.set()
+		self._thread.join()
+		self.socket.close()
+	
+	def __init__(self, secret):
+		"""
+		
+		"""
+		
+		self.secret = secret
+		self.socket = socket(AF_INET, SOCK_DGRAM)
+		self.socket.bind(('127.0.0.1', 0))
+		self.socket.settimeout(0.2)
+		self.port = self.socket.getsockname()[1]
+		self.calls = 0
+	
+	def serve_forever(self):
+		"""
+		
+		"""
+		
+		while not self._stopping.is_set():
+			try:
+				request, address = self.socket.recvfrom(4096)
+			except socket_timeout:
+				continue
+			except OSError:
+				break
+			if (len(request) >= 20) and (request[0] == RADIUS_ACCESS_REQUEST):
+				self.calls += 1
+				self.socket.sendto(radius_response(request, RADIUS_ACCESS_ACCEPT, self.secret), address)
+
+
+class _RadiusClientProtocol(DatagramProtocol):
+	"""
+	
+	"""
+	
+	def __init__(self):
+		"""
+		
+		"""
+		
+		self.transport, self.pending = None, {}
+	
+	def connection_made(self, transport):
+		"""
+		
+		"""
+		
+		self.transport = transport
+	
+	def datagram_received(self, data, addr):
+		"""
+		
+		"""
+		
+		future = self.pending.pop(data[1], None) if len(data) >= 20 else None
+		if (future is not None) and not future.done():
+			future.set_result(data)
+
+
+class LoadTest:
+	"""Proxy load test
+	Installs the staged venv (from "build_rpm") in a temporary prefix, starts the proxy with the "ExecStart" command (and "Environment" values) of the generated systemd unit, and drives RADIUS Access-Requests at it with "concurrency" requests in flight. The proxy talks to a StubDuoAPI and a StubRadiusPrimary, so no network access is needed and the upstreams don't add noise to the numbers.
+	
+	Before that, the startup is measured "startup_runs" times: the interpreter of the unit (with its options) imports twistd and loads the proxy application, the way twistd does before starting the reactor.
+	"""
+	
+	def __init__(self, prefix, systemd_unit, *, target_install_path, label=None, concurrency=16, requests=2000, warmup=50, timeout=5.0, startup_timeout=60.0, startup_runs=5):
+		"""
+		
+		"""
+		
+		self.prefix = Path(prefix)
+		self.systemd_unit = Path(systemd_unit)
+		self.target_install_path = Path(target_install_path)
+		self.install_dir = self.prefix / self.target_install_path.name
+		self.label = label
+		self.concurrency = int(concurrency)
+		self.requests = int(requests)
+		self.warmup = int(warmup)
+		self.timeout = float(timeout)
+		self.startup_timeout = float(startup_timeout)
+		self.startup_runs = int(startup_runs)
+		
+		self.radius_port = free_port()
+		self.radius_secret = token_hex(16).encode('ascii')
+		self.primary_secret = token_hex(16).encode('ascii')
+	
+	def __call__(self):
+		"""Run the load test
+		Starts the stub upstreams and the proxy, waits for the proxy to answer, runs the warm up and measured requests and stops everything. Returns the results.
+		"""
+		
+		with StubDuoAPI(self.prefix) as duo_api, StubRadiusPrimary(self.primary_secret) as primary:
+			self.write_config(duo_api, primary)
+			startup = self.measure_startup() if self.startup_runs else None
+			pid = self.start()
+			try:
+				results = asyncio_run(self.drive(pid))
+			finally:
+				self.stop(pid)
+			results['startup'] = startup
+			results['upstream_calls'] = {'duo_api': dict(duo_api.calls), 'radius_primary': primary.calls}
+		return results
+	
+	def __getattr__(self, item):
+		"""
+		
+		"""
+		
+		if item == 'unit_settings':
+			value = {}
+			for line in self.systemd_unit.read_text().splitlines():
+				name, separator, setting = line.partition('=')
+				if separator and not line.startswith(('#', ';')):
+					value.setdefault(name.strip(), []).append(setting.strip())
+		else:
+			raise AttributeError(item)
+		
+		self.__setattr__(item, value)
+		return value
+	
+	def command(self, directive):
+		"""Unit command
+		The command line for the unit "directive" (ExecStart, ExecStop) relocated to the temporary prefix. The service user is replaced with the current one.
+		"""
+		
+		result = []
+		for argument in shlex_split(self.unit_settings[directive][0]):
+			argument = argument.replace(str(self.target_install_path), str(self.install_dir))
+			if argument.startswith('--uid='):
+				argument = '--uid={}'.format(getuid())
+			elif argument.startswith('--gid='):
+				argument = '--gid={}'.format(getgid())
+			result.append(argument)
+		return result
+	
+	async def drive(self, pid):
+		"""Drive the load
+		Sends the warm up requests, then the measured ones from "concurrency" clients, sampling the proxy memory meanwhile.
+		"""
+		
+		loop = get_running_loop()
+		deadline = monotonic() + self.startup_timeout
+		while not any(code is not None for code, _ in await self._send_requests(loop, 1, 1)):
+			if monotonic() > deadline:
+				raise TimeoutError('The proxy is not answering RADIUS requests after {} seconds. Check {}'.format(self.startup_timeout, self.install_dir / 'log'))
+		await self._send_requests(loop, self.warmup, max(min(self.concurrency, self.warmup), 1))
+		
+		rss_start, _ = rss_kib(pid)
+		sampling, samples = Event(), []
+		sampler = Thread(target=self._sample_rss, args=(pid, sampling, samples), daemon=True)
+		sampler.start()
+		started = perf_counter()
+		outcomes = await self._send_requests(loop, self.requests, self.concurrency)
+		duration = perf_counter() - started
+		sampling.set()
+		sampler.join()
+		rss_end, rss_peak = rss_kib(pid)
+		
+		latencies = sorted(latency for code, latency in outcomes if code in (RADIUS_ACCESS_ACCEPT, RADIUS_ACCESS_REJECT))
+		return {
+			'label': self.label,
+			'timestamp': datetime.now(timezone.utc).isoformat(),
+			'concurrency': self.concurrency,
+			'requests': self.requests,
+			'accepted': sum(1 for code, _ in outcomes if code == RADIUS_ACCESS_ACCEPT),
+			'rejected': sum(1 for code, _ in outcomes if code == RADIUS_ACCESS_REJECT),
+			'failed': sum(1 for code, _ in outcomes if code not in (RADIUS_ACCESS_ACCEPT, RADIUS_ACCESS_REJECT)),
+			'duration': duration,
+			'requests_per_second': len(latencies) / duration if duration else None,
+			'latency_ms': {
+				'mean': mean(latencies) * 1000 if latencies else None,
+				'p50': percentile(latencies, 0.5) * 1000 if latencies else None,
+				'p99': percentile(latencies, 0.99) * 1000 if latencies else None,
+				'max': latencies[-1] * 1000 if latencies else None,
+			},
+			'rss_kib': {
+				'start': rss_start,
+				'end': rss_end,
+				'peak': max([value for value in samples + [rss_peak] if value is not None], default=None),
+			},
+		}
+	
+	@classmethod
+	def install(cls, staging_dir, wheels_dir, prefix, *, target_install_path, python='python3', native_installer=False):
+		"""Install the staged venv
+		Creates the venv the way rpmvenv would (named after "target_install_path", under "prefix") using "python", installs the staged requirements from the local wheels, and lays out the conf, log and run directories. With "native_installer" the staged install plan is unpacked by a WheelInstaller instead of pip. The staged site-packages bundle, if any, is laid out in the venv too.
+		"""
+		
+		staging_dir, install_dir = Path(staging_dir), Path(prefix) / Path(target_install_path).name
+		requirements_file = staging_dir / 'requirements.txt'
+		if not requirements_file.exists():
+			raise FileNotFoundError('No staged requirements in "{}". Run "build_rpm" first'.format(staging_dir))
+		
+		if native_installer:
+			run((str(python), '-m', 'venv', '--without-pip', str(install_dir)), check=True)
+			plan = read_install_plan(requirements_file.read_text())
+			WheelInstaller(install_dir)(*[wheel for wheel, wheel_hash in plan], hashes={wheel: wheel_hash for wheel, wheel_hash in plan if wheel_hash is not None})
+		else:
+			run((str(python), '-m', 'venv', str(install_dir)), check=True)
+			run((str(install_dir / 'bin' / 'python'), '-m', 'pip', 'install', '--no-index', '--no-deps', '--require-hashes', '--find-links', str(wheels_dir), '--requirement', str(requirements_file)), check=True)
+		if (staging_dir / 'bundle').is_dir():
+			copytree(staging_dir / 'bundle', install_dir, dirs_exist_ok=True)
+		for directory in ('conf', 'log', 'run'):
+			(install_dir / directory).mkdir(parents=True, exist_ok=True)
+		return install_dir
+	
+	def measure_startup(self):
+		"""Measure the startup
+		Runs the startup probe (the unit interpreter, with its options, importing twistd and loading the "--python" application file) "startup_runs" times, in new processes. Returns the wall time of the first (coldest) run, the median and the fastest one, and the amount of file system calls of a run (stat-like and open-like), if "strace" is available.
+		"""
+		
+		command = self.command('ExecStart')
+		interpreter = [command[0]]
+		for argument in command[1:]:
+			if not argument.startswith('-'):
+				break
+			interpreter.append(argument)
+		application = next((argument.partition('=')[2] for argument in command if argument.startswith('--python=')), None)
+		if application is None:
+			raise ValueError('No "--python" application in the unit ExecStart: {}'.format(self.unit_settings['ExecStart'][0]))
+		probe = interpreter + ['-c', STARTUP_PROBE, application]
+		environment = dict(environ, **dict(setting.partition('=')[::2] for setting in self.unit_settings.get('Environment', [])))
+		
+		timings = []
+		for _ in range(self.startup_runs):
+			started = perf_counter()
+			run(probe, check=True, cwd=self.install_dir, env=environment, stdout=DEVNULL)
+			timings.append(perf_counter() - started)
+		
+		syscalls = None
+		if which('strace') is None:
+			LOGGER.warning('No "strace" available, the startup system calls are not counted')
+		else:
+			with TemporaryDirectory() as temp_dir_name:
+				summary_file = Path(temp_dir_name) / 'strace.txt'
+				run(['strace', '-f', '-c', '-e', 'trace=%file,%desc', '-o', str(summary_file)] + probe, check=True, cwd=self.install_dir, env=environment, stdout=DEVNULL)
+				counts = {}
+				for line in summary_file.read_text().splitlines():
+					fields = line.split()
+					if (len(fields) >= 5) and fields[3].isdigit():
+						counts[fields[-1]] = int(fields[3])
+			syscalls = {
+				'stat': sum(calls for name, calls in counts.items() if 'stat' in name),
+				'open': sum(calls for name, calls in counts.items() if name in ('open', 'openat', 'openat2', 'creat')),
+				'total': sum(counts.values()),
+			}
+		
+		result = {
+			'runs': len(timings),
+			'first_ms': timings[0] * 1000,
+			'median_ms': median(timings) * 1000,
+			'min_ms': min(timings) * 1000,
+			'syscalls': syscalls,
+		}
+		LOGGER.info('Startup: %.1f ms first, %.1f ms median%s', result['first_ms'], result['median_ms'], '' if syscalls is None else ', {stat} stat and {open} open calls'.format(**syscalls))
+		return result
+	
+	def start(self):
+		"""Start the proxy
+		Runs the unit "ExecStart" command, with the unit environment, and waits for the pidfile. Returns the pid of the proxy.
+		"""
+		
+		pid_file = self.install_dir / 'run' / 'duoauthproxy.pid'
+		pid_file.unlink(missing_ok=True)
+		environment = dict(setting.partition('=')[::2] for setting in self.unit_settings.get('Environment', []))
+		run(self.command('ExecStart'), check=True, cwd=self.install_dir, env=dict(environ, **environment))
+		
+		deadline = monotonic() + self.startup_timeout
+		while not pid_file.exists():
+			if monotonic() > deadline:
+				raise TimeoutError('The proxy did not start in {} seconds. Check {}'.format(self.startup_timeout, self.install_dir / 'log'))
+			sleep(0.1)
+		pid = int(pid_file.read_text().strip())
+		LOGGER.info('Proxy started with pid %d', pid)
+		return pid
+	
+	def stop(self, pid):
+		"""Stop the proxy
+		Runs the unit "ExecStop" command, falling back to SIGTERM.
+		"""
+		
+		try:
+			run(self.command('ExecStop'), check=True, cwd=self.install_dir, timeout=self.startup_timeout)
+		except Exception:
+			LOGGER.warning("Couldn't stop the proxy with ExecStop, terminating pid %d", pid)
+			try:
+				kill(pid, SIGTERM)
+			except ProcessLookupError:
+				pass
+	
+	def write_config(self, duo_api, primary):
+		"""Write the proxy configuration
+		A "radius_server_auto" section backed by the stub RADIUS primary and pointed to the stub Duo API (trusting its certificate).
+		"""
+		
+		config_file = self.install_dir / 'conf' / 'authproxy.cfg'
+		config_file.write_text(PROXY_CONFIG_TEMPLATE.format(
+			ca_certs_file=duo_api.cert_file,
+			primary_port=primary.port,
+			primary_secret=self.primary_secret.decode('ascii'),
+			ikey='DI' + token_hex(9).upper(),
+			skey=token_hex(20),
+			api_port=duo_api.port,
+			radius_secret=self.radius_secret.decode('ascii'),
+			radius_port=self.radius_port,
+		))
+		return config_file
+	
+	async def _client(self, loop, requests, outcomes):
+		"""
+		
+		"""
+		
+		transport, protocol = await loop.create_datagram_endpoint(_RadiusClientProtocol, remote_addr=('127.0.0.1', self.radius_port))
+		try:
+			identifier = 0
+			while requests:
+				requests.pop()
+				identifier = (identifier + 1) % 256
+				authenticator = token_bytes(16)
+				attributes = [
+					(RADIUS_USER_NAME, b'loadtest'),
+					(RADIUS_USER_PASSWORD, radius_password(b'loadtest-password', self.radius_secret, authenticator)),
+					(RADIUS_NAS_IP_ADDRESS, bytes((127, 0, 0, 1))),
+				]
+				packet = radius_packet(RADIUS_ACCESS_REQUEST, identifier, authenticator, attributes, self.radius_secret)
+				future = protocol.pending[identifier] = loop.create_future()
+				started = perf_counter()
+				transport.sendto(packet)
+				try:
+					response = await wait_for(future, self.timeout)
+				except AsyncioTimeoutError:
+					protocol.pending.pop(identifier, None)
+					outcomes.append((None, perf_counter() - started))
+					continue
+				latency = perf_counter() - started
+				expected = md5(response[:4] + authenticator + response[20:] + self.radius_secret).digest()
+				outcomes.append((response[0] if response[4:20] == expected else None, latency))
+		finally:
+			transport.close()
+	
+	@staticmethod
+	def _sample_rss(pid, stop_event, samples):
+		"""
+		
+		"""
+		
+		while not stop_event.wait(0.1):
+			current, _ = rss_kib(pid)
+			if current is not None:
+				samples.append(current)
+	
+	async def _send_requests(self, loop, count, concurrency):
+		"""
+		
+		"""
+		
+		requests, outcomes = list(range(count)), []
+		await gather(*[self._client(loop, requests, outcomes) for _ in range(concurrency)])
+		return outcomes
+
+
+def compare_results(*results):
+	"""Compare load test results
+	Text table with the throughput, latency and memory of every result (a results dict or a JSON file with one) and their change relative to the first one.
+	"""
+	
+	results = [result if isinstance(result, dict) else json_loads(Path(result).read_text()) for result in results]
+	if not results:
+		return ''
+	
+	metrics = (
+		('requests/s', lambda result: result['requests_per_second']),
+		('p50 (ms)', lambda result: result['latency_ms']['p50']),
+		('p99 (ms)', lambda result: result['latency_ms']['p99']),
+		('failed', lambda result: result['failed']),
+		('peak RSS (KiB)', lambda result: result['rss_kib']['peak']),
+		('startup (ms)', lambda result: (result.get('startup') or {}).get('median_ms')),
+		('startup stat calls', lambda result: ((result.get('startup') or {}).get('syscalls') or {}).get('stat')),
+		('startup open calls', lambda result: ((result.get('startup') or {}).get('syscalls') or {}).get('open')),
+	)
+	labels = [str(result.get('label') or 'build {}'.format(position)) for position, result in enumerate(results, 1)]
+	lines = ['\t'.join(['metric'] + labels)]
+	for name, getter in metrics:
+		baseline, row = getter(results[0]), [name]
+		for position, result in enumerate(results):
+			value = getter(result)
+			cell = '-' if value is None else '{:.2f}'.format(value)
+			if position and (value is not None) and baseline:
+				cell += ' ({:+.1f}%)'.format((value - baseline) * 100 / baseline)
+			row.append(cell)
+		lines.append('\t'.join(row))
+	return '\n'.join(lines)
@@ -0,0 +1,410 @@
+#!python
+"""Duo Authentication Proxy Installers (member table)
+Compact index of the tarball members.
+"""
+
+from array import array
+from collections.abc import Mapping
+from gc import collect
+from hashlib import sha256
+from logging import getLogger
+from marshal import dumps as marshal_dumps, loads as marshal_loads, version as marshal_version
+from os import replace
+from pathlib import Path, PurePath, PurePosixPath
+from sys import byteorder, intern
+from tempfile import NamedTemporaryFile
+from tarfile import DIRTYPE, REGTYPE, TarInfo, open as tarfile_open
+from tracemalloc import get_traced_memory, is_tracing, start as tracemalloc_start, stop as tracemalloc_stop
+
+LOGGER = getLogger(__name__)
+
+TARBALL_INDEX_FORMAT = 1
+TARBALL_INDEX_SUFFIX = '.index'
+
+
+class MemberTable(Mapping):
+	"""Tarball member table
+	Maps the member paths to their TarInfo, like a "{PurePath: TarInfo}" dict would, but keeping just the essentials in parallel arrays sorted by path: the (interned) parent directory and the name, the header and data offsets, the size, mode, type and modification time. The TarInfo objects (and the PurePath ones) are only built when requested, so the table takes a fraction of the memory on tarballs with many members.
+	
+	Membership and item lookups take a binary search; the members below a directory (recursively or not) are a contiguous slice of the table. A path that shows up more than once in the tarball maps to its last occurrence, as "TarFile.getmember" does.
+	"""
+	
+	__slots__ = ('_directories', '_directory_index', '_linknames', '_mode', '_mtime', '_name', '_offset', '_offset_data', '_parent', '_size', '_type')
+	
+	def __init__(self, members=()):
+		"""
+		
+		"""
+		
+		self._directories, self._directory_index, self._linknames = [], {}, {}
+		self._parent, self._name = array('L'), []
+		self._offset, self._offset_data, self._size, self._mtime = array('Q'), array('Q'), array('Q'), array('q')
+		self._mode, self._type = array('H'), bytearray()
+		
+		entries = {}
+		for member in members:
+			path = PurePosixPath(member.name).as_posix()
+			parent, _, name = path.rpartition('/')
+			entries[path] = (parent, name, member.offset, member.offset_data, member.size, int(member.mtime), member.mode & 0o7777, member.type[:1] or REGTYPE, member.linkname)
+		
+		for path in sorted(entries):
+			parent, name, offset, offset_data, size, mtime, mode, member_type, linkname = entries[path]
+			if parent not in self._directory_index:
+				self._directory_index[parent] = len(self._directories)
+				self._directories.append(intern(parent))
+			if linkname:
+				self._linknames[len(self._name)] = linkname
+			self._parent.append(self._directory_index[parent])
+			self._name.append(intern(name))
+			self._offset.append(offset)
+			self._offset_data.append(offset_data)
+			self._size.append(size)
+			self._mtime.append(mtime)
+			self._mode.append(mode)
+			self._type += member_type
+	
+	def __contains__(self, path):
+		"""
+		
+		"""
+		
+		return self._find(path) is not None
+	
+	def __getitem__(self, path):
+		"""
+		
+		"""
+		
+		index = self._find(path)
+		if index is None:
+			raise KeyError(path)
+		return self.tarinfo(index)
+	
+	def __iter__(self):
+		"""
+		
+		"""
+		
+		return self.paths()
+	
+	def __len__(self):
+		"""
+		
+		"""
+		
+		return len(self._name)
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '<{} with {} members>'.format(type(self).__name__, len(self))
+	
+	def dump(self):
+		"""Dump the table
+		The table as plain values (strings, bytes, lists and dicts), that "marshal" can store, to be restored by "load".
+		"""
+		
+		return {
+			'directories': list(self._directories),
+			'linknames': dict(self._linknames),
+			'mode': self._mode.tobytes(),
+			'mtime': self._mtime.tobytes(),
+			'name': list(self._name),
+			'offset': self._offset.tobytes(),
+			'offset_data': self._offset_data.tobytes(),
+			'parent': self._parent.tobytes(),
+			'size': self._size.tobytes(),
+			'type': bytes(self._type),
+		}
+	
+	@classmethod
+	def from_tarball(cls, file_path):
+		"""Build from a tarball
+		Reads the headers of the tarball at "file_path" one by one, without keeping the TarInfo objects around.
+		"""
+		
+		def members(tarball):
+			while True:
+				member = tarball.next()
+				if member is None:
+					break
+				tarball.members.clear()
+				yield member
+		
+		with tarfile_open(name=file_path) as tarball:
+			return cls(members(tarball))
+	
+	def isdir(self, path):
+		"""
+		
+		"""
+		
+		index = self._find(path)
+		return (index is not None) and (self._type[index:index + 1] == DIRTYPE)
+	
+	def isfile(self, path):
+		"""
+		
+		"""
+		
+		index = self._find(path)
+		return (index is not None) and (self._type[index:index + 1] in (REGTYPE, b'\0', b'7'))
+	
+	@classmethod
+	def load(cls, state):
+		"""Load a table
+		Restores a table from what "dump" returned, raising ValueError if it's not consistent.
+		"""
+		
+		result = cls()
+		result._directories = [intern(directory) for directory in state['directories']]
+		result._directory_index = {directory: index for index, directory in enumerate(result._directories)}
+		result._linknames = dict(state['linknames'])
+		result._name = [intern(name) for name in state['name']]
+		for attribute in ('mode', 'mtime', 'offset', 'offset_data', 'parent', 'size'):
+			getattr(result, '_' + attribute).frombytes(state[attribute])
+		result._type = bytearray(state['type'])
+		
+		if any(len(column) != len(result._name) for column in (result._mode, result._mtime, result._offset, result._offset_data, result._parent, result._size, result._type)):
+			raise ValueError('Inconsistent member table state')
+		if result._parent and (max(result._parent) >= len(result._directories)):
+			raise ValueError('Inconsistent member table state')
+		return result
+	
+	def name(self, index):
+		"""Member name
+		The name of the member at "index" in the (sorted) table.
+		"""
+		
+		return self._full_name(range(len(self))[index])
+	
+	def names(self, directory=None, *, recursive=True):
+		"""Member names
+		The names (as strings) of all the members, or only the ones below "directory" (just its direct children if not "recursive"), sorted.
+		"""
+		
+		if directory is None:
+			start, end = 0, len(self)
+		else:
+			directory = PurePosixPath(directory).as_posix()
+			start, end = self._search(directory + '/'), self._search(directory + '0')
+		
+		for index in range(start, end):
+			name = self._full_name(index)
+			if recursive or (self._directories[self._parent[index]] == directory):
+				yield name
+	
+	def paths(self, directory=None, *, recursive=True):
+		"""Member paths
+		Same as "names", as PurePath objects.
+		"""
+		
+		for name in self.names(directory, recursive=recursive):
+			yield PurePath(name)
+	
+	def roots(self):
+		"""Top level names
+		The first component of the paths of all the members, sorted. Found out of the directories table and the members at the top level, without building every name.
+		"""
+		
+		result = {directory.partition('/')[0] for directory in self._directories if directory}
+		top_level = self._directory_index.get('')
+		if top_level is not None:
+			result.update(self._name[index] for index, parent in enumerate(self._parent) if parent == top_level)
+		return sorted(result)
+	
+	def tarinfo(self, index):
+		"""TarInfo on demand
+		The TarInfo for the member at "index" in the table, good enough for "TarFile.extractfile" (ownership details are not kept).
+		"""
+		
+		result = TarInfo(self._full_name(index))
+		result.offset, result.offset_data = self._offset[index], self._offset_data[index]
+		result.size, result.mtime, result.mode = self._size[index], self._mtime[index], self._mode[index]
+		result.type = bytes(self._type[index:index + 1])
+		result.linkname = self._linknames.get(index, '')
+		return result
+	
+	def _find(self, path):
+		"""
+		
+		"""
+		
+		name = PurePosixPath(path).as_posix()
+		index = self._search(name)
+		if (index < len(self)) and (self._full_name(index) == name):
+			return index
+		return None
+	
+	def _full_name(self, index):
+		"""
+		
+		"""
+		
+		parent = self._directories[self._parent[index]]
+		return (parent + '/' + self._name[index]) if parent else self._name[index]
+	
+	def _search(self, name):
+		"""
+		
+		"""
+		
+		low, high = 0, len(self)
+		while low < high:
+			middle = (low + high) // 2
+			if self._full_name(middle) < name:
+				low = middle + 1
+			else:
+				high = middle
+		return low
+
+
+class TarballIndex:
+	"""Tarball analysis index
+	The MemberTable of a tarball and the "facts" found out of it (root directory, python version, modules, etc.), persisted in a sidecar file ("<tarball>.index", marshalled) keyed by the SHA-256 of the tarball and the index format. Loading it takes milliseconds, the archive is only decompressed when some member is actually read.
+	
+	The size and modification time of the tarball are kept too: while they match, the tarball isn't even read. Otherwise it gets hashed and the index is reused only if the digest matches (like the same tarball downloaded again), with the new size and time saved.
+	"""
+	
+	def __init__(self, tarball_path, members, facts=None, *, digest=None):
+		"""
+		
+		"""
+		
+		self.tarball_path = Path(tarball_path).absolute()
+		self.members = members
+		self.facts = {} if facts is None else dict(facts)
+		self.digest = digest
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r}, {} members)'.format(type(self).__name__, str(self.tarball_path), len(self.members))
+	
+	@classmethod
+	def index_path(cls, tarball_path):
+		"""Index file path
+		The sidecar index file for the tarball at "tarball_path".
+		"""
+		
+		tarball_path = Path(tarball_path).absolute()
+		return tarball_path.with_name(tarball_path.name + TARBALL_INDEX_SUFFIX)
+	
+	@classmethod
+	def load(cls, tarball_path):
+		"""Load an index
+		The index of the tarball at "tarball_path", if there's a valid one for it (same format and content), None otherwise.
+		"""
+		
+		index_path = cls.index_path(tarball_path)
+		try:
+			state = marshal_loads(index_path.read_bytes())
+			if state['format'] != cls._format():
+				LOGGER.debug('Ignoring the index in an old format: %s', index_path)
+				return None
+			
+			stat = Path(tarball_path).stat()
+			moved = (state['size'], state['mtime_ns']) != (stat.st_size, stat.st_mtime_ns)
+			if moved and (cls._file_digest(tarball_path) != state['digest']):
+				LOGGER.debug('Ignoring the index of a different tarball: %s', index_path)
+				return None
+			result = cls(tarball_path, MemberTable.load(state['members']), state['facts'], digest=state['digest'])
+		except FileNotFoundError:
+			return None
+		except (EOFError, KeyError, TypeError, ValueError):
+			LOGGER.warning('Ignoring the corrupted tarball index: %s', index_path)
+			return None
+		
+		if moved:
+			result.save()
+		LOGGER.debug('Loaded the index of %s: %d members', tarball_path, len(result.members))
+		return result
+	
+	def save(self):
+		"""Save the index
+		Writes the sidecar index file (atomically, so concurrent runs never see a partial one), hashing the tarball if its digest is not known yet. An index that can't be written (like on a read-only directory) is just logged. Returns the index file path, or None if it wasn't written.
+		"""
+		
+		index_path, temp_name = self.index_path(self.tarball_path), None
+		try:
+			stat = self.tarball_path.stat()
+			if self.digest is None:
+				self.digest = self._file_digest(self.tarball_path)
+			state = {
+				'format': self._format(),
+				'digest': self.digest,
+				'size': stat.st_size,
+				'mtime_ns': stat.st_mtime_ns,
+				'facts': self.facts,
+				'members': self.members.dump(),
+			}
+			with NamedTemporaryFile(dir=index_path.parent, prefix=index_path.name + '.', delete=False) as index_file:
+				temp_name = index_file.name
+				index_file.write(marshal_dumps(state))
+			replace(temp_name, index_path)
+		except OSError:
+			if temp_name is not None:
+				Path(temp_name).unlink(missing_ok=True)
+			LOGGER.warning("Couldn't save the tarball index: %s", index_path, exc_info=True)
+			return None
+		
+		return index_path
+	
+	@staticmethod
+	def _file_digest(file_path):
+		"""
+		
+		"""
+		
+		digest = sha256()
+		with open(file_path, 'rb') as file_f:
+			for chunk in iter(lambda: file_f.read(1048576), b''):
+				digest.update(chunk)
+		return digest.hexdigest()
+	
+	@staticmethod
+	def _format():
+		"""
+		
+		"""
+		
+		return (TARBALL_INDEX_FORMAT, marshal_version, byteorder, array('L').itemsize)
+
+
+def member_table_memory(file_path):
+	"""Member table memory
+	Compares the memory taken by the member index of the tarball at "file_path": the "getmembers" list plus a "{PurePath: TarInfo}" dict (the way it used to be built) against a MemberTable. Returns the bytes allocated by each one (as traced by tracemalloc) and the amount of members.
+	"""
+	
+	def measure(function):
+		collect()
+		tracing = is_tracing()
+		if not tracing:
+			tracemalloc_start()
+		before = get_traced_memory()[0]
+		value = function()
+		allocated = get_traced_memory()[0] - before
+		if not tracing:
+			tracemalloc_stop()
+		return value, allocated
+	
+	def legacy():
+		with tarfile_open(name=file_path) as tarball:
+			members = tarball.getmembers()
+			return members, {PurePath(member.name): member for member in members}
+	
+	legacy_index, legacy_bytes = measure(legacy)
+	table, table_bytes = measure(lambda: MemberTable.from_tarball(file_path))
+	del legacy_index
+	result = {
+		'members': len(table),
+		'dict_bytes': legacy_bytes,
+		'table_bytes': table_bytes,
+		'savings': (1 - (table_bytes / legacy_bytes)) if legacy_bytes else None,
+	}
+	LOGGER.info('Member index of %s (%d members): %d bytes as dict, %d bytes as table', file_path, result['members'], legacy_bytes, table_bytes)
+	return result
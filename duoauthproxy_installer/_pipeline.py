@@ -0,0 +1,179 @@
+#!python
+"""Duo Authentication Proxy Installers (pipeline)
+Asyncio based engine to run the installer stages concurrently.
+"""
+
+from asyncio import CancelledError, Semaphore, create_task, gather, get_running_loop, run as asyncio_run, to_thread
+from logging import getLogger
+from os import cpu_count
+from time import monotonic
+
+LOGGER = getLogger(__name__)
+
+DEFAULT_RESOURCE_LIMITS = {
+	'cpu': cpu_count() or 1,
+	'disk': 2,
+	'network': 4,
+}
+
+
+class Stage:
+	"""Pipeline stage
+	A unit of work that declares the values it consumes (inputs) and the ones it produces (outputs). The function is called with the inputs as keyword arguments; if there's more than one output it should return a mapping with all of them.
+	"""
+	
+	def __init__(self, name, function, *, inputs=(), outputs=None, resource='cpu'):
+		"""
+		
+		"""
+		
+		self.name = name
+		self.function = function
+		self.inputs = tuple(inputs)
+		self.outputs = (name,) if outputs is None else tuple(outputs)
+		self.resource = resource
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r}, inputs={!r}, outputs={!r}, resource={!r})'.format(type(self).__name__, self.name, self.inputs, self.outputs, self.resource)
+	
+	def __call__(self, **inputs):
+		"""
+		
+		"""
+		
+		result = self.function(**inputs)
+		if len(self.outputs) == 1:
+			return {self.outputs[0]: result}
+		
+		missing_outputs = [output for output in self.outputs if output not in result]
+		if missing_outputs:
+			raise RuntimeError('Stage "{}" did not produce: {}'.format(self.name, ', '.join(missing_outputs)))
+		return {output: result[output] for output in self.outputs}
+
+
+class StagePipeline:
+	"""Stage pipeline
+	Runs the stages as soon as their inputs are available, with a bounded concurrency per resource class (network, cpu, disk, etc.).
+	"""
+	
+	def __init__(self, *stages, resource_limits=None):
+		"""
+		
+		"""
+		
+		self.resource_limits = DEFAULT_RESOURCE_LIMITS.copy()
+		if resource_limits is not None:
+			self.resource_limits.update(resource_limits)
+		
+		self.stages, self.producers = [], {}
+		for stage in stages:
+			self.add_stage(stage)
+		self.timings = {}
+	
+	def __call__(self, **values):
+		"""
+		
+		"""
+		
+		return asyncio_run(self.run(**values))
+	
+	def add_stage(self, stage):
+		"""Add a stage
+		Register a new stage, checking that its outputs are not produced by some other stage already.
+		"""
+		
+		if stage.resource not in self.resource_limits:
+			raise ValueError('Unknown resource class "{}" for stage "{}"'.format(stage.resource, stage.name))
+		for output in stage.outputs:
+			if output in self.producers:
+				raise ValueError('Output "{}" is produced by both "{}" and "{}"'.format(output, self.producers[output].name, stage.name))
+			self.producers[output] = stage
+		self.stages.append(stage)
+	
+	def critical_path(self, timings=None):
+		"""Critical path
+		The chain of stages that set the duration of the last run (or the one with "timings"): starting from the last stage to finish, every step goes back to the producer of its inputs that finished last, the one the stage was waiting for. Returns the stages in running order, with their timing, "duration" (the running time) and "wait" (the time spent queued for its resource class after the inputs were ready).
+		"""
+		
+		timings = self.timings if timings is None else timings
+		stages = {stage.name: stage for stage in self.stages}
+		result, current = [], max(timings, key=lambda name: timings[name]['end'], default=None)
+		while current is not None:
+			timing = timings[current]
+			result.append(dict(timing, stage=current, resource=stages[current].resource, duration=timing['end'] - timing['start'], wait=timing['start'] - timing['ready']))
+			producers = {self.producers[name].name for name in stages[current].inputs if name in self.producers}
+			current = max((name for name in producers if name in timings), key=lambda name: timings[name]['end'], default=None)
+		return result[::-1]
+	
+	async def run(self, **values):
+		"""Run the pipeline
+		Starts every stage and returns the values (initial and produced) once all of them are done.
+		"""
+		
+		for name in values:
+			if name in self.producers:
+				raise ValueError('Value "{}" is provided but also produced by stage "{}"'.format(name, self.producers[name].name))
+		for stage in self.stages:
+			for name in stage.inputs:
+				if (name not in values) and (name not in self.producers):
+					raise ValueError('Missing input "{}" for stage "{}"'.format(name, stage.name))
+		
+		loop = get_running_loop()
+		futures = {}
+		for name, value in values.items():
+			futures[name] = loop.create_future()
+			futures[name].set_result(value)
+		for name in self.producers:
+			futures[name] = loop.create_future()
+		semaphores = {resource: Semaphore(limit) for resource, limit in self.resource_limits.items()}
+		
+		self.timings, self._started = {}, monotonic()
+		tasks = [create_task(self._run_stage(stage, futures, semaphores[stage.resource])) for stage in self.stages]
+		try:
+			await gather(*tasks)
+		except BaseException:
+			for task in tasks:
+				task.cancel()
+			await gather(*tasks, return_exceptions=True)
+			for future in futures.values():
+				if future.done() and not future.cancelled():
+					future.exception()
+			raise
+		
+		return {name: future.result() for name, future in futures.items()}
+	
+	async def _run_stage(self, stage, futures, semaphore):
+		"""
+		
+		"""
+		
+		try:
+			inputs = {name: await futures[name] for name in stage.inputs}
+			ready = monotonic()
+			async with semaphore:
+				started = monotonic()
+				LOGGER.debug('Starting stage: %s', stage.name)
+				result = await to_thread(stage, **inputs)
+			finished = monotonic()
+		except CancelledError:
+			for name in stage.outputs:
+				futures[name].cancel()
+			raise
+		except BaseException as error:
+			for name in stage.outputs:
+				if not futures[name].done():
+					futures[name].set_exception(error)
+			raise
+		
+		self.timings[stage.name] = {
+			'ready': ready - self._started,
+			'start': started - self._started,
+			'end': finished - self._started,
+		}
+		LOGGER.debug('Stage %s done in %.3f seconds', stage.name, finished - started)
+		for name, value in result.items():
+			futures[name].set_result(value)
@@ -0,0 +1,278 @@
+#!python
+"""Duo Authentication Proxy Installers (requirements)
+Compute the pinned requirements out of the wheels metadata, without installing them.
+"""
+
+from email.parser import BytesHeaderParser
+from hashlib import new as hashlib_new
+from logging import getLogger
+from pathlib import Path
+from shlex import split as shlex_split
+from urllib.parse import unquote, urlparse
+from zipfile import ZipFile
+
+from pip._vendor.packaging.requirements import InvalidRequirement, Requirement
+from pip._vendor.packaging.version import InvalidVersion, Version
+
+from ._wheels import canonical_name, interpreter_environment, interpreter_tags, parse_wheel_name
+
+LOGGER = getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1048576
+
+
+def wheel_metadata(wheel_path):
+	"""Wheel metadata
+	The headers of the "METADATA" file of the wheel. Only the central directory of the zip file and that member are read, nothing gets extracted.
+	"""
+	
+	with ZipFile(wheel_path) as wheel_zip:
+		metadata_files = [name for name in wheel_zip.namelist() if (name.count('/') == 1) and name.endswith('.dist-info/METADATA')]
+		if len(metadata_files) != 1:
+			raise ValueError('Unable to find the metadata in "{}": {}'.format(wheel_path, metadata_files))
+		with wheel_zip.open(metadata_files[0]) as metadata_file:
+			return BytesHeaderParser().parse(metadata_file)
+
+
+def read_install_plan(plan_text):
+	"""Read an install plan
+	The wheel paths and their hashes ("algorithm:digest", or None) out of an install plan written by "WheelRequirements.text" with "references", in install order.
+	"""
+	
+	result = []
+	for line in plan_text.splitlines():
+		if not line.strip() or line.lstrip().startswith('#'):
+			continue
+		name, separator, reference = line.partition(' @ ')
+		if not separator:
+			raise ValueError('Not an install plan entry: {}'.format(line))
+		reference = shlex_split(reference)
+		hashes = [option.partition('=')[2] for option in reference[1:] if option.startswith('--hash=')]
+		result.append((Path(unquote(urlparse(reference[0]).path)), hashes[0] if hashes else None))
+	return result
+
+
+class WheelDistribution:
+	"""Wheel distribution
+	A wheel file with the details from its metadata. The digest of the file is only computed if needed, unless it's already known ("digest", computed while the wheel was written).
+	"""
+	
+	def __init__(self, path, *, rank=None, hash_algorithm='sha256', digest=None):
+		"""
+		
+		"""
+		
+		self.path = Path(path)
+		self.rank = rank
+		self.hash_algorithm = hash_algorithm
+		
+		metadata = wheel_metadata(self.path)
+		self.project_name = metadata['Name']
+		self.name = canonical_name(self.project_name)
+		self.version = metadata['Version']
+		self.summary = metadata['Summary']
+		self.license = metadata['License']
+		self.license_expression = metadata['License-Expression']
+		self.requires = []
+		for requirement in metadata.get_all('Requires-Dist', ()):
+			try:
+				self.requires.append(Requirement(requirement))
+			except InvalidRequirement:
+				LOGGER.warning('Ignoring invalid requirement of %s: %s', self.path.name, requirement)
+		if digest is not None:
+			self.digest = digest
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r})'.format(type(self).__name__, str(self.path))
+	
+	def __getattr__(self, item):
+		"""
+		
+		"""
+		
+		if item == 'digest':
+			digest = hashlib_new(self.hash_algorithm)
+			with self.path.open('rb') as wheel_file:
+				for chunk in iter(lambda: wheel_file.read(HASH_CHUNK_SIZE), b''):
+					digest.update(chunk)
+			value = digest.hexdigest()
+		elif item == 'parsed_version':
+			try:
+				value = Version(self.version)
+			except InvalidVersion:
+				value = Version('0')
+		else:
+			raise AttributeError(item)
+		
+		self.__setattr__(item, value)
+		return value
+	
+	def dependencies(self, extras, environment):
+		"""Dependencies
+		The requirements that apply to the "environment" (a PEP-508 marker environment) when the distribution is installed with "extras".
+		"""
+		
+		result = []
+		for requirement in self.requires:
+			if requirement.marker is None:
+				result.append(requirement)
+			elif any(requirement.marker.evaluate(dict(environment, extra=extra)) for extra in ('',) + tuple(extras)):
+				result.append(requirement)
+		return result
+
+
+class WheelRequirements:
+	"""Wheel requirements
+	The pinned (and hash annotated) requirements for the wheels in a directory, computed out of their metadata. When there are several wheels for a distribution the one with the best ranked tag for the "python" interpreter (and then the newest) is used. The "roots" are the distributions to be installed (all the ones with a compatible wheel by default); their dependencies are followed according to the marker "environment" (the "python" interpreter's by default, updated with the provided values).
+	
+	Requirements that the chosen wheels don't satisfy end up in "conflicts", the ones without any wheel in "missing" (unless they're part of the "preinstalled" distributions, which are never pinned, like "pip freeze" does) and the wheels that are not needed in "unused".
+	
+	The "digests" mapping (wheel path to hex digest, like a FileDigests) provides the known digests of the wheels, so they're not read again to compute them.
+	"""
+	
+	PREINSTALLED = ('distribute', 'pip', 'setuptools', 'wheel')
+	
+	def __init__(self, wheels_dir, *, roots=None, python=None, environment=None, preinstalled=PREINSTALLED, hash_algorithm='sha256', digests=None):
+		"""
+		
+		"""
+		
+		self.wheels_dir = Path(wheels_dir)
+		self.roots = None if roots is None else [canonical_name(root) for root in roots]
+		self.python = python
+		self.preinstalled = frozenset(canonical_name(name) for name in preinstalled)
+		self.hash_algorithm = hash_algorithm
+		self.digests = {} if (digests is None) or (hash_algorithm != 'sha256') else digests
+		self._environment = {} if environment is None else dict(environment)
+	
+	def __getattr__(self, item):
+		"""
+		
+		"""
+		
+		if item == 'candidates':
+			ranking = {tag: rank for rank, tag in enumerate(interpreter_tags(self.python))}
+			value = {}
+			for wheel in sorted(self.wheels_dir.iterdir()):
+				if (wheel.suffix != '.whl') or (parse_wheel_name(wheel.name) is None):
+					continue
+				rank = min((ranking[tag] for tag in parse_wheel_name(wheel.name)[2] if tag in ranking), default=None)
+				distribution = WheelDistribution(wheel, rank=rank, hash_algorithm=self.hash_algorithm, digest=self.digests.get(wheel.absolute()))
+				value.setdefault(distribution.name, []).append(distribution)
+			for distributions in value.values():
+				distributions.sort(key=lambda distribution: distribution.parsed_version, reverse=True)
+				distributions.sort(key=lambda distribution: float('inf') if distribution.rank is None else distribution.rank)
+		elif item == 'environment':
+			value = interpreter_environment(self.python)
+			value.update(self._environment)
+		elif item in ('conflicts', 'graph', 'missing', 'pinned', 'unused'):
+			self.resolve()
+			return getattr(self, item)
+		else:
+			raise AttributeError(item)
+		
+		self.__setattr__(item, value)
+		return value
+	
+	def __str__(self):
+		"""
+		
+		"""
+		
+		return self.text()
+	
+	def resolve(self):
+		"""Resolve the requirements
+		Walks the dependencies from the roots using only the wheels metadata, populating "pinned" (canonical name to WheelDistribution), "graph" (canonical name to the names of its pinned dependencies), "conflicts" (the unsatisfied requirement and the distribution requiring it, as strings), "missing" (same, for requirements without wheels) and "unused" (paths to the wheels not needed). Returns the pinned distributions.
+		"""
+		
+		candidates = self.candidates
+		pinned, graph, conflicts, missing, extras = {}, {}, [], [], {}
+		for name, distributions in candidates.items():
+			if distributions[0].rank is None:
+				LOGGER.warning('No wheel of %s is compatible with the interpreter: %s', name, ', '.join(distribution.path.name for distribution in distributions))
+		
+		queue = [(root, ()) for root in ([name for name, distributions in candidates.items() if distributions[0].rank is not None] if self.roots is None else self.roots)]
+		while queue:
+			name, requested_extras = queue.pop()
+			if name not in candidates:
+				missing.append((name, None))
+				continue
+			new_extras = set(requested_extras) - extras.get(name, set())
+			if (name in pinned) and not new_extras:
+				continue
+			extras.setdefault(name, set()).update(requested_extras)
+			distribution = pinned.setdefault(name, candidates[name][0])
+			graph.setdefault(name, set())
+			
+			for requirement in distribution.dependencies(extras[name], self.environment):
+				dependency = canonical_name(requirement.name)
+				if dependency in candidates:
+					if not requirement.specifier.contains(candidates[dependency][0].version, prereleases=True):
+						conflicts.append((str(requirement), '{}=={}'.format(distribution.project_name, distribution.version)))
+					graph[name].add(dependency)
+					queue.append((dependency, tuple(requirement.extras)))
+				elif dependency not in self.preinstalled:
+					missing.append((str(requirement), '{}=={}'.format(distribution.project_name, distribution.version)))
+		
+		self.pinned = dict(sorted(pinned.items()))
+		self.graph = graph
+		self.conflicts = list(dict.fromkeys(conflicts))
+		self.missing = list(dict.fromkeys(missing))
+		self.unused = [distribution.path for name, distributions in candidates.items() for distribution in distributions if pinned.get(name) is not distribution]
+		
+		for requirement, required_by in self.conflicts:
+			LOGGER.warning('Conflicting requirement: %s (required by %s) is not satisfied by the wheels in %s', requirement, required_by, self.wheels_dir)
+		for requirement, required_by in self.missing:
+			LOGGER.warning('Missing requirement: %s (required by %s) has no wheel in %s', requirement, required_by or 'roots', self.wheels_dir)
+		if self.unused:
+			LOGGER.info('Unused wheels: %s', ', '.join(path.name for path in self.unused))
+		return self.pinned
+	
+	def install_order(self):
+		"""Install order
+		The pinned distributions sorted so every one comes after its dependencies (dependency cycles are broken arbitrarily, but consistently).
+		"""
+		
+		result, visited = [], set()
+		for root in self.pinned:
+			if root in visited:
+				continue
+			stack = [(root, iter(sorted(self.graph[root])))]
+			visited.add(root)
+			while stack:
+				name, dependencies = stack[-1]
+				dependency = next((dependency for dependency in dependencies if dependency not in visited), None)
+				if dependency is None:
+					stack.pop()
+					result.append(self.pinned[name])
+				else:
+					visited.add(dependency)
+					stack.append((dependency, iter(sorted(self.graph[dependency]))))
+		
+		return result
+	
+	def text(self, *, hashes=True, references=False, exclude=()):
+		"""Requirements text
+		The pinned requirements in the "requirements file" format, one per line, with the wheel digest as "--hash" option (which turns on pip's hash checking mode) if "hashes" is set.
+		
+		With "references" the result is an install plan instead: the requirements are direct references to the wheel files, sorted in install order, so pip can install them with "--no-deps --require-hashes" without looking anything up or resolving anything. The distributions named in "exclude" are left out.
+		"""
+		
+		exclude = {canonical_name(name) for name in exclude}
+		lines = []
+		for distribution in (self.install_order() if references else self.pinned.values()):
+			if distribution.name in exclude:
+				continue
+			if references:
+				line = '{} @ {}'.format(distribution.project_name, distribution.path.absolute().as_uri())
+			else:
+				line = '{}=={}'.format(distribution.project_name, distribution.version)
+			if hashes:
+				line += ' --hash={}:{}'.format(self.hash_algorithm, distribution.digest)
+			lines.append(line)
+		return '\n'.join(lines + [''])
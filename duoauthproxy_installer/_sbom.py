@@ -0,0 +1,353 @@
+#!python
+"""Duo Authentication Proxy Installers (bill of materials)
+Track the digests of the packaged files while they're written and describe the package contents as SBOM.
+"""
+
+from base64 import urlsafe_b64decode
+from csv import reader as csv_reader
+from datetime import datetime, timezone
+from hashlib import sha256
+from json import dumps as json_dumps
+from logging import getLogger
+from os.path import normpath
+from pathlib import Path, PurePath, PurePosixPath
+from re import sub as re_sub
+from shutil import move
+from threading import Lock
+from uuid import uuid4
+from zipfile import ZipFile
+
+from ._wheels import canonical_name
+
+LOGGER = getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 1048576
+TARBALL_ARCHIVE_SUFFIXES = ('.tar.gz', '.tgz', '.tar.bz2', '.tar.xz', '.tar', '.zip')
+
+
+def record_digest(record_hash):
+	"""Digest out of a RECORD hash
+	The hex SHA-256 digest in a wheel RECORD hash ("sha256=<urlsafe base64>"), None if it's empty or another algorithm.
+	"""
+	
+	algorithm, _, value = record_hash.partition('=')
+	if (algorithm != 'sha256') or not value:
+		return None
+	return urlsafe_b64decode(value + '=' * (-len(value) % 4)).hex()
+
+
+class FileDigests(dict):
+	"""File digests
+	Maps the file paths to their SHA-256 digest (hex), computed while the files are written ("copy", "write") instead of reading them back afterwards. Moving a file with "move" keeps its digest and the files installed out of a wheel take the digest from its RECORD ("add_record"). Only the files written by external tools, which never stream through here, get hashed on demand by "file_digest". Safe to share between threads.
+	"""
+	
+	def __init__(self, *args, **kwargs):
+		"""
+		
+		"""
+		
+		super().__init__(*args, **kwargs)
+		self._lock = Lock()
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({} files)'.format(type(self).__name__, len(self))
+	
+	def add_record(self, record, root, *, skip_scripts=False):
+		"""Add a RECORD
+		Takes the digests of the files listed in a wheel (or installed distribution) "record" text, relative to "root" (a path on this host or a PurePosixPath on the target one). With "skip_scripts" the ".data/scripts" entries of a wheel RECORD are left out, since the installer rewrites them. Returns the number of entries added.
+		"""
+		
+		root, added = (root if isinstance(root, PurePath) else Path(root)), 0
+		for row in csv_reader(record.splitlines()):
+			if len(row) < 2:
+				continue
+			digest = record_digest(row[1])
+			parts = PurePosixPath(row[0]).parts
+			if digest is None:
+				continue
+			if parts[0].endswith('.data'):
+				if (len(parts) < 3) or (parts[1] not in ('purelib', 'platlib')):
+					if not skip_scripts:
+						LOGGER.debug('Ignoring a RECORD entry outside of site-packages: %s', row[0])
+					continue
+				parts = parts[2:]
+			path = type(root)(normpath(root.joinpath(*parts)))
+			with self._lock:
+				self[path] = digest
+			added += 1
+		return added
+	
+	def add_wheel(self, wheel, site_packages):
+		"""Add a wheel
+		Takes the digests of the files that installing "wheel" puts in the "site_packages" directory out of its RECORD (just that member is read). The scripts are left out, since their "#!python" line is rewritten on install, and so are the files created by the installer (INSTALLER, the installed RECORD and the bytecode).
+		"""
+		
+		with ZipFile(wheel) as wheel_zip:
+			records = [name for name in wheel_zip.namelist() if (name.count('/') == 1) and name.endswith('.dist-info/RECORD')]
+			if len(records) != 1:
+				raise ValueError('Unable to find the RECORD in "{}": {}'.format(wheel, records))
+			record = wheel_zip.read(records[0]).decode('utf8')
+		return self.add_record(record, site_packages, skip_scripts=True)
+	
+	def copy(self, source_f, path):
+		"""Copy a file
+		Streams "source_f" into the file at "path", hashing the content on the way. Returns the path.
+		"""
+		
+		path, digest = Path(path).absolute(), sha256()
+		with path.open('wb') as dest_f:
+			for chunk in iter(lambda: source_f.read(STREAM_CHUNK_SIZE), b''):
+				dest_f.write(chunk)
+				digest.update(chunk)
+		with self._lock:
+			self[path] = digest.hexdigest()
+		return path
+	
+	def file_digest(self, path):
+		"""File digest
+		The digest of the file at "path": the one recorded when it was written or, for files written by other tools, the one of its current content (which gets recorded).
+		"""
+		
+		path = Path(path).absolute()
+		with self._lock:
+			if path in self:
+				return self[path]
+		
+		digest = sha256()
+		with path.open('rb') as file_obj:
+			for chunk in iter(lambda: file_obj.read(STREAM_CHUNK_SIZE), b''):
+				digest.update(chunk)
+		LOGGER.debug('Hashed a file written elsewhere: %s', path)
+		with self._lock:
+			self[path] = digest.hexdigest()
+		return self[path]
+	
+	def manifest(self):
+		"""Manifest
+		The digests in the "sha256sum" format (which "sha256sum --check" can verify), sorted by path.
+		"""
+		
+		with self._lock:
+			entries = sorted((str(path), digest) for path, digest in self.items())
+		return ''.join('{}  {}\n'.format(digest, path) for path, digest in entries)
+	
+	def move(self, source, destination):
+		"""Move a file
+		Moves the file (like "shutil.move") keeping its digest. Returns the new path.
+		"""
+		
+		source = Path(source).absolute()
+		result = Path(move(source, destination)).absolute()
+		with self._lock:
+			if source in self:
+				self[result] = self.pop(source)
+		return result
+	
+	def write(self, path, content):
+		"""Write a file
+		Writes "content" (text is UTF-8 encoded) into the file at "path" and records its digest. Returns the path.
+		"""
+		
+		path = Path(path).absolute()
+		if isinstance(content, str):
+			content = content.encode('utf8')
+		path.write_bytes(content)
+		with self._lock:
+			self[path] = sha256(content).hexdigest()
+		return path
+
+
+class BillOfMaterials:
+	"""Software bill of materials
+	The components of the package "name" "version": the distributions pinned by "wheel_requirements" (a WheelRequirements), described out of their wheel METADATA and the wheel digest (already computed for the requirements hashes), with the dependencies among them. The "tarball_modules" (the result of "InstallerTarball.identify_modules") tell where every distribution came from: a wheel in the tarball, a source module of the tarball built here or a download. The special packages of the tarball (like the python sources) are listed too, as excluded, since they're not installed. The distributions named in "exclude" are left out.
+	
+	Rendered as CycloneDX 1.5 ("cyclonedx") or SPDX 2.3 ("spdx") JSON documents.
+	"""
+	
+	def __init__(self, name, version, wheel_requirements, *, tarball_modules=None, exclude=(), tool=('duoauthproxy_installer', None)):
+		"""
+		
+		"""
+		
+		self.name = name
+		self.version = version
+		self.wheel_requirements = wheel_requirements
+		self.tarball_modules = ((), (), ()) if tarball_modules is None else tarball_modules
+		self.exclude = frozenset(canonical_name(name) for name in exclude)
+		self.tool = tool
+		self.timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+	
+	def __getattr__(self, item):
+		"""
+		
+		"""
+		
+		if item == 'components':
+			tarball_wheels, source_modules, special = self.tarball_modules
+			tarball_wheels = {PurePosixPath(wheel).name for wheel in tarball_wheels}
+			source_modules = {canonical_name(module.rpartition('-')[0] or module) for module in source_modules}
+			value = []
+			for name, distribution in self.wheel_requirements.pinned.items():
+				if name in self.exclude:
+					continue
+				if distribution.path.name in tarball_wheels:
+					origin = 'tarball-wheel'
+				elif name in source_modules:
+					origin = 'tarball-source'
+				else:
+					origin = 'download'
+				value.append({
+					'name': distribution.project_name,
+					'version': distribution.version,
+					'purl': 'pkg:pypi/{}@{}'.format(name, distribution.version),
+					'digest': distribution.digest if self.wheel_requirements.hash_algorithm == 'sha256' else None,
+					'license': distribution.license,
+					'license_expression': distribution.license_expression,
+					'summary': distribution.summary,
+					'origin': origin,
+					'scope': 'required',
+					'dependencies': ['pkg:pypi/{}@{}'.format(dependency, self.wheel_requirements.pinned[dependency].version) for dependency in sorted(self.wheel_requirements.graph.get(name, ())) if dependency not in self.exclude],
+				})
+			for package in special:
+				package = PurePosixPath(package).name
+				for suffix in TARBALL_ARCHIVE_SUFFIXES:
+					if package.endswith(suffix):
+						package = package[:-len(suffix)]
+						break
+				package_name, separator, package_version = package.rpartition('-')
+				package_name, package_version = (package_name, package_version) if separator else (package, None)
+				value.append({
+					'name': package_name,
+					'version': package_version,
+					'purl': 'pkg:generic/{}{}'.format(package_name.lower(), '@' + package_version if package_version else ''),
+					'digest': None,
+					'license': None,
+					'license_expression': None,
+					'summary': None,
+					'origin': 'tarball',
+					'scope': 'excluded',
+					'dependencies': [],
+				})
+		else:
+			raise AttributeError(item)
+		
+		self.__setattr__(item, value)
+		return value
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r}, {!r})'.format(type(self).__name__, self.name, self.version)
+	
+	def cyclonedx(self):
+		"""CycloneDX document
+		The bill of materials as a CycloneDX 1.5 JSON document (a dict).
+		"""
+		
+		root_ref = 'pkg:generic/{}@{}'.format(self.name, self.version)
+		components = []
+		for component in self.components:
+			entry = {'type': 'library', 'bom-ref': component['purl'], 'name': component['name']}
+			if component['version']:
+				entry['version'] = component['version']
+			if component['summary']:
+				entry['description'] = component['summary']
+			entry['scope'] = component['scope']
+			if component['digest']:
+				entry['hashes'] = [{'alg': 'SHA-256', 'content': component['digest']}]
+			if component['license_expression']:
+				entry['licenses'] = [{'expression': component['license_expression']}]
+			elif component['license']:
+				entry['licenses'] = [{'license': {'name': component['license']}}]
+			entry['purl'] = component['purl']
+			entry['properties'] = [{'name': 'duoauthproxy:origin', 'value': component['origin']}]
+			components.append(entry)
+		
+		tool_name, tool_version = self.tool
+		return {
+			'bomFormat': 'CycloneDX',
+			'specVersion': '1.5',
+			'serialNumber': 'urn:uuid:{}'.format(uuid4()),
+			'version': 1,
+			'metadata': {
+				'timestamp': self.timestamp,
+				'tools': {'components': [dict({'type': 'application', 'name': tool_name}, **({'version': tool_version} if tool_version else {}))]},
+				'component': {'type': 'application', 'bom-ref': root_ref, 'name': self.name, 'version': self.version},
+			},
+			'components': components,
+			'dependencies': [{'ref': root_ref, 'dependsOn': [component['purl'] for component in self.components if component['scope'] == 'required']}] + [{'ref': component['purl'], 'dependsOn': component['dependencies']} for component in self.components if component['scope'] == 'required'],
+		}
+	
+	def spdx(self):
+		"""SPDX document
+		The bill of materials as a SPDX 2.3 JSON document (a dict). Only proper license expressions ("License-Expression") are declared, the free form "License" goes to the license comments.
+		"""
+		
+		spdx_ids = {component['purl']: 'SPDXRef-Package-{}'.format(re_sub(r'[^A-Za-z0-9.]+', '-', '{}-{}'.format(component['name'], component['version'] or ''))).rstrip('-') for component in self.components}
+		root_id = 'SPDXRef-RPM-{}'.format(re_sub(r'[^A-Za-z0-9.]+', '-', self.name))
+		packages = [{
+			'SPDXID': root_id,
+			'name': self.name,
+			'versionInfo': self.version,
+			'downloadLocation': 'NOASSERTION',
+			'filesAnalyzed': False,
+			'licenseConcluded': 'NOASSERTION',
+			'licenseDeclared': 'NOASSERTION',
+			'primaryPackagePurpose': 'APPLICATION',
+		}]
+		relationships = [{'spdxElementId': 'SPDXRef-DOCUMENT', 'relationshipType': 'DESCRIBES', 'relatedSpdxElement': root_id}]
+		for component in self.components:
+			package = {
+				'SPDXID': spdx_ids[component['purl']],
+				'name': component['name'],
+				'downloadLocation': 'NOASSERTION',
+				'filesAnalyzed': False,
+				'licenseConcluded': 'NOASSERTION',
+				'licenseDeclared': component['license_expression'] or 'NOASSERTION',
+				'externalRefs': [{'referenceCategory': 'PACKAGE-MANAGER', 'referenceType': 'purl', 'referenceLocator': component['purl']}],
+				'comment': 'Origin: {}'.format(component['origin']),
+			}
+			if component['version']:
+				package['versionInfo'] = component['version']
+			if component['digest']:
+				package['checksums'] = [{'algorithm': 'SHA256', 'checksumValue': component['digest']}]
+			if component['license'] and not component['license_expression']:
+				package['licenseComments'] = component['license']
+			if component['summary']:
+				package['summary'] = component['summary']
+			packages.append(package)
+			
+			if component['scope'] == 'required':
+				relationships.append({'spdxElementId': root_id, 'relationshipType': 'DEPENDS_ON', 'relatedSpdxElement': spdx_ids[component['purl']]})
+				relationships += [{'spdxElementId': spdx_ids[component['purl']], 'relationshipType': 'DEPENDS_ON', 'relatedSpdxElement': spdx_ids[dependency]} for dependency in component['dependencies'] if dependency in spdx_ids]
+		
+		tool_name, tool_version = self.tool
+		return {
+			'spdxVersion': 'SPDX-2.3',
+			'dataLicense': 'CC0-1.0',
+			'SPDXID': 'SPDXRef-DOCUMENT',
+			'name': '{}-{}'.format(self.name, self.version),
+			'documentNamespace': 'https://spdx.org/spdxdocs/{}-{}-{}'.format(self.name, self.version, uuid4()),
+			'creationInfo': {'created': self.timestamp, 'creators': ['Tool: {}{}'.format(tool_name, '-' + tool_version if tool_version else '')]},
+			'packages': packages,
+			'relationships': relationships,
+		}
+	
+	def write(self, prefix):
+		"""Write the documents
+		Writes the CycloneDX and SPDX documents as "<prefix>.cdx.json" and "<prefix>.spdx.json". Returns their paths.
+		"""
+		
+		prefix = Path(prefix)
+		result = []
+		for suffix, document in (('.cdx.json', self.cyclonedx()), ('.spdx.json', self.spdx())):
+			path = prefix.with_name(prefix.name + suffix)
+			path.write_text(json_dumps(document, indent=2))
+			result.append(path)
+		return result
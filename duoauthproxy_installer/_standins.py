@@ -0,0 +1,208 @@
+#!python
+"""Duo Authentication Proxy Installers (stand-ins)
+Deterministic stand-ins for the network and the external tools of a build, so the installer pipeline can be timed end to end on its own.
+"""
+
+from collections import defaultdict
+from hashlib import sha256
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps as json_dumps, loads as json_loads
+from logging import getLogger
+from os import environ, pathsep
+from pathlib import Path
+from shutil import copyfile, copyfileobj
+from sys import executable
+from threading import Thread
+from time import sleep
+from urllib.parse import quote, unquote
+
+from ._wheels import canonical_name, parse_wheel_name
+
+LOGGER = getLogger(__name__)
+
+DEFAULT_STANDIN_TIMINGS = {
+	'bdist_wheel': 2.0,
+	'pip': 1.0,
+	'rpmvenv': 5.0,
+	'venv': 0.5,
+}
+SETTINGS_VARIABLE = 'DUOAUTHPROXY_STANDINS'
+STANDIN_TOOLS = Path(__file__).parent / 'data' / 'standin_tools.py'
+
+
+class StandIns:
+	"""Tool stand-ins
+	Context manager setting up the stand-ins in data/standin_tools.py under "root_dir": a "python" interpreter (to be passed to the installer) and an "rpmvenv" that goes first in the PATH while the context is active. They produce valid artifacts (venvs, wheels, RPMs) and take the time recorded for every build in "history_file" (a BuildHistory file, copied so the original is left alone) or, for everything else, the "timings" per tool (DEFAULT_STANDIN_TIMINGS), scaled by "time_scale".
+	"""
+	
+	def __enter__(self):
+		"""
+		
+		"""
+		
+		self._previous = {name: environ.get(name) for name in ('PATH', SETTINGS_VARIABLE)}
+		environ['PATH'] = str(self.bin_dir) + pathsep + environ.get('PATH', '')
+		environ[SETTINGS_VARIABLE] = str(self.settings_file)
+		return self
+	
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		"""
+		
+		"""
+		
+		for name, value in self._previous.items():
+			if value is None:
+				environ.pop(name, None)
+			else:
+				environ[name] = value
+	
+	def __init__(self, root_dir, *, timings=None, time_scale=1.0, history_file=None):
+		"""
+		
+		"""
+		
+		self.root_dir = Path(root_dir).absolute()
+		self.bin_dir = self.root_dir / 'bin'
+		self.bin_dir.mkdir(parents=True, exist_ok=True)
+		self.log_file = self.root_dir / 'standins.log'
+		self.settings_file = self.root_dir / 'standins.json'
+		
+		self.history_file = None
+		if (history_file is not None) and Path(history_file).expanduser().exists():
+			self.history_file = self.root_dir / 'build_history.json'
+			copyfile(Path(history_file).expanduser(), self.history_file)
+		
+		settings = {
+			'history_file': None if self.history_file is None else str(self.history_file),
+			'log_file': str(self.log_file),
+			'python': executable,
+			'time_scale': time_scale,
+			'timings': dict(DEFAULT_STANDIN_TIMINGS, **(timings or {})),
+		}
+		self.settings_file.write_text(json_dumps(settings, indent=2))
+		
+		source = STANDIN_TOOLS.read_text().split('\n', 1)[1]
+		for name in ('python', 'rpmvenv'):
+			tool = self.bin_dir / name
+			tool.write_text('#!{}\n{}'.format(executable, source))
+			tool.chmod(0o755)
+		self.python = self.bin_dir / 'python'
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r})'.format(type(self).__name__, str(self.root_dir))
+	
+	def usage(self):
+		"""Stand-in usage
+		The number of runs and the time taken by every stand-in tool so far, out of the log.
+		"""
+		
+		result = defaultdict(lambda: {'calls': 0, 'seconds': 0.0})
+		if self.log_file.exists():
+			for line in self.log_file.read_text().splitlines():
+				entry = json_loads(line)
+				result[entry['tool']]['calls'] += 1
+				result[entry['tool']]['seconds'] += entry['seconds']
+		return dict(result)
+
+
+class StandInServer(ThreadingHTTPServer):
+	"""Stand-in download server
+	Local HTTP server for the files in "directory" (like the source tarball), with a PEP-503 simple index of the wheels in there under "/simple/", so it can stand in for both the download site and the package index. Every response is delayed by "latency" seconds.
+	"""
+	
+	daemon_threads = True
+	
+	def __enter__(self):
+		"""
+		
+		"""
+		
+		self._thread = Thread(target=self.serve_forever, name='standin_server', daemon=True)
+		self._thread.start()
+		return self
+	
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		"""
+		
+		"""
+		
+		self.shutdown()
+		self.server_close()
+	
+	def __init__(self, directory, *, latency=0.0):
+		"""
+		
+		"""
+		
+		self.directory = Path(directory).absolute()
+		self.latency = latency
+		self.projects = defaultdict(list)
+		for wheel in sorted(self.directory.glob('*.whl')):
+			details = parse_wheel_name(wheel.name)
+			if details is not None:
+				digest = sha256()
+				with wheel.open('rb') as wheel_f:
+					for chunk in iter(lambda: wheel_f.read(1048576), b''):
+						digest.update(chunk)
+				self.projects[details[0]].append((wheel.name, digest.hexdigest()))
+		self.requests = 0
+		super().__init__(('127.0.0.1', 0), _StandInRequestHandler)
+	
+	@property
+	def url(self):
+		"""
+		
+		"""
+		
+		return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+
+class _StandInRequestHandler(BaseHTTPRequestHandler):
+	"""
+	
+	"""
+	
+	protocol_version = 'HTTP/1.1'
+	
+	def do_GET(self):
+		"""
+		
+		"""
+		
+		self.server.requests += 1
+		if self.server.latency:
+			sleep(self.server.latency)
+		
+		path = unquote(self.path.partition('?')[0])
+		if path.startswith('/simple/'):
+			wheels = self.server.projects.get(canonical_name(path[len('/simple/'):].strip('/')))
+			if wheels is None:
+				return self.send_error(404)
+			body = '<!DOCTYPE html>\n<html><body>\n{}</body></html>\n'.format(''.join('<a href="../../{}#sha256={}">{}</a>\n'.format(quote(name), digest, escape(name)) for name, digest in wheels)).encode('utf8')
+			self.send_response(200)
+			self.send_header('Content-Type', 'text/html')
+			self.send_header('Content-Length', str(len(body)))
+			self.end_headers()
+			return self.wfile.write(body)
+		
+		local_file = self.server.directory / path.lstrip('/')
+		if (local_file.parent != self.server.directory) or not local_file.is_file():
+			return self.send_error(404)
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/octet-stream')
+		self.send_header('Content-Length', str(local_file.stat().st_size))
+		self.end_headers()
+		with local_file.open('rb') as local_f:
+			copyfileobj(local_f, self.wfile, 1048576)
+	
+	def log_message(self, format, *args):
+		"""
+		
+		"""
+		
+		LOGGER.debug('Stand-in server: ' + format, *args)
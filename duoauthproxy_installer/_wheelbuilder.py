@@ -0,0 +1,392 @@
+#!python
+"""Duo Authentication Proxy Installers (wheel builder)
+Build wheels for pure python packages straight from the tarball members, without extracting them or running setuptools.
+"""
+
+from base64 import urlsafe_b64encode
+from fnmatch import fnmatch
+from hashlib import sha256
+from io import BytesIO
+from logging import getLogger
+from os import environ
+from pathlib import Path, PurePath
+from re import search as re_search, sub as re_sub
+from shutil import copyfileobj
+from tempfile import SpooledTemporaryFile
+from time import gmtime
+from zipfile import ZIP_DEFLATED, ZipFile, ZipInfo
+
+LOGGER = getLogger(__name__)
+
+SOURCE_DATE_EPOCH_VARIABLE = 'SOURCE_DATE_EPOCH'
+STREAM_CHUNK_SIZE = 1048576
+ZIP_EPOCH = 315532800
+
+
+def record_hash(digest):
+	"""RECORD hash
+	Encode the digest the way the wheel RECORD file expects it (PEP-376 and PEP-427).
+	"""
+	
+	return 'sha256=' + urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+
+def source_date_epoch():
+	"""Source date epoch
+	The timestamp of the files generated by the wheel builds: the SOURCE_DATE_EPOCH environment variable (as defined by reproducible-builds.org) if set, otherwise the earliest date a zip file can hold (ZIP_EPOCH). It never depends on the time of the build, so the same source always gives the same wheel.
+	"""
+	
+	try:
+		return max(int(environ[SOURCE_DATE_EPOCH_VARIABLE]), ZIP_EPOCH)
+	except (KeyError, ValueError):
+		return ZIP_EPOCH
+
+
+def requires_dist(requires_txt):
+	"""Requires-Dist from requires.txt
+	Convert the content of a setuptools "requires.txt" file into Requires-Dist values (with extras and markers) and Provides-Extra values.
+	"""
+	
+	requirements, extras, section = [], [], ''
+	for line in requires_txt.splitlines():
+		line = line.strip()
+		if not line or line.startswith('#'):
+			continue
+		if line.startswith('[') and line.endswith(']'):
+			section = line[1:-1].strip()
+			extra = section.partition(':')[0]
+			if extra and (extra not in extras):
+				extras.append(extra)
+			continue
+		
+		extra, _, section_marker = section.partition(':')
+		requirement, _, requirement_marker = line.partition(';')
+		markers = ['({})'.format(marker.strip()) for marker in (requirement_marker, section_marker) if marker.strip()]
+		if extra:
+			markers.append('extra == "{}"'.format(extra))
+		if markers:
+			requirements.append('{}; {}'.format(requirement.strip(), ' and '.join(markers)))
+		else:
+			requirements.append(requirement.strip())
+	
+	return requirements, extras
+
+
+class _HashingWriter:
+	"""
+	
+	"""
+	
+	def __init__(self, file_obj):
+		"""
+		
+		"""
+		
+		self.file_obj = file_obj
+		self.digest = sha256()
+	
+	def close(self):
+		"""
+		
+		"""
+		
+		self.file_obj.close()
+	
+	def flush(self):
+		"""
+		
+		"""
+		
+		self.file_obj.flush()
+	
+	def write(self, data):
+		"""
+		
+		"""
+		
+		self.digest.update(data)
+		return self.file_obj.write(data)
+
+
+class PureWheelBuilder:
+	"""Pure python wheel builder
+	Writes a "py3-none-any" wheel out of the members of an unpacked source distribution in the tarball, computing the RECORD hashes while the content streams through. The wheel itself is written as a stream too (with data descriptors, no seeking back to patch the headers), so its digest is computed on the way ("digest", once finished).
+	
+	Only packages that look pure python in the tarball index (setuptools metadata present, no extension sources) get a builder ("for_package" returns None for everything else). Their metadata files are read as they come in the same stream, the files that come before them are spooled meanwhile; if the metadata reveals anything the builder doesn't handle (custom build steps, package data, another build backend) "fallback" gets the reason and "spill" writes what was spooled out, so the rest of the package can be extracted and built with setup.py.
+	"""
+	
+	EGG_INFO_FILES = ('SOURCES.txt', 'top_level.txt', 'requires.txt', 'entry_points.txt')
+	EXTENSION_SUFFIXES = ('.c', '.cc', '.cpp', '.cxx', '.f', '.f90', '.h', '.hpp', '.pxd', '.pyd', '.pyx', '.rs', '.so')
+	LICENSE_PATTERNS = ('LICEN[CS]E*', 'COPYING*', 'NOTICE*', 'AUTHORS*')
+	METADATA_FILES = ('PKG-INFO', 'setup.py', 'setup.cfg', 'pyproject.toml')
+	SPOOL_MAX_SIZE = 1048576
+	UNSUPPORTED_SETUP_KEYWORDS = ('cffi_modules', 'cmdclass', 'data_files', 'distclass', 'ext_modules', 'include_package_data', 'namespace_packages', 'package_data', 'package_dir', 'rust_extensions', 'scripts', 'setup_requires', 'use_scm_version')
+	WHEEL_TAG = 'py3-none-any'
+	
+	def __init__(self, package_name, members, egg_info, wheels_dir):
+		"""
+		
+		"""
+		
+		self.package_name = package_name
+		self.members = frozenset(members)
+		self.egg_info = PurePath(egg_info)
+		self.metadata_files = frozenset(path for path in [PurePath(name) for name in self.METADATA_FILES] + [self.egg_info / name for name in self.EGG_INFO_FILES] if path in self.members)
+		self.wheels_dir = Path(wheels_dir)
+		
+		self.name, self.version, self.metadata, self.entry_points, self.top_level = None, None, None, None, None
+		self.files, self.wheel_path, self.dist_info = None, None, None
+		self.fallback, self.digest = None, None
+		self._metadata, self._spooled = {}, {}
+		self._record, self._zip_file, self._writer = [], None, None
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r})'.format(type(self).__name__, self.package_name)
+	
+	@classmethod
+	def for_package(cls, tarball, package_name, wheels_dir):
+		"""Builder for a package
+		Looks at the package files in the tarball index (nothing is read from the tarball) and returns a builder if the package might be built natively, None otherwise.
+		"""
+		
+		package_path = tarball.packages_dir / package_name
+		members = [member.relative_to(package_path) for member in tarball.member_paths.paths(package_path) if tarball.member_paths.isfile(member)]
+		
+		extensions = [path for path in members if path.suffix.lower() in cls.EXTENSION_SUFFIXES]
+		if extensions:
+			LOGGER.debug('Not a pure python package (%s): %s', extensions[0], package_name)
+			return None
+		
+		egg_info = [path.parent for path in members if (len(path.parts) == 2) and (path.parent.suffix == '.egg-info') and (path.name == 'SOURCES.txt')]
+		if (PurePath('PKG-INFO') not in members) or (len(egg_info) != 1) or ((egg_info[0] / 'top_level.txt') not in members):
+			LOGGER.debug('Missing setuptools metadata: %s', package_name)
+			return None
+		
+		return cls(package_name, members, egg_info[0], wheels_dir)
+	
+	def add(self, path, file_obj, member=None):
+		"""Add a member
+		Takes the content of "file_obj" for "path" (relative to the package root): the metadata files are kept, the wheel files are streamed into the wheel (hashing them on the way) and, while the metadata is incomplete, everything else is spooled. Returns True if the content went into the wheel.
+		"""
+		
+		path = PurePath(path)
+		if self.fallback is not None:
+			raise RuntimeError('Not building {} natively: {}'.format(self.package_name, self.fallback))
+		
+		if path in self.metadata_files:
+			self._metadata[path] = (file_obj.read(), member)
+			if (self.files is None) and (len(self._metadata) == len(self.metadata_files)):
+				self._prepare()
+			return False
+		
+		if self.files is None:
+			spool = SpooledTemporaryFile(max_size=self.SPOOL_MAX_SIZE)
+			copyfileobj(file_obj, spool)
+			spool.seek(0)
+			self._spooled[path] = (spool, member)
+			return False
+		
+		return self._write(path, file_obj, member)
+	
+	def finish(self):
+		"""Finish the wheel
+		Adds the dist-info files (with the RECORD) and moves the wheel in place.
+		"""
+		
+		if self.fallback is not None:
+			raise RuntimeError('Not building {} natively: {}'.format(self.package_name, self.fallback))
+		if self.files is None:
+			self.abort()
+			raise RuntimeError('Incomplete metadata for {}: {}'.format(self.package_name, sorted(str(path) for path in self.metadata_files - set(self._metadata))))
+		
+		written = {path for path, _, _ in self._record}
+		if written != set(self.files.values()):
+			self.abort()
+			raise RuntimeError('Missing files for {}: {}'.format(self.wheel_path.name, sorted(set(self.files.values()) - written)))
+		
+		dist_info_files = {
+			'METADATA': self.metadata,
+			'WHEEL': 'Wheel-Version: 1.0\nGenerator: duoauthproxy_installer\nRoot-Is-Purelib: true\nTag: {}\n'.format(self.WHEEL_TAG),
+		}
+		if self.entry_points:
+			dist_info_files['entry_points.txt'] = self.entry_points
+		if self.top_level:
+			dist_info_files['top_level.txt'] = self.top_level
+		
+		zip_file = self._zip()
+		for name, content in dist_info_files.items():
+			content = content.encode('utf8')
+			path = '{}/{}'.format(self.dist_info, name)
+			zip_file.writestr(ZipInfo(path, date_time=self._date_time()), content, compress_type=ZIP_DEFLATED)
+			self._record.append((path, record_hash(sha256(content).digest()), len(content)))
+		
+		record_path = '{}/RECORD'.format(self.dist_info)
+		record = ''.join('{},{},{}\n'.format(*entry) for entry in self._record) + '{},,\n'.format(record_path)
+		zip_file.writestr(ZipInfo(record_path, date_time=self._date_time()), record, compress_type=ZIP_DEFLATED)
+		zip_file.close()
+		self._writer.close()
+		self.digest = self._writer.digest.hexdigest()
+		self._zip_file, self._writer = None, None
+		
+		LOGGER.debug('Natively built wheel: %s', self.wheel_path.name)
+		return self._partial_path.replace(self.wheel_path)
+	
+	def spill(self, directory):
+		"""Spill the package
+		Writes the files taken so far (metadata and spooled ones) into "directory", the way they would have been extracted, so the package can be completed there and built with setup.py.
+		"""
+		
+		directory = Path(directory)
+		files = [(path, BytesIO(content), member) for path, (content, member) in self._metadata.items()] + [(path, spool, member) for path, (spool, member) in self._spooled.items()]
+		for path, source_f, member in files:
+			target = directory / path
+			target.parent.mkdir(parents=True, exist_ok=True)
+			with source_f, target.open('wb') as dest_f:
+				copyfileobj(source_f, dest_f)
+			if (member is not None) and (member.mode & 0o111):
+				target.chmod(member.mode & 0o777)
+		self._metadata, self._spooled = {}, {}
+	
+	def abort(self):
+		"""
+		
+		"""
+		
+		for spool, member in self._spooled.values():
+			spool.close()
+		self._spooled = {}
+		if self._zip_file is not None:
+			self._zip_file.close()
+			self._writer.close()
+			self._zip_file, self._writer = None, None
+		if self.wheel_path is not None:
+			self._partial_path.unlink(missing_ok=True)
+	
+	@staticmethod
+	def _date_time(member=None):
+		"""
+		
+		"""
+		
+		return gmtime(max(member.mtime, ZIP_EPOCH) if member is not None else source_date_epoch())[:6]
+	
+	@property
+	def _partial_path(self):
+		"""
+		
+		"""
+		
+		return self.wheel_path.with_name(self.wheel_path.name + '.part')
+	
+	def _prepare(self):
+		"""
+		
+		"""
+		
+		content = {path: data.decode('utf8') for path, (data, member) in self._metadata.items()}
+		for build_file in ('setup.py', 'setup.cfg', 'pyproject.toml'):
+			build_content = content.get(PurePath(build_file), '')
+			for keyword in self.UNSUPPORTED_SETUP_KEYWORDS:
+				if re_search(r'\b{}\b'.format(keyword.replace('_', '[-_]')), build_content):
+					return self._fall_back('custom build step in {} ({})'.format(build_file, keyword))
+		backend = re_search(r'build-backend\s*=\s*["\']([^"\']+)["\']', content.get(PurePath('pyproject.toml'), ''))
+		if (backend is not None) and ('setuptools' not in backend.group(1)):
+			return self._fall_back('unsupported build backend ({})'.format(backend.group(1)))
+		
+		top_level = [line.strip() for line in content[self.egg_info / 'top_level.txt'].splitlines() if line.strip()]
+		sources = [PurePath(line.strip()) for line in content[self.egg_info / 'SOURCES.txt'].splitlines() if line.strip()]
+		package_sources = [path for path in sources if (path.parts[0] in top_level) and (len(path.parts) > 1)]
+		package_data = [path for path in package_sources if path.suffix != '.py']
+		if package_data:
+			return self._fall_back('package data ({})'.format(package_data[0]))
+		package_files = package_sources + [path for path in sources if (len(path.parts) == 1) and (path.suffix == '.py') and (path.stem in top_level)]
+		missing = [path for path in package_files if path not in self.members]
+		if not package_files or missing:
+			return self._fall_back('unable to locate the package sources {}'.format(missing))
+		
+		metadata, _, description = content[PurePath('PKG-INFO')].partition('\n\n')
+		headers = metadata.splitlines()
+		name = next((line.partition(':')[2].strip() for line in headers if line.startswith('Name:')), None)
+		version = next((line.partition(':')[2].strip() for line in headers if line.startswith('Version:')), None)
+		if not name or not version:
+			return self._fall_back('incomplete PKG-INFO')
+		
+		if not any(line.startswith('Requires-Dist:') for line in headers):
+			requirements, extras = requires_dist(content.get(self.egg_info / 'requires.txt', ''))
+			if requirements or extras:
+				headers = [line for line in headers if not line.startswith('Metadata-Version:')]
+				headers.insert(0, 'Metadata-Version: 2.1')
+				headers += ['Provides-Extra: {}'.format(extra) for extra in extras]
+				headers += ['Requires-Dist: {}'.format(requirement) for requirement in requirements]
+		
+		license_files = [PurePath(line.partition(':')[2].strip()) for line in headers if line.startswith('License-File:')]
+		if not license_files:
+			license_files = sorted(path for path in self.members if (len(path.parts) == 1) and any(fnmatch(path.name, pattern) for pattern in self.LICENSE_PATTERNS))
+			headers += ['License-File: {}'.format(path.as_posix()) for path in license_files]
+		missing = [path for path in license_files if path not in self.members]
+		if missing:
+			return self._fall_back('missing license files {}'.format(missing))
+		
+		metadata = '\n'.join(headers) + '\n'
+		if description.strip():
+			metadata += '\n' + description
+		
+		safe_name = re_sub(r'[^A-Za-z0-9.]+', '_', name)
+		safe_version = re_sub(r'[^A-Za-z0-9.+!]+', '_', version)
+		self.name, self.version, self.metadata = name, version, metadata
+		self.entry_points, self.top_level = content.get(self.egg_info / 'entry_points.txt'), content[self.egg_info / 'top_level.txt']
+		self.dist_info = '{}-{}.dist-info'.format(safe_name, safe_version)
+		self.wheel_path = self.wheels_dir / '{}-{}-{}.whl'.format(safe_name, safe_version, self.WHEEL_TAG)
+		self.files = {path: path.as_posix() for path in package_files}
+		self.files.update({path: '{}/{}'.format(self.dist_info, path.name) for path in license_files})
+		
+		spooled, self._spooled = self._spooled, {}
+		for path, (spool, member) in spooled.items():
+			with spool:
+				self._write(path, spool, member)
+	
+	def _fall_back(self, reason):
+		"""
+		
+		"""
+		
+		LOGGER.debug('Not building %s natively, %s', self.package_name, reason)
+		self.fallback = reason
+	
+	def _write(self, path, file_obj, member=None):
+		"""
+		
+		"""
+		
+		if path not in self.files:
+			return False
+		
+		zip_info = ZipInfo(self.files[path], date_time=self._date_time(member))
+		zip_info.compress_type = ZIP_DEFLATED
+		zip_info.external_attr = (0o100000 | ((member.mode if member is not None else 0o644) & 0o777)) << 16
+		digest, size = sha256(), 0
+		with self._zip().open(zip_info, 'w') as dest_f:
+			while True:
+				chunk = file_obj.read(STREAM_CHUNK_SIZE)
+				if not chunk:
+					break
+				dest_f.write(chunk)
+				digest.update(chunk)
+				size += len(chunk)
+		self._record.append((self.files[path], record_hash(digest.digest()), size))
+		return True
+	
+	def _zip(self):
+		"""
+		
+		"""
+		
+		if self._zip_file is None:
+			self.wheels_dir.mkdir(parents=True, exist_ok=True)
+			self._writer = _HashingWriter(self._partial_path.open('wb'))
+			self._zip_file = ZipFile(self._writer, 'w')
+		return self._zip_file
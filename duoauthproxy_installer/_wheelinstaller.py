@@ -0,0 +1,201 @@
+#!python
+"""Duo Authentication Proxy Installers (wheel installer)
+Install wheels straight into a venv, in parallel, without going through pip.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+from csv import writer as csv_writer
+from hashlib import new as hashlib_new, sha256
+from logging import getLogger
+from os import cpu_count
+from os.path import relpath
+from pathlib import Path, PurePosixPath
+from re import IGNORECASE, fullmatch as re_fullmatch
+from subprocess import run
+from zipfile import ZipFile
+
+from ._wheelbuilder import record_hash
+
+LOGGER = getLogger(__name__)
+
+CONSOLE_SCRIPT_TEMPLATE = '''#!{python}
+# -*- coding: utf-8 -*-
+import re
+import sys
+from {module} import {name}
+if __name__ == '__main__':
+    sys.argv[0] = re.sub(r'(-script\\.pyw|\\.exe)?$', '', sys.argv[0])
+    sys.exit({function}())
+'''
+INSTALLER_NAME = 'duoauthproxy_installer'
+STREAM_CHUNK_SIZE = 1048576
+
+
+class WheelInstaller:
+	"""Native wheel installer
+	Unpacks wheels into the venv at "venv_path" the way pip would (PEP-427): the ".data" directories go to their scheme paths, the "#!python" scripts and the console scripts get the venv interpreter, and the dist-info gets an INSTALLER file and a RECORD with the installed paths. The wheels are installed concurrently (dependencies are not checked, it's meant to run an install plan) and the modules are byte compiled at the end with "byte_compile".
+	"""
+	
+	def __init__(self, venv_path, *, max_workers=None, byte_compile=True):
+		"""
+		
+		"""
+		
+		self.venv_path = Path(venv_path).absolute()
+		self.max_workers = max_workers or cpu_count()
+		self.byte_compile = byte_compile
+	
+	def __getattr__(self, item):
+		"""
+		
+		"""
+		
+		if item == 'python':
+			value = self.venv_path / 'bin' / 'python'
+		elif item == 'python_version':
+			config = ConfigParser(interpolation=None)
+			config.read_string('[pyvenv]\n' + (self.venv_path / 'pyvenv.cfg').read_text())
+			value = '.'.join(config['pyvenv'].get('version', config['pyvenv'].get('version_info', '')).split('.')[:2])
+			if not value:
+				raise RuntimeError('Unable to detect the python version of the venv: {}'.format(self.venv_path))
+		elif item == 'scheme':
+			site_packages = self.venv_path / 'lib' / 'python{}'.format(self.python_version) / 'site-packages'
+			value = {
+				'data': self.venv_path,
+				'headers': self.venv_path / 'include' / 'site' / 'python{}'.format(self.python_version),
+				'platlib': site_packages,
+				'purelib': site_packages,
+				'scripts': self.venv_path / 'bin',
+			}
+		else:
+			raise AttributeError(item)
+		
+		self.__setattr__(item, value)
+		return value
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r})'.format(type(self).__name__, str(self.venv_path))
+	
+	def __call__(self, *wheels, hashes=None):
+		"""Install wheels
+		Installs the "wheels" concurrently and byte compiles the result. The "hashes" mapping (wheel path to "algorithm:digest") is checked, like pip's hash checking mode would. Returns the dist-info directories.
+		"""
+		
+		hashes = {} if hashes is None else {Path(path): value for path, value in hashes.items()}
+		with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+			result = list(executor.map(lambda wheel: self.install(wheel, expected_hash=hashes.get(Path(wheel))), wheels))
+		
+		if self.byte_compile and result:
+			run((str(self.python), '-m', 'compileall', '-q', '-j', '0', str(self.scheme['purelib'])), check=True)
+		return result
+	
+	def install(self, wheel, expected_hash=None):
+		"""Install a wheel
+		Unpacks a single wheel into the venv, after checking it against "expected_hash" ("algorithm:digest") if provided. Returns the installed dist-info directory.
+		"""
+		
+		wheel = Path(wheel)
+		if expected_hash is not None:
+			algorithm, _, expected_digest = expected_hash.partition(':')
+			digest = hashlib_new(algorithm)
+			with wheel.open('rb') as wheel_f:
+				for chunk in iter(lambda: wheel_f.read(STREAM_CHUNK_SIZE), b''):
+					digest.update(chunk)
+			if digest.hexdigest() != expected_digest:
+				raise RuntimeError('Hash mismatch for {}'.format(wheel))
+		
+		with ZipFile(wheel) as wheel_zip:
+			names = wheel_zip.namelist()
+			dist_info = {PurePosixPath(name).parts[0] for name in names if PurePosixPath(name).parts[0].endswith('.dist-info')}
+			if len(dist_info) != 1:
+				raise ValueError('Unable to find the dist-info in "{}": {}'.format(wheel, sorted(dist_info)))
+			dist_info = dist_info.pop()
+			data_dir = dist_info[:-len('.dist-info')] + '.data'
+			
+			wheel_metadata = wheel_zip.read('{}/WHEEL'.format(dist_info)).decode('utf8')
+			root_is_purelib = any(re_fullmatch(r'Root-Is-Purelib:\s*true\s*', line, flags=IGNORECASE) for line in wheel_metadata.splitlines())
+			root = self.scheme['purelib' if root_is_purelib else 'platlib']
+			
+			record = []
+			for name in names:
+				if name.endswith('/') or (name == '{}/RECORD'.format(dist_info)):
+					continue
+				parts = PurePosixPath(name).parts
+				if parts[0] == data_dir:
+					if (len(parts) < 3) or (parts[1] not in self.scheme):
+						raise ValueError('Unsupported data path in "{}": {}'.format(wheel.name, name))
+					destination = self.scheme[parts[1]].joinpath(*parts[2:])
+					if parts[1] == 'headers':
+						destination = self.scheme['headers'] / dist_info.split('-')[0] / PurePosixPath(*parts[2:])
+				else:
+					destination = root.joinpath(*parts)
+				record.append(self._write(wheel_zip, name, destination, script=(parts[0] == data_dir) and (parts[1] == 'scripts')))
+			
+			if '{}/entry_points.txt'.format(dist_info) in names:
+				record += self._console_scripts(wheel_zip.read('{}/entry_points.txt'.format(dist_info)).decode('utf8'))
+			
+			installer_file = root / dist_info / 'INSTALLER'
+			installer_file.write_text(INSTALLER_NAME + '\n')
+			record.append((installer_file, record_hash(sha256((INSTALLER_NAME + '\n').encode('utf8')).digest()), installer_file.stat().st_size))
+		
+		record_file = root / dist_info / 'RECORD'
+		with record_file.open('w', newline='') as record_f:
+			writer = csv_writer(record_f, lineterminator='\n')
+			for path, digest, size in record:
+				writer.writerow((Path(relpath(path, root)).as_posix(), digest, size))
+			writer.writerow((Path(relpath(record_file, root)).as_posix(), '', ''))
+		
+		LOGGER.debug('Natively installed %s', wheel.name)
+		return root / dist_info
+	
+	def _console_scripts(self, entry_points):
+		"""
+		
+		"""
+		
+		config = ConfigParser(interpolation=None, delimiters=('=',))
+		config.optionxform = str
+		config.read_string(entry_points)
+		result = []
+		for section in ('console_scripts', 'gui_scripts'):
+			if not config.has_section(section):
+				continue
+			for script_name, reference in config.items(section):
+				module, _, attributes = reference.partition('[')[0].strip().partition(':')
+				name = attributes.strip().split('.')[0]
+				content = CONSOLE_SCRIPT_TEMPLATE.format(python=self.python, module=module.strip(), name=name, function=attributes.strip()).encode('utf8')
+				script = self.scheme['scripts'] / script_name
+				script.parent.mkdir(parents=True, exist_ok=True)
+				script.write_bytes(content)
+				script.chmod(0o755)
+				result.append((script, record_hash(sha256(content).digest()), len(content)))
+		return result
+	
+	def _write(self, wheel_zip, name, destination, script=False):
+		"""
+		
+		"""
+		
+		destination.parent.mkdir(parents=True, exist_ok=True)
+		zip_info = wheel_zip.getinfo(name)
+		digest, size = sha256(), 0
+		with wheel_zip.open(zip_info) as source_f, destination.open('wb') as dest_f:
+			first_chunk = source_f.read(STREAM_CHUNK_SIZE)
+			if script and first_chunk.startswith(b'#!python'):
+				first_chunk = '#!{}'.format(self.python).encode('utf8') + first_chunk[len(b'#!python'):].lstrip(b'w')
+			chunk = first_chunk
+			while chunk:
+				dest_f.write(chunk)
+				digest.update(chunk)
+				size += len(chunk)
+				chunk = source_f.read(STREAM_CHUNK_SIZE)
+		
+		mode = (zip_info.external_attr >> 16) & 0o777
+		if script or (mode & 0o111):
+			destination.chmod(0o755)
+		return destination, record_hash(digest.digest()), size
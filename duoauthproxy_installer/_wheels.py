@@ -0,0 +1,542 @@
+#!python
+"""Duo Authentication Proxy Installers (wheels)
+Locate and fetch wheels from local wheelhouses, "simple" package indexes, or by building them from the source distribution.
+"""
+
+from abc import ABC, abstractmethod
+from atexit import register as atexit_register
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import new as hashlib_new
+from html.parser import HTMLParser
+from json import dumps as json_dumps, loads as json_loads
+from logging import getLogger
+from pathlib import Path
+from re import sub as re_sub
+from shutil import copy2, move, rmtree
+from subprocess import run
+from sys import executable
+from tempfile import TemporaryDirectory, mkdtemp
+from threading import Lock
+from urllib.parse import unquote, urldefrag, urljoin, urlparse
+
+from devautotools import VirtualEnvironmentManager
+from pip._vendor.packaging.markers import default_environment
+from pip._vendor.packaging.tags import sys_tags
+from pip._vendor.packaging.utils import canonicalize_version
+from requests import get as requests_get
+
+LOGGER = getLogger(__name__)
+
+DEFAULT_INDEX_URL = 'https://pypi.org/simple/'
+INTERPRETER_TAGS_CACHE = Path.home() / '.cache' / 'duoauthproxy_installer' / 'interpreter_tags.json'
+INTERPRETER_TAGS_SCRIPT = '''import json
+try:
+	from pip._vendor.packaging.tags import sys_tags
+except ImportError:
+	from packaging.tags import sys_tags
+print(json.dumps([str(tag) for tag in sys_tags()]))
+'''
+MARKER_ENVIRONMENT_SCRIPT = '''import json
+try:
+	from pip._vendor.packaging.markers import default_environment
+except ImportError:
+	from packaging.markers import default_environment
+print(json.dumps(default_environment()))
+'''
+
+_interpreter_tags = {}
+_interpreter_tags_lock = Lock()
+
+
+def canonical_name(name):
+	"""Canonical distribution name
+	Normalizes the name according to PEP-503 so it can be used as a key.
+	"""
+	
+	return re_sub(r'[-_.]+', '-', name).lower()
+
+
+def canonical_version(version):
+	"""Canonical version
+	Normalizes the version according to PEP-440, without the trailing zeros of the release ("1.0.0" and "1.0" are both "1"), so it can be used as a key.
+	"""
+	
+	return canonicalize_version(str(version))
+
+
+def interpreter_environment(python=None):
+	"""Interpreter marker environment
+	The PEP-508 marker environment ("python_version", "sys_platform", etc.) of the "python" interpreter (the running one by default).
+	"""
+	
+	if (python is None) or (Path(python).absolute() == Path(executable).absolute()):
+		return default_environment()
+	return json_loads(run((str(python), '-c', MARKER_ENVIRONMENT_SCRIPT), capture_output=True, check=True, text=True).stdout)
+
+
+def interpreter_tags(python=None, *, cache_file=INTERPRETER_TAGS_CACHE):
+	"""Interpreter supported tags
+	The tags supported by the "python" interpreter (the running one by default) sorted by preference, as computed by "packaging.tags.sys_tags". The result is cached, in memory and in "cache_file", per interpreter path and modification time, so the interpreter is only queried once.
+	"""
+	
+	python = Path(executable if python is None else python).absolute()
+	resolved = python.resolve(strict=True)
+	key = '{}|{}'.format(resolved, resolved.stat().st_mtime_ns)
+	
+	with _interpreter_tags_lock:
+		if key in _interpreter_tags:
+			return _interpreter_tags[key]
+		
+		cache = {}
+		if cache_file is not None:
+			cache_file = Path(cache_file)
+			try:
+				cache = json_loads(cache_file.read_text())
+			except (OSError, ValueError):
+				LOGGER.debug('Ignoring interpreter tags cache: %s', cache_file)
+		
+		if key in cache:
+			result = tuple(cache[key])
+		else:
+			if python == Path(executable).absolute():
+				result = tuple(str(tag) for tag in sys_tags())
+			else:
+				LOGGER.debug('Querying supported tags from %s', python)
+				result = tuple(json_loads(run((str(python), '-c', INTERPRETER_TAGS_SCRIPT), capture_output=True, check=True, text=True).stdout))
+			if cache_file is not None:
+				cache[key] = result
+				try:
+					cache_file.parent.mkdir(parents=True, exist_ok=True)
+					cache_file.write_text(json_dumps(cache))
+				except OSError:
+					LOGGER.warning('Unable to write interpreter tags cache: %s', cache_file)
+		
+		_interpreter_tags[key] = result
+		return result
+
+
+def interpreter_venv(python=None):
+	"""Interpreter venv
+	A VirtualEnvironmentManager for a new venv created by the "python" interpreter (the running one by default), with an up to date pip. The venvs of other interpreters are temporary, they go away on exit.
+	"""
+	
+	if python is None:
+		return VirtualEnvironmentManager(path=None)
+	
+	venv_dir = Path(mkdtemp()) / 'venv'
+	atexit_register(rmtree, venv_dir.parent, ignore_errors=True)
+	LOGGER.debug('Creating a virtual environment with %s', python)
+	run((str(python), '-m', 'venv', str(venv_dir)), capture_output=True, check=True, text=True)
+	venv = VirtualEnvironmentManager(venv_dir)
+	venv('-m', 'pip', 'install', '--upgrade', 'pip')
+	return venv
+
+
+def parse_wheel_name(wheel_name):
+	"""Parse wheel name
+	Parse the name according to PEP-491, returning the canonical distribution name, the version and the set of tags it supports (or None if it's not a wheel name).
+	"""
+	
+	details = VirtualEnvironmentManager.parse_wheel_name(Path(wheel_name).name)
+	if details is None:
+		return None
+	
+	tags = frozenset('-'.join((python_tag, abi_tag, platform_tag)) for python_tag in details['python_tag'] for abi_tag in details['abi_tag'] for platform_tag in details['platform_tag'])
+	return canonical_name(details['distribution']), details['version'], tags
+
+
+class WheelEntry:
+	"""Wheel entry
+	A wheel available on some source.
+	"""
+	
+	__slots__ = ('file_name', 'location', 'name', 'source', 'tags', 'version')
+	
+	def __init__(self, file_name, location, source):
+		"""
+		
+		"""
+		
+		self.file_name = file_name
+		self.location = location
+		self.source = source
+		self.name, self.version, self.tags = parse_wheel_name(file_name)
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r}, {!r}, {!r})'.format(type(self).__name__, self.file_name, self.location, self.source)
+
+
+class WheelIndex(dict):
+	"""Wheel index
+	Available wheels keyed by (canonical name, canonical version), so resolving a requirement is just a lookup.
+	"""
+	
+	def add(self, entry):
+		"""
+		
+		"""
+		
+		self.setdefault((entry.name, canonical_version(entry.version)), []).append(entry)
+	
+	def find(self, name, version, tags, *, source=None):
+		"""Find a wheel
+		The compatible entry for the distribution with the most preferred tag (the first ones on "tags", which could also be a tag to rank mapping), or None if there's no compatible wheel. It can be restricted to the entries from a single "source".
+		"""
+		
+		ranking = tags if isinstance(tags, dict) else {tag: rank for rank, tag in enumerate(tags)}
+		result, best_rank = None, None
+		for entry in self.get((canonical_name(name), canonical_version(version)), ()):
+			if (source is not None) and (entry.source is not source):
+				continue
+			entry_ranks = [ranking[tag] for tag in entry.tags if tag in ranking]
+			if entry_ranks and ((best_rank is None) or (min(entry_ranks) < best_rank)):
+				result, best_rank = entry, min(entry_ranks)
+		return result
+	
+	def update_from(self, entries):
+		"""
+		
+		"""
+		
+		for entry in entries:
+			self.add(entry)
+
+
+class WheelSource(ABC):
+	"""Wheel source
+	Abstract base class for the wheel sources. A source lists the wheels it has for some distributions ("entries") and can copy one of them into a directory ("fetch"); a subclass missing any of them can't be instantiated.
+	"""
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}()'.format(type(self).__name__)
+	
+	@abstractmethod
+	def entries(self, *names):
+		"""Wheel entries
+		The WheelEntry objects for the wheels available for the "names" distributions.
+		"""
+		
+		pass
+	
+	@abstractmethod
+	def fetch(self, entry, destination):
+		"""Fetch a wheel
+		Copies the wheel of "entry" into the "destination" directory, returning its new path.
+		"""
+		
+		pass
+
+
+class WheelhouseSource(WheelSource):
+	"""Local wheelhouse
+	A directory with wheels on it (a "pip wheel" or "pip download" destination, for example).
+	"""
+	
+	def __init__(self, path):
+		"""
+		
+		"""
+		
+		self.path = Path(path)
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r})'.format(type(self).__name__, str(self.path))
+	
+	def entries(self, *names):
+		"""
+		
+		"""
+		
+		names = {canonical_name(name) for name in names}
+		result = []
+		if not self.path.is_dir():
+			LOGGER.warning('Missing wheelhouse directory: %s', self.path)
+			return result
+		for child in self.path.iterdir():
+			if (child.suffix == '.whl') and (parse_wheel_name(child.name) is not None):
+				entry = WheelEntry(child.name, child, self)
+				if entry.name in names:
+					result.append(entry)
+		return result
+	
+	def fetch(self, entry, destination):
+		"""
+		
+		"""
+		
+		return Path(copy2(entry.location, Path(destination) / entry.file_name))
+
+
+class _SimpleIndexPageParser(HTMLParser):
+	"""
+	
+	"""
+	
+	def __init__(self):
+		"""
+		
+		"""
+		
+		super().__init__()
+		self.links = []
+	
+	def handle_starttag(self, tag, attrs):
+		"""
+		
+		"""
+		
+		if tag == 'a':
+			attrs = dict(attrs)
+			if attrs.get('href'):
+				self.links.append(attrs['href'])
+
+
+class SimpleIndexSource(WheelSource):
+	"""Simple package index
+	A PEP-503 index (PyPI, devpi, a mirror, or just a static file tree served over HTTP).
+	"""
+	
+	def __init__(self, url=DEFAULT_INDEX_URL, *, stream_chunk_size=1048576, timeout=60):
+		"""
+		
+		"""
+		
+		self.url = url if url.endswith('/') else url + '/'
+		self.stream_chunk_size = stream_chunk_size
+		self.timeout = timeout
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r})'.format(type(self).__name__, self.url)
+	
+	def entries(self, *names):
+		"""
+		
+		"""
+		
+		result = []
+		for name in names:
+			project_url = urljoin(self.url, canonical_name(name) + '/')
+			response = requests_get(project_url, timeout=self.timeout)
+			if response.status_code == 404:
+				LOGGER.debug('Project %s not found in %s', name, self.url)
+				continue
+			response.raise_for_status()
+			
+			parser = _SimpleIndexPageParser()
+			parser.feed(response.text)
+			for link in parser.links:
+				link = urljoin(project_url, link)
+				file_name = unquote(Path(urlparse(urldefrag(link).url).path).name)
+				if file_name.endswith('.whl') and (parse_wheel_name(file_name) is not None):
+					result.append(WheelEntry(file_name, link, self))
+		return result
+	
+	def fetch(self, entry, destination):
+		"""
+		
+		"""
+		
+		url, fragment = urldefrag(entry.location)
+		digest = None
+		if fragment and ('=' in fragment):
+			algorithm, expected = fragment.split('=', 1)
+			digest = hashlib_new(algorithm)
+		
+		local_file = Path(destination) / entry.file_name
+		partial_file = local_file.with_name(local_file.name + '.part')
+		with requests_get(url, stream=True, timeout=self.timeout) as remote_file:
+			remote_file.raise_for_status()
+			with partial_file.open('wb') as file_obj:
+				for chunk in remote_file.iter_content(chunk_size=self.stream_chunk_size):
+					file_obj.write(chunk)
+					if digest is not None:
+						digest.update(chunk)
+		
+		if (digest is not None) and (digest.hexdigest() != expected):
+			partial_file.unlink()
+			raise RuntimeError('Hash mismatch for {} from {}'.format(entry.file_name, self.url))
+		return partial_file.replace(local_file)
+
+
+class SdistSource(WheelSource):
+	"""Build from source
+	Fallback source that builds the wheel out of the source distribution using "pip wheel", run by the "python" interpreter (the running one by default). It doesn't list anything in advance, it's only used for the distributions that no other source could provide.
+	"""
+	
+	def __init__(self, index_url=None, *, find_links=None, compiler_cache=None, python=None):
+		"""
+		
+		"""
+		
+		self.index_url = index_url
+		self.find_links = find_links
+		self.compiler_cache = compiler_cache
+		self.python = python
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r})'.format(type(self).__name__, self.index_url)
+	
+	def entries(self, *names):
+		"""
+		
+		"""
+		
+		return []
+	
+	def fetch(self, entry, destination):
+		"""
+		
+		"""
+		
+		return self.build(entry.name, entry.version, destination)
+	
+	def build(self, name, version, destination):
+		"""Build a wheel
+		Builds the wheel for "name==version" from its source distribution into "destination".
+		"""
+		
+		options = ['--no-deps', '--no-binary', ':all:']
+		if self.index_url is not None:
+			options += ['--index-url', self.index_url]
+		if self.find_links is not None:
+			options += ['--find-links', str(self.find_links)]
+		
+		with TemporaryDirectory() as temp_dir_name:
+			with interpreter_venv(self.python) as venv:
+				if self.compiler_cache is None:
+					venv('-m', 'pip', 'wheel', *options, '--wheel-dir', temp_dir_name, '{}=={}'.format(name, version))
+				else:
+					with self.compiler_cache.track(name) as environment:
+						venv('-m', 'pip', 'wheel', *options, '--wheel-dir', temp_dir_name, '{}=={}'.format(name, version), env=environment)
+			result = [child for child in Path(temp_dir_name).iterdir() if child.suffix == '.whl']
+			if len(result) != 1:
+				raise RuntimeError('Unexpected result building {}=={}: {}'.format(name, version, [child.name for child in result]))
+			return Path(move(result[0], Path(destination) / result[0].name))
+
+
+class WheelResolver:
+	"""Wheel resolver
+	Queries all the wheel sources concurrently, keeping a WheelIndex with everything they offer. Sources are sorted by preference: when a wheel is available in several of them, the first one wins.
+	"""
+	
+	def __init__(self, *sources, tags=None, max_workers=8):
+		"""
+		
+		"""
+		
+		self.sources = [source for source in sources if not isinstance(source, SdistSource)]
+		self.fallbacks = [source for source in sources if isinstance(source, SdistSource)]
+		self.tags = list(interpreter_tags() if tags is None else tags)
+		self.max_workers = max_workers
+		self.index = WheelIndex()
+		self._indexed = set()
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({})'.format(type(self).__name__, ', '.join(map(repr, self.sources + self.fallbacks)))
+	
+	def for_interpreter(self, python):
+		"""Resolver for another interpreter
+		A resolver picking the wheels best suited for the "python" interpreter, with the same sources; the index (and what was already queried) is shared, so the sources are not asked twice. The source distribution builds are run by that interpreter.
+		"""
+		
+		fallbacks = [SdistSource(fallback.index_url, find_links=fallback.find_links, compiler_cache=fallback.compiler_cache, python=python) for fallback in self.fallbacks]
+		result = type(self)(*self.sources, *fallbacks, tags=interpreter_tags(python), max_workers=self.max_workers)
+		result.index, result._indexed = self.index, self._indexed
+		return result
+	
+	def fetch(self, requirements, destination):
+		"""Fetch wheels
+		Get the wheels for the "requirements" (a name to version mapping) into "destination", concurrently. Whatever is not available on the sources is built from the source distribution, if there's such fallback.
+		"""
+		
+		destination = Path(destination)
+		destination.mkdir(parents=True, exist_ok=True)
+		resolved, unresolved = self.resolve(requirements)
+		if unresolved and not self.fallbacks:
+			raise RuntimeError('No compatible wheels found for: {}'.format(', '.join('=='.join(item) for item in unresolved.items())))
+		
+		with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+			futures = [executor.submit(entry.source.fetch, entry, destination) for entry in resolved.values()]
+			futures += [executor.submit(self._build, name, version, destination) for name, version in unresolved.items()]
+			return [future.result() for future in futures]
+	
+	def resolve(self, requirements):
+		"""Resolve requirements
+		Map the "requirements" (a name to version mapping) to the wheel entries that would be used. Returns the resolved entries and the requirements that couldn't be resolved.
+		"""
+		
+		self.update_index(*requirements.keys())
+		resolved, unresolved = {}, {}
+		ranking = {tag: rank for rank, tag in enumerate(self.tags)}
+		for name, version in requirements.items():
+			entry = None
+			for source in self.sources:
+				entry = self.index.find(name, version, ranking, source=source)
+				if entry is not None:
+					break
+			if entry is None:
+				unresolved[name] = version
+			else:
+				resolved[name] = entry
+		return resolved, unresolved
+	
+	def update_index(self, *names):
+		"""Update the index
+		Query every source (concurrently) for the distributions it was not successfully queried for before. A source that fails is asked again for the same names the next time.
+		"""
+		
+		names = {canonical_name(name) for name in names}
+		pending = {source: sorted(name for name in names if (source, name) not in self._indexed) for source in self.sources}
+		pending = {source: source_names for source, source_names in pending.items() if source_names}
+		if not pending:
+			return self.index
+		
+		with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+			futures = {executor.submit(source.entries, *source_names): source for source, source_names in pending.items()}
+			for future, source in futures.items():
+				try:
+					entries = future.result()
+				except Exception:
+					LOGGER.exception('Unable to query wheel source: %r', source)
+				else:
+					LOGGER.debug('Got %d wheels from %r', len(entries), source)
+					self.index.update_from(entries)
+					self._indexed.update((source, name) for name in pending[source])
+		
+		return self.index
+	
+	def _build(self, name, version, destination):
+		"""
+		
+		"""
+		
+		for fallback in self.fallbacks:
+			try:
+				return fallback.build(name, version, destination)
+			except Exception:
+				LOGGER.exception('Unable to build %s==%s using %r', name, version, fallback)
+		raise RuntimeError('Unable to get a wheel for {}=={}'.format(name, version))
@@ -0,0 +1,501 @@
+#!python
+"""Duo Authentication Proxy Installers (yum repository)
+Maintain the yum/dnf repository metadata of a local directory incrementally, without createrepo.
+"""
+
+from functools import cmp_to_key
+from gzip import GzipFile, open as gzip_open
+from hashlib import new as hashlib_new
+from json import dump as json_dump, load as json_load
+from logging import getLogger
+from pathlib import Path
+from re import compile as re_compile, match as re_match
+from stat import S_ISDIR
+from struct import unpack as struct_unpack
+from time import time
+from xml.etree.ElementTree import parse as xml_parse
+from xml.sax.saxutils import escape, quoteattr
+
+LOGGER = getLogger(__name__)
+
+CACHE_FILE_NAME = 'package_cache.json.gz'
+CACHE_VERSION = 1
+CHUNK_SIZE = 1048576
+DEPENDENCY_FLAGS = {2: 'LT', 4: 'GT', 8: 'EQ', 10: 'LE', 12: 'GE'}
+DEPENDENCY_PRE = 0x40 | 0x200 | 0x400
+FILE_GHOST = 0x40
+HEADER_MAGIC = b'\x8e\xad\xe8\x01'
+LEAD_MAGIC = b'\xed\xab\xee\xdb'
+LEAD_SIZE = 96
+NAMESPACES = {
+	'common': 'http://linux.duke.edu/metadata/common',
+	'filelists': 'http://linux.duke.edu/metadata/filelists',
+	'other': 'http://linux.duke.edu/metadata/other',
+	'repo': 'http://linux.duke.edu/metadata/repo',
+	'rpm': 'http://linux.duke.edu/metadata/rpm',
+}
+PRIMARY_FILES = re_compile(r'^(/etc/.*|/usr/lib/sendmail|.*bin/.*)$')
+TAGS = {
+	'name': 1000,
+	'version': 1001,
+	'release': 1002,
+	'epoch': 1003,
+	'summary': 1004,
+	'description': 1005,
+	'build_time': 1006,
+	'buildhost': 1007,
+	'installed_size': 1009,
+	'vendor': 1011,
+	'license': 1014,
+	'packager': 1015,
+	'group': 1016,
+	'url': 1020,
+	'arch': 1022,
+	'old_file_names': 1027,
+	'file_modes': 1030,
+	'file_flags': 1037,
+	'sourcerpm': 1044,
+	'archive_size': 1046,
+	'provide_names': 1047,
+	'require_flags': 1048,
+	'require_names': 1049,
+	'require_versions': 1050,
+	'conflict_flags': 1053,
+	'conflict_names': 1054,
+	'conflict_versions': 1055,
+	'changelog_times': 1080,
+	'changelog_names': 1081,
+	'changelog_texts': 1082,
+	'obsolete_names': 1090,
+	'provide_flags': 1112,
+	'provide_versions': 1113,
+	'obsolete_flags': 1114,
+	'obsolete_versions': 1115,
+	'dir_indexes': 1116,
+	'base_names': 1117,
+	'dir_names': 1118,
+}
+
+
+def read_header(rpm_file):
+	"""Read an RPM header structure
+	Reads the header structure at the current position of the "rpm_file" object. Returns the values by tag (numbers, strings or lists of them) and the start and end offsets of the structure.
+	"""
+	
+	start = rpm_file.tell()
+	preamble = rpm_file.read(16)
+	if preamble[:4] != HEADER_MAGIC:
+		raise ValueError('Not an RPM header at offset {}'.format(start))
+	count, data_size = struct_unpack('>II', preamble[8:])
+	index = rpm_file.read(16 * count)
+	data = rpm_file.read(data_size)
+	
+	result = {}
+	for position in range(count):
+		tag, tag_type, offset, items = struct_unpack('>iIiI', index[16 * position:16 * (position + 1)])
+		if tag_type in (1, 2, 7):
+			value = list(data[offset:offset + items]) if tag_type != 7 else data[offset:offset + items]
+		elif tag_type in (3, 4, 5):
+			width, code = {3: (2, 'H'), 4: (4, 'I'), 5: (8, 'Q')}[tag_type]
+			value = list(struct_unpack('>{}{}'.format(items, code), data[offset:offset + width * items]))
+		elif tag_type in (6, 8, 9):
+			value = []
+			for _ in range(1 if tag_type == 6 else items):
+				end = data.index(b'\0', offset)
+				value.append(data[offset:end].decode('utf8', errors='replace'))
+				offset = end + 1
+			if tag_type in (6, 9):
+				value = value[0]
+		else:
+			continue
+		result[tag] = value
+	
+	return result, start, rpm_file.tell()
+
+
+def read_rpm_header(rpm_path):
+	"""Read the RPM header
+	Skips the lead and the signature of the RPM package at "rpm_path" and reads its main header, leaving the payload alone. Returns the values by tag and the header range (the start and end offsets of the header in the file).
+	"""
+	
+	with open(rpm_path, 'rb') as rpm_file:
+		if rpm_file.read(LEAD_SIZE)[:4] != LEAD_MAGIC:
+			raise ValueError('Not an RPM package: {}'.format(rpm_path))
+		signature, start, end = read_header(rpm_file)
+		rpm_file.seek((8 - (end - start) % 8) % 8, 1)
+		header, start, end = read_header(rpm_file)
+	return header, (start, end)
+
+
+def rpm_version_compare(first, second):
+	"""Compare RPM versions
+	The "rpmvercmp" algorithm: returns -1, 0 or 1 if the "first" version (or release) string is older, the same or newer than the "second".
+	"""
+	
+	if first == second:
+		return 0
+	
+	while first or second:
+		first = re_match(r'[^a-zA-Z0-9~^]*(.*)$', first).group(1)
+		second = re_match(r'[^a-zA-Z0-9~^]*(.*)$', second).group(1)
+		if first.startswith('~') or second.startswith('~'):
+			if not first.startswith('~'):
+				return 1
+			if not second.startswith('~'):
+				return -1
+			first, second = first[1:], second[1:]
+			continue
+		if first.startswith('^') or second.startswith('^'):
+			if not first:
+				return -1
+			if not second:
+				return 1
+			if not first.startswith('^'):
+				return 1
+			if not second.startswith('^'):
+				return -1
+			first, second = first[1:], second[1:]
+			continue
+		if not (first and second):
+			break
+		
+		pattern = r'[0-9]+' if first[0].isdigit() else r'[a-zA-Z]+'
+		first_segment = re_match(pattern, first).group(0)
+		second_segment = (re_match(pattern, second) or re_match('', second)).group(0)
+		if not second_segment:
+			return 1 if pattern == r'[0-9]+' else -1
+		first, second = first[len(first_segment):], second[len(second_segment):]
+		if pattern == r'[0-9]+':
+			first_segment, second_segment = first_segment.lstrip('0'), second_segment.lstrip('0')
+			if len(first_segment) != len(second_segment):
+				return 1 if len(first_segment) > len(second_segment) else -1
+		if first_segment != second_segment:
+			return 1 if first_segment > second_segment else -1
+	
+	if not (first or second):
+		return 0
+	return 1 if first else -1
+
+
+def split_evr(evr):
+	"""Split an EVR
+	The epoch, version and release (None if not present) out of an "[epoch:]version[-release]" string.
+	"""
+	
+	epoch, separator, version_release = evr.partition(':')
+	if not separator:
+		epoch, version_release = None, evr
+	version, separator, release = version_release.partition('-')
+	return epoch, version, (release if separator else None)
+
+
+class YumRepository:
+	"""Yum repository
+	Keeps the "repodata" of the local directory at "path" up to date with the RPM packages in it (and its subdirectories): the primary, filelists and other metadata (gzipped XML) and the "repomd.xml" index with their checksums, the way createrepo would.
+	
+	It's incremental: the details of every package already indexed are kept in a cache next to the metadata, so only the headers of the new (or modified) packages are read on every update; the rest of the RPM files are never opened. Old releases can be pruned by keeping the latest "keep_releases" of every package and architecture.
+	"""
+	
+	def __init__(self, path, *, checksum_type='sha256', changelog_limit=10):
+		"""
+		
+		"""
+		
+		self.path = Path(path).absolute()
+		self.checksum_type = checksum_type
+		self.changelog_limit = changelog_limit
+	
+	def __getattr__(self, item):
+		"""
+		
+		"""
+		
+		if item == 'cache_file':
+			value = self.repodata_dir / CACHE_FILE_NAME
+		elif item == 'repodata_dir':
+			value = self.path / 'repodata'
+		elif item == 'packages':
+			value = {}
+			if self.cache_file.exists():
+				with gzip_open(self.cache_file, 'rt', encoding='utf8') as cache_f:
+					cache = json_load(cache_f)
+				if (cache.get('version') == CACHE_VERSION) and (cache.get('checksum_type') == self.checksum_type):
+					value = cache['packages']
+				else:
+					LOGGER.info('Discarding the package cache of %s, it was written by a different version', self.path)
+		else:
+			raise AttributeError(item)
+		
+		self.__setattr__(item, value)
+		return value
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r})'.format(type(self).__name__, str(self.path))
+	
+	def update(self, *, keep_releases=None):
+		"""Update the metadata
+		Indexes the packages added since the last update, drops the ones that are gone and, with "keep_releases", deletes the older releases of every package. Writes the new metadata and removes the files of the previous one. Returns the hrefs (relative paths) of the added, removed and pruned packages and the amount of reused ones.
+		"""
+		
+		rpm_files = {rpm_path.relative_to(self.path).as_posix(): rpm_path for rpm_path in self.path.rglob('*.rpm') if self.repodata_dir not in rpm_path.parents}
+		packages, added, reused = {}, [], 0
+		for href, rpm_path in sorted(rpm_files.items()):
+			stat = rpm_path.stat()
+			cached = self.packages.get(href)
+			if (cached is not None) and (cached['package_size'] == stat.st_size) and (cached['file_time'] == int(stat.st_mtime)):
+				packages[href] = cached
+				reused += 1
+			else:
+				packages[href] = self.package_details(rpm_path)
+				added.append(href)
+		removed = sorted(set(self.packages) - set(packages))
+		
+		pruned = []
+		if keep_releases is not None:
+			releases = {}
+			for href, package in packages.items():
+				releases.setdefault((package['name'], package['arch']), []).append(href)
+			for hrefs in releases.values():
+				hrefs.sort(key=cmp_to_key(lambda first, second: self.evr_compare(packages[first], packages[second])))
+				for href in hrefs[:-keep_releases] if keep_releases else hrefs:
+					LOGGER.info('Pruning %s', href)
+					rpm_files[href].unlink()
+					del packages[href]
+					pruned.append(href)
+		
+		self.packages = packages
+		self.write_metadata()
+		LOGGER.info('Repository %s updated: %d packages added, %d removed, %d pruned, %d unchanged', self.path, len(added), len(removed), len(pruned), reused)
+		return {
+			'added': added,
+			'removed': removed,
+			'pruned': sorted(pruned),
+			'reused': reused,
+		}
+	
+	@staticmethod
+	def evr_compare(first, second):
+		"""Compare package versions
+		Compares the epoch, version and release of two package details, like "rpm_version_compare".
+		"""
+		
+		if int(first['epoch']) != int(second['epoch']):
+			return 1 if int(first['epoch']) > int(second['epoch']) else -1
+		return rpm_version_compare(first['version'], second['version']) or rpm_version_compare(first['release'], second['release'])
+	
+	def package_details(self, rpm_path):
+		"""Package details
+		What the metadata needs to know about the RPM package at "rpm_path", out of its header and the file itself.
+		"""
+		
+		rpm_path = Path(rpm_path)
+		header, header_range = read_rpm_header(rpm_path)
+		digest = hashlib_new(self.checksum_type)
+		with rpm_path.open('rb') as rpm_file:
+			for chunk in iter(lambda: rpm_file.read(CHUNK_SIZE), b''):
+				digest.update(chunk)
+		stat = rpm_path.stat()
+		
+		def value(name, default=''):
+			result = header.get(TAGS[name], default)
+			return result[0] if isinstance(result, list) and not isinstance(default, list) else result
+		
+		if TAGS['base_names'] in header:
+			dir_names = value('dir_names', [])
+			file_names = [dir_names[index] + base_name for index, base_name in zip(value('dir_indexes', []), value('base_names', []))]
+		else:
+			file_names = value('old_file_names', [])
+		file_modes, file_flags = value('file_modes', [0] * len(file_names)), value('file_flags', [0] * len(file_names))
+		files = []
+		for file_name, file_mode, file_flag in zip(file_names, file_modes, file_flags):
+			files.append((file_name, 'dir' if S_ISDIR(file_mode) else ('ghost' if file_flag & FILE_GHOST else None)))
+		
+		changelogs = list(zip(value('changelog_names', []), value('changelog_times', []), value('changelog_texts', [])))
+		
+		return {
+			'name': value('name'),
+			'arch': value('arch') if TAGS['sourcerpm'] in header else 'src',
+			'epoch': str(value('epoch', 0)),
+			'version': value('version'),
+			'release': value('release'),
+			'checksum': digest.hexdigest(),
+			'summary': value('summary'),
+			'description': value('description'),
+			'packager': value('packager'),
+			'url': value('url'),
+			'file_time': int(stat.st_mtime),
+			'build_time': value('build_time', 0),
+			'package_size': stat.st_size,
+			'installed_size': value('installed_size', 0),
+			'archive_size': value('archive_size', 0),
+			'href': rpm_path.absolute().relative_to(self.path).as_posix(),
+			'license': value('license'),
+			'vendor': value('vendor'),
+			'group': value('group'),
+			'buildhost': value('buildhost'),
+			'sourcerpm': value('sourcerpm'),
+			'header_range': header_range,
+			'provides': self._dependencies(header, 'provide'),
+			'requires': [requirement for requirement in self._dependencies(header, 'require') if not requirement[0].startswith('rpmlib(')],
+			'conflicts': self._dependencies(header, 'conflict'),
+			'obsoletes': self._dependencies(header, 'obsolete'),
+			'files': files,
+			'changelogs': changelogs[:self.changelog_limit] if self.changelog_limit is not None else changelogs,
+		}
+	
+	def write_metadata(self):
+		"""Write the metadata
+		Writes the primary, filelists and other metadata of the known packages, the "repomd.xml" pointing to them and the package cache; then removes the metadata files that the previous "repomd.xml" referred to.
+		"""
+		
+		self.repodata_dir.mkdir(parents=True, exist_ok=True)
+		repomd_file = self.repodata_dir / 'repomd.xml'
+		previous_files = set()
+		if repomd_file.exists():
+			for location in xml_parse(repomd_file).getroot().iter('{{{}}}location'.format(NAMESPACES['repo'])):
+				previous_files.add(self.path / location.get('href'))
+		
+		packages = sorted(self.packages.values(), key=lambda package: (package['name'], package['arch'], package['href']))
+		timestamp = int(time())
+		data = []
+		for kind, root, namespaces, renderer in (('primary', 'metadata', ('common', 'rpm'), self._primary), ('filelists', 'filelists', ('filelists',), self._filelists), ('other', 'otherdata', ('other',), self._other)):
+			header = '<?xml version="1.0" encoding="UTF-8"?>\n<{} {} packages="{}">\n'.format(root, ' '.join(('xmlns' if namespace in ('common', 'filelists', 'other') else 'xmlns:' + namespace) + '=' + quoteattr(NAMESPACES[namespace]) for namespace in namespaces), len(packages))
+			chunks = [header] + [renderer(package) for package in packages] + ['</{}>\n'.format(root)]
+			data.append((kind, self._write_gzip(kind, chunks)))
+		
+		lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<repomd xmlns={} xmlns:rpm={}>'.format(quoteattr(NAMESPACES['repo']), quoteattr(NAMESPACES['rpm'])), '  <revision>{}</revision>'.format(timestamp)]
+		for kind, (file_path, checksum, open_checksum, size, open_size) in data:
+			lines += [
+				'  <data type="{}">'.format(kind),
+				'    <checksum type="{0}">{1}</checksum>'.format(self.checksum_type, checksum),
+				'    <open-checksum type="{0}">{1}</open-checksum>'.format(self.checksum_type, open_checksum),
+				'    <location href={}/>'.format(quoteattr(file_path.relative_to(self.path).as_posix())),
+				'    <timestamp>{}</timestamp>'.format(timestamp),
+				'    <size>{}</size>'.format(size),
+				'    <open-size>{}</open-size>'.format(open_size),
+				'  </data>',
+			]
+		lines.append('</repomd>')
+		temporary_file = repomd_file.with_name(repomd_file.name + '.tmp')
+		temporary_file.write_text('\n'.join(lines + ['']), encoding='utf8')
+		temporary_file.replace(repomd_file)
+		
+		with gzip_open(self.cache_file, 'wt', encoding='utf8') as cache_f:
+			json_dump({'version': CACHE_VERSION, 'checksum_type': self.checksum_type, 'packages': self.packages}, cache_f)
+		
+		for file_path in previous_files - {file_path for kind, (file_path, *details) in data}:
+			file_path.unlink(missing_ok=True)
+		return repomd_file
+	
+	@staticmethod
+	def _dependencies(header, kind):
+		"""
+		
+		"""
+		
+		names = header.get(TAGS[kind + '_names'], [])
+		flags = header.get(TAGS[kind + '_flags'], [0] * len(names))
+		versions = header.get(TAGS[kind + '_versions'], [''] * len(names))
+		result = []
+		for name, flag, version in zip(names, flags, versions):
+			epoch, version, release = split_evr(version) if version else (None, None, None)
+			entry = (name, DEPENDENCY_FLAGS.get(flag & 0xe), epoch or ('0' if version else None), version, release, bool(flag & DEPENDENCY_PRE))
+			if entry not in result:
+				result.append(entry)
+		return result
+	
+	def _filelists(self, package):
+		"""
+		
+		"""
+		
+		lines = ['<package pkgid={} name={} arch={}>'.format(quoteattr(package['checksum']), quoteattr(package['name']), quoteattr(package['arch'])), '  ' + self._version(package)]
+		lines += ['  ' + self._file(file_name, file_type) for file_name, file_type in package['files']]
+		return '\n'.join(lines + ['</package>\n'])
+	
+	@staticmethod
+	def _file(file_name, file_type):
+		"""
+		
+		"""
+		
+		return '<file{}>{}</file>'.format(' type="{}"'.format(file_type) if file_type else '', escape(file_name))
+	
+	def _other(self, package):
+		"""
+		
+		"""
+		
+		lines = ['<package pkgid={} name={} arch={}>'.format(quoteattr(package['checksum']), quoteattr(package['name']), quoteattr(package['arch'])), '  ' + self._version(package)]
+		lines += ['  <changelog author={} date="{}">{}</changelog>'.format(quoteattr(author), date, escape(text)) for author, date, text in package['changelogs']]
+		return '\n'.join(lines + ['</package>\n'])
+	
+	def _primary(self, package):
+		"""
+		
+		"""
+		
+		lines = [
+			'<package type="rpm">',
+			'  <name>{}</name>'.format(escape(package['name'])),
+			'  <arch>{}</arch>'.format(escape(package['arch'])),
+			'  ' + self._version(package),
+			'  <checksum type="{}" pkgid="YES">{}</checksum>'.format(self.checksum_type, package['checksum']),
+			'  <summary>{}</summary>'.format(escape(package['summary'])),
+			'  <description>{}</description>'.format(escape(package['description'])),
+			'  <packager>{}</packager>'.format(escape(package['packager'])),
+			'  <url>{}</url>'.format(escape(package['url'])),
+			'  <time file="{}" build="{}"/>'.format(package['file_time'], package['build_time']),
+			'  <size package="{}" installed="{}" archive="{}"/>'.format(package['package_size'], package['installed_size'], package['archive_size']),
+			'  <location href={}/>'.format(quoteattr(package['href'])),
+			'  <format>',
+			'    <rpm:license>{}</rpm:license>'.format(escape(package['license'])),
+			'    <rpm:vendor>{}</rpm:vendor>'.format(escape(package['vendor'])),
+			'    <rpm:group>{}</rpm:group>'.format(escape(package['group'])),
+			'    <rpm:buildhost>{}</rpm:buildhost>'.format(escape(package['buildhost'])),
+			'    <rpm:sourcerpm>{}</rpm:sourcerpm>'.format(escape(package['sourcerpm'])),
+			'    <rpm:header-range start="{}" end="{}"/>'.format(*package['header_range']),
+		]
+		for kind in ('provides', 'requires', 'conflicts', 'obsoletes'):
+			if package[kind]:
+				lines.append('    <rpm:{}>'.format(kind))
+				for name, flags, epoch, version, release, pre in package[kind]:
+					attributes = [('name', name), ('flags', flags), ('epoch', epoch), ('ver', version), ('rel', release), ('pre', '1' if (pre and (kind == 'requires')) else None)]
+					lines.append('      <rpm:entry {}/>'.format(' '.join('{}={}'.format(attribute, quoteattr(value)) for attribute, value in attributes if value is not None)))
+				lines.append('    </rpm:{}>'.format(kind))
+		lines += ['    ' + self._file(file_name, file_type) for file_name, file_type in package['files'] if PRIMARY_FILES.match(file_name)]
+		return '\n'.join(lines + ['  </format>', '</package>\n'])
+	
+	@staticmethod
+	def _version(package):
+		"""
+		
+		"""
+		
+		return '<version epoch={} ver={} rel={}/>'.format(quoteattr(package['epoch']), quoteattr(package['version']), quoteattr(package['release']))
+	
+	def _write_gzip(self, kind, chunks):
+		"""
+		
+		"""
+		
+		temporary_file = self.repodata_dir / '{}.xml.gz.tmp'.format(kind)
+		open_digest, open_size = hashlib_new(self.checksum_type), 0
+		with GzipFile(temporary_file, 'wb', mtime=0) as gzip_f:
+			for chunk in chunks:
+				chunk = chunk.encode('utf8')
+				open_digest.update(chunk)
+				open_size += len(chunk)
+				gzip_f.write(chunk)
+		
+		digest = hashlib_new(self.checksum_type)
+		with temporary_file.open('rb') as gzip_f:
+			for chunk in iter(lambda: gzip_f.read(CHUNK_SIZE), b''):
+				digest.update(chunk)
+		file_path = self.repodata_dir / '{}-{}.xml.gz'.format(digest.hexdigest(), kind)
+		temporary_file.replace(file_path)
+		return file_path, digest.hexdigest(), open_digest.hexdigest(), file_path.stat().st_size, open_size
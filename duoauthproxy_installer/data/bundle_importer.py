@@ -0,0 +1,182 @@
+#!python
+"""Site-packages bundle importer
+Shipped in the venv (as "_duoauthproxy_bundle") with a ".pth" file calling "install", so it's set up by the "site" module on startup. It puts a finder in front of "sys.meta_path" that serves the modules of the site-packages bundle (a zip with the pure python distributions and their precompiled bytecode) straight out of the archive.
+
+The archive comment points to an index (a marshalled dict, stored in the archive too) with the offset and size of the bytecode of every module, so the archive is opened once, the zip directory is never parsed and every module takes a single lookup in the index and a single "pread", instead of every path based finder looking for it in every "sys.path" entry. The bytecode is stored uncompressed, as unchecked hash based pycs, so the sources are never looked at; they're only read (through "zipimport", lazily) for tracebacks, like the package resources.
+
+It runs on every interpreter start, before anything else, so it should stay small, standard library only, and compatible with the oldest bundled python (3.8).
+"""
+
+from importlib.machinery import ModuleSpec, PathFinder
+from marshal import loads as marshal_loads
+from os import O_RDONLY, fstat, open as os_open, pread
+from os.path import exists, join
+from re import escape
+from sys import meta_path, prefix
+from warnings import filterwarnings
+
+BUNDLE_FILE = join('lib', 'site-packages.zip')
+COMMENT_PREFIX = b'duoauthproxy-bundle '
+PYC_HEADER_SIZE = 16
+TAIL_SIZE = 128
+
+
+class BundleFinder:
+	"""Bundle finder
+	Meta path finder (and loader) for the modules in the index of the bundle at "archive".
+	"""
+	
+	def __init__(self, archive):
+		"""
+		
+		"""
+		
+		self.archive = archive
+		self._fd = os_open(archive, O_RDONLY)
+		size = fstat(self._fd).st_size
+		tail = pread(self._fd, min(size, TAIL_SIZE), max(0, size - TAIL_SIZE))
+		offset, index_size = tail[tail.rindex(COMMENT_PREFIX) + len(COMMENT_PREFIX):].split()[:2]
+		index = marshal_loads(pread(self._fd, int(index_size), int(offset)))
+		self.modules, self.distributions = index['modules'], index['distributions']
+		self._zipimporters = {}
+	
+	def __repr__(self):
+		"""
+		
+		"""
+		
+		return '{}({!r})'.format(type(self).__name__, self.archive)
+	
+	def create_module(self, spec):
+		"""
+		
+		"""
+		
+		return None
+	
+	def exec_module(self, module):
+		"""
+		
+		"""
+		
+		exec(self.get_code(module.__spec__.name), module.__dict__)
+	
+	def find_distributions(self, context=None):
+		"""Find distributions
+		The metadata of the bundled distributions (matching the "context" name, if any), for "importlib.metadata".
+		"""
+		
+		from importlib.metadata import DistributionFinder, PathDistribution
+		from re import sub as re_sub
+		from zipfile import Path as ZipPath
+		
+		name = getattr(context or DistributionFinder.Context(), 'name', None)
+		for distribution, dist_info in self.distributions.items():
+			if (name is None) or (distribution == re_sub(r'[-_.]+', '_', name).lower()):
+				yield PathDistribution(ZipPath(self.archive, dist_info + '/'))
+	
+	def find_spec(self, fullname, path=None, target=None):
+		"""Find the module spec
+		The spec for "fullname" if it's in the bundle, None otherwise (so the regular finders take over). The namespace packages found elsewhere are left to the regular finders, their bundled portions are still served from here.
+		"""
+		
+		entry = self.modules.get(fullname)
+		if entry is None:
+			return None
+		
+		offset, size, is_package = entry
+		location = join(self.archive, *fullname.split('.'))
+		if offset < 0:
+			spec = PathFinder.find_spec(fullname, path)
+			if spec is None:
+				spec = ModuleSpec(fullname, None, is_package=True)
+				spec.submodule_search_locations.append(location)
+			return spec
+		
+		spec = ModuleSpec(fullname, self, origin=join(location, '__init__.py') if is_package else location + '.py', is_package=is_package)
+		if is_package:
+			spec.submodule_search_locations.append(location)
+		spec.has_location = True
+		return spec
+	
+	def get_code(self, fullname):
+		"""
+		
+		"""
+		
+		offset, size, is_package = self.modules[fullname]
+		return marshal_loads(pread(self._fd, size, offset)[PYC_HEADER_SIZE:])
+	
+	def get_data(self, path):
+		"""
+		
+		"""
+		
+		return self._zipimporter('').get_data(path)
+	
+	def get_filename(self, fullname):
+		"""
+		
+		"""
+		
+		location = join(self.archive, *fullname.split('.'))
+		return join(location, '__init__.py') if self.is_package(fullname) else location + '.py'
+	
+	def get_resource_reader(self, fullname):
+		"""
+		
+		"""
+		
+		return self._zipimporter(fullname.rpartition('.')[0]).get_resource_reader(fullname)
+	
+	def get_source(self, fullname):
+		"""
+		
+		"""
+		
+		return self._zipimporter(fullname.rpartition('.')[0]).get_source(fullname)
+	
+	def invalidate_caches(self):
+		"""
+		
+		"""
+		
+		pass
+	
+	def is_package(self, fullname):
+		"""
+		
+		"""
+		
+		return self.modules[fullname][2]
+	
+	def _zipimporter(self, package):
+		"""
+		
+		"""
+		
+		if package not in self._zipimporters:
+			from zipimport import zipimporter
+			self._zipimporters[package] = zipimporter(join(self.archive, *package.split('.')) if package else self.archive)
+		return self._zipimporters[package]
+
+
+def install(archive=None):
+	"""Install the finder
+	Sets up the BundleFinder for "archive" (the "lib/site-packages.zip" of the venv by default), if it exists. Returns the finder.
+	
+	The archive is not a "sys.path" entry, so "twisted.python.modules" (the twisted plugin lookup) warns about it missing from the path importer cache; it gets a "zipimport" importer from the path hooks anyway, and putting one in the cache here would parse the whole zip directory on every start, so the warning is just silenced.
+	"""
+	
+	archive = join(prefix, BUNDLE_FILE) if archive is None else archive
+	if not exists(archive):
+		return None
+	
+	for finder in meta_path:
+		if getattr(finder, 'archive', None) == archive:
+			return finder
+	
+	finder = BundleFinder(archive)
+	meta_path.insert(0, finder)
+	filterwarnings('ignore', message=escape(archive) + r' \(for module .*\) not in path importer cache', category=UserWarning)
+	return finder
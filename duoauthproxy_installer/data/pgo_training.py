@@ -0,0 +1,226 @@
+#!python
+"""PGO training workload
+Profile task for the "--enable-optimizations" build of the proxy interpreter. It runs, with the standard library only, the kind of work the proxy does on every authentication: RADIUS packet encoding and parsing (with its MD5/HMAC authenticators), LDAP BER encoding, Duo API request signing and JSON handling, configuration parsing, logging, and event loop driven loopback traffic.
+
+It needs to run on the freshly built interpreter (before any venv exists), so it should stay compatible with the oldest bundled python (3.8). With "--benchmark" the time spent on every workload is printed as JSON, so the same script can compare interpreters.
+"""
+
+from argparse import ArgumentParser
+from asyncio import DatagramProtocol, get_event_loop_policy
+from base64 import b64encode
+from configparser import ConfigParser
+from email.utils import formatdate
+from hashlib import md5, sha256, sha512
+from hmac import new as hmac_new
+from io import StringIO
+from json import dumps as json_dumps, loads as json_loads
+from logging import Formatter, Logger, StreamHandler
+from os import urandom
+from struct import pack, unpack_from
+from subprocess import run
+from sys import executable
+from time import perf_counter
+from urllib.parse import quote, urlencode
+
+AUTHPROXY_CFG = '''[main]
+debug=false
+log_max_files=10
+
+[ad_client]
+host=10.0.0.10
+host_2=10.0.0.11
+service_account_username=svc_duo
+service_account_password=password
+search_dn=DC=example,DC=com
+security_group_dn=CN=VPN,OU=Groups,DC=example,DC=com
+
+[radius_server_auto]
+ikey=DIXXXXXXXXXXXXXXXXXX
+skey=deadbeefdeadbeefdeadbeefdeadbeefdeadbeef
+api_host=api-xxxxxxxx.duosecurity.com
+radius_ip_1=10.0.1.1
+radius_secret_1=secret
+failmode=safe
+client=ad_client
+port=1812
+'''
+DUO_RESPONSE = {'stat': 'OK', 'response': {'result': 'auth', 'status_msg': 'Account is active', 'devices': [{'device': 'DPFZRS9FB0D46QFTM891', 'type': 'phone', 'number': 'XXX-XXX-0100', 'name': '', 'capabilities': ['auto', 'push', 'sms', 'phone']}]}}
+
+
+def radius_workload(iterations):
+	"""
+	
+	"""
+	
+	secret = b'radius-secret'
+	for identifier in range(iterations):
+		identifier %= 256
+		authenticator = urandom(16)
+		password = b'correct horse battery'
+		password += bytes(-len(password) % 16)
+		hidden, previous = b'', authenticator
+		for start in range(0, len(password), 16):
+			key = md5(secret + previous).digest()
+			previous = bytes(a ^ b for a, b in zip(password[start:start + 16], key))
+			hidden += previous
+		attributes = [(80, bytes(16)), (1, b'user%d' % identifier), (2, hidden), (4, bytes((10, 0, 1, 1))), (32, b'vpn-gateway'), (61, pack('!I', 5))]
+		body = b''.join(pack('!BB', attribute_type, len(value) + 2) + value for attribute_type, value in attributes)
+		packet = pack('!BBH', 1, identifier, 20 + len(body)) + authenticator + body
+		packet = packet[:22] + hmac_new(secret, packet, 'md5').digest() + packet[38:]
+		
+		code, received_identifier, length = unpack_from('!BBH', packet)
+		offset, parsed = 20, {}
+		while offset < length:
+			attribute_type, attribute_length = packet[offset], packet[offset + 1]
+			parsed.setdefault(attribute_type, []).append(packet[offset + 2:offset + attribute_length])
+			offset += attribute_length
+		response = pack('!BBH', 2, received_identifier, 20) + authenticator
+		md5(response + secret).digest()
+
+
+def ldap_workload(iterations):
+	"""
+	
+	"""
+	
+	def ber(tag, value):
+		length = len(value)
+		if length < 0x80:
+			return bytes((tag, length)) + value
+		length_bytes = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+		return bytes((tag, 0x80 | len(length_bytes))) + length_bytes + value
+	
+	def parse(data, offset=0):
+		tag, length = data[offset], data[offset + 1]
+		offset += 2
+		if length & 0x80:
+			size = length & 0x7f
+			length = int.from_bytes(data[offset:offset + size], 'big')
+			offset += size
+		return tag, data[offset:offset + length], offset + length
+	
+	for message_id in range(iterations):
+		bind_dn = 'CN=user{},OU=Users,DC=example,DC=com'.format(message_id).encode('utf8')
+		bind_request = ber(0x60, ber(0x02, bytes((3,))) + ber(0x04, bind_dn) + ber(0x80, b'password'))
+		message = ber(0x30, ber(0x02, message_id.to_bytes(4, 'big')) + bind_request)
+		tag, content, _ = parse(message)
+		offset = 0
+		while offset < len(content):
+			tag, value, offset = parse(content, offset)
+
+
+def duo_api_workload(iterations):
+	"""
+	
+	"""
+	
+	skey = b'deadbeefdeadbeefdeadbeefdeadbeefdeadbeef'
+	for counter in range(iterations):
+		params = {'username': 'user{}'.format(counter), 'factor': 'auto', 'device': 'auto', 'ipaddr': '10.0.1.{}'.format(counter % 255), 'pushinfo': urlencode({'from': 'vpn', 'domain': 'example.com'})}
+		canonical_params = '&'.join('{}={}'.format(quote(key, '~'), quote(str(params[key]), '~')) for key in sorted(params))
+		canonical = '\n'.join((formatdate(), 'POST', 'api-xxxxxxxx.duosecurity.com', '/auth/v2/auth', canonical_params, sha512(b'').hexdigest(), sha512(b'').hexdigest()))
+		signature = hmac_new(skey, canonical.encode('utf8'), sha512).hexdigest()
+		b64encode('DIXXXXXXXXXXXXXXXXXX:{}'.format(signature).encode('ascii'))
+		json_loads(json_dumps(DUO_RESPONSE))
+		sha256(canonical.encode('utf8')).hexdigest()
+
+
+def config_workload(iterations):
+	"""
+	
+	"""
+	
+	for _ in range(max(iterations // 20, 1)):
+		config = ConfigParser(interpolation=None)
+		config.read_string(AUTHPROXY_CFG)
+		for section in config.sections():
+			dict(config[section])
+
+
+def logging_workload(iterations):
+	"""
+	
+	"""
+	
+	logger = Logger('pgo_training')
+	handler = StreamHandler(StringIO())
+	handler.setFormatter(Formatter('%(asctime)s [%(name)s] %(levelname)s %(message)s'))
+	logger.addHandler(handler)
+	for counter in range(iterations):
+		logger.info('Sending request to Duo API (%s) for user %s', 'api-xxxxxxxx.duosecurity.com', 'user{}'.format(counter))
+		logger.debug('Not emitted')
+
+
+def event_loop_workload(iterations):
+	"""
+	
+	"""
+	
+	class Echo(DatagramProtocol):
+		def connection_made(self, transport):
+			self.transport = transport
+		
+		def datagram_received(self, data, addr):
+			self.transport.sendto(data, addr)
+	
+	class Client(DatagramProtocol):
+		def __init__(self, loop, count):
+			self.remaining, self.done = count, loop.create_future()
+		
+		def connection_made(self, transport):
+			self.transport = transport
+			transport.sendto(b'ping')
+		
+		def datagram_received(self, data, addr):
+			self.remaining -= 1
+			if self.remaining > 0:
+				self.transport.sendto(data)
+			elif not self.done.done():
+				self.done.set_result(True)
+	
+	loop = get_event_loop_policy().new_event_loop()
+	try:
+		server, _ = loop.run_until_complete(loop.create_datagram_endpoint(Echo, local_addr=('127.0.0.1', 0)))
+		client, protocol = loop.run_until_complete(loop.create_datagram_endpoint(lambda: Client(loop, iterations), remote_addr=server.get_extra_info('sockname')))
+		loop.run_until_complete(protocol.done)
+		client.close()
+		server.close()
+	finally:
+		loop.close()
+
+
+WORKLOADS = {
+	'radius': radius_workload,
+	'ldap': ldap_workload,
+	'duo_api': duo_api_workload,
+	'config': config_workload,
+	'logging': logging_workload,
+	'event_loop': event_loop_workload,
+}
+
+
+def main():
+	"""
+	
+	"""
+	
+	parser = ArgumentParser(description=__doc__.splitlines()[1])
+	parser.add_argument('--iterations', type=int, default=20000, help='Iterations per workload')
+	parser.add_argument('--benchmark', action='store_true', help='Print the time spent on every workload as JSON')
+	parser.add_argument('--stdlib-tests', action='store_true', help='Also run the default profile task ("-m test --pgo")')
+	arguments = parser.parse_args()
+	
+	timings = {}
+	for name, workload in WORKLOADS.items():
+		started = perf_counter()
+		workload(arguments.iterations)
+		timings[name] = perf_counter() - started
+	
+	if arguments.stdlib_tests:
+		run((executable, '-m', 'test', '--pgo'), check=False)
+	if arguments.benchmark:
+		print(json_dumps({'python': executable, 'iterations': arguments.iterations, 'timings': timings, 'total': sum(timings.values())}))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,201 @@
+#!python
+"""Build tool stand-ins
+Deterministic stand-ins for the external tools of a build, used by the pipeline benchmark (see _standins.py). The same file is installed as "python" and as "rpmvenv", it tells the role by the name it was called with; the settings come from the JSON file in the "DUOAUTHPROXY_STANDINS" environment variable.
+
+As "python" it creates fake venvs ("-m venv", the venv interpreter is another copy of this file), takes the recorded time of "pip" runs without doing anything, and builds dummy (but valid) wheels for "setup.py bdist_wheel" out of the PKG-INFO and the package sources, taking the time recorded in the build history for that package. Inline code ("-c") runs in this process, with this file as "sys.executable" (so the child processes it starts are stand-ins too); anything else goes to the real interpreter.
+
+As "rpmvenv" it reads the staged files and the wheels of the install plan, takes the recorded time and writes an RPM with a real header (that a yum repository can index) and a gzip payload made of those files.
+
+Every stand-in run is logged, as a JSON line, to the log file of the settings.
+"""
+
+from base64 import urlsafe_b64encode
+from email.parser import HeaderParser
+from gzip import GzipFile
+from hashlib import sha256
+from json import dumps as json_dumps, load as json_load
+from os import O_APPEND, O_CREAT, O_WRONLY, close as os_close, environ, execv, open as os_open, write as os_write
+from pathlib import Path
+from re import sub as re_sub
+from shutil import copyfile
+from struct import pack as struct_pack
+from sys import argv, version_info
+from time import sleep, time
+from urllib.parse import unquote, urlparse
+from zipfile import ZIP_DEFLATED, ZipFile
+
+SETTINGS_VARIABLE = 'DUOAUTHPROXY_STANDINS'
+INTERPRETER_FLAGS = ('-B', '-E', '-I', '-O', '-OO', '-S', '-s', '-u')
+RPM_LEAD = b'\xed\xab\xee\xdb\x03\x00\x00\x00' + b'\x00' * 88
+RPM_HEADER_MAGIC = b'\x8e\xad\xe8\x01\x00\x00\x00\x00'
+
+
+def pause(settings, tool, *key):
+	"""Take the recorded time
+	Sleeps for the recorded duration of "tool" (for "key", if there's a specific one, like the package and version of a build), scaled by the "time_scale" of the settings, and logs the run.
+	"""
+	
+	duration = settings['timings'].get(tool, 0.0)
+	if key and settings.get('history_file') and Path(settings['history_file']).exists():
+		with open(settings['history_file']) as history_file:
+			builds = json_load(history_file).get(key[0].lower(), {})
+		build = builds.get(key[1]) if len(key) > 1 else None
+		if (build is None) and builds:
+			build = max(builds.values(), key=lambda build: build.get('recorded', 0))
+		if build is not None:
+			duration = build['duration']
+	
+	duration *= settings.get('time_scale', 1.0)
+	sleep(duration)
+	log_line = json_dumps({'tool': tool, 'key': list(key), 'seconds': duration, 'at': time()}) + '\n'
+	log_fd = os_open(settings['log_file'], O_WRONLY | O_APPEND | O_CREAT, 0o644)
+	try:
+		os_write(log_fd, log_line.encode('utf8'))
+	finally:
+		os_close(log_fd)
+
+
+def rpm_header(entries):
+	"""RPM header structure
+	The bytes of a header structure with the (tag, type, value) "entries": 4 (int32 list), 3 (int16 list), 6 and 9 (string) and 8 (string list).
+	"""
+	
+	index, data = b'', b''
+	for tag, tag_type, value in entries:
+		if tag_type in (3, 4):
+			width, code = {3: (2, 'H'), 4: (4, 'I')}[tag_type]
+			data += b'\x00' * ((width - len(data) % width) % width)
+			offset, count = len(data), len(value)
+			data += struct_pack('>{}{}'.format(count, code), *value)
+		elif tag_type in (6, 9):
+			offset, count = len(data), 1
+			data += value.encode('utf8') + b'\x00'
+		else:
+			offset, count = len(data), len(value)
+			data += b''.join(item.encode('utf8') + b'\x00' for item in value)
+		index += struct_pack('>iIiI', tag, tag_type, offset, count)
+	return RPM_HEADER_MAGIC + struct_pack('>II', len(entries), len(data)) + index + data
+
+
+def standin_bdist_wheel(settings):
+	"""
+	
+	"""
+	
+	metadata = Path('PKG-INFO').read_text()
+	headers = HeaderParser().parsestr(metadata, headersonly=True)
+	name, version = headers['Name'], headers['Version']
+	pause(settings, 'bdist_wheel', name, version)
+	
+	safe_name, safe_version = re_sub(r'[^A-Za-z0-9.]+', '_', name), re_sub(r'[^A-Za-z0-9.+!]+', '_', version)
+	dist_info = '{}-{}.dist-info'.format(safe_name, safe_version)
+	top_level = [line.strip() for egg_info in Path('.').glob('*.egg-info') if (egg_info / 'top_level.txt').exists() for line in (egg_info / 'top_level.txt').read_text().splitlines() if line.strip()]
+	files = {}
+	for package in top_level:
+		if Path(package + '.py').is_file():
+			files[package + '.py'] = Path(package + '.py').read_bytes()
+		for source in sorted(Path(package).rglob('*.py')):
+			files[source.as_posix()] = source.read_bytes()
+	files[dist_info + '/METADATA'] = metadata.encode('utf8')
+	files[dist_info + '/WHEEL'] = b'Wheel-Version: 1.0\nGenerator: standin\nRoot-Is-Purelib: true\nTag: py3-none-any\n'
+	
+	record = ''.join('{},sha256={},{}\n'.format(path, urlsafe_b64encode(sha256(content).digest()).rstrip(b'=').decode('ascii'), len(content)) for path, content in files.items())
+	files[dist_info + '/RECORD'] = (record + dist_info + '/RECORD,,\n').encode('utf8')
+	Path('dist').mkdir(exist_ok=True)
+	with ZipFile(Path('dist') / '{}-{}-py3-none-any.whl'.format(safe_name, safe_version), 'w', ZIP_DEFLATED) as wheel_zip:
+		for path, content in files.items():
+			wheel_zip.writestr(path, content)
+
+
+def standin_python(settings, arguments):
+	"""
+	
+	"""
+	
+	while arguments and (arguments[0] in INTERPRETER_FLAGS):
+		arguments = arguments[1:]
+	
+	if arguments[:2] == ['-m', 'venv']:
+		venv_dir = Path([argument for argument in arguments[2:] if not argument.startswith('-')][-1])
+		(venv_dir / 'bin').mkdir(parents=True, exist_ok=True)
+		for name in ('python', 'python3'):
+			copyfile(__file__, venv_dir / 'bin' / name)
+			(venv_dir / 'bin' / name).chmod(0o755)
+		(venv_dir / 'pyvenv.cfg').write_text('home = {}\ninclude-system-site-packages = false\nversion = {}.{}.{}\n'.format(Path(settings['python']).parent, *version_info[:3]))
+		pause(settings, 'venv')
+	elif arguments[:2] == ['-m', 'pip']:
+		pause(settings, 'pip')
+	elif arguments[:2] == ['setup.py', 'bdist_wheel']:
+		standin_bdist_wheel(settings)
+	elif arguments[:1] == ['-c']:
+		import sys
+		sys.argv, sys.executable = ['-c'] + arguments[2:], str(Path(argv[0]).absolute())
+		exec(compile(arguments[1], '<string>', 'exec'), {'__name__': '__main__', '__builtins__': __builtins__})
+	else:
+		execv(settings['python'], [settings['python']] + arguments)
+
+
+def standin_rpmvenv(settings, arguments):
+	"""
+	
+	"""
+	
+	destination = Path(arguments[arguments.index('--destination') + 1])
+	with open(arguments[-1]) as config_file:
+		config = json_load(config_file)
+	core = config['core']
+	
+	sources = [(Path(data_file['src']), '/' + data_file['dest']) for data_file in config.get('file_extras', {}).get('files', [])]
+	for requirements in config.get('python_venv', {}).get('requirements', []):
+		for line in Path(requirements).read_text().splitlines():
+			name, separator, reference = line.partition(' @ ')
+			if separator:
+				wheel = Path(unquote(urlparse(reference.split()[0]).path))
+				sources.append((wheel, '/{}/{}/{}'.format(config['python_venv']['path'], config['python_venv']['name'], wheel.name)))
+	pause(settings, 'rpmvenv')
+	
+	rpm_file = destination / '{}-{}-{}.x86_64.rpm'.format(core['name'], core['version'], core['release'])
+	installed_size = sum(source.stat().st_size for source, target in sources)
+	header = rpm_header([
+		(1000, 6, core['name']),
+		(1001, 6, str(core['version'])),
+		(1002, 6, str(core['release'])),
+		(1004, 9, core.get('summary', '')),
+		(1005, 9, ''.join(config.get('blocks', {}).get('desc', [])) or core.get('summary', '')),
+		(1006, 4, [int(time())]),
+		(1009, 4, [installed_size]),
+		(1014, 6, core.get('license', '')),
+		(1016, 9, core.get('group', '')),
+		(1020, 6, core.get('url', '')),
+		(1022, 6, 'x86_64'),
+		(1027, 8, [target for source, target in sources] or ['/']),
+		(1044, 6, '{}-{}-{}.src.rpm'.format(core['name'], core['version'], core['release'])),
+		(1047, 8, [core['name']]),
+		(1049, 8, [requirement.split()[0] for requirement in core.get('requires', [])] or ['rpmlib(CompressedFileNames)']),
+	])
+	signature = rpm_header([(1000, 4, [0])])
+	with rpm_file.open('wb') as rpm_f:
+		rpm_f.write(RPM_LEAD + signature + b'\x00' * ((8 - len(signature) % 8) % 8) + header)
+		with GzipFile(fileobj=rpm_f, mode='wb', compresslevel=6, mtime=0) as payload:
+			for source, target in sources:
+				with source.open('rb') as source_f:
+					for chunk in iter(lambda: source_f.read(1048576), b''):
+						payload.write(chunk)
+	print('Wrote: {}'.format(rpm_file))
+
+
+def main():
+	"""
+	
+	"""
+	
+	with open(environ[SETTINGS_VARIABLE]) as settings_file:
+		settings = json_load(settings_file)
+	if Path(argv[0]).name == 'rpmvenv':
+		standin_rpmvenv(settings, argv[1:])
+	else:
+		standin_python(settings, argv[1:])
+
+
+if __name__ == '__main__':
+	main()
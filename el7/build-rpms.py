@@ -5,6 +5,11 @@ This script extracts the python modules from the duoauthproxy tarball, creates a
 
 import argparse
 import ast
+import concurrent.futures
+import email.parser
+import hashlib
+import importlib.util
+import io
 import json
 import logging
 import os
@@ -34,8 +39,15 @@ DEFAULT_LOG_PARAMETERS = {
 	'format'	: '%(asctime)s|%(name)s|%(levelname)s:%(message)s',
 	'datefmt'	: '%H:%M:%S',
 }
+EXTENSION_SUFFIXES = ('.c', '.cc', '.cpp', '.cxx', '.pyx', '.rs')
 LOGGER = logging.getLogger(__name__)
 NON_MODULES = ('python', 'openssl', 'openssl-fips')
+PACKAGE_NAME_FIXES = {
+	'duo_client_python'		: 'duo-client',
+	'setuptools_scm'		: 'setuptools-scm',
+	'twisted_connect_proxy'	: 'twisted-connect-proxy',
+}
+PATCH_MARKER = '.duoauthproxy.patch.sha256'
 SETUPPY_TEMPLATE = '''#!python
 """A setuptools based setup module.
 """
@@ -90,6 +102,8 @@ RPMVENV_TEMPLATE = {
 SYSTEM_FILES = ('.DS_Store',)
 THIS_FILE = pathlib.Path(__file__).resolve(strict = True)
 
+patch = None
+
 
 class MissingWheelError(RuntimeError):
 	pass
@@ -99,19 +113,24 @@ class StandardDUOProxy:
 	
 	RPMVENV_PACKAGES = ('virtualenv', 'rpmvenv')
 	
-	def __init__(self, release_tag, *args, download_certificate = None, openssl_dist = False, recreate_paths = True, rpmbuild = 'rpmbuild', show_output = False, skip_packages = (), source_tarball = None, target_install_path = '/opt/duoauthproxy', venv_base_packages = (), **kwargs):
+	def __init__(self, release_tag, *args, compiler_cache = None, download_certificate = None, jobs = None, openssl_dist = False, prepare_only = False, recreate_paths = True, rpmbuild = 'rpmbuild', show_output = False, skip_packages = (), source_tarball = None, target_install_path = '/opt/duoauthproxy', venv_base_packages = (), **kwargs):
 		'''Instance initialization
 		The connection is initialized but a login is not triggered.
 		'''
 		
+		self.compiler_cache = pathlib.Path(compiler_cache).expanduser().resolve() if compiler_cache else None
+		self.compiler_cache_report = {}
 		if download_certificate is not None:
 			self.download_certificate = pathlib.Path(download_certificate)
 		else:
 			self.download_certificate = False
+		self.jobs = int(jobs) if jobs else (os.cpu_count() or 1)
 		if openssl_dist:
 			self.openssl_dist = pathlib.Path(openssl_dist)
 		else:
 			self.openssl_dist = openssl_dist
+		self.prepare_only = prepare_only
+		self.extraction_report = {}
 		self.recreate_paths = recreate_paths
 		self.release_tag = release_tag
 		self.rpmbuild = pathlib.Path(rpmbuild)
@@ -136,6 +155,9 @@ class StandardDUOProxy:
 	
 	def __call__(self, *args, max_build_passes = 10, **kwargs):
 		
+		if self.prepare_only:
+			return self.prepare_sources()
+		
 		if str(self.venv_python) != sys.executable:
 			LOGGER.info('Re-running from within venv: %s', self.venv_path)
 			sys.exit(subprocess.run([self.venv_python] + sys.argv).returncode)
@@ -182,6 +204,8 @@ class StandardDUOProxy:
 				lp_unwheeled = tuple(unwheeled)
 				lp_install_queue = tuple(install_queue)
 		LOGGER.debug('Hunt is over')
+		if self.compiler_cache_report:
+			LOGGER.info('Compiler cache: %d hits, %d misses over %d modules', sum(hits for hits, misses in self.compiler_cache_report.values()), sum(misses for hits, misses in self.compiler_cache_report.values()), len(self.compiler_cache_report))
 		
 		if len(unwheeled) or len(install_queue):
 			LOGGER.error('Hunting was unsuccessfull. It was not possible to build all the required modules.')
@@ -216,7 +240,7 @@ class StandardDUOProxy:
 		rpmvenv_environment['PATH'] = ':'.join((str(self.venv_python.parent), rpmvenv_environment['PATH']))
 		rpmvenv_command = (self.venv_rpmvenv, '--destination', self.rpm_destination, rpmvenv_json)
 		LOGGER.info('Building RPM: %s', ' '.join(map(str, rpmvenv_command)))
-		return subprocess.run(tuple(map(str, rpmvenv_command)), capture_output = not self.show_output, check = True, env = rpmvenv_environment)
+		return self._run(tuple(map(str, rpmvenv_command)), check = True, env = rpmvenv_environment)
 	
 	def __getattr__(self, name):
 		
@@ -247,14 +271,46 @@ class StandardDUOProxy:
 			self.__setattr__(name, value)
 			return value
 		
+		elif name == 'build_environment':
+			value = os.environ.copy()
+			value.update({
+				'CARGO_BUILD_JOBS'	: str(self.jobs),
+				'MAKEFLAGS'			: '-j{}'.format(self.jobs),
+				'MAX_JOBS'			: str(self.jobs),
+			})
+			if self.compiler_cache is not None:
+				value.update({
+					'CARGO_HOME'		: str(self.compiler_cache / 'cargo'),
+					'CARGO_TARGET_DIR'	: str(self.compiler_cache / 'cargo-target'),
+				})
+				ccache, sccache = shutil.which('ccache'), shutil.which('sccache')
+				if ccache:
+					value.update({
+						'CC'				: '{} {}'.format(ccache, value.get('CC', 'gcc')),
+						'CXX'				: '{} {}'.format(ccache, value.get('CXX', 'g++')),
+						'CCACHE_BASEDIR'	: str(self.base_path),
+						'CCACHE_DIR'		: str(self.compiler_cache / 'ccache'),
+						'CCACHE_NOHASHDIR'	: 'true',
+					})
+				if sccache:
+					value.update({
+						'RUSTC_WRAPPER'	: sccache,
+						'SCCACHE_DIR'	: str(self.compiler_cache / 'sccache'),
+					})
+				if not (ccache or sccache):
+					LOGGER.warning('Neither ccache nor sccache were found, compilations will not be cached')
+			self.__setattr__(name, value)
+			return value
+		
 		elif name == 'installed_wheels':
-			command = [str(self.venv_python), '-m', 'pip', 'list', '--format', 'json']
-			LOGGER.debug('Running: %s', ' '.join(command))
-			value = subprocess.run(command, capture_output = True, check = True)
+			value = {}
+			for metadata_file in self.venv_path.glob('lib*/python*/site-packages/*.dist-info/METADATA'):
+				LOGGER.debug('Reading metadata from %s', metadata_file)
+				with open(metadata_file, 'rb') as metadata_fileobj:
+					metadata = email.parser.BytesHeaderParser().parse(metadata_fileobj)
+				value[metadata['Name'].lower()] = metadata['Version']
 			if self.show_output:
-				print(value.stderr.decode('utf8'), value.stdout.decode('utf8'), sep = '\n', end = '\n')
-			value = json.loads(value.stdout)
-			value = {item['name'].lower() : item['version'] for item in value}
+				pprint.pprint(value)
 			self.__setattr__(name, value)
 			return value
 			
@@ -321,7 +377,7 @@ class StandardDUOProxy:
 		
 		raise AttributeError(name)
 	
-	def _build_wheel(self, module):
+	def _build_wheel(self, module, python = None):
 		
 		LOGGER.debug('Building %s | %s', module, self.pkg_list[module])
 		
@@ -329,13 +385,20 @@ class StandardDUOProxy:
 			if (child.name in ['build', 'dist']) or ((len(child.name) > 9) and (child.name[-9:] == '.egg-info')):
 				shutil.rmtree(child)
 		
-		environment = None
+		python = self.venv_python if python is None else python
+		environment = self.build_environment.copy()
+		stats_log = self.base_path / 'ccache-{}.log'.format(module)
+		if 'CC' in environment and (self.compiler_cache is not None):
+			stats_log.unlink() if stats_log.exists() else None
+			environment['CCACHE_STATSLOG'] = str(stats_log)
+		rust_stats = self._rust_cache_stats(environment)
+		build_command = ['setup.py', 'build_ext', '--parallel', str(self.jobs), 'bdist_wheel'] if self._has_extensions(module) else ['setup.py', 'bdist_wheel']
 		
 		if module == 'setuptools':
 			LOGGER.debug('Boostraping setuptools in %s', self.pkg_list[module])
-			venv_result = subprocess.run([self.venv_python, 'bootstrap.py'], cwd = self.pkg_list[module], capture_output = not self.show_output, check = True)
+			venv_result = self._run([python, 'bootstrap.py'], cwd = self.pkg_list[module], check = True)
 		elif (module == 'cryptography') and self.openssl_dist:
-			environment = os.environ.copy()
+			environment = environment.copy()
 			environment.update({
 				'CFLAGS'	: '-I{}/include'.format(self.openssl_dist),
 				'LDFLAGS'	: '-L{}/lib -Wl,-z,origin'.format(self.openssl_dist),
@@ -344,19 +407,56 @@ class StandardDUOProxy:
 		
 		try:
 			LOGGER.debug('Building wheel for %s using setup.py bdist_wheel in %s', module, self.pkg_list[module])
-			command = [str(self.venv_python), 'setup.py', 'bdist_wheel']
+			command = [str(python)] + build_command
 			LOGGER.debug('Running: %s', ' '.join(command))
-			venv_result = subprocess.run(command, cwd = self.pkg_list[module], capture_output = not self.show_output, check = True, env = environment)
+			venv_result = self._run(command, cwd = self.pkg_list[module], check = True, env = environment)
 		except subprocess.CalledProcessError:
 			LOGGER.debug('The bdist_wheel method on %s failed. Trying with pip wheel', module)
 			dist_dir = self.pkg_list[module] / 'dist'
 			reset_directory(dist_dir)
-			command = [str(self.venv_python), '-m', 'pip', 'wheel', '--no-deps', '--no-index', '--wheel-dir', str(dist_dir), '.']
+			command = [str(python), '-m', 'pip', 'wheel', '--no-deps', '--no-index', '--wheel-dir', str(dist_dir), '.']
 			LOGGER.debug('Running: %s', ' '.join(command))
-			venv_result = subprocess.run(command, cwd = self.pkg_list[module], capture_output = not self.show_output, check = True, env = environment)
-	
+			venv_result = self._run(command, cwd = self.pkg_list[module], check = True, env = environment)
+		
+		if self.compiler_cache is not None:
+			hits, misses = 0, 0
+			if stats_log.exists():
+				for line in stats_log.read_text().splitlines():
+					if line.strip() in ('direct_cache_hit', 'preprocessed_cache_hit'):
+						hits += 1
+					elif line.strip() == 'cache_miss':
+						misses += 1
+				stats_log.unlink()
+			rust_stats_after = self._rust_cache_stats(environment)
+			if (rust_stats is not None) and (rust_stats_after is not None):
+				hits += rust_stats_after[0] - rust_stats[0]
+				misses += rust_stats_after[1] - rust_stats[1]
+			self.compiler_cache_report[module] = (hits, misses)
+			if hits + misses:
+				LOGGER.info('Compiler cache for %s: %d hits, %d misses (%.0f%%)', module, hits, misses, hits * 100 / (hits + misses))
+		
 		return self._find_wheel(module)
 	
+	def _run(self, command, **kwargs):
+		
+		if not self.show_output:
+			kwargs.update(stdout = subprocess.PIPE, stderr = subprocess.STDOUT, universal_newlines = True)
+		return subprocess.run(command, **kwargs)
+	
+	def _rust_cache_stats(self, environment):
+		
+		if 'RUSTC_WRAPPER' not in environment:
+			return None
+		result = subprocess.run([environment['RUSTC_WRAPPER'], '--show-stats', '--stats-format', 'json'], stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, universal_newlines = True, env = environment)
+		if result.returncode:
+			return None
+		stats = json.loads(result.stdout).get('stats', {})
+		return tuple(sum(stats.get(counter, {}).get('counts', {}).values()) for counter in ('cache_hits', 'cache_misses'))
+	
+	def _has_extensions(self, module):
+		
+		return any(path.suffix.lower() in EXTENSION_SUFFIXES for path in self.pkg_list[module].rglob('*') if path.is_file())
+	
 	def _find_wheel(self, module, skip_entries = SYSTEM_FILES):
 		
 		dist_dir = self.pkg_list[module] / 'dist'
@@ -380,11 +480,7 @@ class StandardDUOProxy:
 	
 		for child in pkgs_path.iterdir():
 	
-			parsed = str(child.name).rpartition('-')
-			if len(parsed[0]) and len(parsed[2]):
-				pkgs[parsed[0].lower()] = child
-			else:
-				pkgs[parsed[2].lower()] = child
+			pkgs[package_key(child.name, name_fixes = False)] = child
 	
 		if duo_client_name_fix:
 			if 'duo_client_python' in pkgs:
@@ -407,12 +503,14 @@ class StandardDUOProxy:
 	
 	def _prepare_source_directory(self, source_path, populate = True, skip_entries = None):
 		
+		patch_file = THIS_FILE.parent / 'duoauthproxy.patch'
+		patch_set = patch.fromfile(str(patch_file)) if patch_file.exists() and (patch is not None) else None
+		patch_digest = hashlib.sha256(patch_file.read_bytes()).hexdigest() if patch_file.exists() else None
+		
 		if populate:
-			tarball = tarfile.open(fileobj = self.tarball_file_obj)
 			LOGGER.info('Extracting files from tarball')
-			tarball.extractall(source_path)
-		
-			self.tarball_file_obj.close()
+			self.extraction_report = self._extract_tarball(source_path, patch_set = patch_set)
+			LOGGER.info('Extracted %d files (%d bytes), skipped %d files (%d bytes) from packages that are not needed: %s', self.extraction_report['extracted_files'], self.extraction_report['extracted_bytes'], self.extraction_report['skipped_files'], self.extraction_report['skipped_bytes'], ', '.join(self.extraction_report['skipped_packages']))
 		
 		if skip_entries is None:
 			skip_entries = [*self.skip_packages, *SYSTEM_FILES]
@@ -430,17 +528,95 @@ class StandardDUOProxy:
 			setattr(self, key, value)
 		
 		source_path = childs[0]
-		
-		patch_file = THIS_FILE.parent / 'duoauthproxy.patch'
-		if patch_file.exists():
+		patch_marker = source_path / PATCH_MARKER
+		
+		if patch_file.exists() and patch_marker.exists() and (patch_marker.read_text().strip() == patch_digest):
+			LOGGER.info('Source already patched using %s', patch_file)
+		elif patch_file.exists() and (patch is None):
+			LOGGER.warning('The "patch" module is not available, the source will be patched on the regular run')
+		elif patch_file.exists() and populate:
+			LOGGER.info('Source patched while extracting, using %s: %s', patch_file, ', '.join(self.extraction_report['patched_files']))
+			patch_marker.write_text(patch_digest + '\n')
+		elif patch_file.exists() and patch_marker.exists():
+			LOGGER.warning('The source was patched with a different version of %s; leaving it untouched (use --recreate-paths to start over)', patch_file)
+		elif patch_file.exists():
 			LOGGER.info('Patching source using %s', patch_file)
-			patch_ = patch.fromfile(str(patch_file))
-			patch_.apply(strip = 1, root = source_path)
+			if patch_set.apply(strip = 1, root = source_path):
+				patch_marker.write_text(patch_digest + '\n')
+				patched_packages = set()
+				for item in patch_set.items:
+					target_parts = pathlib.PurePosixPath(patch.pathstrip(item.target, 1).decode('utf8')).parts
+					if (len(target_parts) > 2) and (target_parts[0] == 'pkgs'):
+						patched_packages.add(target_parts[1])
+				for package in sorted(patched_packages):
+					dist_dir = source_path / 'pkgs' / package / 'dist'
+					if dist_dir.exists():
+						LOGGER.info('Dropping the wheels of %s built before patching it', package)
+						reset_directory(dist_dir, create_empty = False)
+			else:
+				LOGGER.warning('The patch %s does not apply cleanly', patch_file)
 		else:
 			LOGGER.info('Doing vanilla build because patch file is not present: %s', patch_file)
 		
 		return source_path
 	
+	def _extract_tarball(self, source_path, patch_set = None):
+		'''Selective extraction
+		Extracts the tarball members that are actually needed: the skipped packages (which are not part of the runtime, like the interpreter and OpenSSL) and the system files never reach the disk. The packages installed in the build venv are extracted too, their wheels end up in the package. The files targeted by "patch_set" are patched on their way to the disk, hunks are checked against the original content first.
+		'''
+		
+		skipped_packages = {name.lower() for name in (*self.skip_packages, *NON_MODULES)}
+		
+		patches = {}
+		if patch_set is not None:
+			for item in patch_set.items:
+				patches[pathlib.PurePosixPath(patch.pathstrip(item.target, 1).decode('utf8'))] = item
+		
+		result = {
+			'extracted_bytes'	: 0,
+			'extracted_files'	: 0,
+			'patched_files'		: [],
+			'skipped_bytes'		: 0,
+			'skipped_files'		: 0,
+			'skipped_packages'	: set(),
+		}
+		with tarfile.open(fileobj = self.tarball_file_obj) as tarball:
+			for member in tarball:
+				member_path = pathlib.PurePosixPath(member.name)
+				package = member_path.parts[2] if (len(member_path.parts) > 2) and (member_path.parts[1] == 'pkgs') else None
+				if (member_path.name in SYSTEM_FILES) or ((package is not None) and (package_key(package) in skipped_packages)):
+					if package is not None:
+						result['skipped_packages'].add(package)
+					if member.isfile():
+						result['skipped_files'] += 1
+						result['skipped_bytes'] += member.size
+					continue
+				
+				relative_path = pathlib.PurePosixPath(*member_path.parts[1:]) if len(member_path.parts) > 1 else None
+				if member.isfile() and (relative_path in patches):
+					content = tarball.extractfile(member).read()
+					patched = apply_hunks(patch_set, patches[relative_path].hunks, content)
+					if patched is None:
+						LOGGER.warning('The patch for %s does not apply; leaving it untouched', relative_path)
+					else:
+						content = patched
+						result['patched_files'].append(str(relative_path))
+					destination = source_path / member_path
+					destination.parent.mkdir(parents = True, exist_ok = True)
+					destination.write_bytes(content)
+					os.chmod(str(destination), member.mode)
+					result['extracted_files'] += 1
+					result['extracted_bytes'] += len(content)
+				else:
+					tarball.extract(member, str(source_path))
+					if member.isfile():
+						result['extracted_files'] += 1
+						result['extracted_bytes'] += member.size
+		
+		self.tarball_file_obj.close()
+		result['skipped_packages'] = sorted(result['skipped_packages'])
+		return result
+	
 	def _prepare_venv_directory(self, venv_path, populate = True):
 		
 		if populate:
@@ -455,7 +631,7 @@ class StandardDUOProxy:
 			LOGGER.info('Deploying venv in %s', venv_path)
 			for command in venv_build_commands:
 				LOGGER.debug('Running: %s', ' '.join(command))
-				result = subprocess.run(command, capture_output = not self.show_output, check = True)
+				result = self._run(command, check = True)
 	# 			LOGGER.debug('Result: %s', result)
 		
 		return venv_path
@@ -478,7 +654,45 @@ class StandardDUOProxy:
 	def install_wheel(self, module, wheel, capture_output = False):
 		
 		LOGGER.debug('Installing wheel for %s from %s', module, wheel.parent)
-		return subprocess.run([self.venv_python, '-m', 'pip', 'install', '--no-index', '--find-links', wheel.parent, module], capture_output = not self.show_output, check = True)
+		return self._run([self.venv_python, '-m', 'pip', 'install', '--no-index', '--find-links', wheel.parent, module], check = True)
+	
+	def prepare_sources(self):
+		'''Early source preparation
+		Extracts the tarball and builds the wheels of the pure python modules using the running interpreter, so it can run while the interpreter RPM is still being built. Only the interpreter neutral wheels (like "py3-none-any") are kept; the regular run picks up the extracted source and those wheels, and builds everything else.
+		
+		It runs on the system python of the build host, which can be as old as 3.6, and might lack the "patch" module; the wheels of the packages patched afterwards by the regular run are dropped and built again there.
+		'''
+		
+		global patch
+		try:
+			import patch
+		except ImportError:
+			patch = None
+		
+		LOGGER.info('Preparing source in %s', self.source_path)
+		can_build = all(importlib.util.find_spec(module) is not None for module in ('setuptools', 'wheel'))
+		pure_modules = [module for module in self.pkg_list if (module not in NON_MODULES) and (module != 'setuptools') and (self.pkg_list[module] / 'setup.py').exists() and not self._has_extensions(module)] if can_build else []
+		if not can_build:
+			LOGGER.warning('The running interpreter lacks setuptools or wheel, only the source will be prepared')
+		
+		LOGGER.info('Building pure python wheels early: %s', pure_modules)
+		result = {}
+		with concurrent.futures.ThreadPoolExecutor(max_workers = self.jobs) as executor:
+			futures = {module : executor.submit(self._build_wheel, module, python = sys.executable) for module in pure_modules}
+			for module, future in futures.items():
+				try:
+					wheel = future.result()
+				except Exception as err:
+					output = getattr(err, 'output', None)
+					LOGGER.warning('Early build of module %s failed, it will be built on the regular run: %s%s', module, err, '\n' + output[-4096:] if output else '')
+					reset_directory(self.pkg_list[module] / 'dist', create_empty = False)
+				else:
+					if is_neutral_wheel(wheel.name):
+						result[module] = wheel
+					else:
+						LOGGER.warning('Early wheel of module %s is specific to the running interpreter (%s), it will be built on the regular run', module, wheel.name)
+						reset_directory(self.pkg_list[module] / 'dist', create_empty = False)
+		return result
 	
 	def prepare_for_rpm(self):
 		
@@ -546,7 +760,7 @@ class StandardDUOProxy:
 		})
 		
 		LOGGER.debug('Installing packages for rpmvenv: %s', self.RPMVENV_PACKAGES)
-		result = subprocess.run([self.venv_python, '-m', 'pip', 'install', '--upgrade'] + list(self.RPMVENV_PACKAGES), capture_output = not self.show_output, check = True)
+		result = self._run([self.venv_python, '-m', 'pip', 'install', '--upgrade'] + list(self.RPMVENV_PACKAGES), check = True)
 		
 		rpmvenv_json = self.build_path / '{name}.{release_tag}.json'.format(**vars(self))
 		LOGGER.debug('Writing the json file for rpmvenv: %s', rpmvenv_json)
@@ -554,6 +768,41 @@ class StandardDUOProxy:
 		return rpmvenv_json
 
 
+def apply_hunks(patch_set, hunks, content):
+	'''Apply hunks in memory
+	Checks that the "hunks" (from a "patch" module PatchSet) match the original "content" and returns the patched content, or None if they don't match.
+	'''
+	
+	lines = content.splitlines()
+	for hunk in hunks:
+		expected = [line[1:].rstrip(b'\r\n') for line in hunk.text if line[:1] in (b' ', b'-')]
+		if [line.rstrip(b'\r\n') for line in lines[hunk.startsrc - 1:hunk.startsrc - 1 + len(expected)]] != expected:
+			return None
+	return b''.join(patch_set.patch_stream(io.BytesIO(content), hunks))
+
+
+def is_neutral_wheel(wheel_name):
+	'''Interpreter neutral wheel
+	Checks if the wheel (by file name) works on any python 3 interpreter: no ABI, no platform and only major version python tags (like "py3" or "py2.py3").
+	'''
+	
+	python_tags, abi_tag, platform_tag = pathlib.PurePath(wheel_name).stem.split('-')[-3:]
+	return (abi_tag == 'none') and (platform_tag == 'any') and all(re.fullmatch(r'py\d', python_tag) for python_tag in python_tags.split('.'))
+
+
+def package_key(entry_name, name_fixes = True):
+	'''Package key
+	The name used to refer to a package in the "pkgs" directory of the tarball, out of the directory (or file) name.
+	'''
+	
+	parsed = str(entry_name).rpartition('-')
+	if len(parsed[0]) and len(parsed[2]):
+		key = parsed[0].lower()
+	else:
+		key = parsed[2].lower()
+	return PACKAGE_NAME_FIXES.get(key, key) if name_fixes else key
+
+
 def reset_directory(path, create_empty = True, *args, **kwargs):
 
 	if path.is_dir():
@@ -596,10 +845,13 @@ if __name__ == '__main__':
 	parser = argparse.ArgumentParser(description = doc_lines[0], epilog = doc_lines[1], formatter_class = argparse.ArgumentDefaultsHelpFormatter)
 	parser.add_argument('release_tag', help='the release tag to use for the RPM')
 	parser.add_argument('--base-path', default = THIS_FILE.parent, help='the working directory. Working directories will live here')
+	parser.add_argument('--compiler-cache', default = os.environ.get('COMPILER_CACHE'), help='directory for the compiler cache (ccache, sccache, and the shared cargo target and registry); compilations are not cached if missing')
 	parser.add_argument('--download-certificate', help='the certificate to use when connecting to download the source tarball')
+	parser.add_argument('--jobs', type=int, default = os.environ.get('JOBS', os.cpu_count()), help='the amount of parallel jobs for the native builds (make, C extensions, Rust crates)')
 	parser.add_argument('--log-level', choices = ['notset', 'debug', 'info', 'warning', 'error', 'critical'], default = 'info', help = 'minimum severity of the messages to be logged')
 	parser.add_argument('--max-build-passes', type=int, default = 10, help='the building process is based on iterative passes; this would be the max number of those (to avoid an infinite loop)')
 	parser.add_argument('--openssl-dist', help='use a specific openssl ditribution instead of relying on the system resolution')
+	parser.add_argument('--prepare-only', action = 'store_true', default = False, help='only extract the source and build the pure python wheels, using the running interpreter; meant to run while the interpreter RPM is being built')
 	parser.add_argument('--recreate-paths', action = 'store_true', default = False, help='recreate directories even if they already exist')
 	parser.add_argument('--rpmbuild', default = 'rpmbuild', help='the path to the rpmbuild tree')
 	parser.add_argument('--show-output', action = 'store_true', default = False, help='show the output of the commands being run')
@@ -1,7 +1,17 @@
 #!/bin/bash
 
+JOBS=${JOBS:-$(nproc)}
+export MAKEFLAGS="-j$JOBS"
+export MAX_JOBS="$JOBS"
+
 yum -y install rpmdevtools yum-utils
 
+if [ -n "$COMPILER_CACHE" ]; then
+	yum -y install epel-release
+	yum -y install ccache
+	export COMPILER_CACHE
+fi
+
 rpmdev-setuptree
 
 for spec_files in *.spec; do
@@ -15,9 +25,19 @@ for spec_files in *.spec; do
     break
 done
 
+if [ -n "$OPTIMIZED_PYTHON" ]; then
+	cp pgo_training.py rpmbuild/SOURCES/
+	PYTHON_BUILD_OPTIONS="--with optimizations"
+fi
+
 yum-builddep -y rpmbuild/SPECS/python38-altinstall-duoauthproxy.spec
 spectool -g -R rpmbuild/SPECS/python38-altinstall-duoauthproxy.spec
-QA_RPATHS=$[ 0x0002|0x0010 ] rpmbuild -ba rpmbuild/SPECS/python38-altinstall-duoauthproxy.spec
+QA_RPATHS=$[ 0x0002|0x0010 ] rpmbuild -ba --define "_smp_mflags -j$JOBS" $PYTHON_BUILD_OPTIONS rpmbuild/SPECS/python38-altinstall-duoauthproxy.spec &
+PYTHON_RPM_BUILD=$!
+
+# Extraction and pure python wheels don't need the new interpreter
+python3 build-rpms.py --jobs "$JOBS" --prepare-only --show-output 1.el7 || echo "Early source preparation failed; the regular run will take care of it"
 
+wait $PYTHON_RPM_BUILD || exit 1
 yum -y install rpmbuild/RPMS/x86_64/python38-altinstall-duoauthproxy-3.8.4-5.el7.x86_64.rpm
-/usr/local/bin/python3 build-rpms.py --openssl-dist /usr/local/openssl/ --show-output 1.el7
+/usr/local/bin/python3 build-rpms.py --jobs "$JOBS" --openssl-dist /usr/local/openssl/ --show-output 1.el7
@@ -2,6 +2,7 @@
 %define debug_package %{nil}
 %global __os_install_post %(echo '%{__os_install_post}' | sed -e 's!/usr/lib[^[:space:]]*/brp-python-bytecompile[[:space:]].*$!!g')
 %define _python_version 3.8.16
+%bcond_with optimizations
 
 Name:           duoauthproxy-python
 Version:        6.2.0
@@ -12,6 +13,9 @@ License:        Python
 URL:            https://www.python.org/
 Source0:        https://dl.duosecurity.com/duoauthproxy-%{version}-src.tgz
 Patch0:			config.mk.patch
+%if %{with optimizations}
+Source1:        pgo_training.py
+%endif
 
 BuildRequires:  bzip2-devel
 BuildRequires:  chkconfig
@@ -46,7 +50,16 @@ This is an apparently customized python %{_python_version} version shipped with
 %setup -q -n duoauthproxy-%{version}-src
 
 %build
-env CXX=/usr/bin/c++ make python
+%if %{with optimizations}
+# The profile guided build is trained with a workload mimicking the proxy instead of the test suite
+cat > %{_builddir}/duoauthproxy-python-config.site <<EOF
+enable_optimizations=yes
+with_lto=yes
+PROFILE_TASK="-E %{SOURCE1} --iterations 20000"
+EOF
+export CONFIG_SITE=%{_builddir}/duoauthproxy-python-config.site
+%endif
+env CXX=/usr/bin/c++ make %{?_smp_mflags} python
 
 %install
 rm -rf %{buildroot}
@@ -43,7 +43,7 @@ Duo proxy returns access approval to the requesting device or application.
 %setup -q -n %{name}-%{version}-src
 
 %build
-env CXX=/usr/bin/c++ make
+env CXX=/usr/bin/c++ make %{?_smp_mflags}
 
 %install
 cd duoauthproxy-build
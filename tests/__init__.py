@@ -0,0 +1,4 @@
+#!python
+"""Duo Authentication Proxy Installers (tests)
+Behavioural tests, run with "python -m unittest discover -s tests -t ." from the repository root.
+"""
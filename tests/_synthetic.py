@@ -0,0 +1,193 @@
+#!python
+"""Synthetic fixtures
+Small, but structurally faithful, duoauthproxy source tarballs and wheels built on the fly, so the tests need no network nor real downloads.
+"""
+
+from base64 import urlsafe_b64encode
+from hashlib import sha256
+from io import BytesIO
+from pathlib import Path
+from shutil import which
+from struct import pack as struct_pack
+from subprocess import run
+from sys import version_info
+from tarfile import DIRTYPE, TarInfo, open as tarfile_open
+from zipfile import ZipFile
+
+SETUP_TEMPLATE = '''from setuptools import setup
+setup(name={name!r}, version={version!r}, packages=[{name!r}], install_requires={requires!r})
+'''
+
+
+def other_python(minimum=(3, 8)):
+	"""Another interpreter
+	The path to an installed python 3 interpreter (at least "minimum") with a version other than the running one, looked up in the pyenv versions and in the PATH; None if there's none.
+	"""
+	
+	for minor in range(minimum[1], 20):
+		if (3, minor) == tuple(version_info[:2]):
+			continue
+		for candidate in sorted((Path.home() / '.pyenv' / 'versions').glob('3.{0}.*/bin/python3.{0}'.format(minor))) + [which('python3.{}'.format(minor))]:
+			if candidate is None:
+				continue
+			probe = run((str(candidate), '-c', 'import sys; print(sys.executable)'), capture_output=True, text=True)
+			if probe.returncode == 0:
+				return Path(probe.stdout.strip())
+	return None
+
+
+def record_hash(content):
+	"""RECORD hash
+	The "sha256=<urlsafe base64>" digest of "content", as written in a wheel RECORD.
+	"""
+	
+	return 'sha256=' + urlsafe_b64encode(sha256(content).digest()).rstrip(b'=').decode('ascii')
+
+
+def wheel_bytes(name, version, tag='py3-none-any', requires=(), files=None):
+	"""Wheel content
+	A valid wheel for "name" "version" with the "tag", the "requires" as Requires-Dist and the "files" (a {path: bytes} map, a single "<name>/__init__.py" by default).
+	"""
+	
+	dist_info = '{}-{}.dist-info'.format(name, version)
+	files = dict({'{}/__init__.py'.format(name): b'VALUE = 1\n'} if files is None else files)
+	files[dist_info + '/METADATA'] = ('Metadata-Version: 2.1\nName: {}\nVersion: {}\n'.format(name, version) + ''.join('Requires-Dist: {}\n'.format(requirement) for requirement in requires)).encode('utf8')
+	files[dist_info + '/WHEEL'] = 'Wheel-Version: 1.0\nGenerator: tests\nRoot-Is-Purelib: {}\nTag: {}\n'.format('true' if tag.endswith('-none-any') else 'false', tag).encode('utf8')
+	record = ''.join('{},{},{}\n'.format(path, record_hash(content), len(content)) for path, content in files.items())
+	files[dist_info + '/RECORD'] = (record + dist_info + '/RECORD,,\n').encode('utf8')
+	
+	result = BytesIO()
+	with ZipFile(result, 'w') as wheel_zip:
+		for path, content in files.items():
+			wheel_zip.writestr(path, content)
+	return result.getvalue()
+
+
+def write_wheel(directory, name, version, tag='py3-none-any', **details):
+	"""Write a wheel
+	Writes the "wheel_bytes" into "directory", with the proper file name, and returns its path.
+	"""
+	
+	wheel = Path(directory) / '{}-{}-{}.whl'.format(name, version, tag)
+	wheel.write_bytes(wheel_bytes(name, version, tag, **details))
+	return wheel
+
+
+def source_package(name, version, requires=(), *, files=None, setup=None, egg_info=True):
+	"""Source package
+	The files ({path: bytes}) of a setuptools source distribution for "name" "version": setup.py (the "setup" text, if provided), PKG-INFO, the "files" (a single "<name>/__init__.py" by default) and, with "egg_info", the egg-info directory listing them.
+	"""
+	
+	metadata = ('Metadata-Version: 2.1\nName: {}\nVersion: {}\n'.format(name, version) + ''.join('Requires-Dist: {}\n'.format(requirement) for requirement in requires)).encode('utf8')
+	result = {
+		'setup.py': (SETUP_TEMPLATE.format(name=name, version=version, requires=list(requires)) if setup is None else setup).encode('utf8'),
+		'PKG-INFO': metadata,
+	}
+	result.update({'{}/__init__.py'.format(name): b'VALUE = 1\n'} if files is None else files)
+	if egg_info:
+		egg_info_dir = '{}.egg-info'.format(name)
+		sources = sorted(result) + [egg_info_dir + '/' + file_name for file_name in ('PKG-INFO', 'SOURCES.txt', 'top_level.txt')]
+		result[egg_info_dir + '/PKG-INFO'] = metadata
+		result[egg_info_dir + '/SOURCES.txt'] = ''.join(path + '\n' for path in sorted(sources)).encode('utf8')
+		result[egg_info_dir + '/top_level.txt'] = '{}\n'.format(name).encode('utf8')
+		if requires:
+			result[egg_info_dir + '/requires.txt'] = ''.join(requirement + '\n' for requirement in requires).encode('utf8')
+	return result
+
+
+def tarball_entries(version='6.4.1', *, sources=None, wheels=None, python_version='3.11.7'):
+	"""Tarball entries
+	The files ({path below the root directory: bytes}) of a duoauthproxy source tarball: configuration, documentation, the python sources, the "wheels" ({file name: bytes}, "alpha" depending on "beta" and a cp27 "gamma" by default) and the "sources" ({directory name: files}, a pure "beta" and the proxy itself by default).
+	"""
+	
+	if wheels is None:
+		wheels = {
+			'alpha-1.0-py3-none-any.whl': wheel_bytes('alpha', '1.0', requires=['beta>=1.0']),
+			'gamma-2.0-cp27-cp27mu-manylinux1_x86_64.whl': wheel_bytes('gamma', '2.0', 'cp27-cp27mu-manylinux1_x86_64'),
+			'wheel-0.43.0-py3-none-any.whl': wheel_bytes('wheel', '0.43.0'),
+		}
+	if sources is None:
+		sources = {
+			'beta-1.0': source_package('beta', '1.0'),
+			'duoauthproxy': source_package('duoauthproxy', version, ['alpha', 'beta']),
+		}
+	
+	result = {
+		'conf/authproxy.cfg': b'[main]\n\n[radius_server_auto]\nport=1812\n',
+		'doc/LICENSE': b'license\n',
+		'selinux_policy/authproxy.te': b'module authproxy 1.0;\n',
+		'install.py': b'print("install")\n',
+		'pkgs/python-{}/README'.format(python_version): b'python\n',
+	}
+	result.update({'pkgs/' + file_name: content for file_name, content in wheels.items()})
+	for directory, files in sources.items():
+		result.update({'pkgs/{}/{}'.format(directory, path): content for path, content in files.items()})
+	return result
+
+
+def rpm_header(entries):
+	"""RPM header structure
+	The bytes of a header structure with the (tag, type, value) "entries": 3 (int16 list), 4 (int32 list), 6 and 9 (string) and 8 (string list).
+	"""
+	
+	index, data = b'', b''
+	for tag, tag_type, value in entries:
+		if tag_type in (3, 4):
+			width, code = {3: (2, 'H'), 4: (4, 'I')}[tag_type]
+			data += b'\x00' * ((width - len(data) % width) % width)
+			offset, count = len(data), len(value)
+			data += struct_pack('>{}{}'.format(count, code), *value)
+		elif tag_type in (6, 9):
+			offset, count = len(data), 1
+			data += value.encode('utf8') + b'\x00'
+		else:
+			offset, count = len(data), len(value)
+			data += b''.join(item.encode('utf8') + b'\x00' for item in value)
+		index += struct_pack('>iIiI', tag, tag_type, offset, count)
+	return b'\x8e\xad\xe8\x01\x00\x00\x00\x00' + struct_pack('>II', len(entries), len(data)) + index + data
+
+
+def rpm_bytes(name, version, release, arch='x86_64', *, epoch=None, requires=(), files=('/opt/duoauthproxy/bin/authproxyctl', '/etc/duoauthproxy.cfg'), payload=b'payload'):
+	"""RPM package
+	A binary RPM package: lead, signature and main header (name, EVR, arch, the "requires", the "files" and a changelog entry) followed by the "payload" bytes, which nothing reads.
+	"""
+	
+	directories = sorted({file_name.rpartition('/')[0] + '/' for file_name in files})
+	entries = [
+		(1000, 6, name), (1001, 6, version), (1002, 6, release), (1004, 9, 'Summary of {}'.format(name)), (1005, 9, 'Description of {}'.format(name)), (1006, 4, [1700000000]), (1009, 4, [4096]),
+		(1022, 6, arch), (1030, 3, [0o100644] * len(files)), (1037, 4, [0] * len(files)), (1044, 6, '{}-{}-{}.src.rpm'.format(name, version, release)),
+		(1047, 8, [name]), (1112, 4, [8]), (1113, 8, ['{}-{}'.format(version, release)]),
+		(1049, 8, ['rpmlib(CompressedFileNames)'] + list(requires)), (1048, 4, [0x1000008] + [0] * len(requires)), (1050, 8, ['3.0.4-1'] + [''] * len(requires)),
+		(1080, 4, [1700000000]), (1081, 8, ['Packager <packager@example.com>']), (1082, 8, ['- Release {}'.format(release)]),
+		(1116, 4, [directories.index(file_name.rpartition('/')[0] + '/') for file_name in files]), (1117, 8, [file_name.rpartition('/')[2] for file_name in files]), (1118, 8, directories),
+	]
+	if epoch is not None:
+		entries.append((1003, 4, [epoch]))
+	entries.sort()
+	signature = rpm_header([(1000, 4, [1234])])
+	return b'\xed\xab\xee\xdb\x03\x00\x00\x00' + b'\x00' * 88 + signature + b'\x00' * ((8 - len(signature) % 8) % 8) + rpm_header(entries) + payload
+
+
+def build_tarball(directory, version='6.4.1', *, entries=None, root_dir=None, **details):
+	"""Build a source tarball
+	Writes "duoauthproxy-<version>-src.tgz" into "directory" with the "entries" (the "tarball_entries" by default, built with "details") below "root_dir", adding the parent directories as members too. Returns its path.
+	"""
+	
+	entries = tarball_entries(version, **details) if entries is None else entries
+	root_dir = 'duoauthproxy-{}-abc123-src'.format(version) if root_dir is None else root_dir
+	tarball_path = Path(directory) / 'duoauthproxy-{}-src.tgz'.format(version)
+	with tarfile_open(tarball_path, 'w:gz') as tarball:
+		directories = set()
+		for name in sorted(entries):
+			parts = name.split('/')
+			for position in range(1, len(parts)):
+				parent = '/'.join(parts[:position])
+				if parent not in directories:
+					directories.add(parent)
+					member = TarInfo('{}/{}'.format(root_dir, parent))
+					member.type, member.mode = DIRTYPE, 0o755
+					tarball.addfile(member)
+			member = TarInfo('{}/{}'.format(root_dir, name))
+			member.size, member.mode = len(entries[name]), 0o644
+			tarball.addfile(member, BytesIO(entries[name]))
+	return tarball_path
@@ -0,0 +1,67 @@
+#!python
+"""Pipeline benchmark tests
+"""
+
+from json import loads as json_loads
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from duoauthproxy_installer import DuoAuthProxyInstaller
+from duoauthproxy_installer._wheels import WheelResolver
+
+from ._synthetic import build_tarball, write_wheel
+
+
+class BenchmarkPipelineTest(TestCase):
+	"""Pipeline benchmark
+	The whole build against the stand-ins and the local server, with no time spent in the tools.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+		self.wheelhouse = self.temp_dir / 'wheelhouse'
+		self.wheelhouse.mkdir()
+		write_wheel(self.wheelhouse, 'gamma', '2.0')
+		self.tarball = build_tarball(self.temp_dir)
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def test_benchmark(self):
+		"""Benchmark results
+		Every phase and stage is timed, the critical path is a chain of stages ending with the last one to finish, and the wheels are fetched and pinned for the stand-in interpreter.
+		"""
+		
+		results_file = self.temp_dir / 'results.json'
+		for_interpreter = WheelResolver.for_interpreter
+		with patch.object(WheelResolver, 'for_interpreter', autospec=True, side_effect=for_interpreter) as resolver_for, patch.object(DuoAuthProxyInstaller, 'compute_requirements', wraps=DuoAuthProxyInstaller.compute_requirements) as compute_requirements:
+			results = DuoAuthProxyInstaller.benchmark_pipeline(self.tarball, wheelhouse=self.wheelhouse, time_scale=0, history_file=self.temp_dir / 'missing_history.json', results_file=results_file)
+		
+		self.assertEqual(results, json_loads(results_file.read_text()))
+		self.assertEqual(results['rpms'], ['duoauthproxy-6.4.1-1.x86_64.rpm'])
+		self.assertEqual(sorted(results['phases']), ['build_rpm', 'prepare', 'publish', 'total'])
+		self.assertEqual(sorted(results['stages']), sorted(stage.name for stage in DuoAuthProxyInstaller('6.4.1').stages()))
+		self.assertGreater(results['requests'], 0)
+		self.assertEqual(results['stand_ins']['rpmvenv']['calls'], 1)
+		
+		path = [step['stage'] for step in results['critical_path']]
+		self.assertEqual(path[0], 'tarball_path')
+		self.assertEqual(path[-1], max(results['stages'], key=lambda name: results['stages'][name]['end']))
+		for step in results['critical_path']:
+			self.assertEqual(step['duration'], results['stages'][step['stage']]['duration'])
+		
+		interpreters = [Path(call.args[1]) for call in resolver_for.call_args_list] + [Path(call.kwargs['python']) for call in compute_requirements.call_args_list]
+		self.assertEqual(len(interpreters), 2)
+		for python in interpreters:
+			self.assertEqual(python.relative_to(python.parents[2]), Path('standins', 'bin', 'python'))
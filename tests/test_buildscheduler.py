@@ -0,0 +1,163 @@
+#!python
+"""Build scheduler tests
+"""
+
+from json import dumps as json_dumps, loads as json_loads
+from pathlib import Path
+from subprocess import run
+from sys import executable
+from tempfile import TemporaryDirectory
+from threading import Event, Lock
+from unittest import TestCase
+
+from duoauthproxy_installer._buildscheduler import DEFAULT_ESTIMATE, BuildHistory, BuildScheduler, measured_command
+
+
+class BuildHistoryTest(TestCase):
+	"""Build history
+	Recording the resources used by the builds and estimating the next ones.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.history_file = Path(self._temp_dir.name) / 'cache' / 'build_history.json'
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def test_estimates(self):
+		"""Estimates
+		A recorded version is estimated out of its own build, another version out of the latest build of the package, and unknown packages get the default values.
+		"""
+		
+		history = BuildHistory(self.history_file)
+		self.assertEqual(history.estimate('beta', '1.0'), DEFAULT_ESTIMATE)
+		
+		history.record('Beta', '1.0', peak_rss=100, duration=10.0, cpu_time=30.0)
+		history.record('beta', '2.0', peak_rss=200, duration=4.0, cpu_time=1.0)
+		
+		history = BuildHistory(self.history_file)
+		self.assertEqual(history.estimate('beta', '1.0'), {'cpu': 3.0, 'duration': 10.0, 'peak_rss': 100})
+		self.assertEqual(history.estimate('BETA', '3.0'), {'cpu': 1.0, 'duration': 4.0, 'peak_rss': 200})
+		self.assertEqual(history.estimate('gamma'), DEFAULT_ESTIMATE)
+		self.assertEqual(sorted(json_loads(self.history_file.read_text())['beta']), ['1.0', '2.0'])
+	
+	def test_corrupted_history(self):
+		"""Corrupted history
+		A history file that doesn't parse is ignored, with a warning, and replaced on the next record.
+		"""
+		
+		self.history_file.parent.mkdir(parents=True)
+		self.history_file.write_text('{"beta": ')
+		history = BuildHistory(self.history_file)
+		with self.assertLogs('duoauthproxy_installer', 'WARNING'):
+			self.assertEqual(history.estimate('beta'), DEFAULT_ESTIMATE)
+		history.record('beta', '1.0', peak_rss=100, duration=1.0)
+		self.assertEqual(json_loads(self.history_file.read_text())['beta']['1.0']['cpu'], 1.0)
+	
+	def test_measured_command(self):
+		"""Measured command
+		The interpreter runs the command in a child process and leaves its resource usage behind, keeping its exit code.
+		"""
+		
+		usage_file = Path(self._temp_dir.name) / 'usage.json'
+		result = run((executable,) + measured_command(usage_file, '-c', 'import sys; sys.exit(3)'))
+		
+		self.assertEqual(result.returncode, 3)
+		usage = json_loads(usage_file.read_text())
+		self.assertEqual(sorted(usage), ['cpu_time', 'duration', 'peak_rss'])
+		self.assertGreater(usage['peak_rss'], 0)
+
+
+class BuildSchedulerTest(TestCase):
+	"""Build scheduler
+	Admitting the builds against the memory and CPU budgets, longest first.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.history = BuildHistory(Path(self._temp_dir.name) / 'build_history.json')
+		for package, duration, peak_rss in (('blocker', 1.0, 60), ('short', 1.0, 60), ('long', 100.0, 60), ('small', 50.0, 10), ('huge', 1.0, 1000)):
+			self.history.record(package, '1.0', peak_rss=peak_rss, duration=duration)
+		self.started, self.running, self.concurrency = [], 0, 0
+		self._lock = Lock()
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def build(self, package, release=None, *, usage_file):
+		"""Build function
+		Records the start and the amount of builds running at once, waiting for "release" (an Event) if given.
+		"""
+		
+		with self._lock:
+			self.started.append(package)
+			self.running += 1
+			self.concurrency = max(self.concurrency, self.running)
+		if release is not None:
+			release.wait(10)
+		with self._lock:
+			self.running -= 1
+		return package
+	
+	def test_memory_budget_and_order(self):
+		"""Admission
+		The builds that don't fit in the memory budget wait, and the longest of them starts first; the ones that fit run alongside.
+		"""
+		
+		release = Event()
+		with BuildScheduler(self.history, memory_budget=100, cpu_budget=4) as scheduler:
+			futures = [scheduler.submit('blocker', '1.0', self.build, 'blocker', release)]
+			futures += [scheduler.submit(package, '1.0', self.build, package) for package in ('short', 'long', 'small')]
+			self.assertEqual(futures[3].result(10), 'small')
+			self.assertEqual(self.started, ['blocker', 'small'])
+			release.set()
+			self.assertEqual([future.result(10) for future in futures], ['blocker', 'short', 'long', 'small'])
+		
+		self.assertEqual(self.started, ['blocker', 'small', 'long', 'short'])
+		self.assertLessEqual(self.concurrency, 2)
+	
+	def test_over_budget_runs_alone(self):
+		"""Over budget builds
+		A build estimated over the budget still runs, once nothing else is running.
+		"""
+		
+		with BuildScheduler(self.history, memory_budget=100, cpu_budget=4) as scheduler:
+			futures = [scheduler.submit(package, '1.0', self.build, package) for package in ('huge', 'short', 'huge')]
+			self.assertEqual([future.result(10) for future in futures], ['huge', 'short', 'huge'])
+		self.assertEqual(self.concurrency, 1)
+	
+	def test_usage_is_recorded(self):
+		"""Usage recording
+		The usage left by the build is recorded in the history; the failed builds raise out of their future and aren't recorded.
+		"""
+		
+		def measured_build(usage_file):
+			usage_file.write_text(json_dumps({'peak_rss': 42, 'duration': 8.0, 'cpu_time': 16.0}))
+		
+		def failed_build(usage_file):
+			raise RuntimeError('broken build')
+		
+		with BuildScheduler(self.history, memory_budget=100, cpu_budget=4) as scheduler:
+			scheduler.submit('delta', '1.0', measured_build).result(10)
+			with self.assertRaisesRegex(RuntimeError, 'broken build'):
+				scheduler.submit('epsilon', '1.0', failed_build).result(10)
+		
+		self.assertEqual(self.history.estimate('delta', '1.0'), {'cpu': 2.0, 'duration': 8.0, 'peak_rss': 42})
+		self.assertNotIn('epsilon', self.history.builds)
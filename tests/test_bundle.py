@@ -0,0 +1,92 @@
+#!python
+"""Site-packages bundle tests
+"""
+
+from json import loads as json_loads
+from pathlib import Path, PurePosixPath
+from subprocess import run
+from sys import executable
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from duoauthproxy_installer._bundle import BUNDLE_FILE, IMPORTER_MODULE, PTH_FILE, SitePackagesBundle
+
+from ._synthetic import write_wheel
+
+IMPORT_SCRIPT = '''import json, sys
+from importlib.metadata import version
+sys.path.insert(0, sys.argv[1])
+import {importer}
+{importer}.install(sys.argv[2])
+import alpha.sub
+from alpha import helpers
+print(json.dumps({{'value': alpha.sub.VALUE, 'helpers': helpers.VALUE, 'file': alpha.sub.__file__, 'package': alpha.__spec__.submodule_search_locations[0], 'version': version('alpha'), 'source': __import__('inspect').getsource(alpha.sub)}}))
+'''.format(importer=IMPORTER_MODULE)
+
+
+class SitePackagesBundleTest(TestCase):
+	"""Site-packages bundle
+	Picking the wheels that can be bundled, and importing the bundled modules through the importer.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+		self.wheels = {
+			'alpha': write_wheel(self.temp_dir, 'alpha', '1.0', files={
+				'alpha/__init__.py': b'',
+				'alpha/sub.py': b'VALUE = 42\n',
+				'alpha-1.0.dist-info/entry_points.txt': b'[console_scripts]\nalpha-tool = alpha.sub:main\n',
+				'alpha-1.0.data/purelib/alpha/helpers.py': b'VALUE = "helper"\n',
+				'alpha-1.0.data/scripts/alpha-script': b'#!python\nprint("script")\n',
+			}),
+			'beta': write_wheel(self.temp_dir, 'beta', '1.0', files={'beta/__init__.py': b'', 'beta/_speedups.cpython-311-x86_64-linux-gnu.so': b'\x7fELF'}),
+			'delta': write_wheel(self.temp_dir, 'delta', '1.0', 'cp311-cp311-linux_x86_64'),
+			'duoauthproxy': write_wheel(self.temp_dir, 'duoauthproxy', '6.4.1'),
+			'epsilon': write_wheel(self.temp_dir, 'epsilon', '1.0', files={'epsilon/__init__.py': b'', 'epsilon-1.0.data/data/share/epsilon.txt': b'data'}),
+		}
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def test_bundled_wheels(self):
+		"""Bundled wheels
+		Only the pure python wheels without data files get bundled, and not the ones listed as unbundled.
+		"""
+		
+		bundle = SitePackagesBundle(self.wheels.values(), python=executable, unbundled=['DuoAuthProxy'])
+		
+		self.assertEqual(sorted(bundle.bundled), ['alpha'])
+		self.assertEqual(sorted(bundle.unbundled), ['beta', 'delta', 'duoauthproxy', 'epsilon'])
+		self.assertEqual(SitePackagesBundle.inspect(self.wheels['beta']), ('beta', 'extension module beta/_speedups.cpython-311-x86_64-linux-gnu.so'))
+		self.assertEqual(SitePackagesBundle.inspect(self.wheels['delta']), ('delta', 'not purelib'))
+		self.assertEqual(SitePackagesBundle.inspect(self.wheels['epsilon']), ('epsilon', 'data file epsilon-1.0.data/data/share/epsilon.txt'))
+	
+	def test_import_from_bundle(self):
+		"""Importing from the bundle
+		The bundled modules (including the purelib data ones) are imported out of the zip, with their metadata and sources available; the scripts are left on disk.
+		"""
+		
+		output_dir, target_install_path = self.temp_dir / 'venv', self.temp_dir / 'opt' / 'duoauthproxy'
+		bundle = SitePackagesBundle([self.wheels['alpha'], self.wheels['duoauthproxy']], python=executable, unbundled=['duoauthproxy'])
+		files = bundle.build(output_dir, target_install_path=target_install_path)
+		
+		site_packages = PurePosixPath('lib', 'python{}'.format(bundle.python_version), 'site-packages')
+		self.assertEqual(sorted(map(str, files)), sorted(map(str, [PurePosixPath('bin', 'alpha-script'), PurePosixPath('bin', 'alpha-tool'), BUNDLE_FILE, site_packages / (IMPORTER_MODULE + '.py'), site_packages / PTH_FILE])))
+		self.assertTrue((output_dir / 'bin' / 'alpha-script').read_text().startswith('#!{}\n'.format(target_install_path / 'bin' / 'python')))
+		self.assertFalse((output_dir / 'lib' / 'alpha').exists())
+		
+		result = run((executable, '-I', '-B', '-c', IMPORT_SCRIPT, str(output_dir / site_packages), str(output_dir / BUNDLE_FILE)), capture_output=True, text=True)
+		self.assertEqual(result.returncode, 0, result.stderr)
+		imported = json_loads(result.stdout)
+		self.assertEqual((imported['value'], imported['helpers'], imported['version'], imported['source']), (42, 'helper', '1.0', 'VALUE = 42\n'))
+		self.assertEqual(imported['file'], str(output_dir / BUNDLE_FILE / 'alpha' / 'sub.py'))
+		self.assertEqual(imported['package'], str(output_dir / BUNDLE_FILE / 'alpha'))
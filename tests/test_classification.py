@@ -0,0 +1,76 @@
+#!python
+"""Wheel classification tests
+"""
+
+from json import loads as json_loads
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from pip._vendor.packaging.tags import sys_tags
+
+from duoauthproxy_installer import InstallerTarball
+from duoauthproxy_installer._wheels import interpreter_tags
+
+from ._synthetic import build_tarball, other_python, wheel_bytes
+
+
+class ClassifyWheelsTest(TestCase):
+	"""Wheel classification
+	Sorting the tarball wheels into build venv, compatible and missing ones.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def test_classification(self):
+		"""Classification
+		The build venv wheels go apart, the best ranked compatible build is picked per distribution and the distributions without a compatible build are reported missing.
+		"""
+		
+		best_tag = str(next(iter(sys_tags())))
+		wheels = {
+			'alpha-1.0-py3-none-any.whl': wheel_bytes('alpha', '1.0'),
+			'delta-1.0-py3-none-any.whl': wheel_bytes('delta', '1.0'),
+			'delta-1.0-{}.whl'.format(best_tag): wheel_bytes('delta', '1.0', best_tag),
+			'gamma-2.0-cp27-cp27mu-manylinux1_x86_64.whl': wheel_bytes('gamma', '2.0', 'cp27-cp27mu-manylinux1_x86_64'),
+			'setuptools-69.0.0-py3-none-any.whl': wheel_bytes('setuptools', '69.0.0'),
+			'wheel-0.43.0-py3-none-any.whl': wheel_bytes('wheel', '0.43.0'),
+		}
+		tarball = InstallerTarball(build_tarball(self.temp_dir, wheels=wheels))
+		venv_wheels, local_wheels, missing_wheels = tarball.classify_wheels()
+		
+		self.assertEqual(venv_wheels, {'setuptools': '69.0.0', 'wheel': '0.43.0'})
+		self.assertEqual(local_wheels, {'alpha': 'alpha-1.0-py3-none-any.whl', 'delta': 'delta-1.0-{}.whl'.format(best_tag)})
+		self.assertEqual(missing_wheels, {'gamma': '2.0'})
+	
+	def test_other_interpreter_tags_are_cached(self):
+		"""Tags of another interpreter
+		The tags come from the interpreter itself and are kept in the cache file, keyed by the interpreter path and modification time.
+		"""
+		
+		python = other_python()
+		if python is None:
+			self.skipTest('No other interpreter available')
+		
+		cache_file = self.temp_dir / 'tags.json'
+		tags = interpreter_tags(python, cache_file=cache_file)
+		self.assertIn(tags[0], tags)
+		self.assertNotEqual(tags[0], str(next(iter(sys_tags()))))
+		
+		cache = json_loads(cache_file.read_text())
+		self.assertEqual(len(cache), 1)
+		self.assertTrue(next(iter(cache)).startswith(str(python.resolve())))
+		self.assertEqual(tuple(next(iter(cache.values()))), tags)
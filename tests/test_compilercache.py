@@ -0,0 +1,111 @@
+#!python
+"""Compiler cache tests
+"""
+
+from json import dumps as json_dumps
+from pathlib import Path
+from shlex import split as shlex_split
+from subprocess import run
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from duoauthproxy_installer._compilercache import CompilerCache
+
+FAKE_CCACHE = '''#!/bin/sh
+# Records a miss the first time a source is seen and a hit afterwards, the way ccache writes its stats log
+mkdir -p "$CCACHE_DIR"
+key=$(echo "$@" | md5sum | cut -d' ' -f1)
+if [ -e "$CCACHE_DIR/$key" ]; then
+	echo direct_cache_hit >> "$CCACHE_STATSLOG"
+else
+	touch "$CCACHE_DIR/$key"
+	echo cache_miss >> "$CCACHE_STATSLOG"
+fi
+exec "$@"
+'''
+FAKE_SCCACHE = '''#!/bin/sh
+cat "$SCCACHE_DIR/stats.json"
+'''
+
+
+class CompilerCacheTest(TestCase):
+	"""Compiler cache
+	The build environment with the cache wrappers, and the hits and misses accounted per module.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+		self.tools = {}
+		for name, script in (('ccache', FAKE_CCACHE), ('sccache', FAKE_SCCACHE)):
+			self.tools[name] = self.temp_dir / name
+			self.tools[name].write_text(script)
+			self.tools[name].chmod(0o755)
+		self.cache_dir = self.temp_dir / 'cache'
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def rust_counters(self, hits, misses):
+		"""Set the sccache counters
+		Writes the stats the fake sccache reports.
+		"""
+		
+		(self.cache_dir / 'sccache').mkdir(parents=True, exist_ok=True)
+		(self.cache_dir / 'sccache' / 'stats.json').write_text(json_dumps({'stats': {'cache_hits': {'counts': {'Rust': hits}}, 'cache_misses': {'counts': {'Rust': misses}}}}))
+	
+	def test_environment(self):
+		"""Build environment
+		The compilers go through ccache, rustc through sccache, and everything lives in the cache directory.
+		"""
+		
+		cache = CompilerCache(self.cache_dir, ccache=str(self.tools['ccache']), sccache=str(self.tools['sccache']))
+		environment = cache.environment({'PATH': '/usr/bin', 'CC': 'clang'})
+		
+		self.assertEqual(environment['CC'], '{} clang'.format(self.tools['ccache']))
+		self.assertEqual(environment['CXX'], '{} g++'.format(self.tools['ccache']))
+		self.assertEqual(environment['RUSTC_WRAPPER'], str(self.tools['sccache']))
+		for name, directory in (('CCACHE_DIR', 'ccache'), ('SCCACHE_DIR', 'sccache'), ('CARGO_HOME', 'cargo'), ('CARGO_TARGET_DIR', 'cargo-target')):
+			self.assertEqual(environment[name], str(self.cache_dir / directory))
+		self.assertEqual(environment['PATH'], '/usr/bin')
+		self.assertNotIn('CCACHE_STATSLOG', environment)
+	
+	def test_no_wrappers(self):
+		"""No wrappers
+		Without ccache nor sccache the compilers are left alone, with a warning.
+		"""
+		
+		with self.assertLogs('duoauthproxy_installer', 'WARNING'):
+			cache = CompilerCache(self.cache_dir, ccache='', sccache='')
+		environment = cache.environment({})
+		self.assertNotIn('CC', environment)
+		self.assertNotIn('RUSTC_WRAPPER', environment)
+		self.assertIsNone(cache.rust_stats())
+	
+	def test_tracked_builds(self):
+		"""Hits per module
+		Every tracked build gets its own hits and misses, out of the ccache stats log and the sccache counters.
+		"""
+		
+		source = self.temp_dir / 'module.c'
+		source.write_text('int value(void) { return 1; }\n')
+		cache = CompilerCache(self.cache_dir, ccache=str(self.tools['ccache']), sccache=str(self.tools['sccache']))
+		self.rust_counters(0, 0)
+		
+		for module in ('first', 'second'):
+			with cache.track(module) as environment:
+				run(shlex_split(environment['CC']) + ['-c', str(source), '-o', str(self.temp_dir / 'module.o')], env=environment, check=True)
+				if module == 'second':
+					self.rust_counters(3, 1)
+		
+		self.assertEqual(cache.report['first'], {'hits': 0, 'misses': 1, 'hit_rate': 0.0})
+		self.assertEqual(cache.report['second'], {'hits': 4, 'misses': 1, 'hit_rate': 0.8})
+		self.assertTrue((self.temp_dir / 'module.o').exists())
@@ -0,0 +1,105 @@
+#!python
+"""Build daemon tests
+"""
+
+from json import loads as json_loads
+from pathlib import Path
+from shutil import copy
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import TestCase
+
+from duoauthproxy_installer._daemon import BuildClient, BuildDaemon, BuildJob, BuildRequestHandler, ThreadingUnixHTTPServer, parse_address
+from duoauthproxy_installer._standins import StandIns
+
+from ._synthetic import build_tarball, write_wheel
+
+
+class BuildDaemonTest(TestCase):
+	"""Build daemon
+	Running jobs on warm installers, and the HTTP API on a unix socket, with the stand-in interpreter and rpmvenv.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+		wheelhouse = self.temp_dir / 'wheelhouse'
+		wheelhouse.mkdir()
+		write_wheel(wheelhouse, 'gamma', '2.0')
+		self.daemon = BuildDaemon(self.temp_dir / 'daemon.sock', max_jobs=2, work_dir=self.temp_dir / 'daemon', installer_root=self.temp_dir / 'root', wheelhouse=wheelhouse, index_url=None, build_missing_wheels=False)
+		copy(build_tarball(self.temp_dir), self.daemon.installer('6.4.1')[0].download_dir)
+		self._stand_ins = StandIns(self.temp_dir / 'standins', time_scale=0)
+		self.stand_ins = self._stand_ins.__enter__()
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._stand_ins.__exit__(None, None, None)
+		self.daemon.executor.shutdown(wait=True)
+		self._temp_dir.cleanup()
+	
+	def test_addresses(self):
+		"""Addresses
+		A "host:port" is a TCP address, a path (optionally with the "unix:" prefix) a unix socket.
+		"""
+		
+		for address, expected in (('127.0.0.1:8750', ('127.0.0.1', 8750)), (':9000', ('127.0.0.1', 9000)), ('/run/build.sock', '/run/build.sock'), ('unix:build:1', 'build:1'), ('relative/dir:1', 'relative/dir:1')):
+			self.assertEqual(parse_address(address), expected, address)
+	
+	def test_warm_installer(self):
+		"""Warm installer
+		The first job of a version runs the whole preparation, the next ones just refresh the assets. The jobs use the default target interpreter, which the daemon host doesn't need to have.
+		"""
+		
+		jobs = [self.daemon.run_job(self.daemon.jobs.setdefault(job.id, job)) for job in (self._job('1'), self._job('2'))]
+		
+		self.assertEqual([(job.status, job.error, job.warm) for job in jobs], [('succeeded', None, False), ('succeeded', None, True)])
+		self.assertIn('stages', jobs[0].timings)
+		self.assertNotIn('stages', jobs[1].timings)
+		self.assertGreaterEqual(jobs[1].timings['run'], jobs[1].timings['prepare'])
+		self.assertEqual(sorted(rpm.name for rpm in (self.temp_dir / 'dist').glob('*.rpm')), ['duoauthproxy-6.4.1-1.x86_64.rpm', 'duoauthproxy-6.4.1-2.x86_64.rpm'])
+		self.assertEqual(self.daemon.status()['warm'], ['6.4.1'])
+		self.assertEqual(self.daemon.status()['jobs'], {'succeeded': 2})
+		self.assertEqual(json_loads((self.temp_dir / 'daemon' / 'jobs' / jobs[1].id / 'rpm_data' / 'duoauthproxy.6.4.1.json').read_text())['python_venv']['cmd'], 'python3 -m venv')
+	
+	def test_http_api(self):
+		"""HTTP API
+		The client submits a job and waits for it over the unix socket; unknown jobs and invalid requests are errors.
+		"""
+		
+		server = ThreadingUnixHTTPServer(self.daemon.address, BuildRequestHandler)
+		server.build_daemon = self.daemon
+		server_thread = Thread(target=server.serve_forever)
+		server_thread.start()
+		try:
+			client = BuildClient('unix:{}'.format(self.daemon.address), timeout=10)
+			submitted = client.submit('6.4.1', '1', dist_dir=str(self.temp_dir / 'dist'), python=str(self.stand_ins.python))
+			self.assertEqual((submitted['release_tag'], submitted['build_format']), ('1', 'rpm'))
+			
+			finished = client.wait(submitted['id'], poll_interval=0.05, timeout=60)
+			self.assertEqual((finished['status'], finished['error'], finished['warm']), ('succeeded', None, False))
+			self.assertEqual([job['id'] for job in client.jobs()], [submitted['id']])
+			self.assertEqual(client.status()['address'], self.daemon.address)
+			self.assertTrue((self.temp_dir / 'dist' / 'duoauthproxy-6.4.1-1.x86_64.rpm').is_file())
+			
+			with self.assertRaisesRegex(RuntimeError, r'\(404\).*Unknown job'):
+				client.job('missing')
+			with self.assertRaisesRegex(RuntimeError, r'\(400\).*Unsupported build format'):
+				client.submit('6.4.1', '2', build_format='deb')
+		finally:
+			server.shutdown()
+			server.server_close()
+			server_thread.join()
+	
+	def _job(self, release_tag):
+		"""
+		
+		"""
+		
+		return BuildJob('6.4.1', release_tag, dist_dir=str(self.temp_dir / 'dist'))
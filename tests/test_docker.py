@@ -0,0 +1,71 @@
+#!python
+"""Docker build context tests
+"""
+
+from pathlib import Path, PurePath
+from tarfile import open as tarfile_open
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipIf
+
+import duoauthproxy_installer
+from duoauthproxy_installer import DockerfileTemplate
+
+DOCKERFILE = '''FROM almalinux:9 AS builder
+COPY --chown=root:root dist/*.whl ./
+ADD ["conf", "/etc/duoauthproxy/"]
+COPY --from=builder /root/RPMS /root/RPMS
+ADD https://example.com/archive.tgz /tmp/
+COPY install.py \\
+	/root/
+RUN python3 install.py
+'''
+
+
+@skipIf((duoauthproxy_installer.Jinja2Environment is None) or (duoauthproxy_installer.docker_from_env is None), 'The "jinja2" and "docker" packages are required')
+class DockerContextTest(TestCase):
+	"""Docker build context
+	Only the files referenced by the COPY/ADD instructions make it into the context sent to the docker daemon.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.root_dir = Path(self._temp_dir.name)
+		for name, content in (('dist/duoauthproxy_installer-0.1.0.dev0-py3-none-any.whl', b'wheel'), ('dist/other.tar.gz', b'sdist'), ('conf/authproxy.cfg', b'[main]\n'), ('conf/extra/ldap.cfg', b'[ldap]\n'), ('install.py', b'print()\n'), ('big/unrelated.bin', bytes(4096))):
+			(self.root_dir / name).parent.mkdir(parents=True, exist_ok=True)
+			(self.root_dir / name).write_bytes(content)
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def test_context_files(self):
+		"""Context files
+		Wildcards are expanded and directories included recursively; the remote sources and the ones from other stages are left out.
+		"""
+		
+		template = DockerfileTemplate('el9', '3.11', self.root_dir)
+		self.assertEqual(template.context_files(DOCKERFILE), [PurePath('conf/authproxy.cfg'), PurePath('conf/extra/ldap.cfg'), PurePath('dist/duoauthproxy_installer-0.1.0.dev0-py3-none-any.whl'), PurePath('install.py')])
+		
+		with self.assertRaises(FileNotFoundError):
+			template.context_files('COPY missing.txt /root/\n')
+	
+	def test_build_context(self):
+		"""Build context tarball
+		The context has the rendered Dockerfile and the wheel it copies, nothing else from the root directory.
+		"""
+		
+		template = DockerfileTemplate('el9', '3.11', self.root_dir, version_tag='6.4.1', target_install_path='/opt/duoauthproxy', dist_dir='/root/RPMS', release_tag='1')
+		context = template.build_context()
+		
+		with tarfile_open(fileobj=context) as context_tarball:
+			self.assertEqual(context_tarball.getnames(), ['Dockerfile', 'dist/duoauthproxy_installer-0.1.0.dev0-py3-none-any.whl'])
+			self.assertEqual(context_tarball.extractfile('Dockerfile').read().decode('utf8'), str(template))
+		self.assertEqual(template.context_size, context.seek(0, 2))
+		self.assertFalse((self.root_dir / 'Dockerfile').exists())
@@ -0,0 +1,217 @@
+#!python
+"""el7 packager tests
+"""
+
+from importlib.util import module_from_spec, spec_from_file_location
+from os import environ
+from pathlib import Path
+from subprocess import run
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+try:
+	import patch as patch_module
+except ImportError:
+	patch_module = None
+
+from ._synthetic import build_tarball, source_package, tarball_entries
+
+BUILD_RPMS = Path(__file__).parent.parent / 'el7' / 'build-rpms.py'
+FAKE_SETUP_PY = '''import pathlib, sys
+if {fail!r}:
+    sys.exit('broken build for {name}')
+pathlib.Path('dist').mkdir()
+pathlib.Path('dist', '{name}-1.0-{tag}.whl').write_bytes(b'wheel')
+'''
+NON_IDEMPOTENT_PATCH = '''--- upstream/pkgs/duoauthproxy/duoauthproxy/__init__.py
++++ patched/pkgs/duoauthproxy/duoauthproxy/__init__.py
+@@ -1,1 +1,2 @@
+ VALUE = 1
++PATCHED = True
+'''
+PYTHON36 = Path.home() / '.pyenv' / 'versions' / '3.6.15' / 'bin' / 'python3.6'
+
+
+def load_build_rpms():
+	"""Load build-rpms.py
+	The el7 packager script as a module (its file name is not importable).
+	"""
+	
+	spec = spec_from_file_location('build_rpms', str(BUILD_RPMS))
+	module = module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+
+class PrepareSourcesTest(TestCase):
+	"""Early source preparation
+	The "--prepare-only" run of build-rpms.py, that runs on the system python of the build host while the bundled interpreter is being built.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def test_neutral_wheels(self):
+		"""Interpreter neutral wheels
+		Only the wheels without ABI, platform nor python minor version are neutral.
+		"""
+		
+		build_rpms = load_build_rpms()
+		for wheel_name, expected in (('beta-1.0-py3-none-any.whl', True), ('beta-1.0-py2.py3-none-any.whl', True), ('beta-1.0-py36-none-any.whl', False), ('beta-1.0-cp36-none-any.whl', False), ('beta-1.0-cp36-cp36m-linux_x86_64.whl', False), ('beta-1.0-1-py3-none-any.whl', True)):
+			self.assertEqual(build_rpms.is_neutral_wheel(wheel_name), expected, wheel_name)
+	
+	def test_prepare_only_on_python36(self):
+		"""Early builds on python 3.6
+		The early builds run on python 3.6; only the neutral wheels of the pure python packages are kept, and the failed builds are reported as warnings with their output.
+		"""
+		
+		if not PYTHON36.exists():
+			self.skipTest('No python 3.6 available')
+		
+		sources = {
+			'beta-1.0': {'setup.py': FAKE_SETUP_PY.format(name='beta', tag='py3-none-any', fail=False).encode('utf8')},
+			'delta-1.0': {'setup.py': FAKE_SETUP_PY.format(name='delta', tag='py3-none-any', fail=False).encode('utf8'), 'delta/_speedups.c': b'int x;\n'},
+			'epsilon-1.0': {'setup.py': FAKE_SETUP_PY.format(name='epsilon', tag='cp36-none-any', fail=False).encode('utf8')},
+			'zeta-1.0': {'setup.py': FAKE_SETUP_PY.format(name='zeta', tag='py3-none-any', fail=True).encode('utf8')},
+		}
+		tarball = build_tarball(self.temp_dir, entries=tarball_entries(sources=sources, wheels={}))
+		site_dir = self.temp_dir / 'site'
+		(site_dir / 'wheel').mkdir(parents=True)
+		(site_dir / 'wheel' / '__init__.py').write_text('# Only has to be found, the fake setup.py scripts build the wheels\n')
+		environment = {name: value for name, value in environ.items() if name not in ('COMPILER_CACHE', 'PYTHONPATH')}
+		environment['PYTHONPATH'] = str(site_dir)
+		
+		result = run((str(PYTHON36), str(BUILD_RPMS), '--prepare-only', '--source-tarball', str(tarball), '--jobs', '2', '1.el7'), cwd=str(self.temp_dir), env=environment, capture_output=True, text=True)
+		
+		self.assertEqual(result.returncode, 0, result.stderr)
+		pkgs_dir = self.temp_dir / 'rpmvenv' / 'source' / 'duoauthproxy-6.4.1-abc123-src' / 'pkgs'
+		self.assertEqual([wheel.name for wheel in (pkgs_dir / 'beta-1.0' / 'dist').iterdir()], ['beta-1.0-py3-none-any.whl'])
+		for package in ('delta-1.0', 'epsilon-1.0', 'zeta-1.0'):
+			self.assertFalse((pkgs_dir / package / 'dist').exists(), package)
+		self.assertIn("'beta': PosixPath(", result.stdout)
+		warnings = [line for line in result.stderr.splitlines() if '|WARNING:' in line]
+		self.assertTrue(any(('epsilon' in line) and ('specific to the running interpreter' in line) for line in warnings), result.stderr)
+		self.assertTrue(any(('zeta' in line) and ('failed' in line) for line in warnings), result.stderr)
+		self.assertIn('broken build for zeta', result.stderr)
+		self.assertNotIn('TypeError', result.stderr)
+
+
+class SourceDirectoryTest(TestCase):
+	"""Source directory
+	Extracting and patching the tarball on the regular run, and reusing the result.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+		self.build_rpms = load_build_rpms()
+		self.tarball = build_tarball(self.temp_dir, entries=tarball_entries(sources={'beta-1.0': source_package('beta', '1.0'), 'duoauthproxy': source_package('duoauthproxy', '6.4.1')}, wheels={}))
+		(self.temp_dir / 'duoauthproxy.patch').write_text(NON_IDEMPOTENT_PATCH)
+		
+		self.venv_path = self.temp_dir / 'venv'
+		dist_info = self.venv_path / 'lib' / 'python3.11' / 'site-packages' / 'beta-1.0.dist-info'
+		dist_info.mkdir(parents=True)
+		(dist_info / 'METADATA').write_text('Metadata-Version: 2.1\nName: beta\nVersion: 1.0\n')
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def packager(self):
+		"""Packager
+		A StandardDUOProxy working in the temporary directory, keeping the directories that exist already and using the build venv.
+		"""
+		
+		result = self.build_rpms.StandardDUOProxy('1.el7', recreate_paths=False, rpmbuild=str(self.temp_dir / 'rpmbuild'), source_tarball=str(self.tarball))
+		result.base_path = self.temp_dir / 'rpmvenv'
+		result.base_path.mkdir(exist_ok=True)
+		result.venv_path = self.venv_path
+		return result
+	
+	def test_venv_packages_are_extracted(self):
+		"""Build venv packages
+		The packages already installed in the build venv are extracted anyway, so they keep their place in the package list.
+		"""
+		
+		packager = self.packager()
+		
+		self.assertEqual(packager.installed_wheels, {'beta': '1.0'})
+		self.assertEqual(sorted(packager.pkg_list), ['beta', 'duoauthproxy'])
+		self.assertTrue((packager.pkg_list['beta'] / 'setup.py').is_file())
+		self.assertEqual(packager.extraction_report['skipped_packages'], ['python-3.11.7'])
+	
+	def test_patching_is_idempotent(self):
+		"""Patch once
+		The source gets patched while extracting, and a run reusing the source directory doesn't patch it again, even if the patch would still apply.
+		"""
+		
+		if patch_module is None:
+			self.skipTest('No "patch" module available')
+		
+		with patch.object(self.build_rpms, 'THIS_FILE', self.temp_dir / 'build-rpms.py'), patch.object(self.build_rpms, 'patch', patch_module):
+			first = self.packager()
+			module_file = first.pkg_list['duoauthproxy'] / 'duoauthproxy' / '__init__.py'
+			self.assertEqual(first.extraction_report['patched_files'], ['pkgs/duoauthproxy/duoauthproxy/__init__.py'])
+			self.assertEqual(module_file.read_text(), 'VALUE = 1\nPATCHED = True\n')
+			
+			with self.assertLogs(self.build_rpms.LOGGER, 'INFO') as logs:
+				self.packager().source_path
+			self.assertEqual(module_file.read_text(), 'VALUE = 1\nPATCHED = True\n')
+			self.assertTrue(any('already patched' in line for line in logs.output), logs.output)
+	
+	def test_patching_the_extracted_source(self):
+		"""Patch on the regular run
+		When the source was extracted without the "patch" module (by the early preparation) the regular run patches it, just once.
+		"""
+		
+		if patch_module is None:
+			self.skipTest('No "patch" module available')
+		
+		with patch.object(self.build_rpms, 'THIS_FILE', self.temp_dir / 'build-rpms.py'):
+			module_file = self.packager().pkg_list['duoauthproxy'] / 'duoauthproxy' / '__init__.py'
+			self.assertEqual(module_file.read_text(), 'VALUE = 1\n')
+			with patch.object(self.build_rpms, 'patch', patch_module):
+				for run_number in range(2):
+					self.packager().source_path
+					self.assertEqual(module_file.read_text(), 'VALUE = 1\nPATCHED = True\n', run_number)
+	
+	def test_early_wheels_of_patched_packages(self):
+		"""Unpatched early wheels
+		The wheels built early from a source that couldn't be patched yet are dropped when the regular run patches it, so the patched package gets built again; the wheels of the other packages are kept.
+		"""
+		
+		if patch_module is None:
+			self.skipTest('No "patch" module available')
+		
+		with patch.object(self.build_rpms, 'THIS_FILE', self.temp_dir / 'build-rpms.py'):
+			early = self.packager()
+			for module in ('beta', 'duoauthproxy'):
+				dist_dir = early.pkg_list[module] / 'dist'
+				dist_dir.mkdir()
+				(dist_dir / '{}-1.0-py3-none-any.whl'.format(module)).write_bytes(b'wheel')
+			
+			with patch.object(self.build_rpms, 'patch', patch_module):
+				regular = self.packager()
+				with self.assertRaises(self.build_rpms.MissingWheelError):
+					regular._find_wheel('duoauthproxy')
+				self.assertEqual(regular.get_wheel('beta', do_not_build=True).name, 'beta-1.0-py3-none-any.whl')
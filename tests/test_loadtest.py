@@ -0,0 +1,135 @@
+#!python
+"""Load test tests
+"""
+
+from asyncio import run as asyncio_run
+from hashlib import md5
+from hmac import new as hmac_new
+from os import getpid, getuid
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from duoauthproxy_installer._loadtest import RADIUS_ACCESS_ACCEPT, RADIUS_ACCESS_REQUEST, RADIUS_MESSAGE_AUTHENTICATOR, RADIUS_USER_PASSWORD, LoadTest, StubRadiusPrimary, compare_results, percentile, radius_attributes, radius_packet, radius_password, radius_response
+
+SECRET = b'shared-secret'
+
+
+class RadiusTest(TestCase):
+	"""RADIUS helpers
+	The packets, hidden passwords and authenticators of the load test client and the stub primary.
+	"""
+	
+	def test_password_hiding(self):
+		"""Hidden password
+		The hidden password is padded to 16 bytes blocks and XORing it with the same key stream gives it back.
+		"""
+		
+		authenticator = bytes(range(16))
+		for password in (b'short', b'exactly-16-bytes', b'a password longer than one block'):
+			hidden = radius_password(password, SECRET, authenticator)
+			self.assertEqual(len(hidden) % 16, 0)
+			self.assertGreaterEqual(len(hidden), len(password))
+			clear, previous = b'', authenticator
+			for start in range(0, len(hidden), 16):
+				key = md5(SECRET + previous).digest()
+				clear += bytes(a ^ b for a, b in zip(hidden[start:start + 16], key))
+				previous = hidden[start:start + 16]
+			self.assertEqual(clear.rstrip(b'\x00'), password)
+	
+	def test_response_authenticators(self):
+		"""Response authenticators
+		The response echoes the identifier and carries valid Response Authenticator and Message-Authenticator values.
+		"""
+		
+		authenticator = bytes(16)
+		request = radius_packet(RADIUS_ACCESS_REQUEST, 42, authenticator, [(RADIUS_USER_PASSWORD, radius_password(b'secret', SECRET, authenticator))], SECRET)
+		self.assertEqual([attribute_type for attribute_type, value in radius_attributes(request)], [RADIUS_MESSAGE_AUTHENTICATOR, RADIUS_USER_PASSWORD])
+		
+		response = radius_response(request, RADIUS_ACCESS_ACCEPT, SECRET)
+		self.assertEqual((response[0], response[1], int.from_bytes(response[2:4], 'big')), (RADIUS_ACCESS_ACCEPT, 42, len(response)))
+		self.assertEqual(response[4:20], md5(response[:4] + authenticator + response[20:] + SECRET).digest())
+		
+		(attribute_type, signature), = radius_attributes(response)
+		self.assertEqual(attribute_type, RADIUS_MESSAGE_AUTHENTICATOR)
+		unsigned = response[:4] + authenticator + response[20:22] + bytes(16) + response[38:]
+		self.assertEqual(signature, hmac_new(SECRET, unsigned, 'md5').digest())
+
+
+class LoadTestTest(TestCase):
+	"""Load test
+	Driving the RADIUS load, relocating the unit commands and comparing the results.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+		self.unit_file = self.temp_dir / 'duoauthproxy.service'
+		self.unit_file.write_text('[Service]\nExecStart=/opt/duoauthproxy/bin/python -s /opt/duoauthproxy/bin/twistd --pidfile=/opt/duoauthproxy/run/duoauthproxy.pid --uid=duo_authproxy_svc --gid=duo_authproxy_svc\nEnvironment=PYTHONOPTIMIZE=1\n')
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def test_drive_against_a_radius_server(self):
+		"""Driving the load
+		Every warm up and measured request gets an authenticated answer from the RADIUS server, and the numbers add up.
+		"""
+		
+		load_test = LoadTest(self.temp_dir, self.unit_file, target_install_path='/opt/duoauthproxy', label='stub', concurrency=4, requests=60, warmup=5)
+		with StubRadiusPrimary(load_test.radius_secret) as server:
+			load_test.radius_port = server.port
+			results = asyncio_run(load_test.drive(getpid()))
+		
+		self.assertEqual((results['accepted'], results['rejected'], results['failed']), (60, 0, 0))
+		self.assertEqual(server.calls, 60 + 5 + 1)
+		self.assertLessEqual(results['latency_ms']['p50'], results['latency_ms']['p99'])
+		self.assertLessEqual(results['latency_ms']['p99'], results['latency_ms']['max'])
+		self.assertGreater(results['requests_per_second'], 0)
+		self.assertIsNotNone(results['rss_kib']['peak'])
+	
+	def test_unreachable_proxy_times_out(self):
+		"""Unanswered requests
+		Waiting for the proxy to answer gives up after the startup timeout.
+		"""
+		
+		load_test = LoadTest(self.temp_dir, self.unit_file, target_install_path='/opt/duoauthproxy', timeout=0.05, startup_timeout=0.2)
+		with self.assertRaises(TimeoutError):
+			asyncio_run(load_test.drive(getpid()))
+	
+	def test_command_is_relocated(self):
+		"""Relocated command
+		The unit command runs from the temporary prefix, as the current user.
+		"""
+		
+		load_test = LoadTest(self.temp_dir / 'prefix', self.unit_file, target_install_path='/opt/duoauthproxy')
+		command = load_test.command('ExecStart')
+		
+		install_dir = str(self.temp_dir / 'prefix' / 'duoauthproxy')
+		self.assertEqual(command[:4], [install_dir + '/bin/python', '-s', install_dir + '/bin/twistd', '--pidfile={}/run/duoauthproxy.pid'.format(install_dir)])
+		self.assertIn('--uid={}'.format(getuid()), command)
+		self.assertEqual(load_test.unit_settings['Environment'], ['PYTHONOPTIMIZE=1'])
+	
+	def test_compare_results(self):
+		"""Comparison
+		Every metric is shown per result, with its change relative to the first one.
+		"""
+		
+		baseline = {'label': 'before', 'requests_per_second': 100.0, 'latency_ms': {'p50': 2.0, 'p99': 10.0}, 'failed': 0, 'rss_kib': {'peak': 1000}}
+		candidate = {'requests_per_second': 150.0, 'latency_ms': {'p50': 1.0, 'p99': 10.0}, 'failed': 1, 'rss_kib': {'peak': None}, 'startup': {'median_ms': 300.0}}
+		rows = {line.split('\t')[0]: line.split('\t')[1:] for line in compare_results(baseline, candidate).splitlines()}
+		
+		self.assertEqual(rows['metric'], ['before', 'build 2'])
+		self.assertEqual(rows['requests/s'], ['100.00', '150.00 (+50.0%)'])
+		self.assertEqual(rows['p50 (ms)'], ['2.00', '1.00 (-50.0%)'])
+		self.assertEqual(rows['peak RSS (KiB)'], ['1000.00', '-'])
+		self.assertEqual(rows['startup (ms)'], ['-', '300.00'])
+		self.assertEqual(percentile([1, 2, 3, 4], 0.5), 2)
+		self.assertIsNone(percentile([], 0.5))
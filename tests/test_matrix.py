@@ -0,0 +1,96 @@
+#!python
+"""Interpreter matrix tests
+"""
+
+from pathlib import Path
+from shutil import copy
+from sys import executable
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from duoauthproxy_installer import DuoAuthProxyInstaller
+from duoauthproxy_installer._requirements import read_install_plan
+from duoauthproxy_installer._standins import StandIns
+from duoauthproxy_installer._wheels import interpreter_tags, parse_wheel_name
+
+from ._synthetic import build_tarball, other_python, tarball_entries, wheel_bytes, write_wheel
+
+
+class InterpreterMatrixTest(TestCase):
+	"""Interpreter matrix
+	Preparing and building for interpreters other than the running one: the missing wheels are fetched for, and the requirements computed against, the target interpreter.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self.other_python = other_python()
+		if self.other_python is None:
+			self.skipTest('No other interpreter available')
+		self.pythons = [Path(executable), self.other_python]
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+		self.wheelhouse = self.temp_dir / 'wheelhouse'
+		self.wheelhouse.mkdir()
+		for python in self.pythons:
+			write_wheel(self.wheelhouse, 'gamma', '2.0', interpreter_tags(python)[0])
+		wheels = {
+			'alpha-1.0-py3-none-any.whl': wheel_bytes('alpha', '1.0', requires=['gamma']),
+			'gamma-2.0-cp27-cp27mu-manylinux1_x86_64.whl': wheel_bytes('gamma', '2.0', 'cp27-cp27mu-manylinux1_x86_64'),
+		}
+		self.tarball = build_tarball(self.temp_dir, entries=tarball_entries(sources={}, wheels=wheels))
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def installer(self, root_name):
+		"""Installer
+		A DuoAuthProxyInstaller working in "root_name" for the synthetic tarball, already downloaded, with the wheelhouse and no index.
+		"""
+		
+		installer = DuoAuthProxyInstaller('6.4.1', installer_root=self.temp_dir / root_name, wheelhouse=self.wheelhouse, index_url=None, build_missing_wheels=False)
+		copy(self.tarball, installer.download_dir)
+		return installer
+	
+	def assertCompatiblePlan(self, plan_text, python):
+		"""Compatible install plan
+		Every wheel of the install plan is compatible with "python", and "gamma" (only available as binary wheels) is in there.
+		"""
+		
+		tags = frozenset(interpreter_tags(python))
+		wheel_names = [wheel.name for wheel, digest in read_install_plan(plan_text)]
+		self.assertIn('gamma', [parse_wheel_name(wheel_name)[0] for wheel_name in wheel_names])
+		for wheel_name in wheel_names:
+			self.assertTrue(parse_wheel_name(wheel_name)[2] & tags, '{} for {}'.format(wheel_name, python))
+	
+	def test_prepare(self):
+		"""Preparing for an interpreter
+		The "prepare" for every interpreter downloads the wheels for it, and its requirements only use those.
+		"""
+		
+		for python in self.pythons:
+			installer = self.installer(python.name)
+			installer.prepare(python=python)
+			self.assertEqual([wheel.name for wheel in installer.tarball_assets['downloaded_wheels']], ['gamma-2.0-{}.whl'.format(interpreter_tags(python)[0])])
+			self.assertCompatiblePlan(installer.requirements, python)
+	
+	def test_build_matrix(self):
+		"""Building the matrix
+		Every interpreter of the matrix gets its own RPM, whose requirements only use the wheels compatible with it, out of the shared wheels directory.
+		"""
+		
+		with StandIns(self.temp_dir / 'standins', time_scale=0):
+			report = self.installer('root').build_matrix('1', *self.pythons, rpms_dir=self.temp_dir / 'rpms', staging_dir=self.temp_dir / 'staging')
+		
+		self.assertEqual(len(list((self.temp_dir / 'root' / 'wheels').glob('gamma-*.whl'))), 2)
+		for python in self.pythons:
+			details = report['interpreters'][str(python)]
+			self.assertTrue((self.temp_dir / 'rpms' / 'duoauthproxy-6.4.1-{}.x86_64.rpm'.format(details['release'])).is_file())
+			self.assertCompatiblePlan((self.temp_dir / 'staging' / 'py{}'.format(details['python_version']) / 'requirements.txt').read_text(), python)
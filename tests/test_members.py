@@ -0,0 +1,184 @@
+#!python
+"""Member table tests
+"""
+
+from io import BytesIO
+from marshal import dumps as marshal_dumps, loads as marshal_loads
+from os import utime
+from pathlib import Path, PurePath
+from tarfile import TarInfo, open as tarfile_open
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from duoauthproxy_installer import InstallerTarball
+from duoauthproxy_installer._members import MemberTable, TarballIndex
+
+from ._synthetic import build_tarball, tarball_entries
+
+
+class MemberTableTest(TestCase):
+	"""Member table
+	Lookups on the compact member index, against what tarfile itself finds.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def write_tarball(self, *files):
+		"""Write a tarball
+		A gzipped tarball with the "files" ((name, bytes) pairs), in order, duplicates included.
+		"""
+		
+		tarball_path = self.temp_dir / 'members.tgz'
+		with tarfile_open(tarball_path, 'w:gz') as tarball:
+			for name, content in files:
+				member = TarInfo(name)
+				member.size = len(content)
+				tarball.addfile(member, BytesIO(content))
+		return tarball_path
+	
+	def test_duplicates_keep_the_last_one(self):
+		"""Duplicated members
+		A path added twice maps to its last occurrence, the one tarfile extracts.
+		"""
+		
+		tarball_path = self.write_tarball(('root/a.txt', b'first'), ('root/b.txt', b'other'), ('root/a.txt', b'second version'))
+		table = MemberTable.from_tarball(tarball_path)
+		
+		self.assertEqual(list(table.names()), ['root/a.txt', 'root/b.txt'])
+		with tarfile_open(tarball_path) as tarball:
+			self.assertEqual(table['root/a.txt'].size, tarball.getmember('root/a.txt').size)
+			self.assertEqual(tarball.extractfile(table['root/a.txt']).read(), b'second version')
+	
+	def test_lookups(self):
+		"""Lookups
+		Membership, directory listings and top level names of a table.
+		"""
+		
+		table = MemberTable.from_tarball(build_tarball(self.temp_dir))
+		
+		self.assertTrue(table.isdir('duoauthproxy-6.4.1-abc123-src/pkgs'))
+		self.assertTrue(table.isfile(PurePath('duoauthproxy-6.4.1-abc123-src/install.py')))
+		self.assertNotIn('duoauthproxy-6.4.1-abc123-src/missing', table)
+		self.assertEqual(list(table.names('duoauthproxy-6.4.1-abc123-src/conf')), ['duoauthproxy-6.4.1-abc123-src/conf/authproxy.cfg'])
+		self.assertEqual(table.roots(), ['duoauthproxy-6.4.1-abc123-src'])
+		self.assertEqual(list(MemberTable.load(table.dump())), list(table))
+	
+	def test_single_root_directory(self):
+		"""Root directory
+		The root directory is only accepted when every member is below it, not just the first and the last ones.
+		"""
+		
+		tarball_path = self.write_tarball(('root/a.txt', b'a'), ('stray/b.txt', b'b'), ('root/z.txt', b'z'))
+		self.assertEqual(MemberTable.from_tarball(tarball_path).roots(), ['root', 'stray'])
+		with self.assertRaises(ValueError):
+			InstallerTarball(tarball_path, use_index=False).root_dir
+		
+		tarball_path = self.write_tarball(('root/a.txt', b'a'), ('README', b'top level file'), ('root/z.txt', b'z'))
+		with self.assertRaises(ValueError):
+			InstallerTarball(tarball_path, use_index=False).root_dir
+		
+		tarball_path = self.write_tarball(('root', b''), ('root/a.txt', b'a'), ('root/pkgs/z.txt', b'z'))
+		self.assertEqual(InstallerTarball(tarball_path, use_index=False).root_dir, PurePath('root'))
+
+
+class TarballIndexTest(TestCase):
+	"""Tarball index
+	Reusing the analysis of a tarball across InstallerTarball instances, and rebuilding it when it doesn't match.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+		self.tarball_path = build_tarball(self.temp_dir)
+		self.index_path = TarballIndex.index_path(self.tarball_path)
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def analysis(self, tarball):
+		"""Tarball analysis
+		The root directory, python version, modules and member names of "tarball" (an InstallerTarball).
+		"""
+		
+		return tarball.root_dir, tarball.python_version, tarball.identify_modules(), list(tarball.member_paths.names())
+	
+	def test_index_is_reused(self):
+		"""Reused index
+		The first InstallerTarball saves the index; the next ones get the same analysis out of it, without reading the headers nor hashing the tarball, and still read the members.
+		"""
+		
+		expected = self.analysis(InstallerTarball(self.tarball_path))
+		self.assertTrue(self.index_path.is_file())
+		
+		with patch.object(MemberTable, 'from_tarball', side_effect=AssertionError('headers read')), patch.object(TarballIndex, '_file_digest', side_effect=AssertionError('tarball hashed')):
+			tarball = InstallerTarball(self.tarball_path)
+			self.assertEqual(self.analysis(tarball), expected)
+		(self.temp_dir / 'assets').mkdir()
+		self.assertEqual(tarball.extract_assets(self.temp_dir / 'assets')['conf'], [self.temp_dir / 'assets' / 'conf' / 'authproxy.cfg'])
+	
+	def test_touched_tarball(self):
+		"""Touched tarball
+		A tarball with another modification time is hashed once; with the same content the index is reused and saved with the new time.
+		"""
+		
+		InstallerTarball(self.tarball_path).member_paths
+		utime(self.tarball_path, ns=(1000000000, 1000000000))
+		
+		with patch.object(MemberTable, 'from_tarball', side_effect=AssertionError('headers read')), patch.object(TarballIndex, '_file_digest', wraps=TarballIndex._file_digest) as file_digest:
+			InstallerTarball(self.tarball_path).member_paths
+			InstallerTarball(self.tarball_path).member_paths
+		self.assertEqual(file_digest.call_count, 1)
+		self.assertEqual(marshal_loads(self.index_path.read_bytes())['mtime_ns'], 1000000000)
+	
+	def test_stale_indexes_are_rebuilt(self):
+		"""Stale indexes
+		Indexes of another tarball, in another format or corrupted are ignored and replaced by a new one.
+		"""
+		
+		InstallerTarball(self.tarball_path).member_paths
+		state = marshal_loads(self.index_path.read_bytes())
+		
+		build_tarball(self.temp_dir, entries=tarball_entries(python_version='3.12.1'))
+		self.assertEqual(InstallerTarball(self.tarball_path).python_version, ['3', '12', '1'])
+		self.assertNotEqual(marshal_loads(self.index_path.read_bytes())['digest'], state['digest'])
+		
+		self.index_path.write_bytes(marshal_dumps(dict(state, format=(0,) + tuple(state['format'][1:]))))
+		self.assertIsNone(TarballIndex.load(self.tarball_path))
+		self.index_path.write_bytes(b'corrupted')
+		with self.assertLogs('duoauthproxy_installer', 'WARNING'):
+			self.assertIsNone(TarballIndex.load(self.tarball_path))
+			self.assertEqual(InstallerTarball(self.tarball_path).python_version, ['3', '12', '1'])
+		self.assertIsNotNone(TarballIndex.load(self.tarball_path))
+	
+	def test_without_index(self):
+		"""No index
+		With "use_index" off nothing is read nor written next to the tarball.
+		"""
+		
+		self.index_path.write_bytes(b'corrupted')
+		tarball = InstallerTarball(self.tarball_path, use_index=False)
+		self.assertEqual(tarball.root_dir, PurePath('duoauthproxy-6.4.1-abc123-src'))
+		self.assertIsNone(tarball.tarball_index)
+		self.assertEqual(self.index_path.read_bytes(), b'corrupted')
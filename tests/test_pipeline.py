@@ -0,0 +1,124 @@
+#!python
+"""Stage pipeline tests
+"""
+
+from threading import Event
+from time import sleep
+from unittest import TestCase
+
+from duoauthproxy_installer._pipeline import Stage, StagePipeline
+
+
+class StagePipelineTest(TestCase):
+	"""Stage pipeline
+	Dependencies, concurrency limits and failures.
+	"""
+	
+	def test_values_flow_between_stages(self):
+		"""Values flow between stages
+		Every stage gets the values it declared as inputs, including the multiple outputs of other stages and the initial values.
+		"""
+		
+		pipeline = StagePipeline(
+			Stage('split', lambda text: {'head': text[:2], 'tail': text[2:]}, inputs=('text',), outputs=('head', 'tail')),
+			Stage('joined', lambda head, tail: tail + head, inputs=('head', 'tail')),
+			Stage('length', lambda joined: len(joined), inputs=('joined',)),
+		)
+		values = pipeline(text='abcde')
+		
+		self.assertEqual(values['joined'], 'cdeab')
+		self.assertEqual(values['length'], 5)
+		self.assertEqual(set(pipeline.timings), {'split', 'joined', 'length'})
+		self.assertLessEqual(pipeline.timings['split']['end'], pipeline.timings['joined']['ready'])
+	
+	def test_independent_stages_overlap(self):
+		"""Independent stages overlap
+		Stages with no dependency between them run concurrently: each one waits for the other to start.
+		"""
+		
+		first_started, second_started = Event(), Event()
+		
+		def first():
+			first_started.set()
+			return second_started.wait(5)
+		
+		def second():
+			second_started.set()
+			return first_started.wait(5)
+		
+		values = StagePipeline(Stage('first', first), Stage('second', second, resource='disk'))()
+		self.assertTrue(values['first'])
+		self.assertTrue(values['second'])
+	
+	def test_resource_limit(self):
+		"""Resource limits
+		No more stages than the limit of their resource class run at the same time.
+		"""
+		
+		running, peak = [0], [0]
+		
+		def work():
+			running[0] += 1
+			peak[0] = max(peak[0], running[0])
+			sleep(0.05)
+			running[0] -= 1
+		
+		pipeline = StagePipeline(*[Stage('work{}'.format(position), work, resource='network') for position in range(4)], resource_limits={'network': 1})
+		pipeline()
+		self.assertEqual(peak[0], 1)
+	
+	def test_failure_propagates(self):
+		"""Failures
+		The error of a stage is raised by the pipeline and the stages depending on it never run.
+		"""
+		
+		called = []
+		
+		def broken():
+			raise RuntimeError('broken stage')
+		
+		pipeline = StagePipeline(Stage('broken', broken), Stage('after', lambda broken: called.append(broken), inputs=('broken',)))
+		with self.assertRaisesRegex(RuntimeError, 'broken stage'):
+			pipeline()
+		self.assertEqual(called, [])
+	
+	def test_invalid_graphs(self):
+		"""Invalid graphs
+		Missing inputs, outputs produced twice and unknown resource classes are rejected.
+		"""
+		
+		with self.assertRaisesRegex(ValueError, 'Missing input'):
+			StagePipeline(Stage('orphan', lambda nowhere: nowhere, inputs=('nowhere',)))()
+		with self.assertRaisesRegex(ValueError, 'produced by both'):
+			StagePipeline(Stage('twice', lambda: 1), Stage('other', lambda: 2, outputs=('twice',)))
+		with self.assertRaisesRegex(ValueError, 'Unknown resource'):
+			StagePipeline(Stage('gpu_work', lambda: 1, resource='gpu'))
+		with self.assertRaisesRegex(RuntimeError, 'did not produce'):
+			StagePipeline(Stage('partial', lambda: {'one': 1}, outputs=('one', 'two')))()
+	
+	def test_critical_path(self):
+		"""Critical path
+		Going back from the last stage to finish, every step is the producer of its inputs that finished last, with the time it was queued for its resource.
+		"""
+		
+		pipeline = StagePipeline(
+			Stage('download', lambda: 1, resource='network'),
+			Stage('split', lambda download: {'head': 1, 'tail': 2}, inputs=('download',), outputs=('head', 'tail')),
+			Stage('extract', lambda: 3, resource='disk'),
+			Stage('build', lambda head, extract: 4, inputs=('head', 'extract')),
+			Stage('report', lambda tail: 5, inputs=('tail',)),
+		)
+		timings = {
+			'download': {'ready': 0.0, 'start': 0.0, 'end': 2.0},
+			'split': {'ready': 2.0, 'start': 2.5, 'end': 3.0},
+			'extract': {'ready': 0.0, 'start': 0.0, 'end': 1.0},
+			'build': {'ready': 3.0, 'start': 3.0, 'end': 7.0},
+			'report': {'ready': 3.0, 'start': 3.0, 'end': 4.0},
+		}
+		
+		path = pipeline.critical_path(timings)
+		self.assertEqual([(step['stage'], step['resource'], step['duration'], step['wait']) for step in path], [('download', 'network', 2.0, 0.0), ('split', 'cpu', 0.5, 0.5), ('build', 'cpu', 4.0, 0.0)])
+		
+		pipeline()
+		self.assertEqual(pipeline.critical_path()[-1]['stage'], max(pipeline.timings, key=lambda name: pipeline.timings[name]['end']))
+		self.assertEqual(StagePipeline(Stage('alone', lambda: 1)).critical_path({}), [])
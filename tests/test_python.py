@@ -0,0 +1,89 @@
+#!python
+"""Bundled interpreter tests
+"""
+
+from json import loads as json_loads
+from pathlib import Path
+from subprocess import run
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from duoauthproxy_installer import PGO_TRAINING_SCRIPT, InstallerTarball
+
+from ._synthetic import build_tarball, other_python, tarball_entries
+
+FAKE_CONFIGURE = r'''#!/bin/sh
+printf '%s\n' "$@" > "$CONFIGURE_LOG"
+prefix=$(printf '%s\n' "$@" | sed -n 's/^--prefix=//p')
+printf '.SILENT:\n\nall:\n\ttouch built\n\naltinstall: built\n\tmkdir -p %s/bin\n\tcp interpreter %s/bin/python3.11\n' "$prefix" "$prefix" > Makefile
+'''
+
+
+class BuildPythonTest(TestCase):
+	"""Bundled interpreter
+	Building the python in the tarball, with and without the profile guided optimizations, and its training workload.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def build(self, **options):
+		"""Build with a fake source tree
+		Runs "build_python" on a tarball whose python sources only have a "configure" script writing a trivial Makefile. Returns the interpreter path and the configure arguments.
+		"""
+		
+		entries = tarball_entries()
+		entries['pkgs/python-3.11.7/configure'] = FAKE_CONFIGURE.replace('$CONFIGURE_LOG', str(self.temp_dir / 'configure.log')).encode('utf8')
+		entries['pkgs/python-3.11.7/interpreter'] = b'#!/bin/sh\necho fake\n'
+		tarball = InstallerTarball(build_tarball(self.temp_dir, entries=entries))
+		result = tarball.build_python(self.temp_dir / 'prefix', jobs=1, **options)
+		return result, (self.temp_dir / 'configure.log').read_text().splitlines()
+	
+	def test_plain_build(self):
+		"""Plain build
+		The interpreter is installed under the prefix, named after the tarball python version, with no optimization flags.
+		"""
+		
+		interpreter, arguments = self.build()
+		
+		self.assertEqual(interpreter, self.temp_dir / 'prefix' / 'bin' / 'python3.11')
+		self.assertTrue(interpreter.is_file())
+		self.assertEqual(arguments, ['--prefix={}'.format(self.temp_dir / 'prefix')])
+	
+	def test_optimized_build(self):
+		"""Optimized build
+		The optimized build enables PGO and LTO, training with the proxy workload.
+		"""
+		
+		interpreter, arguments = self.build(optimizations=True, training_iterations=50)
+		
+		self.assertTrue(interpreter.is_file())
+		self.assertEqual(arguments[1:3], ['--enable-optimizations', '--with-lto'])
+		self.assertEqual(arguments[3], 'PROFILE_TASK=-E {} --iterations 50'.format(PGO_TRAINING_SCRIPT.absolute()))
+	
+	def test_training_workload_runs_on_the_oldest_python(self):
+		"""Training workload
+		The training script runs on a python 3.8, as the oldest bundled one, and reports every workload.
+		"""
+		
+		python = other_python((3, 8))
+		if python is None:
+			self.skipTest('No other interpreter available')
+		
+		output = run((str(python), '-E', str(PGO_TRAINING_SCRIPT), '--iterations', '10', '--benchmark'), capture_output=True, check=True, text=True).stdout
+		result = json_loads(output)
+		self.assertEqual((result['python'], result['iterations']), (str(python), 10))
+		self.assertEqual(sorted(result['timings']), ['config', 'duo_api', 'event_loop', 'ldap', 'logging', 'radius'])
+		self.assertTrue(all(seconds >= 0 for seconds in result['timings'].values()))
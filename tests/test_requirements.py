@@ -0,0 +1,97 @@
+#!python
+"""Requirements tests
+"""
+
+from hashlib import sha256
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from duoauthproxy_installer._requirements import WheelRequirements, read_install_plan
+
+from ._synthetic import write_wheel
+
+
+class WheelRequirementsTest(TestCase):
+	"""Wheel requirements
+	Resolving, pinning and ordering the wheels in a directory out of their metadata only.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.wheels_dir = Path(self._temp_dir.name)
+		write_wheel(self.wheels_dir, 'alpha', '1.0', requires=['beta>=1.0', 'legacy; python_version < "3"', 'delta; extra == "speedups"', 'pip'])
+		write_wheel(self.wheels_dir, 'beta', '1.0', requires=['gamma'])
+		write_wheel(self.wheels_dir, 'beta', '2.0', requires=['gamma<1'])
+		write_wheel(self.wheels_dir, 'gamma', '1.5')
+		write_wheel(self.wheels_dir, 'gamma', '3.0', tag='cp27-cp27mu-manylinux1_x86_64')
+		write_wheel(self.wheels_dir, 'delta', '1.0', requires=['epsilon'])
+		write_wheel(self.wheels_dir, 'legacy', '1.0')
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def test_resolve(self):
+		"""Resolution
+		The newest compatible wheels are pinned following the markers and extras; the unsatisfied requirements are reported, the preinstalled ones are not.
+		"""
+		
+		requirements = WheelRequirements(self.wheels_dir, roots=['alpha'])
+		with self.assertLogs('duoauthproxy_installer', 'WARNING'):
+			pinned = requirements.resolve()
+		
+		self.assertEqual({name: distribution.version for name, distribution in pinned.items()}, {'alpha': '1.0', 'beta': '2.0', 'gamma': '1.5'})
+		self.assertEqual(requirements.conflicts, [('gamma<1', 'beta==2.0')])
+		self.assertEqual(requirements.missing, [])
+		self.assertEqual(sorted(path.name for path in requirements.unused), ['beta-1.0-py3-none-any.whl', 'delta-1.0-py3-none-any.whl', 'gamma-3.0-cp27-cp27mu-manylinux1_x86_64.whl', 'legacy-1.0-py3-none-any.whl'])
+		
+		requirements = WheelRequirements(self.wheels_dir, roots=['alpha'], environment={'python_version': '2.7'})
+		with self.assertLogs('duoauthproxy_installer', 'WARNING'):
+			self.assertIn('legacy', requirements.resolve())
+	
+	def test_extras_and_missing(self):
+		"""Extras
+		The requirements of an extra are only followed when it's requested, and the ones without wheel end up as missing.
+		"""
+		
+		write_wheel(self.wheels_dir, 'omega', '1.0', requires=['alpha[speedups]'])
+		requirements = WheelRequirements(self.wheels_dir, roots=['omega'])
+		with self.assertLogs('duoauthproxy_installer', 'WARNING'):
+			pinned = requirements.resolve()
+		
+		self.assertIn('delta', pinned)
+		self.assertEqual(requirements.missing, [('epsilon', 'delta==1.0')])
+	
+	def test_text_and_install_plan(self):
+		"""Requirements text
+		The pinned requirements carry the wheel digests, and the install plan references the wheels with every one after its dependencies.
+		"""
+		
+		requirements = WheelRequirements(self.wheels_dir, roots=['beta'])
+		with self.assertLogs('duoauthproxy_installer', 'WARNING'):
+			requirements.resolve()
+		digests = {name: sha256((self.wheels_dir / file_name).read_bytes()).hexdigest() for name, file_name in (('beta', 'beta-2.0-py3-none-any.whl'), ('gamma', 'gamma-1.5-py3-none-any.whl'))}
+		
+		self.assertEqual(requirements.text(), 'beta==2.0 --hash=sha256:{}\ngamma==1.5 --hash=sha256:{}\n'.format(digests['beta'], digests['gamma']))
+		self.assertEqual(requirements.text(hashes=False, exclude=['Gamma']), 'beta==2.0\n')
+		
+		plan = read_install_plan(requirements.text(references=True))
+		self.assertEqual(plan, [(self.wheels_dir.absolute() / 'gamma-1.5-py3-none-any.whl', 'sha256:' + digests['gamma']), (self.wheels_dir.absolute() / 'beta-2.0-py3-none-any.whl', 'sha256:' + digests['beta'])])
+		self.assertEqual([distribution.name for distribution in requirements.install_order()], ['gamma', 'beta'])
+	
+	def test_known_digests(self):
+		"""Known digests
+		The provided digests are used instead of reading the wheels again.
+		"""
+		
+		wheel = self.wheels_dir / 'gamma-1.5-py3-none-any.whl'
+		requirements = WheelRequirements(self.wheels_dir, roots=['gamma'], digests={wheel.absolute(): 'f' * 64})
+		self.assertEqual(requirements.text(), 'gamma==1.5 --hash=sha256:{}\n'.format('f' * 64))
@@ -0,0 +1,110 @@
+#!python
+"""RPM build tests
+"""
+
+from hashlib import sha256
+from json import loads as json_loads
+from os import chdir, environ, getcwd
+from pathlib import Path
+from shutil import copy
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from duoauthproxy_installer import DuoAuthProxyInstaller
+from duoauthproxy_installer._requirements import read_install_plan
+from duoauthproxy_installer._standins import StandIns
+
+from ._synthetic import build_tarball, write_wheel
+
+
+class BuildRPMTest(TestCase):
+	"""RPM build
+	The staging and packaging of "build_rpm", with the stand-in interpreter and rpmvenv.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+		self.wheelhouse = self.temp_dir / 'wheelhouse'
+		self.wheelhouse.mkdir()
+		write_wheel(self.wheelhouse, 'gamma', '2.0')
+		self.tarball = build_tarball(self.temp_dir)
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def installer(self, root_name='root'):
+		"""Installer
+		A DuoAuthProxyInstaller working in "root_name" for the synthetic tarball, already downloaded, with the wheelhouse and no index.
+		"""
+		
+		installer = DuoAuthProxyInstaller('6.4.1', installer_root=self.temp_dir / root_name, wheelhouse=self.wheelhouse, index_url=None, build_missing_wheels=False)
+		copy(self.tarball, installer.download_dir)
+		return installer
+	
+	def test_bundled_requirements_written_once(self):
+		"""Bundled requirements
+		With the site-packages bundle the staged requirements only have the unbundled distributions, and the file is written just once.
+		"""
+		
+		writes, write_text = [], Path.write_text
+		def recording_write_text(path, *args, **kwargs):
+			if path.name == 'requirements.txt':
+				writes.append(path)
+			return write_text(path, *args, **kwargs)
+		
+		with StandIns(self.temp_dir / 'standins', time_scale=0) as stand_ins:
+			installer = self.installer()
+			installer.prepare(python=stand_ins.python)
+			with patch.object(Path, 'write_text', recording_write_text):
+				installer.build_rpm('1', rpms_dir=self.temp_dir / 'rpms', staging_dir=self.temp_dir / 'staging', python=stand_ins.python, bundle_site_packages=True)
+		
+		self.assertEqual(writes, [self.temp_dir / 'staging' / 'requirements.txt'])
+		self.assertEqual([wheel.name for wheel, digest in read_install_plan(writes[0].read_text())], ['duoauthproxy-6.4.1-py3-none-any.whl'])
+		self.assertEqual([rpm.name for rpm in (self.temp_dir / 'rpms').glob('*.rpm')], ['duoauthproxy-6.4.1-1.x86_64.rpm'])
+	
+	def test_default_target_interpreter(self):
+		"""Default target interpreter
+		Without an explicit "python" the venv is created by the "python3" of the target host, which doesn't need to exist here: the unprepared installer gets prepared for the running interpreter.
+		"""
+		
+		self.addCleanup(chdir, getcwd())
+		chdir(self.temp_dir)
+		with StandIns(self.temp_dir / 'standins', time_scale=0):
+			installer = self.installer()
+			installer('1', dist_dir=self.temp_dir / 'rpms')
+		
+		self.assertEqual([rpm.name for rpm in (self.temp_dir / 'rpms').glob('*.rpm')], ['duoauthproxy-6.4.1-1.x86_64.rpm'])
+		self.assertEqual(json_loads((self.temp_dir / 'rpm_data' / 'duoauthproxy.6.4.1.json').read_text())['python_venv']['cmd'], 'python3 -m venv')
+		self.assertIn('gamma-2.0-py3-none-any.whl', [wheel.name for wheel, digest in read_install_plan((self.temp_dir / 'rpm_data' / 'requirements.txt').read_text())])
+	
+	def test_dependencies_release_is_stable(self):
+		"""Dependencies release
+		Building the same tarball again gives the same dependencies release, and the RPM is reused, even if the wheels built from source come out different.
+		"""
+		
+		rpms_dir, built_wheels = self.temp_dir / 'rpms', {}
+		with StandIns(self.temp_dir / 'standins', time_scale=0) as stand_ins:
+			for root_name, epoch in (('first', '1700000000'), ('second', '1700000000'), ('third', '1800000000')):
+				installer = self.installer(root_name)
+				with patch.dict(environ, {'SOURCE_DATE_EPOCH': epoch}):
+					installer.prepare(python=stand_ins.python)
+				built_wheels[root_name] = {wheel.name: sha256(wheel.read_bytes()).hexdigest() for wheel in installer.tarball_assets['built_wheels']}
+				with self.assertLogs('duoauthproxy_installer', 'INFO') as logs:
+					installer.build_rpm('1', rpms_dir=rpms_dir, staging_dir=self.temp_dir / root_name / 'staging', python=stand_ins.python, split_dependencies=True)
+				if root_name != 'first':
+					self.assertTrue(any('did not change' in line for line in logs.output), logs.output)
+		
+		self.assertIn('beta-1.0-py3-none-any.whl', built_wheels['first'])
+		self.assertEqual(built_wheels['first'], built_wheels['second'])
+		self.assertNotEqual(built_wheels['first'], built_wheels['third'])
+		self.assertEqual(len(list(rpms_dir.glob('duoauthproxy-deps-*.rpm'))), 1)
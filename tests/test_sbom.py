@@ -0,0 +1,156 @@
+#!python
+"""Bill of materials tests
+"""
+
+from hashlib import sha256
+from io import BytesIO
+from json import loads as json_loads
+from pathlib import Path, PurePosixPath
+from shutil import copy, which
+from subprocess import run
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from duoauthproxy_installer import DuoAuthProxyInstaller
+from duoauthproxy_installer._requirements import WheelRequirements
+from duoauthproxy_installer._sbom import BillOfMaterials, FileDigests, record_digest
+from duoauthproxy_installer._standins import StandIns
+
+from ._synthetic import build_tarball, record_hash, write_wheel
+
+
+class FileDigestsTest(TestCase):
+	"""File digests
+	The digests recorded while writing, copying and moving files, and out of the wheels RECORD.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def test_written_files(self):
+		"""Written files
+		The digests recorded while writing, copying and moving are the ones of the files content, and the manifest checks out with "sha256sum".
+		"""
+		
+		digests = FileDigests()
+		written = digests.write(self.temp_dir / 'written.txt', 'written\n')
+		copied = digests.copy(BytesIO(b'copied\n' * 300000), self.temp_dir / 'copied.bin')
+		(self.temp_dir / 'moved').mkdir()
+		moved = digests.move(digests.write(self.temp_dir / 'to_move.txt', b'moved\n'), self.temp_dir / 'moved')
+		external = self.temp_dir / 'external.txt'
+		external.write_text('external\n')
+		
+		self.assertEqual(sorted(digests), sorted([written, copied, moved]))
+		self.assertEqual(digests.file_digest(external), sha256(b'external\n').hexdigest())
+		for path, digest in digests.items():
+			self.assertEqual(digest, sha256(path.read_bytes()).hexdigest(), path)
+		
+		if which('sha256sum') is not None:
+			result = run(('sha256sum', '--check', '--quiet', '-'), input=digests.manifest(), capture_output=True, text=True)
+			self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+	
+	def test_wheel_record(self):
+		"""Wheel RECORD
+		The files a wheel installs in site-packages get the digests of its RECORD; the scripts and the data files outside of site-packages are left out.
+		"""
+		
+		wheel = write_wheel(self.temp_dir, 'alpha', '1.0', files={
+			'alpha/__init__.py': b'VALUE = 1\n',
+			'alpha-1.0.data/purelib/alpha/helpers.py': b'HELPERS = 1\n',
+			'alpha-1.0.data/scripts/alpha-script': b'#!python\n',
+			'alpha-1.0.data/data/share/alpha.txt': b'data\n',
+		})
+		site_packages = PurePosixPath('/opt/duoauthproxy/lib/python3.11/site-packages')
+		digests = FileDigests()
+		
+		self.assertEqual(digests.add_wheel(wheel, site_packages), 4)
+		self.assertEqual(digests[site_packages / 'alpha' / '__init__.py'], sha256(b'VALUE = 1\n').hexdigest())
+		self.assertEqual(digests[site_packages / 'alpha' / 'helpers.py'], sha256(b'HELPERS = 1\n').hexdigest())
+		self.assertEqual(sorted(path.name for path in digests), ['METADATA', 'WHEEL', '__init__.py', 'helpers.py'])
+		self.assertEqual(record_digest(record_hash(b'content')), sha256(b'content').hexdigest())
+		self.assertIsNone(record_digest('md5=abc'))
+
+
+class BillOfMaterialsTest(TestCase):
+	"""Bill of materials
+	The SBOM documents of the pinned distributions, and the bill of materials written next to the RPMs.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def test_documents(self):
+		"""SBOM documents
+		Every pinned distribution is a component with its wheel digest, origin and dependencies, and the special tarball packages are listed as excluded.
+		"""
+		
+		wheels_dir = self.temp_dir / 'wheels'
+		wheels_dir.mkdir()
+		alpha = write_wheel(wheels_dir, 'alpha', '1.0', requires=['beta'])
+		beta = write_wheel(wheels_dir, 'beta', '1.0')
+		write_wheel(wheels_dir, 'duoauthproxy', '6.4.1', requires=['alpha'])
+		write_wheel(wheels_dir, 'gamma', '2.0')
+		bill = BillOfMaterials('duoauthproxy', '6.4.1-1', WheelRequirements(wheels_dir, roots=['duoauthproxy']), tarball_modules=(['pkgs/alpha-1.0-py3-none-any.whl'], ['beta-1.0'], ['pkgs/python-3.11.7.tgz']), exclude=['duoauthproxy'])
+		
+		cyclonedx = bill.cyclonedx()
+		components = {component['purl']: component for component in cyclonedx['components']}
+		self.assertEqual(sorted(components), ['pkg:generic/python@3.11.7', 'pkg:pypi/alpha@1.0', 'pkg:pypi/beta@1.0'])
+		self.assertEqual(components['pkg:pypi/alpha@1.0']['hashes'], [{'alg': 'SHA-256', 'content': sha256(alpha.read_bytes()).hexdigest()}])
+		self.assertEqual([(purl, component['scope'], component['properties'][0]['value']) for purl, component in sorted(components.items())], [('pkg:generic/python@3.11.7', 'excluded', 'tarball'), ('pkg:pypi/alpha@1.0', 'required', 'tarball-wheel'), ('pkg:pypi/beta@1.0', 'required', 'tarball-source')])
+		self.assertIn({'ref': 'pkg:pypi/alpha@1.0', 'dependsOn': ['pkg:pypi/beta@1.0']}, cyclonedx['dependencies'])
+		
+		spdx = bill.spdx()
+		packages = {package['name']: package for package in spdx['packages']}
+		self.assertEqual(packages['beta']['checksums'], [{'algorithm': 'SHA256', 'checksumValue': sha256(beta.read_bytes()).hexdigest()}])
+		self.assertIn({'spdxElementId': packages['alpha']['SPDXID'], 'relationshipType': 'DEPENDS_ON', 'relatedSpdxElement': packages['beta']['SPDXID']}, spdx['relationships'])
+		self.assertEqual(sorted(path.name for path in bill.write(self.temp_dir / 'duoauthproxy-6.4.1-1')), ['duoauthproxy-6.4.1-1.cdx.json', 'duoauthproxy-6.4.1-1.spdx.json'])
+	
+	def test_rpm_bill_of_materials(self):
+		"""RPM bill of materials
+		Every RPM gets its manifest, with the digests of the data files as staged, and its SBOM documents.
+		"""
+		
+		wheelhouse = self.temp_dir / 'wheelhouse'
+		wheelhouse.mkdir()
+		write_wheel(wheelhouse, 'gamma', '2.0')
+		installer = DuoAuthProxyInstaller('6.4.1', installer_root=self.temp_dir / 'root', wheelhouse=wheelhouse, index_url=None, build_missing_wheels=False)
+		copy(build_tarball(self.temp_dir), installer.download_dir)
+		rpms_dir = self.temp_dir / 'rpms'
+		
+		with StandIns(self.temp_dir / 'standins', time_scale=0) as stand_ins:
+			installer.prepare(python=stand_ins.python)
+			installer.build_rpm('1', rpms_dir=rpms_dir, staging_dir=self.temp_dir / 'staging', python=stand_ins.python)
+		
+		manifest = dict(reversed(line.split('  ', 1)) for line in (rpms_dir / 'duoauthproxy-6.4.1-1.sha256').read_text().splitlines())
+		self.assertEqual(manifest['/opt/duoauthproxy/conf/authproxy.cfg'], sha256(b'[main]\n\n[radius_server_auto]\nport=1812\n').hexdigest())
+		self.assertEqual(manifest['/opt/duoauthproxy/log/authproxy.log'], sha256(b'').hexdigest())
+		
+		components = {component['name']: component for component in json_loads((rpms_dir / 'duoauthproxy-6.4.1-1.cdx.json').read_text())['components']}
+		for name in ('alpha', 'beta', 'gamma'):
+			wheel, = installer.wheels_dir.glob('{}-*.whl'.format(name))
+			self.assertEqual(components[name]['hashes'][0]['content'], sha256(wheel.read_bytes()).hexdigest(), name)
+		self.assertEqual(json_loads((rpms_dir / 'duoauthproxy-6.4.1-1.spdx.json').read_text())['name'], 'duoauthproxy-6.4.1-1')
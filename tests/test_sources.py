@@ -0,0 +1,122 @@
+#!python
+"""Source build tests
+"""
+
+from email.parser import HeaderParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Lock
+from unittest import TestCase
+from unittest.mock import patch
+from zipfile import ZipFile
+
+from duoauthproxy_installer import InstallerTarball
+from duoauthproxy_installer._buildscheduler import BuildHistory
+
+from ._synthetic import build_tarball, source_package, wheel_bytes
+
+
+class _SetupPyVenv:
+	"""Build venv stand-in
+	Callable like a VirtualEnvironmentManager, it "runs setup.py bdist_wheel" by writing a wheel named after the PKG-INFO into "dist" and keeps track of the modules built.
+	"""
+	
+	def __call__(self, *arguments, cwd, env=None):
+		"""
+		
+		"""
+		
+		headers = HeaderParser().parsestr((Path(cwd) / 'PKG-INFO').read_text(), headersonly=True)
+		(Path(cwd) / 'dist').mkdir()
+		(Path(cwd) / 'dist' / '{}-{}-cp311-cp311-linux_x86_64.whl'.format(headers['Name'], headers['Version'])).write_bytes(wheel_bytes(headers['Name'], headers['Version'], 'cp311-cp311-linux_x86_64'))
+		with self._lock:
+			self.built.append(Path(cwd).name)
+	
+	def __init__(self):
+		"""
+		
+		"""
+		
+		self._lock = Lock()
+		self.built = []
+
+
+class BuildSourcesTest(TestCase):
+	"""Source builds
+	Streaming the source packages out of the tarball and building them, natively or through setup.py.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+		sources = {
+			'beta-1.0': source_package('beta', '1.0'),
+			'delta-3.1': source_package('delta', '3.1', files={'delta/__init__.py': b'', 'delta/_speedups.c': b'int x;\n'}),
+			'duoauthproxy': source_package('duoauthproxy', '6.4.1', ['alpha', 'beta']),
+		}
+		self.tarball = InstallerTarball(build_tarball(self.temp_dir, sources=sources))
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def test_packages_are_yielded_as_soon_as_extracted(self):
+		"""Streamed extraction
+		Every package is handed out once its subtree is complete, before the packages after it in the tarball are read.
+		"""
+		
+		destination = self.temp_dir / 'sources'
+		stream = self.tarball.stream_packages(destination, 'beta-1.0', 'duoauthproxy')
+		
+		name, path = next(stream)
+		self.assertEqual((name, path), ('beta-1.0', destination / 'beta-1.0'))
+		self.assertEqual((path / 'beta' / '__init__.py').read_bytes(), b'VALUE = 1\n')
+		self.assertFalse((destination / 'duoauthproxy').exists())
+		
+		self.assertEqual([name for name, path in stream], ['duoauthproxy'])
+		self.assertTrue((destination / 'duoauthproxy' / 'setup.py').is_file())
+	
+	def test_missing_package_is_warned(self):
+		"""Missing package
+		Asking for a package that isn't in the tarball yields it empty, with a warning, instead of hanging the builds.
+		"""
+		
+		with self.assertLogs('duoauthproxy_installer', 'WARNING'):
+			result = list(self.tarball.stream_packages(self.temp_dir / 'sources', 'missing-1.0'))
+		self.assertEqual(result, [('missing-1.0', self.temp_dir / 'sources' / 'missing-1.0')])
+	
+	def test_pure_packages_need_no_venv(self):
+		"""Native builds only
+		When every module is pure python the wheels come straight from the stream and no build venv is created.
+		"""
+		
+		wheels_dir = self.temp_dir / 'wheels'
+		with patch.object(InstallerTarball, '_build_venv', side_effect=AssertionError('venv created')):
+			result = self.tarball.build_sources('beta-1.0', 'duoauthproxy', wheels_dir=wheels_dir)
+		
+		self.assertEqual(sorted(wheel.name for wheel in result), ['beta-1.0-py3-none-any.whl', 'duoauthproxy-6.4.1-py3-none-any.whl'])
+		with ZipFile(wheels_dir / 'duoauthproxy-6.4.1-py3-none-any.whl') as wheel_zip:
+			self.assertIn('Requires-Dist: alpha', wheel_zip.read('duoauthproxy-6.4.1.dist-info/METADATA').decode('utf8'))
+			self.assertIsNone(wheel_zip.testzip())
+		self.assertIn((wheels_dir / 'beta-1.0-py3-none-any.whl').absolute(), self.tarball.digests)
+	
+	def test_extension_modules_go_through_setup_py(self):
+		"""Mixed builds
+		The modules with extension sources are extracted and built with setup.py in the venv, next to the native builds.
+		"""
+		
+		venv = _SetupPyVenv()
+		wheels_dir = self.temp_dir / 'wheels'
+		with patch.object(InstallerTarball, '_build_venv', return_value=venv):
+			result = self.tarball.build_sources('beta-1.0', 'delta-3.1', 'duoauthproxy', wheels_dir=wheels_dir, max_workers=2, memory_budget=1 << 30, build_history=BuildHistory(self.temp_dir / 'build_history.json'))
+		
+		self.assertEqual(venv.built, ['delta-3.1'])
+		self.assertEqual(sorted(wheel.name for wheel in result), ['beta-1.0-py3-none-any.whl', 'delta-3.1-cp311-cp311-linux_x86_64.whl', 'duoauthproxy-6.4.1-py3-none-any.whl'])
+		self.assertTrue(all(wheel.parent == wheels_dir for wheel in result))
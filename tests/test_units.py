@@ -0,0 +1,156 @@
+#!python
+"""Service unit tests
+"""
+
+from configparser import ConfigParser
+from json import dumps as json_dumps
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from duoauthproxy_installer import InstallerTarball, RuntimeProfile
+
+from ._synthetic import build_tarball
+
+TEMPLATE_CONFIG = '''[main]
+debug=false
+
+[ad_client]
+host=10.0.0.1
+
+[radius_server_auto]
+port=1812
+client=ad_client
+
+[ldap_server_auto]
+client=ad_client
+'''
+
+
+def unit_settings(unit_text, section='Service'):
+	"""Unit settings
+	The (name, value) pairs of "section" in a systemd unit, in order.
+	"""
+	
+	result, current = [], None
+	for line in unit_text.splitlines():
+		if line.startswith('[') and line.endswith(']'):
+			current = line[1:-1]
+		elif (current == section) and ('=' in line):
+			result.append(tuple(line.split('=', 1)))
+	return result
+
+
+class InstanceUnitsTest(TestCase):
+	"""Multi-instance setup
+	The per instance configuration and the template and target units.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+		self.tarball = InstallerTarball(build_tarball(self.temp_dir))
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def test_instance_ports(self):
+		"""Instance ports
+		Every listening section moves by the stride per instance, starting from the configured or the default port; the rest of the configuration is left alone.
+		"""
+		
+		for instance, radius_port, ldap_port in ((1, '1812', '389'), (3, '1832', '409')):
+			config = ConfigParser(interpolation=None)
+			config.read_string(InstallerTarball.instance_config(TEMPLATE_CONFIG, instance, port_stride=10))
+			self.assertEqual((config['radius_server_auto']['port'], config['ldap_server_auto']['port']), (radius_port, ldap_port))
+			self.assertEqual(config['ad_client']['host'], '10.0.0.1')
+			self.assertNotIn('port', config['ad_client'])
+	
+	def test_template_and_target(self):
+		"""Instance units
+		The template unit binds the instance files into the standard locations and the target wants every instance.
+		"""
+		
+		result = self.tarball.render_instance_units(self.temp_dir, ['a', 'b'], install_dir='/opt/duoauthproxy', service_uid='duo_authproxy_svc')
+		
+		self.assertEqual(sorted(result), ['systemd_instance_unit', 'systemd_target'])
+		settings = unit_settings(result['systemd_instance_unit'].read_text())
+		self.assertIn(('BindReadOnlyPaths', '/opt/duoauthproxy/conf/instances/%i/authproxy.cfg:/opt/duoauthproxy/conf/authproxy.cfg'), settings)
+		self.assertIn(('PIDFile', '/opt/duoauthproxy/run/instances/%i/duoauthproxy.pid'), settings)
+		self.assertIn('--uid=duo_authproxy_svc', dict(settings)['ExecStart'])
+		self.assertEqual(unit_settings(result['systemd_target'].read_text(), 'Unit')[-1], ('Wants', 'duoauthproxy@a.service duoauthproxy@b.service'))
+		
+		result = self.tarball.render_instance_units(self.temp_dir, 3)
+		self.assertEqual(unit_settings(result['systemd_target'].read_text(), 'Unit')[-1], ('Wants', 'duoauthproxy@1.service duoauthproxy@2.service duoauthproxy@3.service'))
+	
+	def test_cpu_affinity_per_instance(self):
+		"""CPU affinity
+		The CPUs of the profile are shared out between the instances, in drop-ins, instead of pinning every instance to all of them.
+		"""
+		
+		profile = RuntimeProfile('high-throughput')
+		self.assertEqual(profile.service['CPUAffinity'], '0-3')
+		
+		result = self.tarball.render_instance_units(self.temp_dir, 2, install_dir='/opt/duoauthproxy', profile=profile)
+		settings = dict(unit_settings(result['systemd_instance_unit'].read_text()))
+		self.assertNotIn('CPUAffinity', settings)
+		self.assertEqual(settings['Nice'], '-5')
+		self.assertEqual(result['systemd_drop_in_1'], self.temp_dir / 'duoauthproxy@1.service.d' / 'runtime-profile.conf')
+		self.assertEqual([unit_settings(result['systemd_drop_in_{}'.format(instance)].read_text()) for instance in (1, 2)], [[('CPUAffinity', '0 1')], [('CPUAffinity', '2 3')]])
+		
+		result = self.tarball.render_instance_units(self.temp_dir, 6, profile=profile)
+		self.assertEqual([dict(unit_settings(result['systemd_drop_in_{}'.format(instance)].read_text()))['CPUAffinity'] for instance in range(1, 7)], ['0', '1', '2', '3', '0', '1'])
+		
+		self.assertEqual(profile.instance_service(0, 1), {'CPUAffinity': '0 1 2 3'})
+		self.assertEqual(RuntimeProfile('low-latency').instance_service(0, 2), {})
+
+
+class RuntimeProfileTest(TestCase):
+	"""Runtime profiles
+	Loading and validating the service tuning profiles.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def test_shipped_profiles_are_valid(self):
+		"""Shipped profiles
+		Every profile in the data directory loads and validates.
+		"""
+		
+		self.assertEqual(RuntimeProfile.available(), ['high-throughput', 'low-latency', 'memory-constrained'])
+		for name in RuntimeProfile.available():
+			self.assertEqual(RuntimeProfile(name).name, name)
+	
+	def test_invalid_profiles_are_rejected(self):
+		"""Invalid profiles
+		Unknown profiles, keys and service settings or bad values are refused when the profile is loaded.
+		"""
+		
+		with self.assertRaises(FileNotFoundError):
+			RuntimeProfile('turbo')
+		for profile in ({'service': {'CPUAffinity': 'all'}}, {'service': {'ExecStartPre': '/bin/true'}}, {'service': {'Nice': -30}}, {'reactor': 'kqueue'}, {'environment': {'PYTHONOPTIMIZE': '3'}}, {'tuning': {}}):
+			profile_file = self.temp_dir / 'profile.json'
+			profile_file.write_text(json_dumps(profile))
+			with self.assertRaises(ValueError, msg=str(profile)):
+				RuntimeProfile(profile_file)
@@ -0,0 +1,142 @@
+#!python
+"""Native wheel builder tests
+"""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+from zipfile import ZipFile
+
+from duoauthproxy_installer import InstallerTarball
+from duoauthproxy_installer._wheelbuilder import PureWheelBuilder
+
+from ._synthetic import build_tarball, record_hash, source_package
+
+PYPROJECT_PACKAGE_DATA = '''[build-system]
+requires = ["setuptools"]
+build-backend = "setuptools.build_meta"
+
+[tool.setuptools]
+include-package-data = true
+'''
+
+
+class PureWheelBuilderTest(TestCase):
+	"""Native wheel builds
+	Pure python wheels written straight from the tarball stream, and the packages sent back to setup.py.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def stream(self, *packages):
+		"""Stream the packages
+		Builds a tarball with the "packages" (pairs of directory name and files) and streams them with their builders, the tarball is never read out of the stream. Returns the builders and the {package: yielded path} map.
+		"""
+		
+		tarball = InstallerTarball(build_tarball(self.temp_dir, sources=dict(packages)))
+		builders = {package: PureWheelBuilder.for_package(tarball, package, self.temp_dir / 'wheels') for package, files in packages}
+		builders = {package: builder for package, builder in builders.items() if builder is not None}
+		with patch.object(InstallerTarball, 'open_member', side_effect=AssertionError('random access read')):
+			result = dict(tarball.stream_packages(self.temp_dir / 'sources', *dict(packages), builders=builders))
+		return builders, result
+	
+	def test_wheel_from_the_stream(self):
+		"""Native wheel
+		The wheel gets the package files and the license (in the dist-info, declared in the metadata), with a RECORD matching the content, without reading the tarball out of the stream.
+		"""
+		
+		files = {'beta/__init__.py': b'VALUE = 1\n', 'beta/core.py': b'def run():\n\treturn 1\n'}
+		package = source_package('beta', '1.0', ['alpha>=1.0'], files=dict(files, LICENSE=b'MIT\n'))
+		builders, result = self.stream(('beta-1.0', package))
+		
+		wheel = result['beta-1.0']
+		self.assertEqual(wheel, self.temp_dir / 'wheels' / 'beta-1.0-py3-none-any.whl')
+		self.assertFalse((self.temp_dir / 'sources' / 'beta-1.0').exists())
+		with ZipFile(wheel) as wheel_zip:
+			names = set(wheel_zip.namelist())
+			self.assertEqual(names, set(files) | {'beta-1.0.dist-info/{}'.format(name) for name in ('LICENSE', 'METADATA', 'WHEEL', 'top_level.txt', 'RECORD')})
+			metadata = wheel_zip.read('beta-1.0.dist-info/METADATA').decode('utf8')
+			self.assertIn('License-File: LICENSE', metadata.splitlines())
+			self.assertIn('Requires-Dist: alpha>=1.0', metadata.splitlines())
+			record = [line.split(',') for line in wheel_zip.read('beta-1.0.dist-info/RECORD').decode('utf8').splitlines()]
+			for path, digest, size in record:
+				if path != 'beta-1.0.dist-info/RECORD':
+					content = wheel_zip.read(path)
+					self.assertEqual((digest, int(size)), (record_hash(content), len(content)))
+		self.assertIsNotNone(builders['beta-1.0'].digest)
+	
+	def test_extension_modules_have_no_builder(self):
+		"""Extension modules
+		A package with extension sources is left to setup.py from the start.
+		"""
+		
+		package = source_package('delta', '3.1', files={'delta/__init__.py': b'', 'delta/_speedups.c': b'int x;\n'})
+		builders, result = self.stream(('delta-3.1', package))
+		
+		self.assertEqual(builders, {})
+		self.assertTrue((result['delta-3.1'] / 'delta' / '_speedups.c').is_file())
+	
+	def test_package_data_falls_back(self):
+		"""Package data
+		Data files in the package sources (MANIFEST.in) send the package to setup.py, extracted in full, with the files spooled before the metadata was read.
+		"""
+		
+		package = source_package('epsilon', '2.0', files={'epsilon/__init__.py': b'', 'epsilon/schema.json': b'{}\n', 'MANIFEST.in': b'include epsilon/*.json\n'})
+		builders, result = self.stream(('epsilon-2.0', package))
+		
+		self.assertIsNotNone(builders['epsilon-2.0'].fallback)
+		self.assertEqual(result['epsilon-2.0'], self.temp_dir / 'sources' / 'epsilon-2.0')
+		extracted = {path.relative_to(result['epsilon-2.0']).as_posix(): path.read_bytes() for path in result['epsilon-2.0'].rglob('*') if path.is_file()}
+		self.assertEqual(extracted, package)
+		self.assertEqual(list((self.temp_dir / 'wheels').glob('*')), [])
+	
+	def test_include_package_data_keyword_falls_back(self):
+		"""include_package_data
+		The keyword in setup.py is enough to send the package to setup.py.
+		"""
+		
+		setup = "from setuptools import setup\nsetup(name='zeta', version='1.0', packages=['zeta'], include_package_data=True)\n"
+		builders, result = self.stream(('zeta-1.0', source_package('zeta', '1.0', setup=setup)))
+		
+		self.assertIn('include_package_data', builders['zeta-1.0'].fallback)
+		self.assertTrue((result['zeta-1.0'] / 'zeta' / '__init__.py').is_file())
+	
+	def test_pyproject_package_data_falls_back(self):
+		"""pyproject.toml configuration
+		The package data settings of the setuptools table in pyproject.toml send the package to setup.py too.
+		"""
+		
+		package = source_package('eta', '1.0', files={'eta/__init__.py': b'', 'pyproject.toml': PYPROJECT_PACKAGE_DATA.encode('utf8')})
+		builders, result = self.stream(('eta-1.0', package))
+		
+		self.assertIn('pyproject.toml', builders['eta-1.0'].fallback)
+		self.assertTrue((result['eta-1.0'] / 'pyproject.toml').is_file())
+	
+	def test_failed_finish_falls_back(self):
+		"""Failed wheel
+		When the wheel can't be finished the package is extracted and handed to setup.py, instead of failing the whole build.
+		"""
+		
+		package = source_package('beta', '1.0')
+		with patch.object(PureWheelBuilder, 'finish', side_effect=RuntimeError('Missing files')), self.assertLogs('duoauthproxy_installer', 'WARNING'):
+			tarball = InstallerTarball(build_tarball(self.temp_dir, sources={'beta-1.0': package}))
+			builders = {'beta-1.0': PureWheelBuilder.for_package(tarball, 'beta-1.0', self.temp_dir / 'wheels')}
+			result = dict(tarball.stream_packages(self.temp_dir / 'sources', 'beta-1.0', builders=builders))
+		
+		self.assertEqual(result['beta-1.0'], self.temp_dir / 'sources' / 'beta-1.0')
+		self.assertEqual((result['beta-1.0'] / 'setup.py').read_bytes(), package['setup.py'])
+		self.assertEqual(list((self.temp_dir / 'wheels').glob('*.part')), [])
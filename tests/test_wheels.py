@@ -0,0 +1,207 @@
+#!python
+"""Wheel sources and resolver tests
+"""
+
+from functools import partial
+from hashlib import sha256
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import TestCase
+
+from duoauthproxy_installer._wheels import SdistSource, SimpleIndexSource, WheelEntry, WheelhouseSource, WheelResolver, WheelSource, canonical_version
+
+from ._synthetic import write_wheel
+
+TAGS = ('cp311-cp311-manylinux_2_17_x86_64', 'cp311-abi3-manylinux_2_17_x86_64', 'py3-none-any')
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+	"""
+	
+	"""
+	
+	def log_message(self, format, *args):
+		"""
+		
+		"""
+		
+		pass
+
+
+class _FlakyWheelhouse(WheelhouseSource):
+	"""
+	
+	"""
+	
+	def __init__(self, path, failures=1):
+		"""
+		
+		"""
+		
+		super().__init__(path)
+		self.failures, self.calls = failures, 0
+	
+	def entries(self, *names):
+		"""
+		
+		"""
+		
+		self.calls += 1
+		if self.calls <= self.failures:
+			raise ConnectionError('transient failure')
+		return super().entries(*names)
+
+
+class WheelResolverTest(TestCase):
+	"""Wheel resolver
+	Resolution against a local wheelhouse and a simple index served over HTTP.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.temp_dir = Path(self._temp_dir.name)
+		self.wheelhouse = self.temp_dir / 'wheelhouse'
+		self.wheelhouse.mkdir()
+		self.destination = self.temp_dir / 'destination'
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def serve_index(self, *wheels):
+		"""Serve a simple index
+		Starts an "http.server" with a PEP-503 tree ("simple/<project>/index.html") linking the "wheels" (with their sha256) and returns the index URL.
+		"""
+		
+		root = self.temp_dir / 'index'
+		for wheel in wheels:
+			project_dir = root / 'simple' / wheel.name.split('-')[0].lower()
+			project_dir.mkdir(parents=True, exist_ok=True)
+			(root / 'files').mkdir(exist_ok=True)
+			(root / 'files' / wheel.name).write_bytes(wheel.read_bytes())
+			link = '<a href="../../files/{0}#sha256={1}">{0}</a>\n'.format(wheel.name, sha256(wheel.read_bytes()).hexdigest())
+			with (project_dir / 'index.html').open('a') as index_f:
+				index_f.write(link)
+		
+		server = ThreadingHTTPServer(('127.0.0.1', 0), partial(_QuietHandler, directory=str(root)))
+		Thread(target=server.serve_forever, daemon=True).start()
+		self.addCleanup(server.server_close)
+		self.addCleanup(server.shutdown)
+		return 'http://127.0.0.1:{}/simple/'.format(server.server_address[1])
+	
+	def test_wheelhouse_best_tag(self):
+		"""Wheelhouse with several builds
+		The build with the most preferred tag is fetched, the incompatible ones are ignored.
+		"""
+		
+		write_wheel(self.wheelhouse, 'delta', '1.0')
+		write_wheel(self.wheelhouse, 'delta', '1.0', 'cp311-cp311-manylinux_2_17_x86_64')
+		write_wheel(self.wheelhouse, 'delta', '1.0', 'cp27-cp27mu-manylinux1_x86_64')
+		
+		fetched = WheelResolver(WheelhouseSource(self.wheelhouse), tags=TAGS).fetch({'delta': '1.0'}, self.destination)
+		self.assertEqual([wheel.name for wheel in fetched], ['delta-1.0-cp311-cp311-manylinux_2_17_x86_64.whl'])
+		self.assertTrue(fetched[0].exists())
+	
+	def test_simple_index(self):
+		"""Simple index over HTTP
+		Wheels are listed from the project pages and downloaded with their hash checked.
+		"""
+		
+		index_url = self.serve_index(write_wheel(self.wheelhouse, 'delta', '2.0'), write_wheel(self.wheelhouse, 'epsilon', '1.1'))
+		fetched = WheelResolver(SimpleIndexSource(index_url), tags=TAGS).fetch({'Delta': '2.0', 'epsilon': '1.1'}, self.destination)
+		
+		self.assertEqual(sorted(wheel.name for wheel in fetched), ['delta-2.0-py3-none-any.whl', 'epsilon-1.1-py3-none-any.whl'])
+		self.assertEqual(fetched[0].read_bytes(), (self.wheelhouse / fetched[0].name).read_bytes())
+	
+	def test_simple_index_hash_mismatch(self):
+		"""Corrupted download
+		A wheel not matching the hash in the index is rejected and nothing is left behind.
+		"""
+		
+		wheel = write_wheel(self.wheelhouse, 'delta', '2.0')
+		index_url = self.serve_index(wheel)
+		(self.temp_dir / 'index' / 'files' / wheel.name).write_bytes(b'tampered')
+		
+		with self.assertRaisesRegex(RuntimeError, 'Hash mismatch'):
+			WheelResolver(SimpleIndexSource(index_url), tags=TAGS).fetch({'delta': '2.0'}, self.destination)
+		self.assertEqual(list(self.destination.iterdir()), [])
+	
+	def test_source_preference(self):
+		"""Source preference
+		When several sources have the wheel, the first one wins; the rest only fill the gaps.
+		"""
+		
+		index_url = self.serve_index(write_wheel(self.temp_dir, 'delta', '1.0'), write_wheel(self.temp_dir, 'epsilon', '1.0'))
+		write_wheel(self.wheelhouse, 'delta', '1.0')
+		resolver = WheelResolver(WheelhouseSource(self.wheelhouse), SimpleIndexSource(index_url), tags=TAGS)
+		
+		resolved, unresolved = resolver.resolve({'delta': '1.0', 'epsilon': '1.0', 'zeta': '1.0'})
+		self.assertIsInstance(resolved['delta'].source, WheelhouseSource)
+		self.assertIsInstance(resolved['epsilon'].source, SimpleIndexSource)
+		self.assertEqual(unresolved, {'zeta': '1.0'})
+		with self.assertRaisesRegex(RuntimeError, 'zeta==1.0'):
+			resolver.fetch({'zeta': '1.0'}, self.destination)
+	
+	def test_failed_source_is_retried(self):
+		"""Transient source failures
+		A name is only considered indexed after its source answered, so a failure doesn't hide it for the rest of the run.
+		"""
+		
+		write_wheel(self.wheelhouse, 'delta', '1.0')
+		flaky = _FlakyWheelhouse(self.wheelhouse)
+		resolver = WheelResolver(flaky, tags=TAGS)
+		
+		self.assertEqual(resolver.resolve({'delta': '1.0'}), ({}, {'delta': '1.0'}))
+		resolved, unresolved = resolver.resolve({'delta': '1.0'})
+		self.assertEqual(unresolved, {})
+		self.assertEqual(resolved['delta'].file_name, 'delta-1.0-py3-none-any.whl')
+		resolver.resolve({'delta': '1.0'})
+		self.assertEqual(flaky.calls, 2)
+	
+	def test_versions_are_normalized(self):
+		"""Version normalization
+		Versions are compared as PEP-440 versions, not as strings.
+		"""
+		
+		write_wheel(self.wheelhouse, 'delta', '1.0')
+		write_wheel(self.wheelhouse, 'epsilon', '2.0.0')
+		resolved, unresolved = WheelResolver(WheelhouseSource(self.wheelhouse), tags=TAGS).resolve({'delta': '1.0.0', 'epsilon': '2'})
+		
+		self.assertEqual(unresolved, {})
+		self.assertEqual(sorted(entry.file_name for entry in resolved.values()), ['delta-1.0-py3-none-any.whl', 'epsilon-2.0.0-py3-none-any.whl'])
+		self.assertEqual(canonical_version('1.0.0'), canonical_version('1'))
+	
+	def test_incomplete_source(self):
+		"""Incomplete sources
+		A wheel source has to implement both "entries" and "fetch", or it can't be created at all; the source distribution fallback "fetches" by building.
+		"""
+		
+		class ListingOnly(WheelSource):
+			"""
+			
+			"""
+			
+			def entries(self, *names):
+				"""
+				
+				"""
+				
+				return []
+		
+		with self.assertRaises(TypeError):
+			ListingOnly()
+		
+		built = []
+		sdist = SdistSource()
+		sdist.build = lambda name, version, destination: built.append((name, version, destination))
+		sdist.fetch(WheelEntry('delta-1.0-py3-none-any.whl', None, sdist), self.destination)
+		self.assertEqual(built, [('delta', '1.0', self.destination)])
@@ -0,0 +1,122 @@
+#!python
+"""Yum repository tests
+"""
+
+from gzip import open as gzip_open
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+from xml.etree.ElementTree import fromstring as xml_fromstring
+
+from duoauthproxy_installer._yumrepo import NAMESPACES, YumRepository, read_rpm_header, rpm_version_compare
+
+from ._synthetic import rpm_bytes
+
+
+class YumRepositoryTest(TestCase):
+	"""Yum repository
+	Indexing synthetic RPM packages incrementally, and pruning the old releases.
+	"""
+	
+	def setUp(self):
+		"""
+		
+		"""
+		
+		self._temp_dir = TemporaryDirectory()
+		self.repo_dir = Path(self._temp_dir.name)
+	
+	def tearDown(self):
+		"""
+		
+		"""
+		
+		self._temp_dir.cleanup()
+	
+	def write_rpm(self, name, version, release, arch='x86_64', **details):
+		"""Write an RPM
+		Writes the "rpm_bytes" package into the repository directory, named the way rpmbuild does, and returns its path.
+		"""
+		
+		rpm_path = self.repo_dir / '{}-{}-{}.{}.rpm'.format(name, version, release, arch)
+		rpm_path.write_bytes(rpm_bytes(name, version, release, arch, **details))
+		return rpm_path
+	
+	def primary(self):
+		"""Primary metadata
+		The (name, epoch, version, release) of the packages in the primary metadata that "repomd.xml" points to.
+		"""
+		
+		repomd = xml_fromstring((self.repo_dir / 'repodata' / 'repomd.xml').read_text())
+		location = next(data.find('{{{}}}location'.format(NAMESPACES['repo'])).get('href') for data in repomd.iter('{{{}}}data'.format(NAMESPACES['repo'])) if data.get('type') == 'primary')
+		with gzip_open(self.repo_dir / location, 'rt', encoding='utf8') as primary_f:
+			primary = xml_fromstring(primary_f.read())
+		result = []
+		for package in primary.iter('{{{}}}package'.format(NAMESPACES['common'])):
+			version = package.find('{{{}}}version'.format(NAMESPACES['common']))
+			result.append((package.find('{{{}}}name'.format(NAMESPACES['common'])).text, version.get('epoch'), version.get('ver'), version.get('rel')))
+		return sorted(result)
+	
+	def test_header(self):
+		"""Package header
+		The main header is read past the lead and the signature, and the details come out of it.
+		"""
+		
+		rpm_path = self.write_rpm('duoauthproxy', '6.4.1', '1', epoch=2, requires=['python3'])
+		header, (start, end) = read_rpm_header(rpm_path)
+		self.assertEqual((header[1000], header[1001], header[1002], header[1003]), ('duoauthproxy', '6.4.1', '1', [2]))
+		self.assertEqual(end, len(rpm_path.read_bytes()) - len(b'payload'))
+		
+		details = YumRepository(self.repo_dir).package_details(rpm_path)
+		self.assertEqual((details['epoch'], details['arch'], details['href']), ('2', 'x86_64', rpm_path.name))
+		self.assertEqual(details['requires'], [('python3', None, None, None, None, False)])
+		self.assertEqual(details['files'], [('/opt/duoauthproxy/bin/authproxyctl', None), ('/etc/duoauthproxy.cfg', None)])
+		self.assertEqual(details['changelogs'], [('Packager <packager@example.com>', 1700000000, '- Release 1')])
+	
+	def test_incremental_update(self):
+		"""Incremental update
+		Only the headers of the new or modified packages are read on every update; the gone ones are dropped, and the previous metadata files removed.
+		"""
+		
+		self.write_rpm('duoauthproxy', '6.4.1', '1')
+		deps = self.write_rpm('duoauthproxy-deps', '6.4.1', '1.abc')
+		result = YumRepository(self.repo_dir).update()
+		self.assertEqual(result, {'added': ['duoauthproxy-6.4.1-1.x86_64.rpm', 'duoauthproxy-deps-6.4.1-1.abc.x86_64.rpm'], 'removed': [], 'pruned': [], 'reused': 0})
+		first_metadata = set((self.repo_dir / 'repodata').iterdir())
+		
+		self.write_rpm('duoauthproxy', '6.4.2', '1')
+		deps.unlink()
+		repository = YumRepository(self.repo_dir)
+		with patch('duoauthproxy_installer._yumrepo.read_rpm_header', wraps=read_rpm_header) as read_header:
+			result = repository.update()
+		self.assertEqual([call.args[0].name for call in read_header.call_args_list], ['duoauthproxy-6.4.2-1.x86_64.rpm'])
+		self.assertEqual(result, {'added': ['duoauthproxy-6.4.2-1.x86_64.rpm'], 'removed': ['duoauthproxy-deps-6.4.1-1.abc.x86_64.rpm'], 'pruned': [], 'reused': 1})
+		self.assertEqual(self.primary(), [('duoauthproxy', '0', '6.4.1', '1'), ('duoauthproxy', '0', '6.4.2', '1')])
+		self.assertEqual(first_metadata & set((self.repo_dir / 'repodata').iterdir()), {self.repo_dir / 'repodata' / 'package_cache.json.gz', self.repo_dir / 'repodata' / 'repomd.xml'})
+	
+	def test_keep_releases(self):
+		"""Pruning
+		With "keep_releases" only the newest releases of every package and architecture are kept, by epoch, version and release; the rest are deleted.
+		"""
+		
+		for name, version, release, epoch in (('duoauthproxy', '6.4.1', '2', None), ('duoauthproxy', '6.4.1', '10', None), ('duoauthproxy', '6.4.10', '1', None), ('duoauthproxy', '6.4.9', '1', None), ('duoauthproxy-deps', '9.0', '1', None), ('duoauthproxy-deps', '1.0', '1', 1)):
+			self.write_rpm(name, version, release, epoch=epoch)
+		self.write_rpm('duoauthproxy', '6.4.1', '1', 'noarch')
+		
+		result = YumRepository(self.repo_dir).update(keep_releases=3)
+		self.assertEqual(result['pruned'], ['duoauthproxy-6.4.1-2.x86_64.rpm'])
+		
+		result = YumRepository(self.repo_dir).update(keep_releases=1)
+		self.assertEqual(result['pruned'], ['duoauthproxy-6.4.1-10.x86_64.rpm', 'duoauthproxy-6.4.9-1.x86_64.rpm', 'duoauthproxy-deps-9.0-1.x86_64.rpm'])
+		self.assertEqual(result['reused'], 6)
+		self.assertEqual(sorted(path.name for path in self.repo_dir.glob('*.rpm')), ['duoauthproxy-6.4.1-1.noarch.rpm', 'duoauthproxy-6.4.10-1.x86_64.rpm', 'duoauthproxy-deps-1.0-1.x86_64.rpm'])
+		self.assertEqual(self.primary(), [('duoauthproxy', '0', '6.4.1', '1'), ('duoauthproxy', '0', '6.4.10', '1'), ('duoauthproxy-deps', '1', '1.0', '1')])
+	
+	def test_version_compare(self):
+		"""Version comparison
+		The "rpmvercmp" ordering: numeric segments by value, letters before numbers, tildes before anything and carets after.
+		"""
+		
+		for first, second, expected in (('1.0', '1.0', 0), ('1.10', '1.9', 1), ('1.0', '1.0.1', -1), ('1.0a', '1.0', 1), ('1.0~rc1', '1.0', -1), ('1.0^git1', '1.0', 1), ('a', '1', -1), ('1.001', '1.1', 0)):
+			self.assertEqual(rpm_version_compare(first, second), expected, (first, second))